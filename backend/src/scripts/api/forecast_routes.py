@@ -13,6 +13,7 @@ from dotenv import load_dotenv, find_dotenv
 
 # 导入模型初始化模块
 from backend.src.scripts.model_train.models import generate_initial_data, initialize_all_models
+from backend.src.scripts.utils.change_events import ScopedCache, get_change_subscriber
 
 # Determine the backend directory and load .env from there
 backend_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -117,6 +118,11 @@ def connect_to_db():
         logger.error(f"数据库连接失败: {str(e)}")
         return None
 
+# 预测使用的历史数据缓存，导入脚本发布数据变更事件后只失效涉及的城市和日期范围
+HISTORY_TABLES = ['air_quality_data', 'air_quality_newdata']
+HISTORY_CACHE = ScopedCache('forecast_history', max_entries=256)
+get_change_subscriber(connect_to_db).subscribe(HISTORY_CACHE.invalidate, tables=HISTORY_TABLES)
+
 # 从数据库获取最近的数据
 def get_recent_data(city_id, indicator, days=30):
     """从数据库获取最近n天的数据"""
@@ -445,6 +451,14 @@ def get_historical_data(city_id, indicator, days):
         start_date_str = start_date.strftime('%Y-%m-%d')
         end_date_str = end_date.strftime('%Y-%m-%d')
         
+        cache_key = (city_name, db_column_name, start_date_str, end_date_str)
+        cached = HISTORY_CACHE.get(cache_key)
+        if cached is not None:
+            logger.info(f"历史查询: 命中缓存 {cache_key}")
+            return [dict(item) for item in cached]
+        version = HISTORY_CACHE.version()
+        query_failed = False
+        
         # 从数据库查询数据
         conn = connect_to_db()
         if not conn:
@@ -469,6 +483,7 @@ def get_historical_data(city_id, indicator, days):
         except Exception as e:
             logger.error(f"历史查询: 查询air_quality_newdata表出错: {str(e)}")
             new_data_rows = []
+            query_failed = True
         
         # 再从air_quality_data表获取历史数据
         historical_rows = []
@@ -485,6 +500,7 @@ def get_historical_data(city_id, indicator, days):
         except Exception as e:
             logger.error(f"历史查询: 查询air_quality_data表出错: {str(e)}")
             historical_rows = []
+            query_failed = True
         
         # 合并结果
         combined_rows = historical_rows + new_data_rows
@@ -549,6 +565,10 @@ def get_historical_data(city_id, indicator, days):
         conn.close()
         
         logger.info(f"历史查询: 最终处理后返回 {len(history_data)} 条历史数据")
+        # 查询出错时结果不完整，不写入缓存
+        if not query_failed:
+            HISTORY_CACHE.put(cache_key, [dict(item) for item in history_data], version,
+                              HISTORY_TABLES, [city_name], start_date_str, end_date_str)
         return history_data
     except Exception as e:
         logger.error(f"获取历史数据错误: {str(e)}")
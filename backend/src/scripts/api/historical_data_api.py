@@ -32,6 +32,11 @@ backend_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os
 dotenv_path = os.path.join(backend_dir, '.env')
 if os.path.exists(dotenv_path):
     load_dotenv(dotenv_path)
+if backend_dir not in sys.path:
+    sys.path.append(backend_dir)
+
+from src.scripts.utils.change_events import ScopedCache, get_change_subscriber
+from src.scripts.utils.region_registry import get_region_registry
 
 # 配置日志
 api_logger = logging.getLogger('historical_api')
@@ -48,6 +53,10 @@ historical_bp = Blueprint('historical', __name__)
 # 跟踪正在运行的后台进程
 BACKGROUND_PROCESSES = []
 
+# 历史数据查询缓存，导入脚本发布数据变更事件后只失效涉及的城市和日期范围
+HISTORICAL_TABLES = ['air_quality_data', 'air_quality_newdata']
+HISTORICAL_CACHE = ScopedCache('historical', max_entries=int(os.environ.get('HISTORICAL_CACHE_ENTRIES', '512')))
+
 # 定义一个清理函数，确保程序退出时终止所有子进程
 def cleanup_processes():
     for process in BACKGROUND_PROCESSES:
@@ -155,6 +164,9 @@ def connect_to_db():
             api_logger.error(f"错误信息: {e.msg}")
         return None
 
+# 订阅导入脚本发布的数据变更事件，按变更范围失效历史数据缓存
+get_change_subscriber(connect_to_db).subscribe(HISTORICAL_CACHE.invalidate, tables=HISTORICAL_TABLES)
+
 class DateTimeEncoder(json.JSONEncoder):
     """处理JSON序列化datetime对象"""
     def default(self, obj):
@@ -229,6 +241,78 @@ def get_date_range():
             'message': str(e)
         }), 500
 
+def query_historical_rows(conn, city, start_date, end_date, quality_level='all'):
+    """查询一个城市在日期范围内的日数据（两个表合并）"""
+    cursor = conn.cursor(dictionary=True)
+    try:
+        results = []
+
+        # 分别查询两个表，然后合并结果
+        # 第一个表: air_quality_data
+        query1 = """
+        SELECT 
+            city,
+            DATE_FORMAT(record_date, '%Y-%m-%d') as date,
+            aqi_index as aqi,
+            quality_level,
+            pm25_avg as pm25,
+            pm10_avg as pm10,
+            so2_avg as so2,
+            no2_avg as no2,
+            o3_avg as o3,
+            co_avg as co
+        FROM air_quality_data
+        WHERE city = %s AND record_date BETWEEN %s AND %s
+        """
+
+        params1 = [city, start_date, end_date]
+
+        # 添加空气质量等级筛选
+        if quality_level != 'all':
+            query1 += " AND quality_level = %s"
+            params1.append(quality_level)
+
+        api_logger.debug(f"执行SQL查询1: {query1}")
+        api_logger.debug(f"查询参数1: {params1}")
+
+        cursor.execute(query1, params1)
+        results1 = cursor.fetchall()
+        results.extend(results1)
+
+        # 第二个表: air_quality_newdata
+        query2 = """
+        SELECT 
+            city,
+            DATE_FORMAT(record_date, '%Y-%m-%d') as date,
+            aqi_index as aqi,
+            quality_level,
+            pm25_avg as pm25,
+            pm10_avg as pm10,
+            so2_avg as so2,
+            no2_avg as no2,
+            o3_avg as o3,
+            co_avg as co
+        FROM air_quality_newdata
+        WHERE city = %s AND record_date BETWEEN %s AND %s
+        """
+
+        params2 = [city, start_date, end_date]
+
+        # 添加空气质量等级筛选
+        if quality_level != 'all':
+            query2 += " AND quality_level = %s"
+            params2.append(quality_level)
+
+        api_logger.debug(f"执行SQL查询2: {query2}")
+        api_logger.debug(f"查询参数2: {params2}")
+
+        cursor.execute(query2, params2)
+        results2 = cursor.fetchall()
+        results.extend(results2)
+        return results
+    finally:
+        cursor.close()
+
 @historical_bp.route('/api/air-quality/historical', methods=['GET'])
 @historical_bp.route('/air-quality/historical', methods=['GET'])
 def get_historical_data():
@@ -265,83 +349,35 @@ def get_historical_data():
                 'message': '日期格式错误，请使用YYYY-MM-DD格式'
             }), 400
         
-        # 连接数据库
-        conn = connect_to_db()
-        if not conn:
-            # 如果数据库连接失败，返回错误信息
-            return jsonify({
-                'status': 'error',
-                'message': '数据库连接失败'
-            }), 500
-            
-        cursor = conn.cursor(dictionary=True)
-        
+        cache_key = (city, start_date, end_date, quality_level)
+        cached = HISTORICAL_CACHE.get(cache_key)
+        if cached is None:
+            version = HISTORICAL_CACHE.version()
+            # 连接数据库
+            conn = connect_to_db()
+            if not conn:
+                # 如果数据库连接失败，返回错误信息
+                return jsonify({
+                    'status': 'error',
+                    'message': '数据库连接失败'
+                }), 500
+            try:
+                cached = query_historical_rows(conn, city, start_date, end_date, quality_level)
+            except Exception as db_error:
+                api_logger.error(f"SQL执行错误: {str(db_error)}")
+                return jsonify({
+                    'status': 'error',
+                    'message': f'数据库查询错误: {str(db_error)}'
+                }), 500
+            finally:
+                conn.close()
+            HISTORICAL_CACHE.put(cache_key, cached, version, HISTORICAL_TABLES, [city], start_date, end_date)
+        else:
+            api_logger.debug(f"历史数据命中缓存: {cache_key}")
+
+        # 缓存中的行供多个请求共用，复制后再处理
+        results = [dict(row) for row in cached]
         try:
-            results = []
-            
-            # 分别查询两个表，然后合并结果
-            # 第一个表: air_quality_data
-            query1 = """
-            SELECT 
-                city,
-                DATE_FORMAT(record_date, '%Y-%m-%d') as date,
-                aqi_index as aqi,
-                quality_level,
-                pm25_avg as pm25,
-                pm10_avg as pm10,
-                so2_avg as so2,
-                no2_avg as no2,
-                o3_avg as o3,
-                co_avg as co
-            FROM air_quality_data
-            WHERE city = %s AND record_date BETWEEN %s AND %s
-            """
-            
-            params1 = [city, start_date, end_date]
-            
-            # 添加空气质量等级筛选
-            if quality_level != 'all':
-                query1 += " AND quality_level = %s"
-                params1.append(quality_level)
-            
-            api_logger.debug(f"执行SQL查询1: {query1}")
-            api_logger.debug(f"查询参数1: {params1}")
-            
-            cursor.execute(query1, params1)
-            results1 = cursor.fetchall()
-            results.extend(results1)
-            
-            # 第二个表: air_quality_newdata
-            query2 = """
-            SELECT 
-                city,
-                DATE_FORMAT(record_date, '%Y-%m-%d') as date,
-                aqi_index as aqi,
-                quality_level,
-                pm25_avg as pm25,
-                pm10_avg as pm10,
-                so2_avg as so2,
-                no2_avg as no2,
-                o3_avg as o3,
-                co_avg as co
-            FROM air_quality_newdata
-            WHERE city = %s AND record_date BETWEEN %s AND %s
-            """
-            
-            params2 = [city, start_date, end_date]
-            
-            # 添加空气质量等级筛选
-            if quality_level != 'all':
-                query2 += " AND quality_level = %s"
-                params2.append(quality_level)
-            
-            api_logger.debug(f"执行SQL查询2: {query2}")
-            api_logger.debug(f"查询参数2: {params2}")
-            
-            cursor.execute(query2, params2)
-            results2 = cursor.fetchall()
-            results.extend(results2)
-            
             # 如果数据类型不是全部，过滤数据
             if data_type != 'all' and results:
                 filtered_results = []
@@ -365,15 +401,12 @@ def get_historical_data():
                 'status': 'success',
                 'data': results
             })
-        except Exception as db_error:
-            api_logger.error(f"SQL执行错误: {str(db_error)}")
+        except Exception as process_error:
+            api_logger.error(f"处理历史数据出错: {str(process_error)}")
             return jsonify({
                 'status': 'error',
-                'message': f'数据库查询错误: {str(db_error)}'
+                'message': f'数据处理错误: {str(process_error)}'
             }), 500
-        finally:
-            cursor.close()
-            conn.close()
     except Exception as e:
         api_logger.error(f"获取历史数据失败: {str(e)}")
         return jsonify({
@@ -529,14 +562,9 @@ def get_cities():
         
         conn.close()
         
-        # 如果数据库中没有城市数据，使用默认列表
+        # 如果数据库中没有城市数据，使用区域登记表中启用省份的城市
         if not cities:
-            cities = [
-                '广州市', '深圳市', '珠海市', '汕头市', '佛山市', '韶关市', 
-                '湛江市', '肇庆市', '江门市', '茂名市', '惠州市', '梅州市', 
-                '汕尾市', '河源市', '阳江市', '清远市', '东莞市', '中山市', 
-                '潮州市', '揭阳市', '云浮市'
-            ]
+            cities = get_region_registry().cities()
         
         return jsonify({
             'status': 'success',
@@ -544,18 +572,21 @@ def get_cities():
         })
     except Exception as e:
         api_logger.error(f"获取城市列表失败: {str(e)}")
-        # 返回默认城市列表
-        default_cities = [
-            '广州市', '深圳市', '珠海市', '汕头市', '佛山市', '韶关市', 
-            '湛江市', '肇庆市', '江门市', '茂名市', '惠州市', '梅州市', 
-            '汕尾市', '河源市', '阳江市', '清远市', '东莞市', '中山市', 
-            '潮州市', '揭阳市', '云浮市'
-        ]
+        # 返回区域登记表中的城市列表
+        default_cities = get_region_registry().cities()
         return jsonify({
             'status': 'success',
             'data': default_cities
         })
 
+@app.route('/api/air-quality/regions', methods=['GET'])
+def get_regions():
+    """获取区域登记表: 启用的省份及其城市和分组"""
+    return jsonify({
+        'status': 'success',
+        'data': get_region_registry().describe()
+    })
+
 @app.route('/api/air-quality/refresh-data', methods=['POST'])
 def refresh_data():
     """触发运行数据处理脚本以获取最新数据"""
@@ -619,6 +650,8 @@ def refresh_data():
                 if process in BACKGROUND_PROCESSES:
                     BACKGROUND_PROCESSES.remove(process)
                 api_logger.info(f"数据刷新进程已完成，退出代码: {process.returncode}")
+                # 立即读取刷新进程发布的变更事件，不等下一次轮询
+                get_change_subscriber(connect_to_db).poll()
                 
                 # 检查进程是否成功完成
                 if process.returncode != 0:
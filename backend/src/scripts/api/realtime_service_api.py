@@ -22,6 +22,10 @@ backend_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os
 dotenv_path = os.path.join(backend_dir, '.env')
 if os.path.exists(dotenv_path):
     load_dotenv(dotenv_path)
+if backend_dir not in sys.path:
+    sys.path.append(backend_dir)
+
+from src.scripts.utils.region_registry import get_region_registry
 
 # 禁用Flask开发服务器警告
 os.environ['WERKZEUG_SILENCE_STARTUP'] = '1'
@@ -53,135 +57,13 @@ QWEATHER_API_KEY = os.environ.get('QWEATHER_API_KEY')
 if not QWEATHER_API_KEY:
     raise ValueError("QWEATHER_API_KEY environment variable is required but not set")
 
-# 广东省的城市列表（包含所有21个地级市）
-GUANGDONG_CITIES = [
-    {
-        'name': '广州市',
-        'code': 'GZ',
-        'latitude': 23.129110,
-        'longitude': 113.264385
-    },
-    {
-        'name': '深圳市',
-        'code': 'SZ',
-        'latitude': 22.543096,
-        'longitude': 114.057868
-    },
-    {
-        'name': '珠海市',
-        'code': 'ZH',
-        'latitude': 22.270978,
-        'longitude': 113.576677
-    },
-    {
-        'name': '汕头市',
-        'code': 'ST',
-        'latitude': 23.354091,
-        'longitude': 116.681972
-    },
-    {
-        'name': '佛山市',
-        'code': 'FS',
-        'latitude': 23.021478,
-        'longitude': 113.121435
-    },
-    {
-        'name': '韶关市',
-        'code': 'SG',
-        'latitude': 24.810403,
-        'longitude': 113.594461
-    },
-    {
-        'name': '湛江市',
-        'code': 'ZJ',
-        'latitude': 21.270708,
-        'longitude': 110.359377
-    },
-    {
-        'name': '肇庆市',
-        'code': 'ZQ',
-        'latitude': 23.047500,
-        'longitude': 112.465091
-    },
-    {
-        'name': '江门市',
-        'code': 'JM',
-        'latitude': 22.578738,
-        'longitude': 113.081901
-    },
-    {
-        'name': '茂名市',
-        'code': 'MM',
-        'latitude': 21.662999,
-        'longitude': 110.925456
-    },
-    {
-        'name': '惠州市',
-        'code': 'HZ',
-        'latitude': 23.111847,
-        'longitude': 114.416196
-    },
-    {
-        'name': '梅州市',
-        'code': 'MZ',
-        'latitude': 24.288615,
-        'longitude': 116.122238
-    },
-    {
-        'name': '汕尾市',
-        'code': 'SW',
-        'latitude': 22.774485,
-        'longitude': 115.364238
-    },
-    {
-        'name': '河源市',
-        'code': 'HY',
-        'latitude': 23.746266,
-        'longitude': 114.700447
-    },
-    {
-        'name': '阳江市',
-        'code': 'YJ',
-        'latitude': 21.857958,
-        'longitude': 111.982232
-    },
-    {
-        'name': '清远市',
-        'code': 'QY',
-        'latitude': 23.681764,
-        'longitude': 113.056031
-    },
-    {
-        'name': '东莞市',
-        'code': 'DG',
-        'latitude': 23.020673,
-        'longitude': 113.751799
-    },
-    {
-        'name': '中山市',
-        'code': 'ZS',
-        'latitude': 22.517646,
-        'longitude': 113.392782
-    },
-    {
-        'name': '潮州市',
-        'code': 'CZ',
-        'latitude': 23.661701,
-        'longitude': 116.622603
-    },
-    {
-        'name': '揭阳市',
-        'code': 'JY',
-        'latitude': 23.549993,
-        'longitude': 116.372831
-    },
-    {
-        'name': '云浮市',
-        'code': 'YF',
-        'latitude': 22.915094,
-        'longitude': 112.044491
-    }
-]
+# 城市列表（含经纬度）来自区域登记表utils/regions.yaml，按启用的省份轮询
+def realtime_cities(province=None):
+    """需要获取实时数据的城市，province为空时为全部启用的省份"""
+    registry = get_region_registry()
+    provinces = [province] if province else None
+    return [city for city in registry.city_infos(provinces)
+            if city.get('latitude') is not None and city.get('longitude') is not None]
 
 # 设置日志
 class ColoredFormatter(logging.Formatter):
@@ -290,14 +172,10 @@ def get_city_data(city_name):
         # 当前日期
         current_date = datetime.now().strftime('%Y-%m-%d')
         
-        # 查找城市信息
-        city_info = None
-        for city in GUANGDONG_CITIES:
-            if city['name'] == city_name or city['name'].replace('市', '') == city_name:
-                city_info = city
-                break
+        # 查找城市信息（城市名可带或不带"市"字）
+        city_info = get_region_registry().find_city(city_name)
                 
-        if not city_info:
+        if not city_info or city_info.get('latitude') is None:
             logger.error(f"未找到城市: {city_name}")
             return jsonify({
                 'status': 'error',
@@ -350,16 +228,22 @@ def get_city_data(city_name):
 
 @app.route('/api/province', methods=['GET'])
 def get_province_data():
-    """获取全省空气质量数据"""
+    """获取全省空气质量数据（可用province参数指定省份，默认为全部启用的省份）"""
     try:
         # 当前日期
         current_date = datetime.now().strftime('%Y-%m-%d')
+        province = request.args.get('province')
+        if province and province not in get_region_registry().active:
+            return jsonify({
+                'status': 'error',
+                'message': f'未启用的省份: {province}'
+            }), 400
         
         # 使用线程池并行获取所有城市的空气质量数据
         results = []
         with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
             # 提交所有任务
-            future_to_city = {executor.submit(get_city_air_quality, city): city for city in GUANGDONG_CITIES}
+            future_to_city = {executor.submit(get_city_air_quality, city): city for city in realtime_cities(province)}
             
             # 获取结果
             for future in concurrent.futures.as_completed(future_to_city):
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+广东省空气质量监测系统 - 报告产物缓存
+以 (区域, 日期范围, 报告类型, 格式, 内容选项, 模板版本, 数据水位) 的哈希为键缓存已生成的报告文件。
+数据水位随导入数据变化，覆盖范围内的数据一旦被修改，旧的缓存键自然失效。
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+from datetime import datetime
+
+logger = logging.getLogger('report_cache')
+
+# 报告模板版本 - 修改报告生成器的输出内容时递增，使所有旧缓存失效
+REPORT_TEMPLATE_VERSION = '1'
+
+REPORT_CACHE_ENABLED = os.environ.get('REPORT_CACHE_ENABLED', 'true').lower() == 'true'
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """计算文件的sha256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _hash(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False,
+                                     default=str).encode('utf-8')).hexdigest()
+
+
+class ReportCache:
+    """内容寻址的报告产物缓存
+
+    缓存文件保存在cache_dir下，以缓存键命名；索引保存在报告元数据存储的report_cache表中。
+    命中时把缓存文件硬链接（或复制）到新报告的输出路径，删除单个报告不会影响缓存。
+    """
+
+    def __init__(self, store, cache_dir, enabled=REPORT_CACHE_ENABLED):
+        self.store = store
+        self.cache_dir = cache_dir
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._session = {'hits': 0, 'misses': 0, 'bytes_saved': 0}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def build_key(region, start_date, end_date, report_type, report_format, content_options,
+                  watermark, realtime_bucket=None):
+        """构建缓存键
+
+        Returns:
+            tuple: (cache_key, request_hash)，request_hash不含数据水位，用于替换旧版本
+        """
+        request = {
+            'region': region,
+            'start_date': start_date,
+            'end_date': end_date,
+            'type': report_type,
+            'format': report_format,
+            'content': content_options or {},
+            'template_version': REPORT_TEMPLATE_VERSION
+        }
+        request_hash = _hash(request)
+        cache_key = _hash({'request': request_hash, 'watermark': watermark, 'realtime': realtime_bucket})
+        return cache_key, request_hash
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._session[name] += amount
+        try:
+            self.store.incr_counter(f"cache_{name}", amount)
+        except Exception as e:
+            logger.warning(f"更新缓存计数失败: {str(e)}")
+
+    def lookup(self, cache_key):
+        """查找缓存条目，文件已丢失的条目会被清理
+
+        Returns:
+            dict或None: 缓存条目
+        """
+        if not self.enabled:
+            return None
+        entry = self.store.cache_get(cache_key)
+        if entry and not os.path.isfile(entry['file_path']):
+            logger.warning(f"缓存文件丢失，移除缓存条目: {entry['file_path']}")
+            self.store.cache_delete(cache_key)
+            entry = None
+        if entry is None:
+            self._count('misses')
+        return entry
+
+    def materialize(self, entry, output_path):
+        """将缓存产物放到报告输出路径，优先使用硬链接"""
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        try:
+            os.link(entry['file_path'], output_path)
+        except OSError:
+            shutil.copyfile(entry['file_path'], output_path)
+
+        self.store.cache_record_hit(entry['cache_key'], datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        self._count('hits')
+        self._count('bytes_saved', entry.get('size_bytes') or 0)
+        logger.info(f"报告缓存命中: {entry['cache_key'][:12]} -> {output_path}")
+        return output_path
+
+    def put(self, cache_key, request_hash, report_format, source_path, watermark=None):
+        """把新生成的报告登记到缓存
+
+        Returns:
+            dict或None: 缓存条目
+        """
+        if not self.enabled or not os.path.isfile(source_path):
+            return None
+
+        ext = os.path.splitext(source_path)[1]
+        cache_path = os.path.join(self.cache_dir, f"{cache_key}{ext}")
+        tmp_path = f"{cache_path}.tmp"
+        try:
+            try:
+                os.link(source_path, tmp_path)
+            except OSError:
+                shutil.copyfile(source_path, tmp_path)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logger.warning(f"写入报告缓存失败: {str(e)}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return None
+
+        entry = {
+            'cache_key': cache_key,
+            'request_hash': request_hash,
+            'format': report_format,
+            'file_path': cache_path,
+            'size_bytes': os.path.getsize(cache_path),
+            'sha256': file_sha256(cache_path),
+            'watermark': watermark,
+            'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'hits': 0
+        }
+        stale_entries = self.store.cache_put(entry)
+        for stale in stale_entries:
+            try:
+                if stale['file_path'] and os.path.exists(stale['file_path']):
+                    os.remove(stale['file_path'])
+            except OSError as e:
+                logger.warning(f"删除过期缓存文件失败: {str(e)}")
+        if stale_entries:
+            logger.info(f"数据已更新，替换 {len(stale_entries)} 个旧缓存条目")
+        return entry
+
+    def stats(self):
+        """缓存命中率与节省字节数统计"""
+        totals = self.store.get_counters('cache_')
+        hits = totals.get('cache_hits', 0)
+        misses = totals.get('cache_misses', 0)
+        with self._lock:
+            session = dict(self._session)
+        session_total = session['hits'] + session['misses']
+        return {
+            'enabled': self.enabled,
+            'template_version': REPORT_TEMPLATE_VERSION,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None,
+            'bytes_saved': totals.get('cache_bytes_saved', 0),
+            'session': dict(session, hit_rate=round(session['hits'] / session_total, 4) if session_total else None),
+            'storage': self.store.cache_summary()
+        }
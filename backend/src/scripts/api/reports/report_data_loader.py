@@ -0,0 +1,405 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+广东省空气质量监测系统 - 报告数据加载
+一次查询取出报告所需的全部日数据（air_quality_data 与 air_quality_newdata 合并），
+按精确的城市名过滤，可选合并带缓存的实时数据，返回各报告生成器共用的类型化数据表。
+"""
+
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+
+import pandas as pd
+import requests
+import mysql.connector
+
+from src.scripts.utils.region_registry import get_region_registry
+
+logger = logging.getLogger('report_data_loader')
+
+# 区域代码到城市列表的映射（城市名与数据库中的city字段完全一致），来自区域登记表utils/regions.yaml:
+# 启用省份的每个城市、省内分组和整个省份
+REGION_CITY_MAP = get_region_registry().region_city_map()
+
+# 类型化数据表的列及类型
+REPORT_FRAME_DTYPES = {
+    'city': 'category',
+    'aqi': 'float64',
+    'quality_level': 'object',
+    'pm25': 'float64',
+    'pm10': 'float64',
+    'so2': 'float64',
+    'no2': 'float64',
+    'o3': 'float64',
+    'co': 'float64'
+}
+
+AQI_COLUMNS = ['date', 'aqi', 'quality_level', 'city']
+POLLUTANT_COLUMNS = ['date', 'pm25', 'pm10', 'so2', 'no2', 'o3', 'co', 'city']
+
+# 实时数据配置
+REALTIME_API_URL = os.environ.get('REALTIME_API_URL', 'http://localhost:5001')
+REALTIME_CACHE_TTL = int(os.environ.get('REPORT_REALTIME_TTL', '300'))
+# 实时API请求失败时空结果的保留秒数，避免实时服务不可用时每个报告都等待请求超时
+REALTIME_FAILURE_TTL = int(os.environ.get('REPORT_REALTIME_FAILURE_TTL', '30'))
+REPORT_INCLUDE_REALTIME = os.environ.get('REPORT_INCLUDE_REALTIME', 'true').lower() == 'true'
+
+# 两张日数据表合并查询，newdata排在后面，去重时以新表为准
+REPORT_DATA_QUERY = """
+SELECT record_date AS date, city, aqi_index AS aqi, quality_level,
+       pm25_avg AS pm25, pm10_avg AS pm10, so2_avg AS so2,
+       no2_avg AS no2, o3_avg AS o3, co_avg AS co, 0 AS source_order
+FROM air_quality_data
+WHERE record_date BETWEEN %s AND %s {city_condition}
+UNION ALL
+SELECT record_date AS date, city, aqi_index AS aqi, quality_level,
+       pm25_avg AS pm25, pm10_avg AS pm10, so2_avg AS so2,
+       no2_avg AS no2, o3_avg AS o3, co_avg AS co, 1 AS source_order
+FROM air_quality_newdata
+WHERE record_date BETWEEN %s AND %s {city_condition}
+ORDER BY date, city, source_order
+"""
+
+
+def normalize_city_name(name):
+    """将城市名规范为数据库中的形式（例如'广州' -> '广州市'）"""
+    name = (name or '').strip()
+    if name and not name.endswith('市'):
+        name = f"{name}市"
+    return name
+
+
+def resolve_region_cities(region):
+    """解析区域参数为精确的城市列表
+
+    Args:
+        region (str): 区域代码、城市中文名或'all'
+
+    Returns:
+        list: 城市列表，'all'为登记表中启用省份的全部城市（不包括ingest_all_cities导入的其他城市）
+    """
+    if not region or region == 'all':
+        return get_region_registry().cities()
+    if region in REGION_CITY_MAP:
+        return list(REGION_CITY_MAP[region])
+    city = get_region_registry().find_city(region)
+    return [city['name'] if city else normalize_city_name(region)]
+
+
+class RealtimeCache:
+    """实时省级数据的TTL缓存，多个报告任务共享同一次HTTP请求结果
+
+    HTTP请求在锁外执行，同一时间只有一个线程请求：已有数据的线程直接使用上一次的结果，
+    没有数据的线程等待这次请求完成。请求失败的空结果只保留failure_ttl秒。
+    """
+
+    def __init__(self, ttl=REALTIME_CACHE_TTL, failure_ttl=REALTIME_FAILURE_TTL):
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self._cond = threading.Condition()
+        self._data = None
+        self._expires_at = 0
+        self._fetching = False
+
+    def get(self):
+        with self._cond:
+            while True:
+                if self._data is not None and time.time() < self._expires_at:
+                    return self._data
+                if not self._fetching:
+                    break
+                if self._data is not None:
+                    # 其他线程正在刷新，先使用上一次的数据
+                    return self._data
+                self._cond.wait()
+            self._fetching = True
+
+        data = None
+        try:
+            data = self._fetch()
+        finally:
+            with self._cond:
+                self._fetching = False
+                if data is None:
+                    self._data = []
+                    self._expires_at = time.time() + self.failure_ttl
+                else:
+                    self._data = data
+                    self._expires_at = time.time() + self.ttl
+                self._cond.notify_all()
+                result = self._data
+        return result
+
+    @staticmethod
+    def _fetch():
+        """请求实时API，失败时返回None"""
+        url = f"{REALTIME_API_URL}/api/province"
+        try:
+            logger.info(f"从实时API获取数据: {url}")
+            response = requests.get(url, params={'use_real_data': 'true', 'disable_simulation': 'true'},
+                                    timeout=10)
+            if response.status_code != 200:
+                logger.error(f"实时API返回错误状态码: {response.status_code}")
+                return None
+            data = response.json()
+            if isinstance(data, dict) and 'data' in data:
+                return data['data'] or []
+            return data if isinstance(data, list) else []
+        except Exception as e:
+            logger.error(f"从实时API获取数据失败: {str(e)}")
+            return None
+
+
+REALTIME_CACHE = RealtimeCache()
+
+
+class ReportDataset:
+    """报告数据集
+
+    frame为类型化的日数据表（每城市每日一行），aqi_data和pollutants是按需生成的列视图。
+    支持 data['aqi_data']、data.get('pollutants')、'error' in data 等字典式访问，
+    与原有报告生成器保持兼容。
+    """
+
+    def __init__(self, frame, error=None, realtime_rows=0):
+        self.frame = frame
+        self.error = error
+        self.realtime_rows = realtime_rows
+        # 已渲染的图表列表，由报告流程在渲染文档前填充
+        self.charts = []
+        self._views = {}
+
+    def __getstate__(self):
+        # 发送到工作进程时不携带缓存的列视图，由工作进程按需重建
+        state = self.__dict__.copy()
+        state['_views'] = {}
+        return state
+
+    @property
+    def empty(self):
+        return self.frame.empty
+
+    def _view(self, columns):
+        key = tuple(columns)
+        if key not in self._views:
+            if self.frame.empty:
+                self._views[key] = pd.DataFrame(columns=columns)
+            else:
+                view = self.frame[columns].copy()
+                # 日期以datetime.date展示，与报告中原有的日期格式一致
+                view['date'] = view['date'].dt.date
+                view['city'] = view['city'].astype(str)
+                self._views[key] = view
+        return self._views[key]
+
+    def split_by_city(self):
+        """按城市拆分为多个数据集（一次分组，供批量报告共享同一次数据加载）
+
+        Returns:
+            dict: 城市名 -> ReportDataset
+        """
+        if self.frame.empty:
+            return {}
+        return {str(city): ReportDataset(group.reset_index(drop=True))
+                for city, group in self.frame.groupby('city', observed=True, sort=False)}
+
+    @property
+    def aqi_data(self):
+        return self._view(AQI_COLUMNS)
+
+    @property
+    def pollutants(self):
+        return self._view(POLLUTANT_COLUMNS)
+
+    def __getitem__(self, key):
+        if key == 'aqi_data':
+            return self.aqi_data
+        if key == 'pollutants':
+            return self.pollutants
+        if key == 'frame':
+            return self.frame
+        if key == 'charts':
+            return self.charts
+        if key == 'error' and self.error:
+            return self.error
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        if key == 'error':
+            return bool(self.error)
+        return key in ('aqi_data', 'pollutants', 'frame', 'charts')
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+def _empty_frame():
+    frame = pd.DataFrame({'date': pd.Series(dtype='datetime64[ns]')})
+    for column, dtype in REPORT_FRAME_DTYPES.items():
+        frame[column] = pd.Series(dtype=dtype)
+    return frame
+
+
+def _to_typed_frame(rows):
+    frame = pd.DataFrame(rows)
+    if frame.empty:
+        return _empty_frame()
+    frame['date'] = pd.to_datetime(frame['date'])
+    for column in ('aqi', 'pm25', 'pm10', 'so2', 'no2', 'o3', 'co'):
+        frame[column] = pd.to_numeric(frame[column], errors='coerce')
+    # 同一城市同一日期在两张表中都有时，保留新表的记录
+    frame = frame.drop_duplicates(subset=['city', 'date'], keep='last')
+    frame = frame.drop(columns=['source_order'], errors='ignore')
+    return frame.astype(REPORT_FRAME_DTYPES).reset_index(drop=True)
+
+
+def _realtime_frame(cities, today):
+    wanted = set(cities)
+    records = []
+    for city_data in REALTIME_CACHE.get():
+        city_name = normalize_city_name(city_data.get('name', ''))
+        if city_name not in wanted:
+            continue
+        records.append({
+            'date': today,
+            'city': city_name,
+            'aqi': city_data.get('aqi'),
+            'quality_level': city_data.get('level', ''),
+            'pm25': city_data.get('pm25'),
+            'pm10': city_data.get('pm10'),
+            'so2': city_data.get('so2'),
+            'no2': city_data.get('no2'),
+            'o3': city_data.get('o3'),
+            'co': city_data.get('co')
+        })
+    return _to_typed_frame(records) if records else _empty_frame()
+
+
+def load_report_dataset(start_date, end_date, region, db_config, include_realtime=None):
+    """加载报告数据
+
+    Args:
+        start_date (str): 开始日期 YYYY-MM-DD
+        end_date (str): 结束日期 YYYY-MM-DD
+        region (str): 区域代码、城市名或'all'
+        db_config (dict): 数据库连接配置
+        include_realtime (bool): 时间范围包含今天时是否合并实时数据，默认取REPORT_INCLUDE_REALTIME
+
+    Returns:
+        ReportDataset: 报告数据集，出错时error不为空
+    """
+    if include_realtime is None:
+        include_realtime = REPORT_INCLUDE_REALTIME
+
+    cities = resolve_region_cities(region)
+    city_condition = ''
+    city_params = []
+    if cities:
+        city_condition = f"AND city IN ({', '.join(['%s'] * len(cities))})"
+        city_params = cities
+
+    query = REPORT_DATA_QUERY.format(city_condition=city_condition)
+    params = [start_date, end_date] + city_params + [start_date, end_date] + city_params
+
+    conn = None
+    cursor = None
+    try:
+        start = time.perf_counter()
+        conn = mysql.connector.connect(**db_config)
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        frame = _to_typed_frame(rows)
+        logger.info(f"报告数据加载: {start_date}至{end_date}, 区域={region}, "
+                    f"{len(frame)}条, 耗时{time.perf_counter() - start:.3f}秒")
+    except Exception as e:
+        logger.error(f"报告数据加载失败: {str(e)}")
+        return ReportDataset(_empty_frame(), error=str(e))
+    finally:
+        if cursor:
+            cursor.close()
+        if conn and conn.is_connected():
+            conn.close()
+
+    realtime_rows = 0
+    today = datetime.now().strftime('%Y-%m-%d')
+    if include_realtime and start_date <= today <= end_date:
+        realtime = _realtime_frame(cities, today)
+        if not realtime.empty:
+            # 只补充数据库中当天还没有的城市
+            have_today = set(frame.loc[frame['date'] == pd.Timestamp(today), 'city'].astype(str))
+            realtime = realtime[~realtime['city'].astype(str).isin(have_today)]
+            realtime_rows = len(realtime)
+            if realtime_rows:
+                frame = pd.concat([frame.astype({'city': 'object'}), realtime.astype({'city': 'object'})],
+                                  ignore_index=True).astype(REPORT_FRAME_DTYPES)
+                logger.info(f"合并实时数据: {realtime_rows}条")
+
+    return ReportDataset(frame, realtime_rows=realtime_rows)
+
+
+# 数据水位: 覆盖范围内的行数与逐行内容校验和，任何插入、更新或删除都会改变它
+WATERMARK_QUERY = """
+SELECT COUNT(*) AS row_count,
+       COALESCE(BIT_XOR(CRC32(CONCAT_WS('|', src, city, record_date, aqi_index, quality_level,
+                                        pm25_avg, pm10_avg, so2_avg, no2_avg, o3_avg, co_avg))), 0) AS checksum
+FROM (
+    SELECT 'd' AS src, city, record_date, aqi_index, quality_level,
+           pm25_avg, pm10_avg, so2_avg, no2_avg, o3_avg, co_avg
+    FROM air_quality_data
+    WHERE record_date BETWEEN %s AND %s {city_condition}
+    UNION ALL
+    SELECT 'n' AS src, city, record_date, aqi_index, quality_level,
+           pm25_avg, pm10_avg, so2_avg, no2_avg, o3_avg, co_avg
+    FROM air_quality_newdata
+    WHERE record_date BETWEEN %s AND %s {city_condition}
+) AS covered
+"""
+
+
+def compute_data_watermark(start_date, end_date, region, db_config):
+    """计算报告覆盖范围内数据的水位标识
+
+    Returns:
+        str: 形如 '<行数>:<校验和>' 的水位字符串
+    """
+    cities = resolve_region_cities(region)
+    city_condition = ''
+    city_params = []
+    if cities:
+        city_condition = f"AND city IN ({', '.join(['%s'] * len(cities))})"
+        city_params = cities
+
+    query = WATERMARK_QUERY.format(city_condition=city_condition)
+    params = [start_date, end_date] + city_params + [start_date, end_date] + city_params
+
+    conn = None
+    cursor = None
+    try:
+        conn = mysql.connector.connect(**db_config)
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        row_count, checksum = cursor.fetchone()
+        return f"{row_count}:{checksum}"
+    finally:
+        if cursor:
+            cursor.close()
+        if conn and conn.is_connected():
+            conn.close()
+
+
+def realtime_bucket(start_date, end_date, include_realtime=None):
+    """实时数据参与报告时返回当前TTL时间片编号，否则返回None"""
+    if include_realtime is None:
+        include_realtime = REPORT_INCLUDE_REALTIME
+    today = datetime.now().strftime('%Y-%m-%d')
+    if include_realtime and start_date <= today <= end_date:
+        return int(time.time() // max(1, REALTIME_CACHE_TTL))
+    return None
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+广东省空气质量监测系统 - Excel报告写入
+默认使用openpyxl的write_only模式，数据行分块顺序写入磁盘，
+数据工作表之后再写统计分析和每日汇总图表，内存占用不随行数增长。
+"""
+
+import os
+import math
+import logging
+from datetime import datetime
+
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment
+from openpyxl.chart import LineChart, BarChart, Reference
+
+from src.scripts.utils.region_registry import get_region_registry
+
+logger = logging.getLogger('report_excel')
+
+# 流式写入开关与分块行数
+EXCEL_STREAMING = os.environ.get('REPORT_EXCEL_STREAMING', 'true').lower() == 'true'
+EXCEL_CHUNK_ROWS = int(os.environ.get('REPORT_EXCEL_CHUNK_ROWS', '5000'))
+
+AQI_SHEET_COLUMNS = [('日期', 'date', 12), ('AQI', 'aqi', 8), ('质量等级', 'quality_level', 10), ('城市', 'city', 10)]
+POLLUTANT_SHEET_COLUMNS = [('日期', 'date', 12), ('PM2.5', 'pm25', 8), ('PM10', 'pm10', 8), ('SO2', 'so2', 8),
+                           ('NO2', 'no2', 8), ('O3', 'o3', 8), ('CO', 'co', 8), ('城市', 'city', 10)]
+POLLUTANT_NAMES = [('PM2.5', 'pm25'), ('PM10', 'pm10'), ('SO2', 'so2'), ('NO2', 'no2'), ('O3', 'o3'), ('CO', 'co')]
+
+
+def _header_row(ws, headers):
+    row = []
+    for header in headers:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.font = Font(bold=True)
+        row.append(cell)
+    return row
+
+
+def _set_widths(ws, widths):
+    for index, width in enumerate(widths):
+        ws.column_dimensions[openpyxl.utils.get_column_letter(index + 1)].width = width
+
+
+def _clean(value):
+    if value is None:
+        return None
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def _append_frame(ws, frame, columns):
+    """分块把DataFrame写入工作表，日期列写为字符串
+
+    Returns:
+        int: 写入的数据行数
+    """
+    written = 0
+    for start in range(0, len(frame), EXCEL_CHUNK_ROWS):
+        chunk = frame.iloc[start:start + EXCEL_CHUNK_ROWS]
+        columns_data = []
+        for column in columns:
+            if column not in chunk.columns:
+                columns_data.append([None] * len(chunk))
+            elif column == 'date':
+                columns_data.append(chunk[column].astype(str).tolist())
+            else:
+                columns_data.append(chunk[column].tolist())
+        for values in zip(*columns_data):
+            ws.append([_clean(value) for value in values])
+        written += len(chunk)
+    return written
+
+
+def _write_data_sheet(wb, title, frame, sheet_columns):
+    ws = wb.create_sheet(title)
+    _set_widths(ws, [width for _, _, width in sheet_columns])
+    ws.freeze_panes = 'A2'
+    ws.append(_header_row(ws, [header for header, _, _ in sheet_columns]))
+    return _append_frame(ws, frame, [column for _, column, _ in sheet_columns])
+
+
+def write_excel_report(data, content_options, output_path, region, start_date, end_date, streaming=None):
+    """写入Excel报告
+
+    Args:
+        data: ReportDataset或包含aqi_data、pollutants的字典
+        content_options (dict): 内容选项
+        output_path (str): 输出文件路径
+        region (str): 地区
+        start_date (str): 开始日期
+        end_date (str): 结束日期
+        streaming (bool): 是否使用write_only流式模式，默认取REPORT_EXCEL_STREAMING
+
+    Returns:
+        str: 输出文件路径
+    """
+    if streaming is None:
+        streaming = EXCEL_STREAMING
+
+    aqi_data = data['aqi_data']
+    pollutants = data['pollutants']
+
+    wb = openpyxl.Workbook(write_only=streaming)
+    if not streaming:
+        wb.remove(wb.active)
+
+    # 报告信息工作表
+    info_sheet = wb.create_sheet("报告信息")
+    _set_widths(info_sheet, [12, 40])
+    registry = get_region_registry()
+    title_cell = WriteOnlyCell(info_sheet, value=f"{registry.area_name()}空气质量监测报告")
+    title_cell.font = Font(size=16, bold=True)
+    title_cell.alignment = Alignment(horizontal='left')
+    info_sheet.append([title_cell])
+    info_sheet.append([])
+    info_sheet.append(["区域:", registry.region_info(region)['name']])
+    info_sheet.append(["时间范围:", f"{start_date} 至 {end_date}"])
+    info_sheet.append(["生成时间:", datetime.now().strftime('%Y-%m-%d %H:%M:%S')])
+
+    # 1. 空气质量数据工作表（逐块写入）
+    if content_options.get('air_quality', True) and not aqi_data.empty:
+        rows = _write_data_sheet(wb, "空气质量数据", aqi_data, AQI_SHEET_COLUMNS)
+        logger.info(f"Excel写入空气质量数据: {rows}行")
+
+    # 2. 污染物数据工作表（逐块写入）
+    if content_options.get('pollutants', True) and not pollutants.empty:
+        rows = _write_data_sheet(wb, "污染物数据", pollutants, POLLUTANT_SHEET_COLUMNS)
+        logger.info(f"Excel写入污染物数据: {rows}行")
+
+    # 3. 统计分析工作表（数据写完后生成）
+    stats_sheet = wb.create_sheet("统计分析")
+    _set_widths(stats_sheet, [16, 12])
+    stats_sheet.append(_header_row(stats_sheet, ["统计指标", "数值"]))
+    if not aqi_data.empty:
+        stats_sheet.append(["AQI数据记录数", len(aqi_data)])
+        stats_sheet.append(["平均AQI", round(float(aqi_data['aqi'].mean()), 2)])
+        stats_sheet.append(["最高AQI", round(float(aqi_data['aqi'].max()), 2)])
+        stats_sheet.append(["最低AQI", round(float(aqi_data['aqi'].min()), 2)])
+
+    if not pollutants.empty:
+        stats_sheet.append([])
+        stats_sheet.append(_header_row(stats_sheet, ["污染物平均值"]))
+        # 表头1行 + AQI统计4行 + 空行 + 小标题，之后是污染物数据
+        first_row = 1 + (4 if not aqi_data.empty else 0) + 2 + 1
+        poll_rows = 0
+        for display_name, column in POLLUTANT_NAMES:
+            if column in pollutants.columns:
+                stats_sheet.append([display_name, _clean(round(float(pollutants[column].mean()), 2))])
+                poll_rows += 1
+        if poll_rows:
+            chart = BarChart()
+            chart.title = "主要污染物平均浓度"
+            chart.legend = None
+            chart.add_data(Reference(stats_sheet, min_col=2, min_row=first_row,
+                                     max_row=first_row + poll_rows - 1))
+            chart.set_categories(Reference(stats_sheet, min_col=1, min_row=first_row,
+                                           max_row=first_row + poll_rows - 1))
+            stats_sheet.add_chart(chart, "D2")
+
+    # 4. 每日汇总与趋势图（按日聚合后的数据量很小）
+    if content_options.get('trends', True) and not aqi_data.empty and aqi_data['date'].nunique() > 1:
+        daily = aqi_data.groupby('date', as_index=False)['aqi'].mean().sort_values('date')
+        daily['aqi'] = daily['aqi'].round(1)
+        trend_sheet = wb.create_sheet("每日汇总")
+        _set_widths(trend_sheet, [12, 10])
+        trend_sheet.append(_header_row(trend_sheet, ["日期", "平均AQI"]))
+        _append_frame(trend_sheet, daily, ['date', 'aqi'])
+
+        chart = LineChart()
+        chart.title = "AQI日均值变化趋势"
+        chart.y_axis.title = "AQI"
+        chart.width = 24
+        chart.add_data(Reference(trend_sheet, min_col=2, min_row=1, max_row=len(daily) + 1), titles_from_data=True)
+        chart.set_categories(Reference(trend_sheet, min_col=1, min_row=2, max_row=len(daily) + 1))
+        trend_sheet.add_chart(chart, "D2")
+
+    # 先写临时文件，完成后原子替换
+    tmp_path = f"{output_path}.part"
+    try:
+        wb.save(tmp_path)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return output_path
@@ -8,11 +8,9 @@
 
 import os
 import sys
-import json
 import uuid
 import logging
 from datetime import datetime
-from threading import Thread
 from pathlib import Path
 import pandas as pd
 import mysql.connector
@@ -38,6 +36,11 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = str(Path(__file__).resolve().parents[4])
 sys.path.append(project_root)
 
+# 报告格式生成器（导入时没有副作用，不需要加载reports_api）
+from src.scripts.api.reports import report_writers
+from src.scripts.utils.region_registry import get_region_registry
+from src.scripts.api.reports.report_data_loader import resolve_region_cities
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -76,35 +79,24 @@ DB_CONFIG = {
 if not DB_CONFIG['password']:
     raise ValueError("DB_PASSWORD environment variable is required but not set")
 
-# 报告元数据存储路径
+# 报告元数据存储路径（与reports_api共用同一个SQLite存储）
 REPORT_METADATA_PATH = os.path.join(REPORTS_DIR, 'reports_metadata.json')
+REPORT_STORE_PATH = os.path.join(REPORTS_DIR, 'reports_metadata.db')
+
+from src.scripts.api.reports.report_jobs import get_report_job_queue, ReportQueueFull, ReportJobCancelled
+from src.scripts.api.reports.report_store import get_report_store
+
+REPORT_STORE = get_report_store(REPORT_STORE_PATH, legacy_json_path=REPORT_METADATA_PATH)
 
 def save_report(report_id, report_info):
-    """保存报告信息到元数据文件
+    """保存报告信息到元数据存储
     
     Args:
         report_id (str): 报告ID
         report_info (dict): 报告信息
     """
     try:
-        # 加载现有的报告元数据
-        metadata = load_reports_metadata()
-        
-        # 查找并更新或添加报告信息
-        found = False
-        for i, report in enumerate(metadata['reports']):
-            if report.get('id') == report_id:
-                metadata['reports'][i] = report_info
-                found = True
-                break
-                
-        if not found:
-            metadata['reports'].append(report_info)
-            
-        # 保存更新后的元数据，确保设置正确的编码
-        with open(REPORT_METADATA_PATH, 'w', encoding='utf-8') as f:
-            json.dump(metadata, f, ensure_ascii=False, indent=2)
-            
+        REPORT_STORE.add(dict(report_info, id=report_id))
         logger.info(f"报告信息保存成功: {report_id}")
         return True
     except Exception as e:
@@ -113,12 +105,10 @@ def save_report(report_id, report_info):
 
 def load_reports_metadata():
     """加载所有报告的元数据"""
-    if os.path.exists(REPORT_METADATA_PATH):
-        try:
-            with open(REPORT_METADATA_PATH, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            logger.error(f"加载报告元数据失败: {str(e)}")
+    try:
+        return {'reports': REPORT_STORE.query()}
+    except Exception as e:
+        logger.error(f"加载报告元数据失败: {str(e)}")
     return {'reports': []}
 
 def get_pollutant_data(region_id, start_date, end_date, pollutant):
@@ -144,26 +134,12 @@ def get_pollutant_data(region_id, start_date, end_date, pollutant):
         where_clause = "record_date BETWEEN %s AND %s"
         params = [start_date, end_date]
         
-        # 处理区域条件
-        if region_id and region_id != 'all':
-            # 尝试转换区域ID为城市名称
-            region_map = {
-                'guangzhou': '广州市',
-                'shenzhen': '深圳市',
-                'pearl_delta': ['广州市', '深圳市', '珠海市', '佛山市', '惠州市', '东莞市', '中山市', '江门市', '肇庆市'],
-                'east': ['汕头市', '梅州市', '揭阳市', '潮州市', '汕尾市'],
-                'west': ['湛江市', '茂名市', '阳江市'],
-                'north': ['韶关市', '清远市', '河源市', '云浮市']
-            }
-            
-            if region_id in region_map:
-                if isinstance(region_map[region_id], list):
-                    placeholders = ', '.join(['%s'] * len(region_map[region_id]))
-                    where_clause += f" AND city IN ({placeholders})"
-                    params.extend(region_map[region_id])
-                else:
-                    where_clause += " AND city = %s"
-                    params.append(region_map[region_id])
+        # 处理区域条件 - 区域代码按区域登记表解析为城市列表（'all'为启用省份的全部城市）
+        cities = resolve_region_cities(region_id)
+        if cities:
+            placeholders = ', '.join(['%s'] * len(cities))
+            where_clause += f" AND city IN ({placeholders})"
+            params.extend(cities)
         
         # 确定要查询的列
         column_map = {
@@ -278,23 +254,8 @@ def get_region_info(region_id):
     Returns:
         dict: 包含区域信息的字典
     """
-    # 区域名称映射
-    region_names = {
-        'all': '广东省',
-        'guangzhou': '广州市',
-        'shenzhen': '深圳市',
-        'pearl_delta': '珠三角',
-        'east': '粤东地区',
-        'west': '粤西地区',
-        'north': '粤北地区'
-    }
-    
-    # 返回区域信息
-    return {
-        'id': region_id,
-        'name': region_names.get(region_id, '广东省'),
-        'type': 'province' if region_id == 'all' else 'city' if region_id in ['guangzhou', 'shenzhen'] else 'region'
-    }
+    # 区域名称和类型来自区域登记表
+    return get_region_registry().region_info(region_id)
 
 def generate_pdf_report(data, report_data, output_dir):
     """生成PDF格式的报告
@@ -308,21 +269,8 @@ def generate_pdf_report(data, report_data, output_dir):
         str: 生成的报告文件路径
     """
     try:
-        # 导入reports_api模块中的函数
-        import importlib.util
-        import sys
-        
-        # 构建reports_api模块的路径
-        module_path = os.path.join(current_dir, 'reports_api.py')
-        
-        # 动态加载模块
-        spec = importlib.util.spec_from_file_location('reports_api', module_path)
-        reports_api = importlib.util.module_from_spec(spec)
-        sys.modules['reports_api'] = reports_api
-        spec.loader.exec_module(reports_api)
-        
-        # 获取generate_pdf_report函数
-        api_generate_pdf = reports_api.generate_pdf_report
+        # 使用报告格式生成器中的generate_pdf_report函数
+        api_generate_pdf = report_writers.generate_pdf_report
         
         # 生成文件路径
         report_filename = f"{os.path.basename(output_dir)}.pdf"
@@ -363,21 +311,8 @@ def generate_pdf_report(data, report_data, output_dir):
 def generate_word_report(data, report_data, output_dir):
     """生成Word格式的报告"""
     try:
-        # 导入reports_api模块中的函数
-        import importlib.util
-        import sys
-        
-        # 构建reports_api模块的路径
-        module_path = os.path.join(current_dir, 'reports_api.py')
-        
-        # 动态加载模块
-        spec = importlib.util.spec_from_file_location('reports_api', module_path)
-        reports_api = importlib.util.module_from_spec(spec)
-        sys.modules['reports_api'] = reports_api
-        spec.loader.exec_module(reports_api)
-        
-        # 获取generate_word_report函数
-        api_generate_word = reports_api.generate_word_report
+        # 使用报告格式生成器中的generate_word_report函数
+        api_generate_word = report_writers.generate_word_report
         
         # 生成文件路径
         report_filename = f"{os.path.basename(output_dir)}.docx"
@@ -418,21 +353,8 @@ def generate_word_report(data, report_data, output_dir):
 def generate_excel_report(data, report_data, output_dir):
     """生成Excel格式的报告"""
     try:
-        # 导入reports_api模块中的函数
-        import importlib.util
-        import sys
-        
-        # 构建reports_api模块的路径
-        module_path = os.path.join(current_dir, 'reports_api.py')
-        
-        # 动态加载模块
-        spec = importlib.util.spec_from_file_location('reports_api', module_path)
-        reports_api = importlib.util.module_from_spec(spec)
-        sys.modules['reports_api'] = reports_api
-        spec.loader.exec_module(reports_api)
-        
-        # 获取generate_excel_report函数
-        api_generate_excel = reports_api.generate_excel_report
+        # 使用报告格式生成器中的generate_excel_report函数
+        api_generate_excel = report_writers.generate_excel_report
         
         # 生成文件路径
         report_filename = f"{os.path.basename(output_dir)}.xlsx"
@@ -473,21 +395,8 @@ def generate_excel_report(data, report_data, output_dir):
 def generate_html_report(data, report_data, output_dir):
     """生成HTML格式的报告"""
     try:
-        # 导入reports_api模块中的函数
-        import importlib.util
-        import sys
-        
-        # 构建reports_api模块的路径
-        module_path = os.path.join(current_dir, 'reports_api.py')
-        
-        # 动态加载模块
-        spec = importlib.util.spec_from_file_location('reports_api', module_path)
-        reports_api = importlib.util.module_from_spec(spec)
-        sys.modules['reports_api'] = reports_api
-        spec.loader.exec_module(reports_api)
-        
-        # 获取generate_html_report函数
-        api_generate_html = reports_api.generate_html_report
+        # 使用报告格式生成器中的generate_html_report函数
+        api_generate_html = report_writers.generate_html_report
         
         # 生成文件路径
         report_filename = f"{os.path.basename(output_dir)}.html"
@@ -646,8 +555,17 @@ def generate_report(report_data):
         # 保存报告信息
         save_report(report_id, report_info)
         
-        # 使用非阻塞IO来避免使用线程
-        # Thread(target=_generate_report_async, args=(report_id, report_data, report_info)).start()
+        # 提交到共享的报告任务队列，由有界工作线程池异步生成
+        try:
+            get_report_job_queue().submit(
+                _generate_report_async, report_id, report_data, report_info,
+                job_id=report_id, name=f"{report_info['region_name']} {report_info['pollutant']}"
+            )
+        except ReportQueueFull as e:
+            report_info['status'] = 'failed'
+            report_info['error'] = str(e)
+            save_report(report_id, report_info)
+            return {'success': False, 'error': str(e)}
         
         # 直接返回结果，让客户端后续查询进度
         return {'success': True, 'report_id': report_id, 'status': 'processing'}
@@ -658,14 +576,15 @@ def generate_report(report_data):
         return {'success': False, 'error': error_msg}
 
 
-# 从Thread中分离出来的函数，现在需要单独调用
-def _generate_report_async(report_id, report_data, report_info):
+# 报告任务队列的工作函数
+def _generate_report_async(report_id, report_data, report_info, job=None):
     """异步生成报告的后台任务
     
     Args:
         report_id (str): 报告ID
         report_data (dict): 报告生成数据
         report_info (dict): 报告信息记录
+        job (ReportJob): 所属任务，用于上报进度
     """
     try:
         logger.info(f"开始异步生成报告 ID: {report_id}")
@@ -675,6 +594,8 @@ def _generate_report_async(report_id, report_data, report_info):
         save_report(report_id, report_info)
         
         # 获取数据
+        if job is not None:
+            job.update_progress(10, '获取报告数据')
         data = fetch_report_data(report_data)
         if not data:
             error_msg = "获取报告数据失败: 返回空数据"
@@ -682,7 +603,7 @@ def _generate_report_async(report_id, report_data, report_info):
             report_info['status'] = 'failed'
             report_info['error'] = error_msg
             save_report(report_id, report_info)
-            return
+            return {'error': report_info['error']}
             
         if 'error' in data:
             error_msg = data.get('error', '获取报告数据失败')
@@ -690,7 +611,7 @@ def _generate_report_async(report_id, report_data, report_info):
             report_info['status'] = 'failed'
             report_info['error'] = error_msg
             save_report(report_id, report_info)
-            return
+            return {'error': report_info['error']}
             
         # 检查数据是否为空
         if not data.get('timeseries'):
@@ -699,7 +620,7 @@ def _generate_report_async(report_id, report_data, report_info):
             report_info['status'] = 'failed'
             report_info['error'] = error_msg
             save_report(report_id, report_info)
-            return
+            return {'error': report_info['error']}
         
         # 获取格式并生成对应的报告
         report_format = report_data.get('format', 'pdf').lower()
@@ -712,7 +633,7 @@ def _generate_report_async(report_id, report_data, report_info):
             report_info['status'] = 'failed'
             report_info['error'] = error_msg
             save_report(report_id, report_info)
-            return
+            return {'error': report_info['error']}
         
         # 根据格式选择相应的目录
         format_dir_map = {
@@ -729,6 +650,8 @@ def _generate_report_async(report_id, report_data, report_info):
         
         # 生成报告文件
         file_path = None
+        if job is not None:
+            job.update_progress(40, f"渲染{report_format}报告")
         
         try:
             if report_format == 'pdf':
@@ -745,28 +668,28 @@ def _generate_report_async(report_id, report_data, report_info):
             report_info['status'] = 'failed'
             report_info['error'] = error_msg
             save_report(report_id, report_info)
-            return
+            return {'error': report_info['error']}
         
         if not file_path:
             logger.error(f"报告 {report_id} 文件生成失败: 未返回有效路径")
             report_info['status'] = 'failed'
             report_info['error'] = "报告文件生成失败: 未返回有效路径"
             save_report(report_id, report_info)
-            return
+            return {'error': report_info['error']}
         
         if isinstance(file_path, dict) and 'error' in file_path:
             logger.error(f"报告 {report_id} 文件生成失败: {file_path['error']}")
             report_info['status'] = 'failed'
             report_info['error'] = file_path['error']
             save_report(report_id, report_info)
-            return
+            return {'error': report_info['error']}
         
         if not os.path.exists(file_path):
             logger.error(f"报告 {report_id} 文件生成失败: 文件不存在")
             report_info['status'] = 'failed'
             report_info['error'] = "报告文件生成失败: 文件不存在"
             save_report(report_id, report_info)
-            return
+            return {'error': report_info['error']}
         
         # 更新报告信息
         report_info['status'] = 'completed'
@@ -778,7 +701,12 @@ def _generate_report_async(report_id, report_data, report_info):
         # 保存更新后的报告信息
         save_report(report_id, report_info)
         logger.info(f"报告 {report_id} 生成完成，文件路径: {file_path}")
+        return report_info
         
+    except ReportJobCancelled:
+        report_info['status'] = 'cancelled'
+        save_report(report_id, report_info)
+        raise
     except Exception as e:
         error_msg = f"生成报告过程中发生错误: {str(e)}"
         logger.error(error_msg, exc_info=True)
@@ -790,6 +718,7 @@ def _generate_report_async(report_id, report_data, report_info):
             save_report(report_id, report_info)
         except Exception as save_err:
             logger.error(f"更新报告状态失败: {str(save_err)}")
+        return {'error': error_msg}
 
 
 def fetch_report_data(report_data):
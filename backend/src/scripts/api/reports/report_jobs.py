@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+广东省空气质量监测系统 - 报告生成任务队列
+使用有界线程池在后台执行报告渲染，提供任务ID、状态、进度、取消和耗时统计
+"""
+
+import os
+import time
+import uuid
+import logging
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger('report_jobs')
+
+# 任务状态
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+
+FINISHED_STATES = (JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED)
+
+# 默认并发配置 - 可通过环境变量覆盖
+DEFAULT_MAX_WORKERS = int(os.environ.get('REPORT_WORKERS', '2'))
+DEFAULT_MAX_PENDING = int(os.environ.get('REPORT_MAX_PENDING', '50'))
+DEFAULT_HISTORY_SIZE = int(os.environ.get('REPORT_JOB_HISTORY', '200'))
+
+
+class ReportJobCancelled(Exception):
+    """任务被取消时在工作线程中抛出，用于中断渲染流程"""
+
+
+class ReportQueueFull(Exception):
+    """等待中的任务数量达到上限"""
+
+
+class ReportJob:
+    """单个报告生成任务"""
+
+    def __init__(self, job_id, name, func, args, kwargs):
+        self.id = job_id
+        self.name = name
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.status = JOB_QUEUED
+        self.progress = 0
+        self.message = '等待执行'
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        # 各阶段耗时（秒），由 stage() 上下文记录
+        self.timings = OrderedDict()
+        self.future = None
+        self._cancel_event = threading.Event()
+        self._done_event = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def cancel_requested(self):
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        """在渲染过程中检查取消标记，已取消则抛出ReportJobCancelled"""
+        if self._cancel_event.is_set():
+            raise ReportJobCancelled(f"任务 {self.id} 已取消")
+
+    def update_progress(self, progress, message=None):
+        """更新任务进度(0-100)，同时作为取消检查点"""
+        self.check_cancelled()
+        with self._lock:
+            self.progress = max(0, min(100, int(progress)))
+            if message:
+                self.message = message
+
+    @contextmanager
+    def stage(self, stage_name):
+        """记录一个渲染阶段的耗时
+
+        Args:
+            stage_name (str): 阶段名称，例如'load_data'、'render'
+        """
+        self.check_cancelled()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.timings[stage_name] = round(self.timings.get(stage_name, 0) + elapsed, 4)
+
+    def record_timing(self, name, seconds):
+        """记录一个子步骤的耗时，例如单个图表的渲染时间"""
+        with self._lock:
+            self.timings[name] = round(seconds, 4)
+
+    def wait(self, timeout=None):
+        """阻塞等待任务结束
+
+        Returns:
+            bool: 任务是否已结束
+        """
+        return self._done_event.wait(timeout)
+
+    def to_dict(self):
+        """转换为可JSON序列化的字典"""
+        with self._lock:
+            queue_wait = None
+            run_time = None
+            if self.started_at:
+                queue_wait = round(self.started_at - self.created_at, 4)
+                run_time = round((self.finished_at or time.time()) - self.started_at, 4)
+            elif self.finished_at:
+                queue_wait = round(self.finished_at - self.created_at, 4)
+
+            return {
+                'job_id': self.id,
+                'name': self.name,
+                'status': self.status,
+                'progress': self.progress,
+                'message': self.message,
+                'error': self.error,
+                'result': self.result,
+                'created_at': _format_ts(self.created_at),
+                'started_at': _format_ts(self.started_at),
+                'finished_at': _format_ts(self.finished_at),
+                'timing': {
+                    'queue_wait_seconds': queue_wait,
+                    'run_seconds': run_time,
+                    'stages': dict(self.timings)
+                }
+            }
+
+
+def _format_ts(ts):
+    return datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S') if ts else None
+
+
+class ReportJobQueue:
+    """有界报告任务队列
+
+    工作线程数量决定同时进行的渲染数，等待数量超过max_pending时拒绝新任务，
+    已结束的任务保留最近history_size条以供状态查询。
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, max_pending=DEFAULT_MAX_PENDING,
+                 history_size=DEFAULT_HISTORY_SIZE):
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max(1, max_pending)
+        self.history_size = max(1, history_size)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                            thread_name_prefix='report-worker')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {
+            'submitted': 0,
+            JOB_COMPLETED: 0,
+            JOB_FAILED: 0,
+            JOB_CANCELLED: 0,
+            'rejected': 0
+        }
+        self._total_run_seconds = 0.0
+
+    def submit(self, func, *args, job_id=None, name=None, **kwargs):
+        """提交报告任务
+
+        func将以 func(*args, job=job, **kwargs) 的形式在工作线程中调用，
+        返回值保存在job.result中。
+
+        Args:
+            func (callable): 任务函数
+            job_id (str): 任务ID，默认自动生成
+            name (str): 任务名称，用于展示
+
+        Returns:
+            ReportJob: 新建的任务
+
+        Raises:
+            ReportQueueFull: 等待中的任务过多
+        """
+        with self._lock:
+            pending = sum(1 for j in self._jobs.values() if j.status == JOB_QUEUED)
+            if pending >= self.max_pending:
+                self._counters['rejected'] += 1
+                raise ReportQueueFull(f"报告任务队列已满({pending}个等待中)，请稍后重试")
+
+            job_id = job_id or f"job_{uuid.uuid4().hex[:12]}"
+            job = ReportJob(job_id, name or job_id, func, args, kwargs)
+            self._jobs[job_id] = job
+            self._counters['submitted'] += 1
+            self._trim_history()
+
+        job.future = self._executor.submit(self._run, job)
+        logger.info(f"报告任务已入队: {job_id} ({job.name})")
+        return job
+
+    def _run(self, job):
+        with job._lock:
+            if job.cancel_requested:
+                job.status = JOB_CANCELLED
+                job.message = '任务已取消'
+                job.finished_at = time.time()
+            else:
+                job.status = JOB_RUNNING
+                job.message = '正在生成'
+                job.started_at = time.time()
+
+        if job.status == JOB_CANCELLED:
+            self._finish(job)
+            return None
+
+        try:
+            result = job.func(*job.args, job=job, **job.kwargs)
+            if isinstance(result, dict) and result.get('error'):
+                self._mark(job, JOB_FAILED, error=result['error'], message='生成失败')
+            else:
+                self._mark(job, JOB_COMPLETED, result=result, message='生成完成', progress=100)
+        except ReportJobCancelled:
+            self._mark(job, JOB_CANCELLED, message='任务已取消')
+        except Exception as e:
+            logger.error(f"报告任务执行失败: {job.id}: {str(e)}\n{traceback.format_exc()}")
+            self._mark(job, JOB_FAILED, error=str(e), message='生成失败')
+        finally:
+            self._finish(job)
+        return job.result
+
+    def _mark(self, job, status, result=None, error=None, message=None, progress=None):
+        with job._lock:
+            job.status = status
+            job.result = result
+            job.error = error
+            job.finished_at = time.time()
+            if message:
+                job.message = message
+            if progress is not None:
+                job.progress = progress
+
+    def _finish(self, job):
+        with self._lock:
+            self._counters[job.status] = self._counters.get(job.status, 0) + 1
+            if job.started_at and job.finished_at:
+                self._total_run_seconds += job.finished_at - job.started_at
+        job._done_event.set()
+        logger.info(f"报告任务结束: {job.id}, 状态={job.status}, 耗时={job.to_dict()['timing']}")
+
+    def _trim_history(self):
+        """只保留最近history_size个已结束任务（调用方持有锁）"""
+        finished = [jid for jid, j in self._jobs.items() if j.status in FINISHED_STATES]
+        for jid in finished[:max(0, len(finished) - self.history_size)]:
+            del self._jobs[jid]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self, status=None):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        if status:
+            jobs = [j for j in jobs if j.status == status]
+        return [j.to_dict() for j in reversed(jobs)]
+
+    def cancel(self, job_id):
+        """取消任务: 排队中的任务直接取消，运行中的任务在下一个检查点中断
+
+        Returns:
+            ReportJob或None: 对应任务
+        """
+        job = self.get(job_id)
+        if not job or job.status in FINISHED_STATES:
+            return job
+        job._cancel_event.set()
+        if job.future is not None and job.future.cancel():
+            # 尚未开始执行，future取消成功，_run不会再被调用
+            self._mark(job, JOB_CANCELLED, message='任务已取消')
+            self._finish(job)
+        logger.info(f"已请求取消报告任务: {job_id}")
+        return job
+
+    def stats(self):
+        """任务队列运行统计"""
+        with self._lock:
+            jobs = list(self._jobs.values())
+            counters = dict(self._counters)
+            total_run = self._total_run_seconds
+        finished = counters[JOB_COMPLETED] + counters[JOB_FAILED]
+        return {
+            'max_workers': self.max_workers,
+            'max_pending': self.max_pending,
+            'queued': sum(1 for j in jobs if j.status == JOB_QUEUED),
+            'running': sum(1 for j in jobs if j.status == JOB_RUNNING),
+            'counters': counters,
+            'avg_run_seconds': round(total_run / finished, 4) if finished else None
+        }
+
+    def shutdown(self, wait=False):
+        for job in list(self._jobs.values()):
+            if job.status == JOB_QUEUED:
+                self.cancel(job.id)
+        self._executor.shutdown(wait=wait)
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_report_job_queue():
+    """获取进程内共享的报告任务队列"""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = ReportJobQueue()
+    return _queue
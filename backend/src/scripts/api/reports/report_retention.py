@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+广东省空气质量监测系统 - 报告文件保留策略
+按字节预算和最长闲置时间清理已生成的报告文件：超过闲置时间的报告直接删除，
+总占用超过预算时按最近使用时间从旧到新淘汰报告和缓存产物。缓存命中的报告与缓存产物
+是硬链接，占用按不重复的inode统计。报告文件按文件名哈希分散到子目录中，
+避免单个目录下文件过多。
+"""
+
+import os
+import time
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+
+logger = logging.getLogger('report_retention')
+
+# 保留策略配置 - 可通过环境变量覆盖，0表示不限制
+REPORT_RETENTION_MAX_BYTES = int(os.environ.get('REPORT_RETENTION_MAX_BYTES', str(5 * 1024 * 1024 * 1024)))
+REPORT_RETENTION_MAX_AGE_DAYS = float(os.environ.get('REPORT_RETENTION_MAX_AGE_DAYS', '90'))
+REPORT_RETENTION_INTERVAL = int(os.environ.get('REPORT_RETENTION_INTERVAL', '3600'))
+
+# 哈希分片目录的前缀长度（2位十六进制 -> 256个子目录）
+SHARD_PREFIX_LENGTH = 2
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def shard_dir(base_dir, file_name):
+    """文件所在的哈希分片目录"""
+    digest = hashlib.md5(file_name.encode('utf-8')).hexdigest()
+    return os.path.join(base_dir, digest[:SHARD_PREFIX_LENGTH])
+
+
+def sharded_path(base_dir, file_name, create=True):
+    """构建报告文件的分片存储路径，例如 pdf/3f/report_xxx.pdf"""
+    directory = shard_dir(base_dir, file_name)
+    if create:
+        os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, file_name)
+
+
+def directory_usage(path):
+    """递归统计目录下的文件数和字节数"""
+    files = 0
+    size = 0
+    stack = [path]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            files += 1
+                            size += entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return {'files': files, 'bytes': size}
+
+
+class ReportRetentionManager:
+    """报告文件保留管理
+
+    报告大小和最近下载时间保存在报告元数据存储中，淘汰时先删除元数据记录再删除文件，
+    下载接口不会再返回已被淘汰的报告。报告缓存目录中的产物按最近命中时间单独过期，
+    同时计入字节预算：报告与缓存产物共享同一inode时，两者都被删除后才释放磁盘空间。
+    """
+
+    def __init__(self, store, directories, max_bytes=REPORT_RETENTION_MAX_BYTES,
+                 max_age_days=REPORT_RETENTION_MAX_AGE_DAYS, interval=REPORT_RETENTION_INTERVAL,
+                 cache_dir=None):
+        self.store = store
+        self.directories = dict(directories)
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.interval = interval
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.last_run = None
+
+    def _remove_file(self, path):
+        """删除文件，返回实际释放的字节数（还有其他硬链接时为0）"""
+        if not path:
+            return 0
+        try:
+            stat = os.stat(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return 0
+        except OSError as e:
+            logger.warning(f"删除报告文件失败: {path}: {str(e)}")
+            return 0
+        # 分片目录为空时一并删除
+        parent = os.path.dirname(path)
+        if parent not in self.directories.values():
+            try:
+                os.rmdir(parent)
+            except OSError:
+                pass
+        return stat.st_size if stat.st_nlink <= 1 else 0
+
+    def _evict(self, record, reason):
+        """删除一条报告记录及其文件
+
+        Returns:
+            int: 释放的字节数
+        """
+        if self.store.delete(record['id']) is None:
+            return 0
+        freed = self._remove_file(record.get('file_path'))
+        logger.info(f"报告已按保留策略删除({reason}): {record['id']}, 释放 {freed} 字节")
+        return freed
+
+    def _evict_cache(self, entry, reason):
+        """删除一个缓存条目及其文件，返回释放的字节数"""
+        self.store.cache_delete(entry['cache_key'])
+        freed = self._remove_file(entry.get('file_path'))
+        logger.info(f"缓存产物已按保留策略删除({reason}): {entry['cache_key'][:12]}, 释放 {freed} 字节")
+        return freed
+
+    def disk_holders(self):
+        """报告文件和缓存产物，按最近使用时间升序排列
+
+        Returns:
+            tuple: (holders, inodes)。holders中每项带kind('report'/'cache')和inode（文件不存在时为None）；
+                inodes为 (st_dev, st_ino) -> {'size', 'refs'}，硬链接的报告和缓存产物共享一项
+        """
+        holders = ([dict(row, kind='report') for row in self.store.report_files()] +
+                   [dict(row, kind='cache') for row in self.store.cache_files()])
+        inodes = {}
+        for holder in holders:
+            try:
+                stat = os.stat(holder['file_path'] or '')
+            except OSError:
+                holder['inode'] = None
+                continue
+            holder['inode'] = (stat.st_dev, stat.st_ino)
+            info = inodes.setdefault(holder['inode'], {'size': stat.st_size, 'refs': 0})
+            info['refs'] += 1
+        holders.sort(key=lambda holder: holder['last_used'] or '')
+        return holders, inodes
+
+    def backfill_sizes(self):
+        """为缺少文件大小的旧记录补齐大小，文件已不存在的记录大小记为0"""
+        updated = 0
+        while True:
+            rows = self.store.missing_sizes()
+            if not rows:
+                return updated
+            sizes = []
+            for row in rows:
+                try:
+                    sizes.append((row['id'], os.path.getsize(row['file_path'] or '')))
+                except OSError:
+                    sizes.append((row['id'], 0))
+            self.store.set_sizes(sizes)
+            updated += len(sizes)
+
+    def enforce(self):
+        """执行一次保留策略
+
+        Returns:
+            dict: 本次清理的统计
+        """
+        with self._lock:
+            start = time.perf_counter()
+            result = {'expired': 0, 'evicted': 0, 'missing': 0, 'cache_expired': 0, 'cache_evicted': 0,
+                      'bytes_freed': 0}
+            self.backfill_sizes()
+
+            # 1. 超过最长闲置时间的报告和缓存产物
+            if self.max_age_days > 0:
+                cutoff = (datetime.now() - timedelta(days=self.max_age_days)).strftime(TIME_FORMAT)
+                while True:
+                    records = self.store.least_recently_used(limit=500, before=cutoff)
+                    if not records:
+                        break
+                    for record in records:
+                        result['bytes_freed'] += self._evict(record, '超过保留时间')
+                        result['expired'] += 1
+                for entry in self.store.cache_expired(cutoff):
+                    result['bytes_freed'] += self._evict_cache(entry, '超过保留时间')
+                    result['cache_expired'] += 1
+
+            # 2. 报告和缓存产物按不重复的inode统计占用，超过字节预算时从最久未使用的开始淘汰
+            holders, inodes = self.disk_holders()
+            usage = sum(info['size'] for info in inodes.values())
+            if self.max_bytes > 0:
+                for holder in holders:
+                    if usage <= self.max_bytes:
+                        break
+                    if holder['kind'] == 'cache':
+                        result['bytes_freed'] += self._evict_cache(holder, '超出存储预算')
+                        result['cache_evicted'] += 1
+                    elif holder['inode'] is None:
+                        # 文件已丢失的记录直接移除，保持元数据与磁盘一致
+                        self.store.delete(holder['id'])
+                        result['missing'] += 1
+                    else:
+                        result['bytes_freed'] += self._evict(holder, '超出存储预算')
+                        result['evicted'] += 1
+                    if holder['inode'] is not None:
+                        info = inodes[holder['inode']]
+                        info['refs'] -= 1
+                        if info['refs'] == 0:
+                            usage -= info['size']
+            result['usage_bytes'] = usage
+
+            result['seconds'] = round(time.perf_counter() - start, 3)
+            result['finished_at'] = datetime.now().strftime(TIME_FORMAT)
+            self.last_run = result
+            for name in ('expired', 'evicted', 'cache_expired', 'cache_evicted', 'bytes_freed'):
+                if result[name]:
+                    self.store.incr_counter(f"retention_{name}", result[name])
+            if result['expired'] or result['evicted'] or result['cache_expired'] or result['cache_evicted']:
+                logger.info(f"报告保留策略执行完成: {result}")
+            return result
+
+    def usage(self, scan_disk=False):
+        """存储占用指标
+
+        bytes为报告记录的大小之和；disk_bytes为报告和缓存产物按不重复inode统计的占用（与字节预算比较的值），
+        取最近一次执行保留策略时的结果，scan_disk时重新统计。
+
+        Args:
+            scan_disk (bool): 是否遍历目录统计实际磁盘占用（文件较多时较慢）
+        """
+        summary = self.store.usage_summary()
+        if scan_disk:
+            disk_bytes = sum(info['size'] for info in self.disk_holders()[1].values())
+        else:
+            disk_bytes = self.last_run['usage_bytes'] if self.last_run else None
+        used = disk_bytes if disk_bytes is not None else summary['bytes']
+        metrics = {
+            'reports': summary['reports'],
+            'bytes': summary['bytes'],
+            'disk_bytes': disk_bytes,
+            'by_format': summary['by_format'],
+            'cache': self.store.cache_summary(),
+            'max_bytes': self.max_bytes,
+            'max_age_days': self.max_age_days,
+            'usage_ratio': round(used / self.max_bytes, 4) if self.max_bytes > 0 else None,
+            'totals': self.store.get_counters('retention_'),
+            'last_run': self.last_run
+        }
+        if scan_disk:
+            directories = dict(self.directories)
+            if self.cache_dir:
+                directories['cache'] = self.cache_dir
+            metrics['disk'] = {name: directory_usage(path) for name, path in directories.items()}
+        return metrics
+
+    def start(self):
+        """启动后台清理线程"""
+        if self.interval <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='report-retention', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.enforce()
+            except Exception as e:
+                logger.error(f"执行报告保留策略失败: {str(e)}")
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
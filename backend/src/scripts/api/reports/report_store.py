@@ -0,0 +1,449 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+广东省空气质量监测系统 - 报告元数据存储
+基于SQLite的索引化报告元数据存储，支持按ID查找、按日期/区域/类型过滤分页，
+以及并发安全的写入。首次启动时自动从旧的JSON元数据文件迁移。
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger('report_store')
+
+# 有独立列并建立索引的字段，其余字段保存在extra中
+INDEXED_FIELDS = [
+    'id', 'name', 'type', 'format', 'region', 'start_date', 'end_date',
+    'created_at', 'file_path', 'file_name', 'download_url', 'status',
+    'size_bytes', 'last_accessed_at'
+]
+
+# 早期版本的数据库缺少的列，打开时自动补齐
+ADDED_COLUMNS = {
+    'size_bytes': 'INTEGER',
+    'last_accessed_at': 'TEXT'
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    type TEXT,
+    format TEXT,
+    region TEXT,
+    start_date TEXT,
+    end_date TEXT,
+    created_at TEXT,
+    file_path TEXT,
+    file_name TEXT,
+    download_url TEXT,
+    status TEXT,
+    size_bytes INTEGER,
+    last_accessed_at TEXT,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_reports_created_at ON reports (created_at);
+CREATE INDEX IF NOT EXISTS idx_reports_region_created ON reports (region, created_at);
+CREATE INDEX IF NOT EXISTS idx_reports_type_created ON reports (type, created_at);
+CREATE INDEX IF NOT EXISTS idx_reports_dates ON reports (start_date, end_date);
+CREATE INDEX IF NOT EXISTS idx_reports_file_name ON reports (file_name);
+CREATE INDEX IF NOT EXISTS idx_reports_last_used ON reports (COALESCE(last_accessed_at, created_at));
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS report_cache (
+    cache_key TEXT PRIMARY KEY,
+    request_hash TEXT,
+    format TEXT,
+    file_path TEXT,
+    size_bytes INTEGER,
+    sha256 TEXT,
+    watermark TEXT,
+    created_at TEXT,
+    last_hit_at TEXT,
+    hits INTEGER DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_report_cache_request ON report_cache (request_hash);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER DEFAULT 0
+);
+"""
+
+CACHE_FIELDS = [
+    'cache_key', 'request_hash', 'format', 'file_path', 'size_bytes', 'sha256',
+    'watermark', 'created_at', 'last_hit_at', 'hits'
+]
+
+
+class ReportMetadataStore:
+    """报告元数据存储
+
+    每个线程使用独立的SQLite连接，数据库以WAL模式打开，
+    读操作不阻塞写操作，写操作由SQLite保证原子性。
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        conn = self._conn()
+        self._add_missing_columns(conn)
+        conn.executescript(SCHEMA)
+        conn.commit()
+
+    @staticmethod
+    def _add_missing_columns(conn):
+        """为旧版本创建的reports表补齐新增的列"""
+        existing = {row[1] for row in conn.execute('PRAGMA table_info(reports)').fetchall()}
+        if not existing:
+            return
+        for column, column_type in ADDED_COLUMNS.items():
+            if column not in existing:
+                conn.execute(f"ALTER TABLE reports ADD COLUMN {column} {column_type}")
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _to_row(record):
+        values = [record.get(field) for field in INDEXED_FIELDS]
+        extra = {k: v for k, v in record.items() if k not in INDEXED_FIELDS}
+        values.append(json.dumps(extra, ensure_ascii=False, default=str) if extra else None)
+        return values
+
+    @staticmethod
+    def _from_row(row):
+        record = {field: row[field] for field in INDEXED_FIELDS if row[field] is not None}
+        if row['extra']:
+            try:
+                record.update(json.loads(row['extra']))
+            except ValueError:
+                pass
+        return record
+
+    def add(self, record):
+        """插入或更新一条报告记录
+
+        Args:
+            record (dict): 报告记录，必须包含id
+
+        Returns:
+            bool: 是否成功
+        """
+        if not record or not record.get('id'):
+            logger.error("添加报告记录失败: 记录缺少id")
+            return False
+        placeholders = ', '.join(['?'] * (len(INDEXED_FIELDS) + 1))
+        columns = ', '.join(INDEXED_FIELDS + ['extra'])
+        conn = self._conn()
+        with conn:
+            conn.execute(f"INSERT OR REPLACE INTO reports ({columns}) VALUES ({placeholders})",
+                         self._to_row(record))
+        return True
+
+    def update(self, report_id, **fields):
+        """更新报告记录的部分字段
+
+        Returns:
+            dict或None: 更新后的记录
+        """
+        conn = self._conn()
+        with conn:
+            # BEGIN IMMEDIATE 保证读-改-写期间不被其他写入者打断
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT * FROM reports WHERE id = ?', (report_id,)).fetchone()
+            if row is None:
+                return None
+            record = self._from_row(row)
+            record.update(fields)
+            placeholders = ', '.join(['?'] * (len(INDEXED_FIELDS) + 1))
+            columns = ', '.join(INDEXED_FIELDS + ['extra'])
+            conn.execute(f"INSERT OR REPLACE INTO reports ({columns}) VALUES ({placeholders})",
+                         self._to_row(record))
+        return record
+
+    def get(self, report_id):
+        row = self._conn().execute('SELECT * FROM reports WHERE id = ?', (report_id,)).fetchone()
+        return self._from_row(row) if row else None
+
+    def get_by_file_name(self, file_name):
+        row = self._conn().execute('SELECT * FROM reports WHERE file_name = ? LIMIT 1',
+                                   (file_name,)).fetchone()
+        return self._from_row(row) if row else None
+
+    def delete(self, report_id):
+        """删除报告记录
+
+        Returns:
+            dict或None: 被删除的记录
+        """
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT * FROM reports WHERE id = ?', (report_id,)).fetchone()
+            if row is None:
+                return None
+            conn.execute('DELETE FROM reports WHERE id = ?', (report_id,))
+        return self._from_row(row)
+
+    def touch(self, report_id, accessed_at):
+        """记录报告最近一次被下载的时间（保留策略按此淘汰）"""
+        conn = self._conn()
+        with conn:
+            conn.execute('UPDATE reports SET last_accessed_at = ? WHERE id = ?', (accessed_at, report_id))
+
+    def least_recently_used(self, limit=100, before=None):
+        """按最近使用时间(最近下载时间，未下载过则为生成时间)升序返回报告
+
+        Args:
+            limit (int): 返回条数
+            before (str): 只返回最近使用时间早于该时间的报告
+
+        Returns:
+            list: 报告记录列表
+        """
+        sql = 'SELECT * FROM reports'
+        params = []
+        if before:
+            sql += ' WHERE COALESCE(last_accessed_at, created_at) < ?'
+            params.append(before)
+        sql += ' ORDER BY COALESCE(last_accessed_at, created_at) ASC LIMIT ?'
+        params.append(int(limit))
+        return [self._from_row(row) for row in self._conn().execute(sql, params).fetchall()]
+
+    def missing_sizes(self, limit=1000):
+        """尚未记录文件大小的报告（旧版本生成的记录）"""
+        rows = self._conn().execute('SELECT id, file_path FROM reports WHERE size_bytes IS NULL LIMIT ?',
+                                    (int(limit),)).fetchall()
+        return [dict(row) for row in rows]
+
+    def set_sizes(self, sizes):
+        """批量写入文件大小
+
+        Args:
+            sizes (list): [(report_id, size_bytes)]
+        """
+        conn = self._conn()
+        with conn:
+            conn.executemany('UPDATE reports SET size_bytes = ? WHERE id = ?',
+                             [(size, report_id) for report_id, size in sizes])
+
+    def usage_summary(self):
+        """按格式统计报告数量和占用字节数"""
+        rows = self._conn().execute(
+            'SELECT format, COUNT(*) AS reports, COALESCE(SUM(size_bytes), 0) AS bytes '
+            'FROM reports GROUP BY format').fetchall()
+        by_format = {row['format'] or 'unknown': {'reports': row['reports'], 'bytes': row['bytes']}
+                     for row in rows}
+        return {
+            'reports': sum(item['reports'] for item in by_format.values()),
+            'bytes': sum(item['bytes'] for item in by_format.values()),
+            'by_format': by_format
+        }
+
+    @staticmethod
+    def _build_filters(region=None, report_type=None, report_format=None, status=None,
+                       start_date=None, end_date=None):
+        conditions = []
+        params = []
+        if region:
+            conditions.append('region = ?')
+            params.append(region)
+        if report_type:
+            conditions.append('type = ?')
+            params.append(report_type)
+        if report_format:
+            conditions.append('format = ?')
+            params.append(report_format)
+        if status:
+            conditions.append('status = ?')
+            params.append(status)
+        # 日期过滤: 报告覆盖的时间段与查询区间有交集
+        if start_date:
+            conditions.append('end_date >= ?')
+            params.append(start_date)
+        if end_date:
+            conditions.append('start_date <= ?')
+            params.append(end_date)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        return where, params
+
+    def query(self, limit=None, offset=0, **filters):
+        """按条件查询报告记录，按生成时间降序
+
+        Args:
+            limit (int): 每页条数，None表示不分页
+            offset (int): 偏移量
+            **filters: region, report_type, report_format, status, start_date, end_date
+
+        Returns:
+            list: 报告记录列表
+        """
+        where, params = self._build_filters(**filters)
+        sql = f"SELECT * FROM reports {where} ORDER BY created_at DESC"
+        if limit is not None:
+            sql += ' LIMIT ? OFFSET ?'
+            params += [int(limit), int(offset or 0)]
+        rows = self._conn().execute(sql, params).fetchall()
+        return [self._from_row(row) for row in rows]
+
+    def count(self, **filters):
+        where, params = self._build_filters(**filters)
+        return self._conn().execute(f"SELECT COUNT(*) FROM reports {where}", params).fetchone()[0]
+
+    def cache_get(self, cache_key):
+        """按缓存键查找报告产物"""
+        row = self._conn().execute('SELECT * FROM report_cache WHERE cache_key = ?',
+                                   (cache_key,)).fetchone()
+        return dict(row) if row else None
+
+    def cache_put(self, entry):
+        """登记缓存产物，并移除同一请求旧数据版本的缓存条目
+
+        Args:
+            entry (dict): 包含CACHE_FIELDS中字段的缓存条目
+
+        Returns:
+            list: 被替换的旧缓存条目（调用方负责删除对应文件）
+        """
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            stale = conn.execute(
+                'SELECT * FROM report_cache WHERE request_hash = ? AND cache_key != ?',
+                (entry.get('request_hash'), entry['cache_key'])).fetchall()
+            if stale:
+                conn.execute('DELETE FROM report_cache WHERE request_hash = ? AND cache_key != ?',
+                             (entry.get('request_hash'), entry['cache_key']))
+            conn.execute(
+                f"INSERT OR REPLACE INTO report_cache ({', '.join(CACHE_FIELDS)}) "
+                f"VALUES ({', '.join(['?'] * len(CACHE_FIELDS))})",
+                [entry.get(field, 0 if field == 'hits' else None) for field in CACHE_FIELDS])
+        return [dict(row) for row in stale]
+
+    def cache_record_hit(self, cache_key, hit_at):
+        conn = self._conn()
+        with conn:
+            conn.execute('UPDATE report_cache SET hits = hits + 1, last_hit_at = ? WHERE cache_key = ?',
+                         (hit_at, cache_key))
+
+    def cache_delete(self, cache_key):
+        conn = self._conn()
+        with conn:
+            conn.execute('DELETE FROM report_cache WHERE cache_key = ?', (cache_key,))
+
+    def cache_expired(self, before):
+        """最近命中时间(未命中过则为创建时间)早于before的缓存条目"""
+        rows = self._conn().execute(
+            'SELECT * FROM report_cache WHERE COALESCE(last_hit_at, created_at) < ?', (before,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def report_files(self):
+        """全部报告的文件路径、大小和最近使用时间（最近下载时间，未下载过则为生成时间）"""
+        rows = self._conn().execute(
+            'SELECT id, file_path, size_bytes, COALESCE(last_accessed_at, created_at) AS last_used '
+            'FROM reports').fetchall()
+        return [dict(row) for row in rows]
+
+    def cache_files(self):
+        """全部缓存条目的文件路径、大小和最近使用时间（最近命中时间，未命中过则为创建时间）"""
+        rows = self._conn().execute(
+            'SELECT cache_key, file_path, size_bytes, COALESCE(last_hit_at, created_at) AS last_used '
+            'FROM report_cache').fetchall()
+        return [dict(row) for row in rows]
+
+    def cache_summary(self):
+        """缓存条目数与占用字节数"""
+        row = self._conn().execute(
+            'SELECT COUNT(*) AS entries, COALESCE(SUM(size_bytes), 0) AS bytes FROM report_cache').fetchone()
+        return {'entries': row['entries'], 'bytes': row['bytes']}
+
+    def incr_counter(self, name, amount=1):
+        conn = self._conn()
+        with conn:
+            conn.execute('INSERT INTO counters (name, value) VALUES (?, ?) '
+                         'ON CONFLICT(name) DO UPDATE SET value = value + excluded.value',
+                         (name, int(amount)))
+
+    def get_counters(self, prefix=''):
+        rows = self._conn().execute('SELECT name, value FROM counters WHERE name LIKE ?',
+                                    (f"{prefix}%",)).fetchall()
+        return {row['name']: row['value'] for row in rows}
+
+    def migrate_from_json(self, json_path):
+        """一次性从旧版JSON元数据文件迁移
+
+        迁移完成后在store_meta中记录标记，并将JSON文件重命名为*.migrated。
+        兼容列表格式和 {'reports': [...]} 格式。
+
+        Returns:
+            int: 迁移的记录数
+        """
+        conn = self._conn()
+        done = conn.execute("SELECT value FROM store_meta WHERE key = 'json_migrated'").fetchone()
+        if done or not os.path.exists(json_path):
+            return 0
+
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (ValueError, OSError) as e:
+            logger.error(f"读取旧报告元数据失败，跳过迁移: {json_path}: {str(e)}")
+            return 0
+
+        if isinstance(data, dict):
+            data = data.get('reports', [])
+        records = [r for r in data if isinstance(r, dict) and r.get('id')] if isinstance(data, list) else []
+
+        placeholders = ', '.join(['?'] * (len(INDEXED_FIELDS) + 1))
+        columns = ', '.join(INDEXED_FIELDS + ['extra'])
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            # INSERT OR IGNORE: 已存在于数据库中的记录以数据库为准
+            conn.executemany(f"INSERT OR IGNORE INTO reports ({columns}) VALUES ({placeholders})",
+                             [self._to_row(r) for r in records])
+            conn.execute("INSERT OR REPLACE INTO store_meta (key, value) VALUES ('json_migrated', ?)",
+                         (str(int(time.time())),))
+
+        try:
+            os.replace(json_path, f"{json_path}.migrated")
+        except OSError as e:
+            logger.warning(f"重命名旧报告元数据文件失败: {str(e)}")
+
+        logger.info(f"已从 {json_path} 迁移 {len(records)} 条报告元数据")
+        return len(records)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_report_store(db_path, legacy_json_path=None):
+    """获取指定路径的报告元数据存储（进程内共享）
+
+    Args:
+        db_path (str): SQLite数据库文件路径
+        legacy_json_path (str): 旧版JSON元数据文件路径，存在时执行一次性迁移
+    """
+    with _stores_lock:
+        store = _stores.get(db_path)
+        if store is None:
+            store = ReportMetadataStore(db_path)
+            if legacy_json_path:
+                store.migrate_from_json(legacy_json_path)
+            _stores[db_path] = store
+        return store
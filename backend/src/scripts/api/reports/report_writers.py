@@ -0,0 +1,1266 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+广东省空气质量监测系统 - 报告格式生成器
+PDF/Excel/Word/HTML生成器不依赖Flask应用和报告存储，导入时没有副作用，
+可以在图表渲染进程池的工作进程中运行。
+"""
+
+import os
+import io
+import time
+import base64
+import shutil
+import tempfile
+import threading
+import logging
+import traceback
+from datetime import datetime
+from pathlib import Path
+
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.lib.utils import ImageReader
+from docx import Document
+from docx.shared import Inches
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml.ns import qn
+
+from src.scripts.api.reports.report_excel import write_excel_report
+from src.scripts.utils.region_registry import get_region_registry
+
+logger = logging.getLogger('reports_api')
+
+# 默认中文字体文件路径
+DEFAULT_FONT_PATH = os.path.join(str(Path(__file__).resolve().parents[4]), 'data', 'fonts', 'simhei.ttf')
+
+
+# 根据AQI值获取空气质量等级
+def get_air_quality_category(aqi):
+    if aqi <= 50:
+        return "优"
+    elif aqi <= 100:
+        return "良"
+    elif aqi <= 150:
+        return "轻度污染"
+    elif aqi <= 200:
+        return "中度污染"
+    elif aqi <= 300:
+        return "重度污染"
+    else:
+        return "严重污染"
+
+def get_report_type_name(report_type):
+    """获取报告类型的中文名称
+    
+    Args:
+        report_type (str): 报告类型代码
+        
+    Returns:
+        str: 报告类型的中文名称
+    """
+    report_types = {
+        'daily': '日报',
+        'weekly': '周报',
+        'monthly': '月报',
+        'quarterly': '季度报告',
+        'yearly': '年度报告',
+        'custom': '自定义报告'
+    }
+    return report_types.get(report_type, '未知类型')
+
+def get_region_name(region_code):
+    """获取区域的中文名称（来自区域登记表，'all'为启用省份的名称）
+    
+    Args:
+        region_code (str): 区域代码
+        
+    Returns:
+        str: 区域的中文名称
+    """
+    return get_region_registry().region_info(region_code)['name']
+
+# PDF中文字体注册状态（每个进程只注册一次）
+_pdf_font_name = None
+_pdf_font_lock = threading.Lock()
+def ensure_pdf_fonts():
+    """注册PDF使用的中文字体，返回可用的字体名称"""
+    global _pdf_font_name
+    if _pdf_font_name is not None:
+        return _pdf_font_name
+    with _pdf_font_lock:
+        if _pdf_font_name is not None:
+            return _pdf_font_name
+        candidates = [DEFAULT_FONT_PATH, 'C:/Windows/Fonts/simhei.ttf',
+                      '/usr/share/fonts/truetype/arphic/uming.ttc']
+        font_path = next((path for path in candidates if os.path.exists(path)), None)
+        if font_path:
+            try:
+                pdfmetrics.registerFont(TTFont('SimHei', font_path))
+                logger.info(f"已注册PDF中文字体: {font_path}")
+                _pdf_font_name = 'SimHei'
+            except Exception as e:
+                logger.error(f"注册PDF中文字体失败: {str(e)}")
+                _pdf_font_name = 'Helvetica'
+        else:
+            logger.warning("找不到中文字体，将使用默认字体")
+            _pdf_font_name = 'Helvetica'
+        return _pdf_font_name
+
+# 生成PDF报告
+def generate_pdf_report(data, content_options, output_path, report_type, region, start_date, end_date):
+    """生成PDF格式的报告
+    
+    Args:
+        data (dict): 数据字典，包含AQI数据和污染物数据
+        content_options (dict): 内容选项，指定要包含的内容
+        output_path (str): 输出文件路径
+        report_type (str): 报告类型
+        region (str): 地区
+        start_date (str): 开始日期
+        end_date (str): 结束日期
+        
+    Returns:
+        str: 生成的报告文件路径，或者带有错误信息的字典
+    """
+    tmp_path = None
+    chart_dir = None
+    try:
+        logger.info(f"开始生成PDF报告: {output_path}")
+        logger.info(f"内容选项: {content_options}")
+        
+        # 检查数据有效性（ReportDataset或兼容的字典）
+        if data is None or not hasattr(data, 'get'):
+            error_msg = "无效的数据格式"
+            logger.error(error_msg)
+            return {'error': error_msg}
+            
+        aqi_data = data.get('aqi_data')
+        pollutants = data.get('pollutants')
+        
+        if aqi_data is None or pollutants is None:
+            error_msg = "数据中缺少AQI数据或污染物数据"
+            logger.error(error_msg)
+            return {'error': error_msg}
+            
+        # 确保输出目录存在
+        output_dir = os.path.dirname(output_path)
+        os.makedirs(output_dir, exist_ok=True)
+        
+        # 中文字体每个进程只注册一次
+        font_name = ensure_pdf_fonts()
+        bold_font_name = font_name if font_name == 'SimHei' else 'Helvetica-Bold'
+        
+        # 创建PDF文档 - 直接写入同目录下的临时文件，完成后原子重命名；
+        # 每页内容流压缩后保存，图表以文件引用方式嵌入，不在内存中保留整份PDF字节。
+        # 图表的临时PNG放在系统临时目录，不出现在报告目录中（也不会被保留策略和目录统计扫到）
+        logger.info("创建PDF文档...")
+        tmp_path = f"{output_path}.part"
+        chart_dir = tempfile.mkdtemp(prefix='report_charts_')
+        c = canvas.Canvas(tmp_path, pagesize=A4, pageCompression=1)
+        width, height = A4
+        
+        # 页码计数器
+        page_number = 1
+        
+        # 函数：添加页眉和页码
+        def add_header_and_footer():
+            # 页眉
+            c.setFont(font_name, 10)
+            c.drawString(50, height - 20, f"{get_region_name('all')}空气质量监测系统 - {get_report_type_name(report_type)}报告")
+            c.drawRightString(width - 50, height - 20, f"时间范围: {start_date} 至 {end_date}")
+            
+            # 页脚
+            c.drawString(50, 20, f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+            c.drawRightString(width - 50, 20, f"第 {page_number} 页")
+        
+        # 设置标题
+        c.setFont(font_name, 18)
+        title = f"{get_region_name('all')}空气质量监测系统 - {get_report_type_name(report_type)}报告"
+        c.drawCentredString(width/2, height-50, title)
+        
+        # 设置副标题
+        c.setFont(font_name, 12)
+        subtitle = f"时间范围: {start_date} 至 {end_date}   地区: {get_region_name(region)}"
+        c.drawCentredString(width/2, height-80, subtitle)
+        
+        # 绘制分隔线
+        c.line(50, height-90, width-50, height-90)
+        
+        # 添加页眉页脚
+        add_header_and_footer()
+        
+        # 当前位置（Y坐标）
+        y_position = height - 120
+        
+        # 添加摘要
+        if not aqi_data.empty:
+            c.setFont(font_name, 12)
+            c.drawString(50, y_position, "空气质量摘要")
+            y_position -= 20
+            
+            # 计算平均AQI
+            avg_aqi = round(aqi_data['aqi'].mean(), 1)
+            # 获取最高AQI
+            max_aqi = aqi_data['aqi'].max()
+            # 获取最高AQI的城市
+            max_aqi_city = aqi_data.loc[aqi_data['aqi'].idxmax()]['city'] if len(aqi_data) > 0 else "无数据"
+            
+            # 绘制摘要信息
+            c.setFont(font_name, 10)
+            c.drawString(70, y_position, f"平均空气质量指数(AQI): {avg_aqi}")
+            y_position -= 15
+            c.drawString(70, y_position, f"最高空气质量指数: {max_aqi} ({max_aqi_city})")
+            y_position -= 15
+            c.drawString(70, y_position, f"空气质量等级: {get_air_quality_category(avg_aqi)}")
+            y_position -= 30
+        
+        # 添加空气质量概览部分
+        if content_options.get('air_quality', True) and not aqi_data.empty:
+            logger.info("添加空气质量概览...")
+            c.setFont(font_name, 12)
+            c.drawString(50, y_position, "空气质量概览")
+            y_position -= 20
+            
+            # 创建空气质量数据表格
+            cities = aqi_data['city'].unique()
+            rows = [["城市", "AQI", "质量等级"]]
+            
+            # 统计城市数量，以便规划表格布局
+            total_cities = len(cities)
+            logger.info(f"报告将包含 {total_cities} 个城市的数据")
+            
+            # 为所有城市添加数据
+            for city in cities:
+                city_data = aqi_data[aqi_data['city'] == city]
+                avg_city_aqi = round(city_data['aqi'].mean(), 1)
+                quality_level = get_air_quality_category(avg_city_aqi)
+                rows.append([city, str(avg_city_aqi), quality_level])
+            
+            # 绘制表格
+            table_width = width - 100
+            col_widths = [table_width * 0.4, table_width * 0.3, table_width * 0.3]
+            row_height = 20
+            rows_per_page = 25  # 每页最多显示的行数
+            
+            # 计算表格需要多少页
+            total_rows = len(rows)
+            
+            # 如果数据太多，需要分页
+            if y_position - (total_rows * row_height) < 50:
+                # 第一页能容纳的行数（考虑已用空间）
+                first_page_rows = max(1, min(rows_per_page, int((y_position - 50) / row_height)))
+                
+                # 绘制表头和第一页数据
+                for i in range(min(first_page_rows, total_rows)):
+                    row = rows[i]
+                    for j, cell in enumerate(row):
+                        x = 50 + sum(col_widths[:j])
+                        y = y_position - i * row_height
+                        
+                        # 绘制单元格
+                        if i == 0:  # 表头
+                            c.setFillColorRGB(0.9, 0.9, 0.9)
+                            c.rect(x, y - 15, col_widths[j], row_height, stroke=1, fill=1)
+                            c.setFillColorRGB(0, 0, 0)  # 重置填充颜色
+                            c.setFont(bold_font_name, 9)
+                            # 居中显示表头文字
+                            text_width = c.stringWidth(cell, bold_font_name, 9)
+                            text_x = x + (col_widths[j] - text_width) / 2
+                            c.drawString(text_x, y - 5, cell)
+                        else:
+                            c.setFont(font_name, 9)
+                            # 居中显示数据
+                            text_width = c.stringWidth(cell, font_name, 9)
+                            text_x = x + (col_widths[j] - text_width) / 2
+                            c.drawString(text_x, y - 5, cell)
+                            c.rect(x, y - 15, col_widths[j], row_height, stroke=1, fill=0)
+                
+                # 处理剩余的行
+                if total_rows > first_page_rows:
+                    # 开始新页面
+                    c.showPage()
+                    page_number += 1
+                    add_header_and_footer()
+                    
+                    # 重新绘制表头
+                    y_position = height - 120
+                    c.setFont(font_name, 12)
+                    c.drawString(50, y_position, "空气质量概览 (续)")
+                    y_position -= 20
+                    
+                    # 在新页面重新绘制表头
+                    header_row = rows[0]
+                    for j, cell in enumerate(header_row):
+                        x = 50 + sum(col_widths[:j])
+                        y = y_position
+                        
+                        c.setFillColorRGB(0.9, 0.9, 0.9)
+                        c.rect(x, y - 15, col_widths[j], row_height, stroke=1, fill=1)
+                        c.setFillColorRGB(0, 0, 0)
+                        c.setFont(bold_font_name, 9)
+                        c.drawString(x + 2, y, cell)
+                        c.rect(x, y - 15, col_widths[j], row_height, stroke=1, fill=0)
+                    
+                    # 计算剩余的行
+                    remaining_rows = total_rows - first_page_rows
+                    rows_per_new_page = min(rows_per_page - 1, int((height - 150) / row_height))  # 减去表头和页眉页脚
+                    pages_needed = (remaining_rows + rows_per_new_page - 1) // rows_per_new_page
+                    
+                    row_index = first_page_rows
+                    for page in range(pages_needed):
+                        start_row = row_index
+                        end_row = min(row_index + rows_per_new_page, total_rows)
+                        
+                        for i in range(start_row, end_row):
+                            row = rows[i]
+                            row_pos = i - start_row + 1  # +1是因为表头占一行
+                            
+                            for j, cell in enumerate(row):
+                                x = 50 + sum(col_widths[:j])
+                                y = y_position - row_pos * row_height
+                                
+                                c.setFont(font_name, 9)
+                                c.drawString(x + 2, y - 5, cell)
+                                c.rect(x, y - 15, col_widths[j], row_height, stroke=1, fill=0)
+                        
+                        row_index = end_row
+                        
+                        # 如果还有更多页，创建新页面
+                        if page < pages_needed - 1:
+                            c.showPage()
+                            page_number += 1
+                            add_header_and_footer()
+                            
+                            # 重设Y位置
+                            y_position = height - 120
+                            c.setFont(font_name, 12)
+                            c.drawString(50, y_position, "空气质量概览 (续)")
+                            y_position -= 20
+                            
+                            # 重新绘制表头
+                            header_row = rows[0]
+                            for j, cell in enumerate(header_row):
+                                x = 50 + sum(col_widths[:j])
+                                y = y_position
+                                
+                                c.setFillColorRGB(0.9, 0.9, 0.9)
+                                c.rect(x, y - 15, col_widths[j], row_height, stroke=1, fill=1)
+                                c.setFillColorRGB(0, 0, 0)
+                                c.setFont(bold_font_name, 9)
+                                c.drawString(x + 2, y, cell)
+                                c.rect(x, y - 15, col_widths[j], row_height, stroke=1, fill=0)
+            else:
+                # 如果一页足够，直接绘制所有行
+                for i, row in enumerate(rows):
+                    for j, cell in enumerate(row):
+                        x = 50 + sum(col_widths[:j])
+                        y = y_position - i * row_height
+                        
+                        if i == 0:  # 表头
+                            c.setFillColorRGB(0.9, 0.9, 0.9)
+                            c.rect(x, y - 15, col_widths[j], row_height, stroke=1, fill=1)
+                            c.setFillColorRGB(0, 0, 0)
+                            c.setFont(bold_font_name, 9)
+                        else:
+                            c.setFont(font_name, 9)
+                            
+                        c.drawString(x + 2, y - 5, cell)
+                        c.rect(x, y - 15, col_widths[j], row_height, stroke=1, fill=0)
+            
+            # 更新Y位置（前进至表格末尾）
+            if total_rows <= rows_per_page:
+                y_position -= (total_rows + 1) * row_height
+            else:
+                # 如果已分页，则Y位置是当前页最后绘制的位置
+                y_position -= ((row_index - start_row) + 2) * row_height
+            
+            y_position -= 20  # 与下一部分保持间距
+        
+        # 添加污染物分析部分
+        if content_options.get('pollutants', True) and not pollutants.empty:
+            # 如果空间不足，换页
+            if y_position < 200:
+                c.showPage()
+                page_number += 1
+                add_header_and_footer()
+                y_position = height - 120
+            
+            logger.info("添加污染物分析...")
+            c.setFont(font_name, 12)
+            c.drawString(50, y_position, "污染物分析")
+            y_position -= 25  # 适当间距
+            
+            # 计算各污染物平均值
+            pollutants_avg = {
+                'PM2.5': round(pollutants['pm25'].mean(), 1),
+                'PM10': round(pollutants['pm10'].mean(), 1),
+                'SO2': round(pollutants['so2'].mean(), 1),
+                'NO2': round(pollutants['no2'].mean(), 1),
+                'O3': round(pollutants['o3'].mean(), 1),
+                'CO': round(pollutants['co'].mean(), 2)
+            }
+            
+            # 绘制污染物均值表格
+            c.setFont(font_name, 10)
+            c.drawString(70, y_position, "主要污染物平均浓度:")
+            y_position -= 25  # 适当间距
+            
+            # 绘制表头
+            pollutants_table_width = width - 140
+            col_width = pollutants_table_width / 6  # 6个污染物
+            row_height = 30  # 大幅增加行高
+            
+            # 表头
+            headers = ['PM2.5', 'PM10', 'SO2', 'NO2', 'O3', 'CO']
+            for i, header in enumerate(headers):
+                x = 70 + i * col_width
+                c.setFillColorRGB(0.9, 0.9, 0.9)
+                c.rect(x, y_position - 20, col_width, row_height, stroke=1, fill=1)
+                c.setFillColorRGB(0, 0, 0)
+                c.setFont(bold_font_name, 9)
+                # 居中显示表头文字
+                text_width = c.stringWidth(header, bold_font_name, 9)
+                text_x = x + (col_width - text_width) / 2
+                c.drawString(text_x, y_position - 5, header)
+            
+            y_position -= row_height + 5  # 增加行间距
+            
+            # 数据行
+            values = list(pollutants_avg.values())
+            for i, value in enumerate(values):
+                x = 70 + i * col_width
+                c.setFont(font_name, 9)
+                c.rect(x, y_position - 20, col_width, row_height, stroke=1, fill=0)
+                # 居中显示数据
+                value_str = str(value)
+                text_width = c.stringWidth(value_str, font_name, 9)
+                text_x = x + (col_width - text_width) / 2
+                c.drawString(text_x, y_position - 5, value_str)
+            
+            y_position -= (row_height + 40)  # 大幅增加间距
+            
+            # 添加各城市污染物表格
+            c.setFont(font_name, 10)
+            c.drawString(70, y_position, "各城市主要污染物指标:")
+            y_position -= 25  # 适当间距
+            
+            # 创建城市污染物表格
+            cities = pollutants['city'].unique()
+            rows = [["城市", "PM2.5", "PM10", "SO2", "NO2", "O3", "CO"]]
+            
+            for city in cities:
+                city_data = pollutants[pollutants['city'] == city]
+                pm25 = round(city_data['pm25'].mean(), 1)
+                pm10 = round(city_data['pm10'].mean(), 1)
+                so2 = round(city_data['so2'].mean(), 1)
+                no2 = round(city_data['no2'].mean(), 1)
+                o3 = round(city_data['o3'].mean(), 1)
+                co = round(city_data['co'].mean(), 2)
+                
+                rows.append([city, str(pm25), str(pm10), str(so2), str(no2), str(o3), str(co)])
+            
+            # 设置表格参数
+            table_width = width - 140  # 表格总宽度
+            col_widths = [
+                table_width * 0.25,  # 城市名称列宽度
+                table_width * 0.125,  # PM2.5列宽度
+                table_width * 0.125,  # PM10列宽度
+                table_width * 0.125,  # SO2列宽度
+                table_width * 0.125,  # NO2列宽度
+                table_width * 0.125,  # O3列宽度
+                table_width * 0.125   # CO列宽度
+            ]
+            
+            # 固定参数
+            row_height = 25  # 行高
+            x_start = 70     # 表格起始x坐标
+            max_rows_per_page = 15  # 每页最多行数
+            
+            # 绘制表格
+            row_index = 0
+            while row_index < len(rows):
+                # 检查是否需要新页面
+                if row_index > 0 and (row_index % max_rows_per_page == 0 or y_position < 150):
+                    c.showPage()
+                    page_number += 1
+                    add_header_and_footer()
+                    y_position = height - 120
+                    
+                    c.setFont(font_name, 12)
+                    c.drawString(50, y_position, "污染物分析 (续)")
+                    y_position -= 25
+                    
+                    # 重新绘制表头
+                    draw_table_header = True
+                else:
+                    draw_table_header = (row_index == 0)
+                
+                # 计算本页要绘制的行数
+                remaining_rows = len(rows) - row_index
+                rows_this_page = min(remaining_rows, max_rows_per_page if row_index > 0 else max_rows_per_page - 1)
+                
+                # 绘制表头
+                if draw_table_header:
+                    header_row = rows[0]
+                    for i, header in enumerate(header_row):
+                        x = x_start + sum(col_widths[:i])
+                        
+                        # 绘制表头背景和边框
+                        c.setFillColorRGB(0.9, 0.9, 0.9)  # 浅灰色背景
+                        c.rect(x, y_position - row_height, col_widths[i], row_height, stroke=1, fill=1)
+                        c.setFillColorRGB(0, 0, 0)  # 重置为黑色
+                        
+                        # 绘制表头文字
+                        c.setFont(bold_font_name, 9)
+                        text_width = c.stringWidth(header, bold_font_name, 9)
+                        text_x = x + (col_widths[i] - text_width) / 2  # 水平居中
+                        c.drawString(text_x, y_position - row_height + 8, header)  # 垂直居中
+                    
+                    y_position -= row_height
+                    
+                    # 如果是第一页，跳过表头行，因为已经绘制了
+                    if row_index == 0:
+                        row_index += 1
+                
+                # 绘制数据行
+                for i in range(rows_this_page):
+                    current_row = row_index + i
+                    if current_row >= len(rows):
+                        break
+                        
+                    row = rows[current_row]
+                    
+                    for j, cell in enumerate(row):
+                        x = x_start + sum(col_widths[:j])
+                        
+                        # 绘制单元格边框
+                        c.rect(x, y_position - row_height, col_widths[j], row_height, stroke=1, fill=0)
+                        
+                        # 绘制单元格内容
+                        c.setFont(font_name, 9)
+                        
+                        if j == 0:  # 城市名称列左对齐
+                            c.drawString(x + 5, y_position - row_height + 8, cell)
+                        else:  # 数值列居中对齐
+                            text_width = c.stringWidth(cell, font_name, 9)
+                            text_x = x + (col_widths[j] - text_width) / 2
+                            c.drawString(text_x, y_position - row_height + 8, cell)
+                    
+                    y_position -= row_height
+                
+                # 更新行索引
+                row_index += rows_this_page
+                
+                # 如果还有更多行要绘制，则添加新页面
+                if row_index < len(rows):
+                    continue
+            
+            # 表格结束后添加适当间距
+            y_position -= 20
+        
+        # 添加趋势变化部分
+        if content_options.get('trends', True) and not aqi_data.empty:
+            # 如果空间不足，换页
+            if y_position < 200:
+                c.showPage()
+                page_number += 1
+                add_header_and_footer()
+                y_position = height - 120
+            
+            logger.info("添加趋势变化...")
+            c.setFont(font_name, 12)
+            c.drawString(50, y_position, "趋势变化")
+            y_position -= 20
+            
+            # 对于PDF，添加趋势说明文字
+            c.setFont(font_name, 10)
+            c.drawString(70, y_position, "空气质量指数变化趋势:")
+            y_position -= 15
+            
+            # 计算并描述变化趋势
+            if len(aqi_data['date'].unique()) > 1:
+                # 有多天数据，可计算趋势
+                earliest_date = aqi_data['date'].min()
+                latest_date = aqi_data['date'].max()
+                earliest_avg = aqi_data[aqi_data['date'] == earliest_date]['aqi'].mean()
+                latest_avg = aqi_data[aqi_data['date'] == latest_date]['aqi'].mean()
+                
+                change_pct = ((latest_avg - earliest_avg) / earliest_avg) * 100 if earliest_avg > 0 else 0
+                
+                trend_text = f"从 {earliest_date} 到 {latest_date}，平均AQI从 {earliest_avg:.1f} 变化到 {latest_avg:.1f}，"
+                
+                if change_pct > 5:
+                    trend_text += f"上升了 {abs(change_pct):.1f}%，空气质量有所下降。"
+                elif change_pct < -5:
+                    trend_text += f"下降了 {abs(change_pct):.1f}%，空气质量有所改善。"
+                else:
+                    trend_text += "变化不大，空气质量基本稳定。"
+                
+                c.drawString(70, y_position, trend_text)
+            else:
+                c.drawString(70, y_position, "监测时间段过短，无法显示变化趋势。")
+            
+            y_position -= 30
+            
+            # 嵌入图表: PNG写入临时文件，drawImage按文件引用读取
+            for chart in data.get('charts') or []:
+                chart_path = os.path.join(chart_dir, f"{chart['name']}.png")
+                with open(chart_path, 'wb') as chart_file:
+                    chart_file.write(chart['png'])
+                img_width, img_height = ImageReader(chart_path).getSize()
+                draw_width = width - 100
+                draw_height = draw_width * img_height / img_width
+                
+                if y_position - draw_height < 60:
+                    c.showPage()
+                    page_number += 1
+                    add_header_and_footer()
+                    y_position = height - 120
+                
+                c.drawImage(chart_path, 50, y_position - draw_height, width=draw_width, height=draw_height)
+                y_position -= draw_height + 10
+                if chart.get('title'):
+                    c.setFont(font_name, 9)
+                    c.drawCentredString(width / 2, y_position, chart['title'])
+                    y_position -= 25
+        
+        # 添加预警信息部分
+        if content_options.get('alerts', True) and not aqi_data.empty:
+            # 如果空间不足，换页
+            if y_position < 200:
+                c.showPage()
+                page_number += 1
+                add_header_and_footer()
+                y_position = height - 120
+            
+            logger.info("添加预警信息...")
+            c.setFont(font_name, 12)
+            c.drawString(50, y_position, "预警信息")
+            y_position -= 20
+            
+            # 查找AQI超标的城市
+            high_aqi_data = aqi_data[aqi_data['aqi'] > 100]
+            
+            if not high_aqi_data.empty:
+                c.setFont(font_name, 10)
+                c.drawString(70, y_position, f"发现 {len(high_aqi_data)} 个城市AQI超过100，可能对敏感人群健康造成影响:")
+                y_position -= 15
+                
+                # 列出超标城市
+                cities_warning = high_aqi_data.groupby('city')['aqi'].mean().reset_index()
+                cities_warning = cities_warning.sort_values(by='aqi', ascending=False)
+                
+                warning_text = ", ".join([f"{row['city']}({row['aqi']:.1f})" for _, row in cities_warning.iterrows()])
+                
+                # 处理长文本换行
+                max_width = width - 140
+                words = warning_text.split(", ")
+                lines = []
+                current_line = ""
+                
+                for word in words:
+                    test_line = current_line + word + ", " if current_line else word + ", "
+                    if c.stringWidth(test_line, font_name, 9) < max_width:
+                        current_line = test_line
+                    else:
+                        lines.append(current_line)
+                        current_line = word + ", "
+                
+                if current_line:
+                    lines.append(current_line)
+                
+                # 绘制文本
+                for line in lines:
+                    c.drawString(90, y_position, line)
+                    y_position -= 15
+            else:
+                c.setFont(font_name, 10)
+                c.drawString(70, y_position, "监测期间内未发现明显空气质量超标情况。")
+                y_position -= 15
+            
+            y_position -= 15
+        
+        # 添加政策建议部分
+        if content_options.get('recommendations', False):
+            # 如果空间不足，换页
+            if y_position < 200:
+                c.showPage()
+                page_number += 1
+                add_header_and_footer()
+                y_position = height - 120
+            
+            logger.info("添加政策建议...")
+            c.setFont(font_name, 12)
+            c.drawString(50, y_position, "政策建议")
+            y_position -= 20
+            
+            # 根据空气质量给出建议
+            recommendations = [
+                "实施工业企业限产停产措施，减少污染物排放",
+                "加强道路扬尘治理，增加洒水降尘频次",
+                "建议公众减少户外活动，外出佩戴口罩",
+                "加大环保执法力度，严厉打击违法排污行为"
+            ]
+            
+            # 绘制建议列表
+            c.setFont(font_name, 10)
+            for i, rec in enumerate(recommendations):
+                c.drawString(70, y_position, "• " + rec)
+                y_position -= 15
+        
+        # 完成文档并原子替换为正式文件
+        c.save()
+        os.replace(tmp_path, output_path)
+        
+        # 验证文件是否已创建
+        if os.path.exists(output_path):
+            logger.info(f"PDF报告生成成功: {output_path}")
+            return output_path
+        else:
+            error_msg = f"PDF文件写入失败: {output_path}"
+            logger.error(error_msg)
+            return {'error': error_msg}
+    except Exception as e:
+        error_msg = f"生成PDF报告失败: {str(e)}"
+        logger.error(f"{error_msg}\n{traceback.format_exc()}")
+        return {'error': error_msg}
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        if chart_dir:
+            shutil.rmtree(chart_dir, ignore_errors=True)
+
+# 生成Excel报告
+def generate_excel_report(data, content_options, output_path, report_type, region, start_date, end_date):
+    """生成Excel报告（默认write_only流式写入，数据行分块写盘，统计与图表在数据表之后写入）"""
+    try:
+        return write_excel_report(data, content_options, output_path, region, start_date, end_date)
+    except Exception as e:
+        logger.error(f"Excel生成失败: {str(e)}\n{traceback.format_exc()}")
+        return {'error': str(e)}
+
+# 生成Word报告
+def generate_word_report(data, content_options, output_path, report_type, region, start_date, end_date):
+    try:
+        # 创建Word文档
+        doc = Document()
+        
+        # 设置中文字体（如果需要）
+        try:
+            # 设置文档默认字体
+            doc.styles['Normal'].font.name = '宋体'
+            doc.styles['Normal']._element.rPr.rFonts.set(qn('w:eastAsia'), '宋体')
+        except:
+            logger.warning("无法设置中文字体，将使用默认字体")
+        
+        # 添加标题
+        doc.add_heading(f"{get_region_name('all')}空气质量监测报告", level=0)
+        
+        # 添加基本信息
+        doc.add_paragraph(f"区域: {get_region_name(region)}")
+        doc.add_paragraph(f"时间范围: {start_date} 至 {end_date}")
+        doc.add_paragraph(f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        
+        # 添加分隔线
+        doc.add_paragraph('_' * 50)
+        
+        # 1. 空气质量概览
+        if content_options.get('air_quality', True) and not data['aqi_data'].empty:
+            doc.add_heading('1. 空气质量概览', level=1)
+            aqi_data = data['aqi_data']
+            
+            # 计算统计信息
+            avg_aqi = aqi_data['aqi'].mean()
+            max_aqi = aqi_data['aqi'].max()
+            min_aqi = aqi_data['aqi'].min()
+            
+            p = doc.add_paragraph()
+            p.add_run(f"数据记录数: {len(aqi_data)}\n")
+            p.add_run(f"平均AQI: {avg_aqi:.1f}\n")
+            p.add_run(f"最高AQI: {max_aqi:.1f}\n")
+            p.add_run(f"最低AQI: {min_aqi:.1f}\n")
+            
+            # 添加空气质量数据表格
+            doc.add_heading('空气质量数据表', level=2)
+            
+            # 创建表格
+            table = doc.add_table(rows=1, cols=4)
+            table.style = 'Table Grid'
+            
+            # 添加表头
+            hdr_cells = table.rows[0].cells
+            hdr_cells[0].text = '日期'
+            hdr_cells[1].text = 'AQI'
+            hdr_cells[2].text = '质量等级'
+            hdr_cells[3].text = '城市'
+            
+            # 添加数据行 (限制为前10行以避免文档过长)
+            for _, row in aqi_data.head(10).iterrows():
+                row_cells = table.add_row().cells
+                row_cells[0].text = str(row.get('date', ''))
+                row_cells[1].text = str(row.get('aqi', ''))
+                row_cells[2].text = str(row.get('quality_level', ''))
+                row_cells[3].text = str(row.get('city', ''))
+        
+        # 2. 污染物分析
+        if content_options.get('pollutants', True) and not data['pollutants'].empty:
+            doc.add_heading('2. 主要污染物分析', level=1)
+            
+            pollutants_df = data['pollutants']
+            
+            # 计算主要污染物平均值
+            pollutants_means = {
+                'PM2.5': pollutants_df['pm25'].mean(),
+                'PM10': pollutants_df['pm10'].mean(),
+                'SO2': pollutants_df['so2'].mean(),
+                'NO2': pollutants_df['no2'].mean(),
+                'O3': pollutants_df['o3'].mean(),
+                'CO': pollutants_df['co'].mean()
+            }
+            
+            p = doc.add_paragraph()
+            for poll, value in pollutants_means.items():
+                p.add_run(f"{poll}: {value:.1f}\n")
+        
+        # 3. 趋势分析
+        if content_options.get('trends', True):
+            doc.add_heading('3. 空气质量趋势', level=1)
+            charts = data.get('charts') or []
+            if charts:
+                for chart in charts:
+                    doc.add_picture(io.BytesIO(chart['png']), width=Inches(6))
+                    if chart.get('title'):
+                        caption = doc.add_paragraph(chart['title'])
+                        caption.alignment = WD_ALIGN_PARAGRAPH.CENTER
+            else:
+                doc.add_paragraph("所选时间范围内的数据不足，无法绘制趋势图表。")
+        
+        # 4. 预警信息
+        if content_options.get('alerts', True):
+            doc.add_heading('4. 空气质量预警信息', level=1)
+            
+            # 检查是否有超标情况
+            if not data['aqi_data'].empty:
+                high_aqi = data['aqi_data'][data['aqi_data']['aqi'] > 100]
+                if not high_aqi.empty:
+                    doc.add_paragraph(f"发现 {len(high_aqi)} 天空气质量超过100，可能对敏感人群健康造成影响。")
+                else:
+                    doc.add_paragraph("监测期间内未发现明显空气质量超标情况。")
+        
+        # 5. 政策建议
+        if content_options.get('recommendations', False):
+            doc.add_heading('5. 改善空气质量的建议', level=1)
+            
+            recommendations = [
+                "加强工业排放监管，严格执行排放标准",
+                "推广清洁能源使用，减少化石燃料消耗",
+                "加强城市绿化建设，增加空气净化能力",
+                "提高公众环保意识，鼓励绿色出行方式"
+            ]
+            
+            for rec in recommendations:
+                doc.add_paragraph(rec, style='List Bullet')
+        
+        # 保存Word文档
+        doc.save(output_path)
+        return output_path
+    except Exception as e:
+        logger.error(f"Word生成失败: {str(e)}\n{traceback.format_exc()}")
+        return {'error': str(e)}
+
+# 生成HTML报告
+def generate_html_report(data, content_options, output_path, report_type, region, start_date, end_date):
+    try:
+        # 计算统计信息
+        aqi_stats = {}
+        pollutants_stats = {}
+        
+        if not data['aqi_data'].empty:
+            aqi_data = data['aqi_data']
+            aqi_stats = {
+                'count': len(aqi_data),
+                'avg': round(aqi_data['aqi'].mean(), 1),
+                'max': round(aqi_data['aqi'].max(), 1),
+                'min': round(aqi_data['aqi'].min(), 1),
+            }
+        
+        if not data['pollutants'].empty:
+            pollutants_df = data['pollutants']
+            pollutants_stats = {
+                'PM2.5': round(pollutants_df['pm25'].mean(), 1),
+                'PM10': round(pollutants_df['pm10'].mean(), 1),
+                'SO2': round(pollutants_df['so2'].mean(), 1),
+                'NO2': round(pollutants_df['no2'].mean(), 1),
+                'O3': round(pollutants_df['o3'].mean(), 1),
+                'CO': round(pollutants_df['co'].mean(), 1)
+            }
+        
+        # 创建HTML内容 - 头部
+        html = f"""<!DOCTYPE html>
+<html lang="zh-CN">
+        <head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{get_region_name('all')}空气质量监测报告</title>
+            <style>
+        body {{ 
+            font-family: "Microsoft YaHei", Arial, sans-serif; 
+            margin: 0;
+            padding: 20px;
+            color: #333;
+        }}
+        .container {{
+            max-width: 1000px;
+            margin: 0 auto;
+            background-color: #fff;
+            padding: 20px;
+            box-shadow: 0 0 10px rgba(0,0,0,0.1);
+        }}
+        h1, h2, h3 {{ color: #0066cc; }}
+        h1 {{ text-align: center; margin-bottom: 30px; }}
+        .header-info {{ 
+            text-align: center; 
+            margin-bottom: 30px;
+            color: #666;
+        }}
+        .timestamp {{
+            text-align: right;
+            color: #888;
+            font-size: 0.9em;
+            margin-bottom: 20px;
+        }}
+        table {{ 
+            border-collapse: collapse; 
+            width: 100%; 
+            margin-bottom: 20px;
+        }}
+        th, td {{ 
+            border: 1px solid #ddd; 
+            padding: 10px; 
+            text-align: center;
+        }}
+        th {{ 
+            background-color: #f2f2f2; 
+            font-weight: bold;
+        }}
+        tr:nth-child(even) {{ background-color: #f9f9f9; }}
+        .stats-card {{
+            display: inline-block;
+            background-color: #f8f9fa;
+            border-radius: 5px;
+            padding: 15px;
+            margin: 10px;
+            min-width: 120px;
+            text-align: center;
+            box-shadow: 0 2px 5px rgba(0,0,0,0.1);
+        }}
+        .stats-card .value {{
+            font-size: 24px;
+            font-weight: bold;
+            color: #0066cc;
+            margin: 10px 0;
+        }}
+        .stats-card .label {{
+            font-size: 14px;
+            color: #666;
+        }}
+        .stats-container {{
+            display: flex;
+            flex-wrap: wrap;
+            justify-content: center;
+            margin-bottom: 30px;
+        }}
+        .section {{
+            margin-bottom: 40px;
+            border-bottom: 1px solid #eee;
+            padding-bottom: 20px;
+        }}
+        .pollutant-grid {{
+            display: grid;
+            grid-template-columns: repeat(3, 1fr);
+            gap: 15px;
+            margin-top: 20px;
+        }}
+        .pollutant-card {{
+            background-color: #f8f9fa;
+            border-radius: 5px;
+            padding: 15px;
+            text-align: center;
+            box-shadow: 0 2px 5px rgba(0,0,0,0.1);
+        }}
+        .recommendation {{
+            background-color: #f0f7ff;
+            border-left: 5px solid #0066cc;
+            padding: 15px;
+            margin-bottom: 10px;
+        }}
+        .alert {{
+            background-color: #fff8f8;
+            border-left: 5px solid #cc0000;
+            padding: 15px;
+            margin-bottom: 10px;
+        }}
+        .info {{
+            background-color: #f8f8ff;
+            border-left: 5px solid #6666cc;
+            padding: 15px;
+            margin-bottom: 10px;
+        }}
+            </style>
+        </head>
+        <body>
+    <div class="container">
+        <h1>{get_region_name('all')}空气质量监测报告</h1>
+        
+        <div class="header-info">
+            <p>区域: {get_region_name(region)}</p>
+            <p>时间范围: {start_date} 至 {end_date}</p>
+        </div>
+        
+        <div class="timestamp">
+            <p>生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
+        </div>
+"""
+        
+        # 1. 空气质量概览部分
+        if content_options.get('air_quality', True) and aqi_stats:
+            html += """
+        <div class="section">
+            <h2>1. 空气质量概览</h2>
+            
+            <div class="stats-container">
+"""
+            
+            # 添加AQI统计卡片
+            for label, key, label_text in [
+                ('数据记录数', 'count', '记录数'),
+                ('平均AQI', 'avg', '平均AQI'),
+                ('最高AQI', 'max', '最高AQI'),
+                ('最低AQI', 'min', '最低AQI')
+            ]:
+                if key in aqi_stats:
+                    html += f"""
+                <div class="stats-card">
+                    <div class="label">{label_text}</div>
+                    <div class="value">{aqi_stats[key]}</div>
+                </div>
+"""
+            
+            html += """
+            </div>
+            
+            <h3>空气质量数据表</h3>
+            <table>
+                <tr>
+                    <th>日期</th>
+                    <th>AQI</th>
+                    <th>质量等级</th>
+                    <th>城市</th>
+                </tr>
+"""
+        
+            # 添加AQI数据行（最多显示15行）
+            for _, row in data['aqi_data'].head(15).iterrows():
+                html += f"""
+                <tr>
+                    <td>{row.get('date')}</td>
+                    <td>{row.get('aqi')}</td>
+                    <td>{row.get('quality_level')}</td>
+                    <td>{row.get('city')}</td>
+                </tr>
+"""
+        
+        html += """
+            </table>
+        </div>
+"""
+        
+        # 2. 污染物分析部分
+        if content_options.get('pollutants', True) and pollutants_stats:
+            html += """
+        <div class="section">
+            <h2>2. 主要污染物分析</h2>
+            
+            <p>以下是监测期间各项污染物的平均浓度：</p>
+            
+            <div class="pollutant-grid">
+"""
+            
+            # 添加污染物统计卡片
+            for pollutant, value in pollutants_stats.items():
+                html += f"""
+                <div class="pollutant-card">
+                    <div class="label">{pollutant}</div>
+                    <div class="value">{value}</div>
+                </div>
+"""
+            
+            html += """
+            </div>
+        </div>
+"""
+        
+        # 3. 趋势分析
+        if content_options.get('trends', True):
+            html += """
+        <div class="section">
+            <h2>3. 空气质量趋势</h2>
+            
+"""
+            charts = data.get('charts') or []
+            if charts:
+                for chart in charts:
+                    encoded = base64.b64encode(chart['png']).decode('ascii')
+                    html += f"""
+            <div class="chart">
+                <img src="data:image/png;base64,{encoded}" alt="{chart.get('title') or chart['name']}" style="max-width: 100%;">
+                <p style="text-align: center;">{chart.get('title') or ''}</p>
+            </div>
+"""
+            else:
+                html += """
+            <div class="info">
+                <p>所选时间范围内的数据不足，无法绘制趋势图表。</p>
+            </div>
+"""
+            html += """
+        </div>
+"""
+        
+        # 4. 预警信息
+        if content_options.get('alerts', True) and not data['aqi_data'].empty:
+            html += """
+        <div class="section">
+            <h2>4. 空气质量预警信息</h2>
+"""
+            
+            # 检查是否有超标情况
+            high_aqi = data['aqi_data'][data['aqi_data']['aqi'] > 100]
+            if not high_aqi.empty:
+                html += f"""
+            <div class="alert">
+                <p>发现 {len(high_aqi)} 天空气质量超过100，可能对敏感人群健康造成影响。</p>
+            </div>
+            
+            <table>
+                <tr>
+                    <th>日期</th>
+                    <th>AQI</th>
+                    <th>质量等级</th>
+                    <th>城市</th>
+                </tr>
+"""
+                
+                for _, row in high_aqi.head(10).iterrows():
+                    html += f"""
+                <tr>
+                    <td>{row.get('date')}</td>
+                    <td>{row.get('aqi')}</td>
+                    <td>{row.get('quality_level')}</td>
+                    <td>{row.get('city')}</td>
+                </tr>
+"""
+                
+                html += """
+            </table>
+"""
+            else:
+                html += """
+            <div class="info">
+                <p>监测期间内未发现明显空气质量超标情况。</p>
+            </div>
+"""
+            
+            html += """
+        </div>
+"""
+        
+        # 5. 政策建议
+        if content_options.get('recommendations', False):
+            html += """
+        <div class="section">
+            <h2>5. 改善空气质量的建议</h2>
+"""
+            
+            recommendations = [
+                "加强工业排放监管，严格执行排放标准",
+                "推广清洁能源使用，减少化石燃料消耗",
+                "加强城市绿化建设，增加空气净化能力",
+                "提高公众环保意识，鼓励绿色出行方式"
+            ]
+            
+            for rec in recommendations:
+                html += f"""
+            <div class="recommendation">
+                <p>{rec}</p>
+            </div>
+"""
+            
+            html += """
+        </div>
+"""
+        
+        # 结束文档
+        html += """
+    </div>
+        </body>
+</html>
+"""
+        
+        # 保存HTML文件
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(html)
+        
+        return output_path
+    except Exception as e:
+        logger.error(f"HTML生成失败: {str(e)}\n{traceback.format_exc()}")
+        return {'error': str(e)}
+
+# 按格式调用报告生成器
+def write_report_format(data, mapped_options, output_path, report_type, region, start_date, end_date, report_format):
+    if report_format == 'pdf':
+        return generate_pdf_report(data, mapped_options, output_path, report_type, region, start_date, end_date)
+    elif report_format == 'excel':
+        return generate_excel_report(data, mapped_options, output_path, report_type, region, start_date, end_date)
+    elif report_format == 'word':
+        return generate_word_report(data, mapped_options, output_path, report_type, region, start_date, end_date)
+    elif report_format == 'html':
+        return generate_html_report(data, mapped_options, output_path, report_type, region, start_date, end_date)
+    logger.error(f"不支持的报告格式: {report_format}")
+    return {'error': f"不支持的报告格式: {report_format}"}
+
+# 检查报告文件是否写出
+def check_report_file(output_path):
+    # 检查报告文件是否成功生成
+    if not os.path.exists(output_path):
+        logger.error(f"报告文件未生成: {output_path}")
+        return {'error': f"报告文件未生成: {output_path}"}
+    
+    # 检查文件大小是否合理（至少应该有1KB）
+    file_size = os.path.getsize(output_path)
+    if file_size < 1024:
+        logger.warning(f"报告文件大小异常: {file_size} 字节")
+    
+    logger.info(f"报告生成成功: {output_path}, 大小: {file_size} 字节")
+    return output_path
+
+# 写出一个格式的报告 - 图表渲染进程池中执行的入口
+def render_format_file(data, mapped_options, output_path, report_type, region, start_date, end_date, report_format):
+    """调用对应格式的生成器写出报告并检查文件
+
+    Returns:
+        tuple: (报告文件路径或带有错误信息的字典, 写出耗时秒数)
+    """
+    start = time.perf_counter()
+    result = write_report_format(data, mapped_options, output_path, report_type, region,
+                                 start_date, end_date, report_format)
+    if not (isinstance(result, dict) and 'error' in result):
+        result = check_report_file(output_path)
+    return result, time.perf_counter() - start
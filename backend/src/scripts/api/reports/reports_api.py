@@ -12,8 +12,13 @@ import json
 import time
 import logging
 import traceback
-import io
-from datetime import datetime, timedelta
+import shutil
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from contextlib import nullcontext
+from datetime import datetime
 from pathlib import Path
 from flask import Flask, jsonify, request, send_file, abort, Response
 from flask_cors import CORS
@@ -25,24 +30,8 @@ import matplotlib.pyplot as plt
 from matplotlib.font_manager import FontProperties
 import seaborn as sns
 import mysql.connector
-from reportlab.pdfgen import canvas
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib.units import inch, mm
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-import openpyxl
-from openpyxl.styles import Font, Alignment, PatternFill
-from openpyxl.utils import get_column_letter
-from docx import Document
-from docx.shared import Inches, Pt, RGBColor
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.oxml.ns import qn
 import mimetypes
 import uuid
-from urllib.parse import quote
-import requests
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -98,10 +87,31 @@ except ImportError as e:
     
     report_generation = ReportGenerationMock()
 
+# 报告生成任务队列
+from src.scripts.api.reports.report_jobs import get_report_job_queue, ReportQueueFull, ReportJobCancelled
+from src.scripts.api.reports.report_store import get_report_store
+from src.scripts.api.reports.report_data_loader import (
+    load_report_dataset, compute_data_watermark, realtime_bucket, REGION_CITY_MAP, normalize_city_name,
+    resolve_region_cities
+)
+from src.scripts.api.reports.report_cache import ReportCache, file_sha256
+from src.scripts.utils.chart_pool import get_chart_pool
+from src.scripts.utils.change_events import ScopedCache, get_change_subscriber
+from src.scripts.api.reports.report_writers import (
+    get_report_type_name, get_region_name, ensure_pdf_fonts, render_format_file
+)
+from src.scripts.api.reports.report_retention import ReportRetentionManager, sharded_path
+
 # 创建Flask应用
 app = Flask(__name__)
 CORS(app)
 
+# 前置Nginx/Apache时由其直接发送报告文件(X-Sendfile)，否则由WSGI服务器的file_wrapper零拷贝发送
+app.config['USE_X_SENDFILE'] = os.environ.get('REPORT_USE_X_SENDFILE', 'false').lower() == 'true'
+
+# 报告文件生成后不再修改，下载响应允许客户端缓存的秒数
+REPORT_DOWNLOAD_MAX_AGE = int(os.environ.get('REPORT_DOWNLOAD_MAX_AGE', '3600'))
+
 # 报告存储目录
 REPORTS_DIR = os.path.join(project_root, 'data', 'reports')
 os.makedirs(REPORTS_DIR, exist_ok=True)
@@ -111,9 +121,10 @@ REPORTS_PDF_DIR = os.path.join(REPORTS_DIR, 'pdf')
 REPORTS_EXCEL_DIR = os.path.join(REPORTS_DIR, 'excel')
 REPORTS_WORD_DIR = os.path.join(REPORTS_DIR, 'word')
 REPORTS_HTML_DIR = os.path.join(REPORTS_DIR, 'html')
+REPORTS_BATCH_DIR = os.path.join(REPORTS_DIR, 'batch')
 
 # 创建所有报告目录
-for dir_path in [REPORTS_DIR, REPORTS_PDF_DIR, REPORTS_EXCEL_DIR, REPORTS_WORD_DIR, REPORTS_HTML_DIR]:
+for dir_path in [REPORTS_DIR, REPORTS_PDF_DIR, REPORTS_EXCEL_DIR, REPORTS_WORD_DIR, REPORTS_HTML_DIR, REPORTS_BATCH_DIR]:
     os.makedirs(dir_path, exist_ok=True)
     logger.info(f"确保报告目录存在: {dir_path}")
 
@@ -124,8 +135,36 @@ os.makedirs(FONTS_DIR, exist_ok=True)
 # 默认字体文件路径
 DEFAULT_FONT_PATH = os.path.join(FONTS_DIR, 'simhei.ttf')
 
-# 报告元数据存储路径
+# 报告元数据存储路径（旧版JSON文件仅用于一次性迁移）
 REPORT_METADATA_PATH = os.path.join(REPORTS_DIR, 'reports_metadata.json')
+REPORT_STORE_PATH = os.path.join(REPORTS_DIR, 'reports_metadata.db')
+
+# 报告元数据存储（SQLite，带索引）
+REPORT_STORE = get_report_store(REPORT_STORE_PATH, legacy_json_path=REPORT_METADATA_PATH)
+
+# 报告产物缓存（相同请求且数据未变化时直接复用已生成的文件）
+REPORT_CACHE_DIR = os.path.join(REPORTS_DIR, 'cache')
+REPORT_CACHE = ReportCache(REPORT_STORE, REPORT_CACHE_DIR)
+
+# 报告文件保留策略（字节预算 + 最长闲置时间，按最近下载时间淘汰）
+REPORT_RETENTION = ReportRetentionManager(
+    REPORT_STORE,
+    {'pdf': REPORTS_PDF_DIR, 'excel': REPORTS_EXCEL_DIR, 'word': REPORTS_WORD_DIR,
+     'html': REPORTS_HTML_DIR, 'batch': REPORTS_BATCH_DIR},
+    cache_dir=REPORT_CACHE_DIR
+)
+
+# 图表渲染进程池（常驻工作进程，报告中的图表并发渲染并缓存）
+CHART_POOL = get_chart_pool()
+
+# 报告生成任务队列（有界工作线程池，控制同时进行的渲染数量）
+REPORT_JOB_QUEUE = get_report_job_queue()
+
+# 批量报告中同时渲染的报告数量
+REPORT_BATCH_WORKERS = int(os.environ.get('REPORT_BATCH_WORKERS', '4'))
+
+# 单城市区域代码（批量报告默认覆盖的城市）
+BATCH_CITY_REGIONS = [code for code, cities in REGION_CITY_MAP.items() if len(cities) == 1]
 
 # 数据库配置
 DB_CONFIG = {
@@ -173,409 +212,129 @@ def handle_error(error_msg, status_code=500):
         logger.error(f"构建错误响应失败: {str(e)}")
         return f"服务器错误: {error_msg}", status_code
 
+# 请求中的布尔参数: JSON布尔值，或表单/查询参数中的字符串
+TRUE_VALUES = ('1', 'true', 'yes', 'on')
+FALSE_VALUES = ('0', 'false', 'no', 'off', '')
+
+def parse_bool(value, default):
+    """解析请求中的布尔参数，None时返回默认值，无法识别时抛出ValueError"""
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str):
+        text = value.strip().lower()
+        if text in TRUE_VALUES:
+            return True
+        if text in FALSE_VALUES:
+            return False
+    raise ValueError(f"无法识别的布尔值: {value!r}")
+
+# 支持的报告格式
+REPORT_FORMATS = ('pdf', 'excel', 'word', 'html')
+
+def parse_report_formats(report_format, formats):
+    """解析请求中的format和formats参数
+
+    formats为列表时优先于format（只有一个元素时也一样），重复的格式只保留一个。
+
+    Returns:
+        list: 小写的报告格式列表
+
+    Raises:
+        ValueError: formats不是非空列表，或格式不是字符串、不受支持
+    """
+    if formats is None:
+        formats = [report_format]
+    elif not isinstance(formats, list) or not formats:
+        raise ValueError("formats必须是非空的格式列表")
+    parsed = []
+    for value in formats:
+        if not isinstance(value, str):
+            raise ValueError(f"报告格式必须是字符串: {value!r}")
+        parsed.append(value.strip().lower())
+    parsed = list(dict.fromkeys(parsed))
+    unsupported = [fmt for fmt in parsed if fmt not in REPORT_FORMATS]
+    if unsupported:
+        raise ValueError(f"不支持的报告格式: {', '.join(unsupported)}")
+    return parsed
+
+# 前端内容选项及默认值，realtime为None时由REPORT_INCLUDE_REALTIME决定
+CONTENT_OPTION_DEFAULTS = {'overview': True, 'pollution': True, 'trend': True, 'warning': True,
+                           'policy': False, 'realtime': None}
+
+def parse_content_options(content):
+    """解析请求中的content参数，各选项按布尔值解析（字符串"false"视为False）
+
+    Raises:
+        ValueError: content不是对象，或选项无法识别为布尔值
+    """
+    if content is None:
+        content = {}
+    if not isinstance(content, dict):
+        raise ValueError("content必须是对象")
+    return {name: parse_bool(content.get(name), default) for name, default in CONTENT_OPTION_DEFAULTS.items()}
+
 # 加载空气质量数据
-def load_air_quality_data(start_date, end_date, region):
-    conn = None
-    cursor = None
-    try:
-        today = datetime.now().strftime('%Y-%m-%d')
-        
-        # 记录请求参数，用于排查问题
-        logger.info(f"加载空气质量数据 - 参数: start_date={start_date}, end_date={end_date}, region={region}")
-        
-        # 准备返回的数据框架
-        aqi_data = pd.DataFrame()
-        pollutants = pd.DataFrame()
-        
-        # 首先尝试从数据库加载所有数据，不管是否包括今天
-        # 连接数据库
-        conn = mysql.connector.connect(**DB_CONFIG)
-        cursor = conn.cursor(dictionary=True)
-        
-        # 构建查询条件
-        region_condition = ""
-        region_params = []
-        
-        if region != 'all':
-            # 更宽松的区域查询逻辑 - 模糊匹配或精确匹配
-            region_condition = "AND (city = %s OR city LIKE %s OR city LIKE %s)"
-            region_params = [region, f"{region}%", f"%{region}%"]
-        
-        # 查询AQI数据
-        aqi_query = f"""
-        SELECT record_date as date, aqi_index as aqi, quality_level, city
-        FROM air_quality_data
-        WHERE record_date BETWEEN %s AND %s {region_condition}
-        ORDER BY record_date
-        """
-        aqi_params = [start_date, end_date] + region_params
-        
-        logger.info(f"执行AQI查询: {aqi_query}, 参数: {aqi_params}")
-        cursor.execute(aqi_query, aqi_params)
-        db_aqi_data = cursor.fetchall()
-        logger.info(f"AQI查询结果: 获取到 {len(db_aqi_data)} 条记录")
-        
-        if db_aqi_data:
-            aqi_data = pd.DataFrame(db_aqi_data)
-            logger.info(f"AQI数据非空: {len(aqi_data)}条, 列: {list(aqi_data.columns)}")
-            if not aqi_data.empty:
-                logger.info(f"AQI数据样例: {aqi_data.head(1).to_dict('records')}")
-        
-        # 查询污染物数据
-        poll_query = f"""
-        SELECT record_date as date, pm25_avg as pm25, pm10_avg as pm10, so2_avg as so2, no2_avg as no2, o3_avg as o3, co_avg as co, city
-        FROM air_quality_data
-        WHERE record_date BETWEEN %s AND %s {region_condition}
-        ORDER BY record_date
-        """
-        poll_params = [start_date, end_date] + region_params
-        
-        logger.info(f"执行污染物查询: {poll_query}, 参数: {poll_params}")
-        cursor.execute(poll_query, poll_params)
-        db_pollutants = cursor.fetchall()
-        logger.info(f"污染物查询结果: 获取到 {len(db_pollutants)} 条记录")
-        
-        if db_pollutants:
-            pollutants = pd.DataFrame(db_pollutants)
-            logger.info(f"污染物数据非空: {len(pollutants)}条, 列: {list(pollutants.columns)}")
-            if not pollutants.empty:
-                logger.info(f"污染物数据样例: {pollutants.head(1).to_dict('records')}")
-        
-        # 检查并尝试获取实时数据
-        if start_date <= today <= end_date:
-            logger.info(f"时间范围包括今天，尝试获取实时数据")
-            try:
-                # 获取实时数据
-                realtime_data = fetch_realtime_data('all')
-                if realtime_data:
-                    logger.info(f"成功获取到实时数据: {len(realtime_data)}条")
-                    
-                    # 转换为DataFrame并与历史数据合并
-                    realtime_aqi_records = []
-                    realtime_pollutant_records = []
-                    
-                    for city_data in realtime_data:
-                        city_name = city_data.get('name', '')
-                        
-                        # 如果指定了特定区域但不是全省，使用更宽松的匹配
-                        if region != 'all':
-                            # 更宽松的匹配
-                            if not (region.lower() in city_name.lower() or 
-                                   city_name.lower() in region.lower() or
-                                   city_name.lower() == region.lower()):
-                                continue
-                        
-                        # 创建AQI记录
-                        aqi_record = {
-                            'date': today,
-                            'aqi': city_data.get('aqi', 0),
-                            'quality_level': city_data.get('level', ''),
-                            'city': city_name
-                        }
-                        realtime_aqi_records.append(aqi_record)
-                        
-                        # 创建污染物记录
-                        pollutant_record = {
-                            'date': today,
-                            'pm25': city_data.get('pm25', 0),
-                            'pm10': city_data.get('pm10', 0),
-                            'so2': city_data.get('so2', 0),
-                            'no2': city_data.get('no2', 0),
-                            'o3': city_data.get('o3', 0),
-                            'co': float(city_data.get('co', 0)),
-                            'city': city_name
-                        }
-                        realtime_pollutant_records.append(pollutant_record)
-                    
-                    logger.info(f"处理后的实时数据记录: AQI={len(realtime_aqi_records)}条, 污染物={len(realtime_pollutant_records)}条")
-                    
-                    # 转换为DataFrame并与历史数据合并
-                    if realtime_aqi_records:
-                        realtime_aqi_df = pd.DataFrame(realtime_aqi_records)
-                        if not aqi_data.empty:
-                            aqi_data = pd.concat([aqi_data, realtime_aqi_df], ignore_index=True)
-                            logger.info(f"合并后AQI数据: {len(aqi_data)}条")
-                        else:
-                            aqi_data = realtime_aqi_df
-                            logger.info(f"仅使用实时AQI数据: {len(aqi_data)}条")
-                    
-                    if realtime_pollutant_records:
-                        realtime_pollutants_df = pd.DataFrame(realtime_pollutant_records)
-                        if not pollutants.empty:
-                            pollutants = pd.concat([pollutants, realtime_pollutants_df], ignore_index=True)
-                            logger.info(f"合并后污染物数据: {len(pollutants)}条")
-                        else:
-                            pollutants = realtime_pollutants_df
-                            logger.info(f"仅使用实时污染物数据: {len(pollutants)}条")
-            except Exception as e:
-                logger.error(f"获取实时数据失败: {str(e)}\n{traceback.format_exc()}")
-                # 实时数据获取失败，继续使用已经获取的历史数据
-        
-        # 如果还是没有数据，尝试扩大时间范围再查询
-        if aqi_data.empty and pollutants.empty:
-            logger.warning(f"在指定时间范围内未找到数据，尝试扩大查询范围")
-            
-            # 计算一个更长的时间范围 (例如前后延长7天)
-            extended_start = (datetime.strptime(start_date, '%Y-%m-%d') - timedelta(days=7)).strftime('%Y-%m-%d')
-            extended_end = (datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=7)).strftime('%Y-%m-%d')
-            
-            # 重新连接数据库(如果连接已关闭)
-            if not conn or not conn.is_connected():
-                conn = mysql.connector.connect(**DB_CONFIG)
-                cursor = conn.cursor(dictionary=True)
-            
-            # 重新查询AQI数据
-            ext_aqi_query = f"""
-            SELECT record_date as date, aqi_index as aqi, quality_level, city
-            FROM air_quality_data
-            WHERE record_date BETWEEN %s AND %s {region_condition}
-            ORDER BY record_date
-            """
-            ext_aqi_params = [extended_start, extended_end] + region_params
-            
-            logger.info(f"扩展时间范围AQI查询: {ext_aqi_query}, 参数: {ext_aqi_params}")
-            cursor.execute(ext_aqi_query, ext_aqi_params)
-            ext_aqi_data = cursor.fetchall()
-            logger.info(f"扩展时间范围AQI查询结果: 获取到 {len(ext_aqi_data)} 条记录")
-            
-            if ext_aqi_data:
-                aqi_data = pd.DataFrame(ext_aqi_data)
-                logger.info(f"扩展时间范围AQI数据非空: {len(aqi_data)}条, 列: {list(aqi_data.columns)}")
-                if not aqi_data.empty:
-                    logger.info(f"扩展AQI数据样例: {aqi_data.head(1).to_dict('records')}")
-            
-            # 重新查询污染物数据
-            ext_poll_query = f"""
-            SELECT record_date as date, pm25_avg as pm25, pm10_avg as pm10, so2_avg as so2, no2_avg as no2, o3_avg as o3, co_avg as co, city
-            FROM air_quality_data
-            WHERE record_date BETWEEN %s AND %s {region_condition}
-            ORDER BY record_date
-            """
-            ext_poll_params = [extended_start, extended_end] + region_params
-            
-            logger.info(f"扩展时间范围污染物查询: {ext_poll_query}, 参数: {ext_poll_params}")
-            cursor.execute(ext_poll_query, ext_poll_params)
-            ext_pollutants = cursor.fetchall()
-            logger.info(f"扩展时间范围污染物查询结果: 获取到 {len(ext_pollutants)} 条记录")
-            
-            if ext_pollutants:
-                pollutants = pd.DataFrame(ext_pollutants)
-                logger.info(f"扩展时间范围污染物数据非空: {len(pollutants)}条, 列: {list(pollutants.columns)}")
-                if not pollutants.empty:
-                    logger.info(f"扩展污染物数据样例: {pollutants.head(1).to_dict('records')}")
-        
-        # 如果使用了扩展时间范围后有数据，过滤保留原来时间范围内的数据
-        if not aqi_data.empty:
-            # 检查是否需要过滤 (如果进行了扩展时间范围查询)
-            if 'date' in aqi_data.columns:
-                # 过滤保留原始时间范围内的数据
-                aqi_data = aqi_data[(aqi_data['date'] >= start_date) & (aqi_data['date'] <= end_date)]
-                logger.info(f"过滤后AQI数据: {len(aqi_data)}条")
-        
-        if not pollutants.empty:
-            # 同样过滤污染物数据
-            if 'date' in pollutants.columns:
-                pollutants = pollutants[(pollutants['date'] >= start_date) & (pollutants['date'] <= end_date)]
-                logger.info(f"过滤后污染物数据: {len(pollutants)}条")
-        
-        # 最终返回数据
-        # 即使没有查到数据，也返回空的DataFrame而不是错误
-        return {
-            'aqi_data': aqi_data if not aqi_data.empty else pd.DataFrame(),
-            'pollutants': pollutants if not pollutants.empty else pd.DataFrame()
-        }
-    
-    except Exception as e:
-        logger.error(f"数据加载失败: {str(e)}\n{traceback.format_exc()}")
-        return {'aqi_data': pd.DataFrame(), 'pollutants': pd.DataFrame(), 'error': str(e)}
-    finally:
-        # 确保资源释放
-        if cursor:
-            cursor.close()
-        if conn and conn.is_connected():
-            conn.close()
+def load_air_quality_data(start_date, end_date, region, include_realtime=None):
+    """加载报告所需的空气质量数据（单次查询，精确城市匹配）
 
-# 从实时API获取数据
-def fetch_realtime_data(region='all'):
-    """从实时数据API获取数据
-    
-    Args:
-        region (str): 区域ID，默认为'all'表示全省
-        
     Returns:
-        list: 包含城市实时数据的列表
+        ReportDataset: 支持 data['aqi_data'] / data['pollutants'] 访问的报告数据集
     """
-    try:
-        # 根据区域决定API端点
-        if region == 'all':
-            endpoint = '/api/province'  # 获取全省数据
-        else:
-            endpoint = f'/api/realtime/{region}'  # 获取特定城市数据
-            
-        # 构建请求URL
-        url = f"http://localhost:5001{endpoint}"
-        
-        # 添加参数，禁用模拟数据
-        params = {'use_real_data': 'true', 'disable_simulation': 'true'}
-            
-        # 发送GET请求
-        logger.info(f"从实时API获取数据: {url}")
-        response = requests.get(url, params=params, timeout=10)
-        
-        # 检查响应状态
-        if response.status_code != 200:
-            logger.error(f"实时API返回错误状态码: {response.status_code}")
-            return []
-            
-        # 解析响应数据
-        data = response.json()
-        
-        # 处理不同的响应格式
-        if isinstance(data, dict) and 'data' in data:
-            result = data['data']
-        elif isinstance(data, list):
-            result = data
-        else:
-            result = []
-            
-        logger.info(f"成功获取实时数据: {len(result)} 条记录")
-        return result
-    except Exception as e:
-        logger.error(f"从实时API获取数据失败: {str(e)}")
-        return []
+    logger.info(f"加载空气质量数据 - 参数: start_date={start_date}, end_date={end_date}, region={region}")
+    return load_report_dataset(start_date, end_date, region, DB_CONFIG, include_realtime=include_realtime)
 
-# 加载报告元数据
-def load_report_metadata():
-    try:
-        if os.path.exists(REPORT_METADATA_PATH):
-            try:
-                with open(REPORT_METADATA_PATH, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    # 验证数据格式
-                    if not isinstance(data, list):
-                        logger.warning(f"报告元数据格式不正确: {REPORT_METADATA_PATH}，重置为空列表")
-                        return []
-                    return data
-            except json.JSONDecodeError:
-                logger.error(f"报告元数据文件格式错误: {REPORT_METADATA_PATH}")
-                # 文件存在但格式错误，创建备份
-                backup_path = f"{REPORT_METADATA_PATH}.bak.{int(time.time())}"
-                try:
-                    os.rename(REPORT_METADATA_PATH, backup_path)
-                    logger.info(f"已创建元数据文件备份: {backup_path}")
-                except Exception as e:
-                    logger.error(f"创建备份文件失败: {str(e)}")
-                
-                # 重新创建文件
-                with open(REPORT_METADATA_PATH, 'w', encoding='utf-8') as f:
-                    json.dump([], f)
-                return []
-        else:
-            # 如果文件不存在，确保目录存在并创建空文件
-            try:
-                parent_dir = os.path.dirname(REPORT_METADATA_PATH)
-                if not os.path.exists(parent_dir):
-                    os.makedirs(parent_dir, exist_ok=True)
-                    logger.info(f"创建报告元数据目录: {parent_dir}")
-                
-                with open(REPORT_METADATA_PATH, 'w', encoding='utf-8') as f:
-                    json.dump([], f)
-                logger.info(f"创建新的报告元数据文件: {REPORT_METADATA_PATH}")
-                return []
-            except Exception as e:
-                logger.error(f"创建报告元数据文件失败: {str(e)}\n{traceback.format_exc()}")
-                return []
-    except Exception as e:
-        logger.error(f"加载报告元数据失败: {str(e)}\n{traceback.format_exc()}")
-        return []
+# 数据水位缓存: 水位查询要扫描覆盖范围内的全部日数据，数据变更事件到达前重复请求直接复用；
+# 另设最长保留时间，不发布事件的写入方（手工SQL等）改动数据后报告缓存最多过时这么久
+WATERMARK_TABLES = ['air_quality_data', 'air_quality_newdata']
+REPORT_WATERMARK_TTL = float(os.environ.get('REPORT_WATERMARK_TTL', '300'))
+WATERMARK_CACHE = ScopedCache('report_watermark', max_entries=1024, ttl=REPORT_WATERMARK_TTL)
 
-# 保存报告元数据
-def save_report_metadata(metadata):
-    if metadata is None:
-        logger.warning("保存报告元数据: metadata参数为None，将使用空列表")
-        metadata = []
-        
-    if not isinstance(metadata, list):
-        logger.warning(f"保存报告元数据: metadata不是列表格式({type(metadata)})，将强制转换")
-        try:
-            # 尝试转换为列表，如果可能的话
-            metadata = list(metadata)
-        except:
-            logger.error("保存报告元数据: metadata无法转换为列表，将使用空列表")
-            metadata = []
-    
-    try:
-        # 确保目录存在
-        dir_path = os.path.dirname(REPORT_METADATA_PATH)
-        if not os.path.exists(dir_path):
-            try:
-                os.makedirs(dir_path, exist_ok=True)
-                logger.info(f"创建报告元数据目录: {dir_path}")
-            except Exception as mkdir_err:
-                logger.error(f"创建报告元数据目录失败: {str(mkdir_err)}")
-                return False
-        
-        # 先将数据写入临时文件，然后重命名，避免写入中断导致数据丢失
-        temp_path = f"{REPORT_METADATA_PATH}.tmp"
-        try:
-            with open(temp_path, 'w', encoding='utf-8') as f:
-                json.dump(metadata, f, ensure_ascii=False, indent=2)
-                
-            # 如果原文件存在，先创建备份
-            if os.path.exists(REPORT_METADATA_PATH):
-                backup_path = f"{REPORT_METADATA_PATH}.bak"
-                try:
-                    os.replace(REPORT_METADATA_PATH, backup_path)
-                    logger.debug(f"创建元数据文件备份: {backup_path}")
-                except Exception as backup_err:
-                    logger.warning(f"创建元数据备份失败，继续保存: {str(backup_err)}")
-            
-            # 重命名临时文件为正式文件
-            os.replace(temp_path, REPORT_METADATA_PATH)
-            logger.info(f"成功保存报告元数据: {len(metadata)}条记录")
-            return True
-                
-        except Exception as write_err:
-            logger.error(f"写入报告元数据失败: {str(write_err)}")
-            # 尝试删除临时文件
-            if os.path.exists(temp_path):
-                try:
-                    os.remove(temp_path)
-                except:
-                    pass
+
+def connect_reports_db():
+    return mysql.connector.connect(**DB_CONFIG)
+
+
+# 水位缓存订阅数据变更事件，由init_reports_api注册且每个进程只注册一次
+_watermark_subscribed = False
+_watermark_subscribe_lock = threading.Lock()
+
+
+def subscribe_watermark_cache():
+    """把水位缓存的失效回调注册到进程内共享的变更订阅器（重复调用不会重复注册）"""
+    global _watermark_subscribed
+    with _watermark_subscribe_lock:
+        if _watermark_subscribed:
             return False
-    except Exception as e:
-        logger.error(f"保存报告元数据失败: {str(e)}\n{traceback.format_exc()}")
-        return False
+        get_change_subscriber(connect_reports_db).subscribe(WATERMARK_CACHE.invalidate, tables=WATERMARK_TABLES)
+        _watermark_subscribed = True
+        return True
+
+
+def get_data_watermark(start_date, end_date, region):
+    """获取报告覆盖范围内数据的水位标识，按 (日期范围, 区域) 缓存，数据变更事件覆盖该范围或超过TTL时失效"""
+    cache_key = (start_date, end_date, region)
+    watermark = WATERMARK_CACHE.get(cache_key)
+    if watermark is None:
+        version = WATERMARK_CACHE.version()
+        watermark = compute_data_watermark(start_date, end_date, region, DB_CONFIG)
+        WATERMARK_CACHE.put(cache_key, watermark, version, WATERMARK_TABLES,
+                            resolve_region_cities(region), start_date, end_date)
+    return watermark
 
 # 添加报告记录到元数据
 def add_report_record(report_info):
     if not report_info or not isinstance(report_info, dict):
         logger.error("添加报告记录失败: report_info参数无效")
         return False
-        
+
     try:
-        # 加载现有元数据
-        metadata = load_report_metadata()
-        
-        # 确保metadata是列表
-        if metadata is None:
-            metadata = []
-        elif not isinstance(metadata, list):
-            logger.warning("加载的元数据不是列表格式，将重置为空列表")
-            metadata = []
-            
-        # 添加新记录
-        metadata.append(report_info)
-        
-        # 保存更新后的元数据
-        try:
-            result = save_report_metadata(metadata)
-            logger.info(f"添加报告记录: {report_info.get('id')} - 结果: {'成功' if result else '失败'}")
-            return result
-        except Exception as save_err:
-            logger.error(f"保存报告元数据失败: {str(save_err)}")
-            return False
+        result = REPORT_STORE.add(report_info)
+        logger.info(f"添加报告记录: {report_info.get('id')} - 结果: {'成功' if result else '失败'}")
+        return result
     except Exception as e:
         logger.error(f"添加报告记录失败: {str(e)}\n{traceback.format_exc()}")
         return False
@@ -583,44 +342,360 @@ def add_report_record(report_info):
 # API路由 - 获取报告历史
 @app.route('/api/reports/history', methods=['GET'])
 def get_report_history():
+    """获取报告历史
+
+    可选查询参数: region, type, format, status, start_date, end_date（按覆盖时间段过滤），
+    page与page_size（分页）。返回按生成时间降序的报告列表，总数放在X-Total-Count响应头中。
+    """
     try:
-        # 从文件加载报告元数据
-        reports = load_report_metadata()
-        
-        # 确保reports是可迭代的，如果为None则返回空列表
-        if reports is None:
-            logger.warning("报告元数据加载返回None，将使用空列表")
-            reports = []
-            
-        # 确保返回的是列表
-        if not isinstance(reports, list):
-            logger.warning(f"报告元数据不是列表格式: {type(reports)}，将转换为列表")
-            # 如果是字典，且可能有items方法，尝试转换为列表
-            if isinstance(reports, dict):
-                try:
-                    reports = list(reports.values())
-                except:
-                    reports = []
-            else:
-                try:
-                    reports = list(reports)
-                except:
-                    reports = []
-            
-        # 按生成时间降序排序
-        try:
-            if reports and len(reports) > 0:
-                reports.sort(key=lambda x: x.get('created_at', ''), reverse=True)
-        except Exception as sort_err:
-            logger.error(f"报告排序失败: {str(sort_err)}")
-            # 排序失败不影响返回结果
-        
-        # 返回成功响应
-        return jsonify(reports)
+        filters = {
+            'region': request.args.get('region'),
+            'report_type': request.args.get('type'),
+            'report_format': request.args.get('format'),
+            'status': request.args.get('status'),
+            'start_date': request.args.get('start_date'),
+            'end_date': request.args.get('end_date')
+        }
+
+        limit = None
+        offset = 0
+        page_size = request.args.get('page_size', type=int)
+        if page_size:
+            page = max(1, request.args.get('page', 1, type=int))
+            limit = max(1, min(page_size, 500))
+            offset = (page - 1) * limit
+
+        reports = REPORT_STORE.query(limit=limit, offset=offset, **filters)
+        response = jsonify(reports)
+        response.headers['X-Total-Count'] = str(REPORT_STORE.count(**filters) if limit else len(reports))
+        return response
     except Exception as e:
         logger.error(f"获取报告历史失败: {str(e)}\n{traceback.format_exc()}")
         return handle_error(f"获取报告历史失败: {str(e)}")
 
+# 根据报告格式确定输出目录和扩展名
+def get_report_output_target(report_format):
+    """获取报告格式对应的输出目录和文件扩展名
+
+    Args:
+        report_format (str): 报告格式
+
+    Returns:
+        tuple: (输出目录, 文件扩展名)
+    """
+    if report_format == 'pdf':
+        return REPORTS_PDF_DIR, '.pdf'
+    elif report_format == 'excel':
+        return REPORTS_EXCEL_DIR, '.xlsx'
+    elif report_format == 'word':
+        return REPORTS_WORD_DIR, '.docx'
+    elif report_format == 'html':
+        return REPORTS_HTML_DIR, '.html'
+    elif report_format == 'zip':
+        return REPORTS_BATCH_DIR, '.zip'
+    return REPORTS_DIR, f".{report_format}"
+
+# 报告生成任务 - 在任务队列的工作线程中执行
+def run_report_job(report_id, report_name, report_type, start_date, end_date, region,
+                   content_options, report_format, output_path, cache_info=None, job=None):
+    """执行一次报告渲染并写入报告元数据
+
+    Args:
+        report_id (str): 报告ID
+        report_name (str): 报告名称
+        report_type (str): 报告类型
+        start_date (str): 开始日期
+        end_date (str): 结束日期
+        region (str): 地区
+        content_options (dict): 前端内容选项
+        report_format (str): 报告格式
+        output_path (str): 输出文件路径
+        cache_info (dict): 缓存键信息，生成成功后登记到报告缓存
+        job (ReportJob): 所属任务，用于上报进度和检查取消
+
+    Returns:
+        dict: 报告记录，或带有错误信息的字典
+    """
+    result = generate_report_content(
+        report_type, start_date, end_date,
+        region, content_options, report_format,
+        output_path, job=job
+    )
+
+    if isinstance(result, dict) and 'error' in result:
+        logger.error(f"报告生成失败: {result['error']}")
+        return result
+
+    # 检查文件是否实际生成
+    if not os.path.exists(output_path):
+        error_msg = f"报告文件未能成功生成: {output_path}"
+        logger.error(error_msg)
+        return {'error': error_msg}
+
+    extra = cache_report_output(cache_info, report_format, output_path)
+    return register_report(report_id, report_name, report_type, start_date, end_date,
+                           region, report_format, output_path, extra=extra)
+
+# 把新生成的报告登记到报告缓存，返回写入报告记录的附加字段
+def cache_report_output(cache_info, report_format, output_path):
+    if not cache_info:
+        return None
+    try:
+        entry = REPORT_CACHE.put(cache_info['cache_key'], cache_info['request_hash'], report_format,
+                                 output_path, watermark=cache_info.get('watermark'))
+        if entry:
+            return {'cache_key': entry['cache_key'], 'sha256': entry['sha256']}
+    except Exception as e:
+        logger.warning(f"登记报告缓存失败: {str(e)}")
+    return None
+
+# 多格式报告任务 - 在任务队列的工作线程中执行
+def run_multi_format_report_job(report_id, report_name, report_type, start_date, end_date, region,
+                                content_options, targets, cached_reports=None, job=None):
+    """一次生成同一报告的多个格式，每个格式登记为一条报告记录
+
+    Args:
+        targets (list): 待生成的格式，每项为 {'id', 'format', 'output_path', 'cache_info'}
+        cached_reports (list): 已由缓存直接得到的报告记录，合并到结果中
+
+    Returns:
+        dict: {'success', 'id', 'reports', 'errors'}，全部格式失败时返回带有错误信息的字典
+    """
+    outputs = {target['format']: target['output_path'] for target in targets}
+    results = generate_multi_format_content(report_type, start_date, end_date, region,
+                                            content_options, outputs, job=job)
+    if 'error' in results:
+        logger.error(f"报告生成失败: {results['error']}")
+        return results
+
+    reports = list(cached_reports or [])
+    errors = {}
+    for target in targets:
+        report_format = target['format']
+        result = results.get(report_format)
+        if not isinstance(result, str):
+            errors[report_format] = (result or {}).get('error', '报告未生成')
+            continue
+        extra = cache_report_output(target.get('cache_info'), report_format, target['output_path']) or {}
+        extra['group_id'] = report_id
+        reports.append(register_report(target['id'], report_name, report_type, start_date, end_date,
+                                       region, report_format, target['output_path'], extra=extra))
+
+    if not reports:
+        return {'error': '；'.join(f"{fmt}: {error}" for fmt, error in errors.items())}
+    return {'success': True, 'id': report_id, 'name': report_name, 'reports': reports, 'errors': errors}
+
+# 登记已生成的报告文件
+def register_report(report_id, report_name, report_type, start_date, end_date, region,
+                    report_format, output_path, extra=None):
+    """写入报告元数据并构建返回给客户端的报告信息"""
+    output_filename = os.path.basename(output_path)
+
+    # 创建报告记录 - 添加报告名称和状态字段
+    report_record = {
+        'id': report_id,
+        'name': report_name,
+        'type': report_type,
+        'format': report_format,
+        'region': region,
+        'start_date': start_date,
+        'end_date': end_date,
+        'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'file_path': output_path,
+        'download_url': f"/api/reports/download/{output_filename}",
+        'status': 'completed',
+        'file_name': output_filename,
+        'size_bytes': os.path.getsize(output_path) if os.path.exists(output_path) else None
+    }
+    if extra:
+        report_record.update(extra)
+
+    # 添加报告记录到元数据
+    try:
+        add_success = add_report_record(report_record)
+        if not add_success:
+            logger.warning(f"报告元数据添加失败，但报告文件已生成: {output_path}")
+    except Exception as e:
+        logger.error(f"添加报告记录到元数据时发生错误: {str(e)}")
+        # 即使记录添加失败，也继续返回成功，因为文件已生成
+
+    logger.info(f"报告生成成功: {report_id}, 文件路径: {output_path}")
+    return {
+        'success': True,
+        'id': report_id,
+        'name': report_name,
+        'type': report_type,
+        'format': report_format,
+        'download_url': report_record['download_url'],
+        'file_name': output_filename,
+        'created_at': report_record['created_at'],
+        'status': 'completed',
+        'cached': bool(extra and extra.get('cached'))
+    }
+
+# 解析批量报告的城市参数
+def resolve_batch_cities(cities):
+    """把城市代码或中文名列表解析为 [(区域代码, 城市名)]，未指定时返回全部城市
+
+    Returns:
+        list: 去重后的城市列表；无法识别的城市原样作为区域代码
+    """
+    if not cities:
+        return [(code, REGION_CITY_MAP[code][0]) for code in BATCH_CITY_REGIONS]
+
+    city_codes = {REGION_CITY_MAP[code][0]: code for code in BATCH_CITY_REGIONS}
+    resolved = []
+    seen = set()
+    for item in cities:
+        if item in BATCH_CITY_REGIONS:
+            city_name = REGION_CITY_MAP[item][0]
+        else:
+            city_name = normalize_city_name(item)
+        if not city_name or city_name in seen:
+            continue
+        seen.add(city_name)
+        resolved.append((city_codes.get(city_name, city_name), city_name))
+    return resolved
+
+# 批量报告任务 - 一次数据加载，按城市并发渲染并打包为zip
+def run_batch_report_job(batch_id, batch_name, report_type, start_date, end_date, cities,
+                         content_options, report_format, include_summary=True, job=None):
+    """为每个城市生成一份报告（可附带全省汇总），打包为带manifest.json的zip
+
+    Args:
+        batch_id (str): 批量报告ID，同时作为zip文件名
+        batch_name (str): 批量报告名称
+        report_type (str): 报告类型
+        start_date (str): 开始日期
+        end_date (str): 结束日期
+        cities (list): resolve_batch_cities返回的 [(区域代码, 城市名)]
+        content_options (dict): 前端内容选项
+        report_format (str): 单个报告的格式
+        include_summary (bool): 是否附带全省汇总报告
+        job (ReportJob): 所属任务，用于上报进度和检查取消
+
+    Returns:
+        dict: 报告记录，或带有错误信息的字典
+    """
+    _, file_ext = get_report_output_target(report_format)
+    zip_path = sharded_path(REPORTS_BATCH_DIR, f"{batch_id}.zip")
+    work_dir = tempfile.mkdtemp(prefix=f"{batch_id}_", dir=REPORTS_BATCH_DIR)
+    mapped_options = map_content_options(content_options)
+    type_name = get_report_type_name(report_type)
+    batch_start = time.perf_counter()
+
+    try:
+        # 全省数据只加载一次，再按城市分组
+        report_progress(job, 5, f"加载{get_region_name('all')}空气质量数据")
+        with report_stage(job, 'load_data'):
+            data = load_air_quality_data(start_date, end_date, 'all',
+                                         include_realtime=content_options.get('realtime'))
+        if 'error' in data:
+            return {'error': f"数据加载失败: {data.get('error', '未知错误')}"}
+        if data.empty:
+            return {'error': f"所选时间段({start_date}至{end_date})没有可用的空气质量数据"}
+
+        with report_stage(job, 'split'):
+            city_data = data.split_by_city()
+
+        # 构建渲染任务，没有数据的城市直接记为跳过
+        manifest = []
+        tasks = []
+        if include_summary:
+            tasks.append(('all', f"{get_region_name('all')}汇总", data))
+        for region_code, city_name in cities:
+            dataset = city_data.get(city_name)
+            if dataset is None or dataset.empty:
+                manifest.append({'region': region_code, 'city': city_name, 'file': None,
+                                 'status': 'skipped', 'error': '所选时间段没有数据'})
+                continue
+            tasks.append((region_code, city_name, dataset))
+
+        def render_one(region_code, city_name, dataset):
+            if job is not None:
+                job.check_cancelled()
+            file_name = f"{region_code}_{city_name}_{type_name}{file_ext}"
+            output_path = os.path.join(work_dir, file_name)
+            start = time.perf_counter()
+            result = render_report_file(dataset, report_type, start_date, end_date, region_code,
+                                        mapped_options, report_format, output_path,
+                                        job=job, track_progress=False)
+            entry = {'region': region_code, 'city': city_name, 'file': file_name,
+                     'rows': len(dataset.frame), 'seconds': round(time.perf_counter() - start, 3)}
+            if isinstance(result, dict) and 'error' in result:
+                entry.update(file=None, status='failed', error=result['error'])
+            else:
+                entry.update(status='completed', size_bytes=os.path.getsize(output_path),
+                             sha256=file_sha256(output_path))
+            return entry
+
+        # 有界线程池并发提交；图表和报告生成器都在共享的渲染进程池中执行，并行度受CHART_WORKERS限制
+        report_progress(job, 10, f"渲染 {len(tasks)} 份报告")
+        completed = 0
+        with ThreadPoolExecutor(max_workers=max(1, REPORT_BATCH_WORKERS),
+                                thread_name_prefix='batch-report') as executor:
+            futures = {executor.submit(render_one, *task): task for task in tasks}
+            try:
+                for future in as_completed(futures):
+                    region_code, city_name, _ = futures[future]
+                    try:
+                        manifest.append(future.result())
+                    except ReportJobCancelled:
+                        raise
+                    except Exception as e:
+                        logger.error(f"批量报告渲染失败: {city_name}: {str(e)}")
+                        manifest.append({'region': region_code, 'city': city_name, 'file': None,
+                                         'status': 'failed', 'error': str(e)})
+                    completed += 1
+                    report_progress(job, 10 + int(80 * completed / len(tasks)),
+                                    f"已完成 {completed}/{len(tasks)} 份报告")
+            except ReportJobCancelled:
+                for future in futures:
+                    future.cancel()
+                raise
+
+        generated = [entry for entry in manifest if entry['status'] == 'completed']
+        if not generated:
+            return {'error': '批量报告中没有成功生成的报告'}
+
+        # 按城市顺序打包，已压缩的格式(xlsx/docx)直接存储
+        report_progress(job, 92, '打包报告')
+        order = {region_code: index for index, (region_code, _) in enumerate([('all', None)] + list(cities))}
+        manifest.sort(key=lambda entry: order.get(entry['region'], len(order)))
+        counts = {status: sum(1 for entry in manifest if entry['status'] == status)
+                  for status in ('completed', 'failed', 'skipped')}
+        compress_type = zipfile.ZIP_STORED if report_format in ('excel', 'word') else zipfile.ZIP_DEFLATED
+        with report_stage(job, 'package'):
+            tmp_path = f"{zip_path}.part"
+            try:
+                with zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+                    for entry in generated:
+                        archive.write(os.path.join(work_dir, entry['file']), entry['file'],
+                                      compress_type=compress_type)
+                    archive.writestr('manifest.json', json.dumps({
+                        'batch_id': batch_id,
+                        'name': batch_name,
+                        'type': report_type,
+                        'format': report_format,
+                        'start_date': start_date,
+                        'end_date': end_date,
+                        'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                        'seconds': round(time.perf_counter() - batch_start, 3),
+                        'counts': counts,
+                        'reports': manifest
+                    }, ensure_ascii=False, indent=2))
+                os.replace(tmp_path, zip_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+        logger.info(f"批量报告完成: {batch_id}, 成功{counts['completed']}份, "
+                    f"失败{counts['failed']}份, 跳过{counts['skipped']}份")
+        return register_report(batch_id, batch_name, report_type, start_date, end_date, 'all',
+                               'zip', zip_path, extra={'batch': dict(counts, format=report_format)})
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
 # API路由 - 生成报告
 @app.route('/api/reports/generate', methods=['POST'])
 def generate_report():
@@ -634,8 +709,18 @@ def generate_report():
         start_date = data.get('startDate')
         end_date = data.get('endDate')
         region = data.get('region', 'all')
-        report_format = data.get('format', 'pdf').lower()  # 确保格式小写
         report_name = data.get('name', f"空气质量{get_report_type_name(report_type)}")
+        # 默认异步执行，async=false时在请求内等待任务完成（兼容旧客户端）
+        try:
+            run_async = parse_bool(data.get('async'), True)
+            use_cache = parse_bool(data.get('use_cache'), True) and REPORT_CACHE.enabled
+            # 报告格式统一转为小写，formats列表中只有一种格式时按单格式报告处理
+            formats = parse_report_formats(data.get('format', 'pdf'), data.get('formats'))
+            # 提取内容选项 - 根据前端传递的值映射到后端处理的字段
+            content_options = parse_content_options(data.get('content'))
+        except ValueError as e:
+            return handle_error(f"参数错误: {e}", 400)
+        report_format = formats[0]
         
         # 记录请求信息
         logger.info(f"收到报告生成请求: 类型={report_type}, 区域={region}, 日期={start_date}至{end_date}, 格式={report_format}")
@@ -648,184 +733,348 @@ def generate_report():
         report_id = f"report_{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}"
         
         # 确定输出目录
-        if report_format == 'pdf':
-            output_dir = REPORTS_PDF_DIR
-            file_ext = '.pdf'
-        elif report_format == 'excel':
-            output_dir = REPORTS_EXCEL_DIR
-            file_ext = '.xlsx'
-        elif report_format == 'word':
-            output_dir = REPORTS_WORD_DIR
-            file_ext = '.docx'
-        elif report_format == 'html':
-            output_dir = REPORTS_HTML_DIR
-            file_ext = '.html'
-        else:
-            output_dir = REPORTS_DIR
-            file_ext = f".{report_format}"
+        output_dir, file_ext = get_report_output_target(report_format)
             
         # 确保输出目录存在
         try:
             os.makedirs(output_dir, exist_ok=True)
-            logger.info(f"确保报告输出目录存在: {output_dir}")
         except Exception as e:
             logger.error(f"创建输出目录失败: {str(e)}")
             return handle_error(f"创建输出目录失败: {str(e)}")
         
-        # 构建输出文件路径
+        # 构建输出文件路径（按文件名哈希分片存放）
         output_filename = f"{report_id}{file_ext}"
-        output_path = os.path.join(output_dir, output_filename)
+        output_path = sharded_path(output_dir, output_filename)
         logger.info(f"报告将保存至: {output_path}")
         
-        # 提取内容选项 - 根据前端传递的值映射到后端处理的字段
-        content_options = {
-            'overview': data.get('content', {}).get('overview', True), 
-            'pollution': data.get('content', {}).get('pollution', True),
-            'trend': data.get('content', {}).get('trend', True),
-            'warning': data.get('content', {}).get('warning', True),
-            'policy': data.get('content', {}).get('policy', False)
-        }
-        
-        # 生成报告文件
-        result = generate_report_content(
-            report_type, start_date, end_date, 
-            region, content_options, report_format, 
-            output_path
-        )
-        
-        if isinstance(result, dict) and 'error' in result:
-            logger.error(f"报告生成失败: {result['error']}")
-            return handle_error(result['error'])
-            
-        # 检查文件是否实际生成
-        if not os.path.exists(output_path):
-            error_msg = f"报告文件未能成功生成: {output_path}"
-            logger.error(error_msg)
-            return handle_error(error_msg)
-            
-        # 构建下载URL - 确保包含完整的文件扩展名
-        download_url = f"/api/reports/download/{output_filename}"
-        
-        # 创建报告记录 - 添加报告名称和状态字段
-        report_record = {
-            'id': report_id,
-            'name': report_name,
-            'type': report_type,
-            'format': report_format,
-            'region': region,
-            'start_date': start_date,
-            'end_date': end_date,
-            'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'file_path': output_path,
-            'download_url': download_url,
-            'status': 'completed',
-            'file_name': output_filename
-        }
+        # 多格式请求: 一次加载数据、一次渲染图表，各格式并行生成
+        if len(formats) > 1:
+            return generate_multi_format_report(
+                report_id, report_name, report_type, start_date, end_date, region,
+                content_options, formats, use_cache, run_async
+            )
         
-        # 添加报告记录到元数据
+        # 查询报告缓存: 相同请求且覆盖范围内的数据未变化时直接复用
+        cache_info = None
+        if use_cache:
+            watermark = None
+            try:
+                watermark = get_data_watermark(start_date, end_date, region)
+            except Exception as e:
+                logger.warning(f"报告缓存检查失败，直接生成报告: {str(e)}")
+            if watermark is not None:
+                result, cache_info = lookup_cached_report(
+                    report_id, report_name, report_type, start_date, end_date, region,
+                    content_options, report_format, output_path, watermark
+                )
+                if result:
+                    return jsonify(result)
+        
+        # 提交到报告任务队列，由工作线程池控制同时渲染的数量
         try:
-            add_success = add_report_record(report_record)
-            if not add_success:
-                logger.warning(f"报告元数据添加失败，但报告文件已生成: {output_path}")
-        except Exception as e:
-            logger.error(f"添加报告记录到元数据时发生错误: {str(e)}")
-            # 即使记录添加失败，也继续返回成功，因为文件已生成
+            job = REPORT_JOB_QUEUE.submit(
+                run_report_job,
+                report_id, report_name, report_type, start_date, end_date,
+                region, content_options, report_format, output_path,
+                cache_info=cache_info, job_id=report_id, name=report_name
+            )
+        except ReportQueueFull as e:
+            return handle_error(str(e), 503)
+        
+        if not run_async:
+            job.wait()
+            job_info = job.to_dict()
+            if job_info['status'] != 'completed':
+                return handle_error(job_info.get('error') or f"报告生成失败: {job_info['status']}")
+            return jsonify(job_info['result'])
         
-        # 返回成功响应 - 包含完整的报告信息
+        # 立即返回任务信息，客户端通过状态接口轮询进度
         response = {
             'success': True,
             'id': report_id,
+            'job_id': job.id,
             'name': report_name,
             'type': report_type,
             'format': report_format,
-            'download_url': download_url,
-            'file_name': output_filename,
-            'created_at': report_record['created_at'],
-            'status': 'completed'
+            'status': job.status,
+            'status_url': f"/api/reports/jobs/{job.id}",
+            'download_url': f"/api/reports/download/{output_filename}",
+            'file_name': output_filename
         }
-        logger.info(f"报告生成成功: {report_id}, 文件路径: {output_path}")
-        return jsonify(response)
+        return jsonify(response), 202
             
     except Exception as e:
         logger.error(f"报告生成失败: {str(e)}\n{traceback.format_exc()}")
         return handle_error(f"报告生成失败: {str(e)}")
 
-# API路由 - 下载报告
-@app.route('/api/reports/download/<filename>', methods=['GET'])
-def download_report(filename):
+# 查询报告缓存，命中时直接登记报告
+def lookup_cached_report(report_id, report_name, report_type, start_date, end_date, region,
+                         content_options, report_format, output_path, watermark):
+    """按数据水位查找已缓存的相同报告
+
+    Returns:
+        tuple: (命中时的报告记录或None, 未命中时生成后登记缓存所需的cache_info)
+    """
     try:
-        if not filename:
-            logger.error("下载请求缺少文件名")
-            return handle_error("下载失败: 缺少报告ID", 400)
-            
-        # 记录下载请求
-        logger.info(f"收到报告下载请求: {filename}")
-        
-        # 从元数据中查找报告
-        reports = load_report_metadata()
-        report = None
-        
-        # 提取report_id和扩展名
-        report_id = filename.split('.')[0] if '.' in filename else filename
-        ext = filename.split('.')[-1] if '.' in filename else ''
-        
-        # 先尝试通过文件名完全匹配
-        if reports and isinstance(reports, list):
-            for r in reports:
-                if not isinstance(r, dict):
-                    continue
-                if r.get('file_name') == filename:
-                    report = r
-                    logger.debug(f"从元数据中找到报告文件: {filename}")
-                    break
-                if r.get('id') == report_id:
-                    report = r
-                    logger.debug(f"从元数据中通过ID找到报告: {report_id}")
-                    break
-        
-        # 如果没找到，尝试在各个目录中查找文件
-        if not report:
-            # 根据扩展名确定可能的目录
-            if ext == 'pdf':
-                primary_dir = REPORTS_PDF_DIR
-            elif ext in ['xlsx', 'xls']:
-                primary_dir = REPORTS_EXCEL_DIR
-            elif ext in ['docx', 'doc']:
+        cache_key, request_hash = REPORT_CACHE.build_key(
+            region, start_date, end_date, report_type, report_format, content_options,
+            watermark, realtime_bucket(start_date, end_date, content_options.get('realtime'))
+        )
+        entry = REPORT_CACHE.lookup(cache_key)
+        if entry:
+            REPORT_CACHE.materialize(entry, output_path)
+            result = register_report(
+                report_id, report_name, report_type, start_date, end_date, region,
+                report_format, output_path,
+                extra={'cached': True, 'cache_key': cache_key, 'sha256': entry.get('sha256')}
+            )
+            return result, None
+        return None, {'cache_key': cache_key, 'request_hash': request_hash, 'watermark': watermark}
+    except Exception as e:
+        logger.warning(f"报告缓存检查失败，直接生成报告: {str(e)}")
+        return None, None
+
+# 多格式报告请求 - 逐个格式查缓存，未命中的格式合并为一个任务生成
+def generate_multi_format_report(report_id, report_name, report_type, start_date, end_date, region,
+                                 content_options, formats, use_cache, run_async):
+    watermark = None
+    if use_cache:
+        try:
+            watermark = get_data_watermark(start_date, end_date, region)
+        except Exception as e:
+            logger.warning(f"报告缓存检查失败，直接生成报告: {str(e)}")
+
+    cached_reports = []
+    targets = []
+    for report_format in formats:
+        output_dir, file_ext = get_report_output_target(report_format)
+        os.makedirs(output_dir, exist_ok=True)
+        format_id = f"{report_id}_{report_format}"
+        output_path = sharded_path(output_dir, f"{format_id}{file_ext}")
+        cache_info = None
+        if watermark is not None:
+            result, cache_info = lookup_cached_report(
+                format_id, report_name, report_type, start_date, end_date, region,
+                content_options, report_format, output_path, watermark
+            )
+            if result:
+                cached_reports.append(result)
+                continue
+        targets.append({'id': format_id, 'format': report_format,
+                        'output_path': output_path, 'cache_info': cache_info})
+
+    # 全部命中缓存
+    if not targets:
+        return jsonify({'success': True, 'id': report_id, 'name': report_name,
+                        'reports': cached_reports, 'errors': {}})
+
+    try:
+        job = REPORT_JOB_QUEUE.submit(
+            run_multi_format_report_job,
+            report_id, report_name, report_type, start_date, end_date, region,
+            content_options, targets, cached_reports=cached_reports,
+            job_id=report_id, name=report_name
+        )
+    except ReportQueueFull as e:
+        return handle_error(str(e), 503)
+
+    if not run_async:
+        job.wait()
+        job_info = job.to_dict()
+        if job_info['status'] != 'completed':
+            return handle_error(job_info.get('error') or f"报告生成失败: {job_info['status']}")
+        return jsonify(job_info['result'])
+
+    return jsonify({
+        'success': True,
+        'id': report_id,
+        'job_id': job.id,
+        'name': report_name,
+        'type': report_type,
+        'formats': formats,
+        'status': job.status,
+        'status_url': f"/api/reports/jobs/{job.id}",
+        'reports': cached_reports,
+        'pending': [{'id': target['id'], 'format': target['format'],
+                     'file_name': os.path.basename(target['output_path']),
+                     'download_url': f"/api/reports/download/{os.path.basename(target['output_path'])}"}
+                    for target in targets]
+    }), 202
+
+# API路由 - 批量生成各城市报告
+@app.route('/api/reports/batch', methods=['POST'])
+def generate_batch_report():
+    try:
+        data = request.json
+        if not data:
+            return handle_error("请求数据为空", 400)
+
+        report_type = data.get('type', 'monthly')
+        start_date = data.get('startDate')
+        end_date = data.get('endDate')
+        batch_name = data.get('name', f"各城市空气质量{get_report_type_name(report_type)}")
+        try:
+            report_format = parse_report_formats(data.get('format', 'pdf'), None)[0]
+            include_summary = parse_bool(data.get('include_summary'), True)
+            content_options = parse_content_options(data.get('content'))
+        except ValueError as e:
+            return handle_error(f"参数错误: {e}", 400)
+
+        if not start_date or not end_date:
+            return handle_error("开始日期和结束日期不能为空", 400)
+
+        cities = resolve_batch_cities(data.get('cities'))
+        if not cities:
+            return handle_error("城市列表为空", 400)
+
+        batch_id = f"batch_{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        logger.info(f"收到批量报告请求: 类型={report_type}, 城市={len(cities)}个, "
+                    f"日期={start_date}至{end_date}, 格式={report_format}")
+
+        try:
+            job = REPORT_JOB_QUEUE.submit(
+                run_batch_report_job,
+                batch_id, batch_name, report_type, start_date, end_date, cities,
+                content_options, report_format, include_summary=include_summary,
+                job_id=batch_id, name=batch_name
+            )
+        except ReportQueueFull as e:
+            return handle_error(str(e), 503)
+
+        output_filename = f"{batch_id}.zip"
+        return jsonify({
+            'success': True,
+            'id': batch_id,
+            'job_id': job.id,
+            'name': batch_name,
+            'type': report_type,
+            'format': 'zip',
+            'report_format': report_format,
+            'cities': [city for _, city in cities],
+            'include_summary': include_summary,
+            'status': job.status,
+            'status_url': f"/api/reports/jobs/{job.id}",
+            'download_url': f"/api/reports/download/{output_filename}",
+            'file_name': output_filename
+        }), 202
+    except Exception as e:
+        logger.error(f"批量报告生成失败: {str(e)}\n{traceback.format_exc()}")
+        return handle_error(f"批量报告生成失败: {str(e)}")
+
+# API路由 - 报告任务列表
+@app.route('/api/reports/jobs', methods=['GET'])
+def list_report_jobs():
+    status = request.args.get('status')
+    return jsonify({
+        'jobs': REPORT_JOB_QUEUE.list_jobs(status),
+        'stats': REPORT_JOB_QUEUE.stats()
+    })
+
+# API路由 - 报告任务状态
+@app.route('/api/reports/jobs/<job_id>', methods=['GET'])
+def get_report_job(job_id):
+    job = REPORT_JOB_QUEUE.get(job_id)
+    if not job:
+        return handle_error(f"找不到报告任务 {job_id}", 404)
+    return jsonify(job.to_dict())
+
+# API路由 - 报告任务进度（轻量轮询）
+@app.route('/api/reports/jobs/<job_id>/progress', methods=['GET'])
+def get_report_job_progress(job_id):
+    job = REPORT_JOB_QUEUE.get(job_id)
+    if not job:
+        return handle_error(f"找不到报告任务 {job_id}", 404)
+    job_info = job.to_dict()
+    return jsonify({
+        'job_id': job_id,
+        'status': job_info['status'],
+        'progress': job_info['progress'],
+        'message': job_info['message']
+    })
+
+# API路由 - 取消报告任务
+@app.route('/api/reports/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_report_job(job_id):
+    job = REPORT_JOB_QUEUE.cancel(job_id)
+    if not job:
+        return handle_error(f"找不到报告任务 {job_id}", 404)
+    return jsonify(job.to_dict())
+
+# API路由 - 报告缓存统计
+@app.route('/api/reports/cache/stats', methods=['GET'])
+def get_report_cache_stats():
+    try:
+        stats = REPORT_CACHE.stats()
+        stats['watermark_cache'] = WATERMARK_CACHE.stats()
+        stats['change_events'] = get_change_subscriber(connect_reports_db).stats()
+        return jsonify(stats)
+    except Exception as e:
+        logger.error(f"获取报告缓存统计失败: {str(e)}")
+        return handle_error(f"获取报告缓存统计失败: {str(e)}")
+
+# API路由 - 报告存储占用
+@app.route('/api/reports/storage', methods=['GET'])
+def get_report_storage():
+    try:
+        scan_disk = request.args.get('scan', 'false').lower() == 'true'
+        return jsonify(REPORT_RETENTION.usage(scan_disk=scan_disk))
+    except Exception as e:
+        logger.error(f"获取报告存储占用失败: {str(e)}")
+        return handle_error(f"获取报告存储占用失败: {str(e)}")
+
+# API路由 - 立即执行报告保留策略
+@app.route('/api/reports/retention/run', methods=['POST'])
+def run_report_retention():
+    try:
+        return jsonify({'success': True, 'result': REPORT_RETENTION.enforce()})
+    except Exception as e:
+        logger.error(f"执行报告保留策略失败: {str(e)}\n{traceback.format_exc()}")
+        return handle_error(f"执行报告保留策略失败: {str(e)}")
+
+# API路由 - 下载报告
+@app.route('/api/reports/download/<filename>', methods=['GET'])
+def download_report(filename):
+    try:
+        if not filename:
+            logger.error("下载请求缺少文件名")
+            return handle_error("下载失败: 缺少报告ID", 400)
+            
+        # 记录下载请求
+        logger.info(f"收到报告下载请求: {filename}")
+        
+        # 提取report_id和扩展名
+        report_id = filename.split('.')[0] if '.' in filename else filename
+        ext = filename.split('.')[-1] if '.' in filename else ''
+
+        # 通过索引查找: 先按文件名，再按报告ID
+        report = REPORT_STORE.get_by_file_name(filename) or REPORT_STORE.get(report_id)
+
+        # 元数据中没有记录时，只在该扩展名对应的目录中查找
+        if not report:
+            if ext == 'pdf':
+                primary_dir = REPORTS_PDF_DIR
+            elif ext in ['xlsx', 'xls']:
+                primary_dir = REPORTS_EXCEL_DIR
+            elif ext in ['docx', 'doc']:
                 primary_dir = REPORTS_WORD_DIR
             elif ext == 'html':
                 primary_dir = REPORTS_HTML_DIR
+            elif ext == 'zip':
+                primary_dir = REPORTS_BATCH_DIR
             else:
                 primary_dir = REPORTS_DIR
-                
-            # 检查主要可能的位置
-            primary_path = os.path.join(primary_dir, filename)
-            if os.path.exists(primary_path) and os.path.isfile(primary_path):
-                logger.info(f"找到报告文件: {primary_path}")
-                # 创建临时报告记录
-                report = {
-                    'file_path': primary_path,
-                    'file_name': filename
-                }
-            else:
-                # 检查所有报告目录
-                potential_paths = [
-                    os.path.join(REPORTS_PDF_DIR, filename),
-                    os.path.join(REPORTS_EXCEL_DIR, filename),
-                    os.path.join(REPORTS_WORD_DIR, filename),
-                    os.path.join(REPORTS_HTML_DIR, filename),
-                    os.path.join(REPORTS_DIR, filename)
-                ]
-                
-                for path in potential_paths:
-                    if os.path.exists(path) and os.path.isfile(path):
-                        logger.info(f"找到报告文件: {path}")
-                        # 创建临时报告记录
-                        report = {
-                            'file_path': path,
-                            'file_name': filename
-                        }
-                        break
-        
+
+            # 先查分片目录，再查旧版本的平铺目录
+            for primary_path in (sharded_path(primary_dir, os.path.basename(filename), create=False),
+                                 os.path.join(primary_dir, os.path.basename(filename))):
+                if os.path.isfile(primary_path):
+                    logger.info(f"找到未登记的报告文件: {primary_path}")
+                    report = {
+                        'file_path': primary_path,
+                        'file_name': filename
+                    }
+                    break
+
         if not report:
             logger.error(f"报告文件不存在: {filename}")
             return handle_error("下载失败: 报告不存在或已被删除", 404)
@@ -861,13 +1110,35 @@ def download_report(filename):
             logger.warning(f"无法确定MIME类型: {str(mime_err)}")
             content_type = 'application/octet-stream'
         
+        # 记录下载时间，保留策略优先淘汰长期未下载的报告
+        if report.get('id'):
+            try:
+                REPORT_STORE.touch(report['id'], datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+            except Exception as e:
+                logger.warning(f"记录报告下载时间失败: {str(e)}")
+        
+        # 报告文件内容不变，以sha256作为强ETag（首次下载时计算并写回元数据）
+        etag = report.get('sha256')
+        if not etag and report.get('id'):
+            try:
+                etag = file_sha256(file_path)
+                REPORT_STORE.update(report['id'], sha256=etag)
+            except Exception as e:
+                logger.warning(f"计算报告文件哈希失败: {str(e)}")
+                etag = None
+        
         try:
             logger.info(f"发送报告文件: {file_path}, 类型: {content_type}")
+            # conditional=True: 支持Range断点续传和If-None-Match/If-Modified-Since条件请求
             return send_file(
                 file_path,
                 mimetype=content_type,
                 as_attachment=True,
-                download_name=report.get('file_name', os.path.basename(file_path))
+                download_name=report.get('file_name', os.path.basename(file_path)),
+                conditional=True,
+                etag=etag or True,
+                last_modified=os.path.getmtime(file_path),
+                max_age=REPORT_DOWNLOAD_MAX_AGE
             )
         except Exception as send_err:
             logger.error(f"发送文件失败: {str(send_err)}")
@@ -938,12 +1209,14 @@ def service_status():
         # 检查报告元数据
         metadata_status = "ok"
         try:
-            reports = load_report_metadata()
-            metadata_details = {"count": len(reports) if reports else 0}
+            metadata_details = {"count": REPORT_STORE.count(), "store": REPORT_STORE_PATH}
         except Exception as e:
             metadata_status = "error"
             metadata_details = {"error": str(e)}
         
+        # 报告存储占用
+        storage_details = REPORT_RETENTION.usage()
+        
         # 构建完整状态报告
         status_report = {
             'status': 'ok',  # 默认值
@@ -964,6 +1237,22 @@ def service_status():
                 'metadata': {
                     'status': metadata_status,
                     'details': metadata_details
+                },
+                'job_queue': {
+                    'status': 'ok',
+                    'details': REPORT_JOB_QUEUE.stats()
+                },
+                'cache': {
+                    'status': 'ok' if REPORT_CACHE.enabled else 'disabled',
+                    'details': REPORT_CACHE.stats()
+                },
+                'charts': {
+                    'status': 'ok',
+                    'details': CHART_POOL.stats()
+                },
+                'storage': {
+                    'status': 'warning' if (storage_details['usage_ratio'] or 0) > 1 else 'ok',
+                    'details': storage_details
                 }
             },
             'version': '1.0.0',
@@ -985,1347 +1274,264 @@ def service_status():
         logger.error(f"获取服务状态失败: {str(e)}\n{traceback.format_exc()}")
         return handle_error(f"获取服务状态失败: {str(e)}")
 
-# 根据AQI值获取空气质量等级
-def get_air_quality_category(aqi):
-    if aqi <= 50:
-        return "优"
-    elif aqi <= 100:
-        return "良"
-    elif aqi <= 150:
-        return "轻度污染"
-    elif aqi <= 200:
-        return "中度污染"
-    elif aqi <= 300:
-        return "重度污染"
-    else:
-        return "严重污染"
+# 报告任务进度上报 - 未在任务中运行时(job为None)不做任何处理
+def report_progress(job, progress, message=None):
+    if job is not None:
+        job.update_progress(progress, message)
+
+def report_stage(job, stage_name):
+    return job.stage(stage_name) if job is not None else nullcontext()
+
+# 根据报告数据构建图表规格
+def build_report_chart_specs(data, content_options):
+    """构建报告需要的图表规格列表（供图表渲染池使用）"""
+    frame = data.get('frame')
+    if frame is None or frame.empty:
+        return []
+
+    specs = []
+    if content_options.get('trends', True) and frame['date'].nunique() > 1:
+        daily = frame.groupby('date', as_index=False)['aqi'].mean()
+        specs.append({
+            'name': 'aqi_trend',
+            'kind': 'line',
+            'data': daily,
+            'options': {'x_column': 'date', 'y_columns': ['aqi'], 'title': 'AQI日均值变化趋势',
+                        'xlabel': '日期', 'ylabel': 'AQI', 'include_markers': len(daily) <= 62}
+        })
+    if content_options.get('air_quality', True) and frame['city'].nunique() > 1:
+        city_avg = (frame.groupby('city', observed=True, as_index=False)['aqi'].mean()
+                    .sort_values('aqi', ascending=False))
+        city_avg['city'] = city_avg['city'].astype(str)
+        specs.append({
+            'name': 'city_aqi',
+            'kind': 'bar',
+            'data': city_avg,
+            'options': {'x_column': 'city', 'y_column': 'aqi', 'title': '各城市平均AQI',
+                        'xlabel': '城市', 'ylabel': 'AQI'}
+        })
+    if content_options.get('pollutants', True):
+        labels = {'pm25': 'PM2.5', 'pm10': 'PM10', 'so2': 'SO2', 'no2': 'NO2', 'o3': 'O3'}
+        means = frame[list(labels)].mean().dropna()
+        if not means.empty:
+            pollutant_avg = pd.DataFrame({
+                'pollutant': [labels[column] for column in means.index],
+                'value': means.values.round(1)
+            })
+            specs.append({
+                'name': 'pollutant_avg',
+                'kind': 'bar',
+                'data': pollutant_avg,
+                'options': {'x_column': 'pollutant', 'y_column': 'value', 'title': '主要污染物平均浓度',
+                            'xlabel': '污染物', 'ylabel': '浓度(μg/m³)', 'color': '#fa8c16'}
+            })
+    return specs
+
+# 并发渲染报告图表
+def render_report_charts(data, content_options, job=None):
+    """渲染报告图表并记录每个图表的耗时
+
+    Returns:
+        list: 渲染成功的图表，每项包含name、title、png
+    """
+    specs = build_report_chart_specs(data, content_options)
+    if not specs:
+        return []
+
+    results = CHART_POOL.render_many(specs)
+    charts = []
+    for result in results:
+        if job is not None:
+            job.record_timing(f"chart:{result['name']}", result['render_seconds'])
+        if result['png']:
+            charts.append(result)
+    logger.info(f"报告图表渲染完成: {len(charts)}/{len(specs)}个, "
+                f"缓存命中{sum(1 for r in results if r['cached'])}个")
+    return charts
+
+# 将前端内容选项映射到后端内容选项
+def map_content_options(content_options):
+    return {
+        'air_quality': content_options.get('overview', True),
+        'pollutants': content_options.get('pollution', True),
+        'trends': content_options.get('trend', True),
+        'alerts': content_options.get('warning', True),
+        'recommendations': content_options.get('policy', False)
+    }
+
+# 用已加载的数据渲染一份报告文件
+def render_report_file(data, report_type, start_date, end_date, region, mapped_options,
+                       report_format, output_path, job=None, track_progress=True):
+    """渲染图表并调用对应格式的生成器写出报告文件
+
+    Args:
+        data (ReportDataset): 报告数据
+        mapped_options (dict): 后端内容选项（见map_content_options）
+        job (ReportJob): 所属任务，用于阶段计时和取消检查
+        track_progress (bool): 是否上报单报告进度，批量任务中由调用方统一上报
+
+    Returns:
+        str: 报告文件路径，或带有错误信息的字典
+    """
+    progress = (lambda p, msg: report_progress(job, p, msg)) if track_progress else (lambda p, msg: None)
+    
+    # 渲染图表（并发，结果缓存），Excel报告使用原生图表，不需要渲染图片
+    if report_format in ('pdf', 'word', 'html'):
+        progress(25, '渲染图表')
+        with report_stage(job, 'charts'):
+            data.charts = render_report_charts(data, mapped_options, job=job)
+    
+    # 根据格式生成不同类型的报告，生成器在渲染进程池中执行，批量报告的多个城市可以真正并行
+    progress(40, f"渲染{report_format}报告")
+    with report_stage(job, 'render'):
+        result, _ = CHART_POOL.submit(render_format_file, data, mapped_options, output_path, report_type,
+                                      region, start_date, end_date, report_format).result()
+    progress(90, '保存报告')
+    return result
+
+# 加载并检查报告数据
+def load_report_data(start_date, end_date, region, content_options, job=None):
+    """加载报告数据，数据加载失败或为空时返回带有错误信息的字典"""
+    # 加载空气质量数据 - 确保禁用模拟数据
+    report_progress(job, 10, '加载空气质量数据')
+    with report_stage(job, 'load_data'):
+        data = load_air_quality_data(start_date, end_date, region,
+                                     include_realtime=content_options.get('realtime'))
+    
+    # 检查数据是否包含错误
+    if 'error' in data:
+        error_msg = data.get('error', '未知错误')
+        logger.warning(f"数据加载过程中发生错误: {error_msg}")
+        return {'error': f"数据加载失败: {error_msg}"}
+    
+    # 检查数据是否都为空 - 只有当AQI数据和污染物数据都为空时才返回错误
+    aqi_empty = data.get('aqi_data') is None or data.get('aqi_data').empty
+    poll_empty = data.get('pollutants') is None or data.get('pollutants').empty
+    
+    if aqi_empty and poll_empty:
+        logger.warning(f"所选时间段({start_date}至{end_date})和地区({region})没有可用的空气质量数据")
+        return {'error': f"所选时间段({start_date}至{end_date})和地区({get_region_name(region)})没有可用的空气质量数据，请选择其他时间范围或地区"}
+    
+    # 展示数据信息
+    logger.info(f"生成报告 - AQI数据: {0 if aqi_empty else len(data['aqi_data'])}条, 污染物数据: {0 if poll_empty else len(data['pollutants'])}条")
+    return data
 
 # 生成报告内容
-def generate_report_content(report_type, start_date, end_date, region, content_options, report_format, output_path):
+def generate_report_content(report_type, start_date, end_date, region, content_options, report_format, output_path, job=None):
     # 加载数据
     try:
-        # 加载空气质量数据 - 确保禁用模拟数据
-        data = load_air_quality_data(start_date, end_date, region)
-        
-        # 检查数据是否包含错误
-        if 'error' in data:
-            error_msg = data.get('error', '未知错误')
-            logger.warning(f"数据加载过程中发生错误: {error_msg}")
-            return {'error': f"数据加载失败: {error_msg}"}
-        
-        # 检查数据是否都为空 - 只有当AQI数据和污染物数据都为空时才返回错误
-        aqi_empty = data.get('aqi_data') is None or data.get('aqi_data').empty
-        poll_empty = data.get('pollutants') is None or data.get('pollutants').empty
-        
-        if aqi_empty and poll_empty:
-            logger.warning(f"所选时间段({start_date}至{end_date})和地区({region})没有可用的空气质量数据")
-            return {'error': f"所选时间段({start_date}至{end_date})和地区({get_region_name(region)})没有可用的空气质量数据，请选择其他时间范围或地区"}
-        
-        # 展示数据信息
-        logger.info(f"生成报告 - AQI数据: {0 if aqi_empty else len(data['aqi_data'])}条, 污染物数据: {0 if poll_empty else len(data['pollutants'])}条")
+        data = load_report_data(start_date, end_date, region, content_options, job=job)
+        if isinstance(data, dict):
+            return data
         
         # 生成报告
         logger.info(f"生成{report_type}报告: {start_date}至{end_date}, 区域={region}, 格式={report_format}")
         logger.info(f"内容选项: {content_options}")
         
         # 将前端内容选项映射到后端内容选项
-        mapped_options = {
-            'air_quality': content_options.get('overview', True),
-            'pollutants': content_options.get('pollution', True),
-            'trends': content_options.get('trend', True),
-            'alerts': content_options.get('warning', True),
-            'recommendations': content_options.get('policy', False)
-        }
-        
-        # 根据格式生成不同类型的报告
-        if report_format == 'pdf':
-            result = generate_pdf_report(data, mapped_options, output_path, report_type, region, start_date, end_date)
-        elif report_format == 'excel':
-            result = generate_excel_report(data, mapped_options, output_path, report_type, region, start_date, end_date)
-        elif report_format == 'word':
-            result = generate_word_report(data, mapped_options, output_path, report_type, region, start_date, end_date)
-        elif report_format == 'html':
-            result = generate_html_report(data, mapped_options, output_path, report_type, region, start_date, end_date)
-        else:
-            logger.error(f"不支持的报告格式: {report_format}")
-            return {'error': f"不支持的报告格式: {report_format}"}
+        mapped_options = map_content_options(content_options)
         
-        # 检查报告文件是否成功生成
-        if not os.path.exists(output_path):
-            logger.error(f"报告文件未生成: {output_path}")
-            return {'error': f"报告文件未生成: {output_path}"}
-        
-        # 检查文件大小是否合理（至少应该有1KB）
-        file_size = os.path.getsize(output_path)
-        if file_size < 1024:
-            logger.warning(f"报告文件大小异常: {file_size} 字节")
-        
-        logger.info(f"报告生成成功: {output_path}, 大小: {file_size} 字节")
-        return output_path
+        return render_report_file(data, report_type, start_date, end_date, region,
+                                  mapped_options, report_format, output_path, job=job)
+    except ReportJobCancelled:
+        # 任务被取消，清理未完成的文件后交给任务队列处理
+        if os.path.exists(output_path):
+            try:
+                os.remove(output_path)
+            except OSError:
+                pass
+        raise
     except Exception as e:
         logger.error(f"报告生成失败: {str(e)}\n{traceback.format_exc()}")
         return {'error': f"报告生成失败: {str(e)}"}
 
-# 生成PDF报告
-def generate_pdf_report(data, content_options, output_path, report_type, region, start_date, end_date):
-    """生成PDF格式的报告
-    
+# 多格式报告内容 - 一次加载、一次渲染图表，各格式生成器在渲染进程池中并行写出
+def generate_multi_format_content(report_type, start_date, end_date, region, content_options, outputs, job=None):
+    """用同一份数据和图表生成多个格式的报告
+
     Args:
-        data (dict): 数据字典，包含AQI数据和污染物数据
-        content_options (dict): 内容选项，指定要包含的内容
-        output_path (str): 输出文件路径
-        report_type (str): 报告类型
-        region (str): 地区
-        start_date (str): 开始日期
-        end_date (str): 结束日期
-        
+        outputs (dict): 报告格式 -> 输出文件路径
+        job (ReportJob): 所属任务，用于上报进度和检查取消
+
     Returns:
-        str: 生成的报告文件路径，或者带有错误信息的字典
+        dict: 报告格式 -> 文件路径或带有错误信息的字典；数据加载失败时返回 {'error': ...}
     """
+    futures = {}
     try:
-        logger.info(f"开始生成PDF报告: {output_path}")
-        logger.info(f"内容选项: {content_options}")
-        
-        # 检查数据有效性
-        if data is None or not isinstance(data, dict):
-            error_msg = "无效的数据格式"
-            logger.error(error_msg)
-            return {'error': error_msg}
-            
-        aqi_data = data.get('aqi_data')
-        pollutants = data.get('pollutants')
-        
-        if aqi_data is None or pollutants is None:
-            error_msg = "数据中缺少AQI数据或污染物数据"
-            logger.error(error_msg)
-            return {'error': error_msg}
-            
-        # 确保输出目录存在
-        output_dir = os.path.dirname(output_path)
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # 注册中文字体
-        font_path = DEFAULT_FONT_PATH
-        if not os.path.exists(font_path):
-            font_path = os.path.join(FONTS_DIR, 'simhei.ttf')
-            if not os.path.exists(font_path):
-                # 尝试使用系统字体
-                system_fonts = ['C:/Windows/Fonts/simhei.ttf', '/usr/share/fonts/truetype/arphic/uming.ttc']
-                for sf in system_fonts:
-                    if os.path.exists(sf):
-                        font_path = sf
-                        break
-        
-        if os.path.exists(font_path):
-            logger.info(f"使用字体: {font_path}")
-            pdfmetrics.registerFont(TTFont('SimHei', font_path))
-        else:
-            logger.warning("找不到中文字体，将使用默认字体")
-        
-        # 创建PDF文档
-        logger.info("创建PDF文档...")
-        pdf_buffer = io.BytesIO()
-        c = canvas.Canvas(pdf_buffer, pagesize=A4)
-        width, height = A4
-        
-        # 页码计数器
-        page_number = 1
-        
-        # 函数：添加页眉和页码
-        def add_header_and_footer():
-            # 页眉
-            c.setFont('SimHei' if os.path.exists(font_path) else 'Helvetica', 10)
-            c.drawString(50, height - 20, f"广东省空气质量监测系统 - {get_report_type_name(report_type)}报告")
-            c.drawRightString(width - 50, height - 20, f"时间范围: {start_date} 至 {end_date}")
-            
-            # 页脚
-            c.drawString(50, 20, f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-            c.drawRightString(width - 50, 20, f"第 {page_number} 页")
-        
-        # 设置标题
-        c.setFont('SimHei' if os.path.exists(font_path) else 'Helvetica', 18)
-        title = f"广东省空气质量监测系统 - {get_report_type_name(report_type)}报告"
-        c.drawCentredString(width/2, height-50, title)
-        
-        # 设置副标题
-        c.setFont('SimHei' if os.path.exists(font_path) else 'Helvetica', 12)
-        subtitle = f"时间范围: {start_date} 至 {end_date}   地区: {get_region_name(region)}"
-        c.drawCentredString(width/2, height-80, subtitle)
-        
-        # 绘制分隔线
-        c.line(50, height-90, width-50, height-90)
-        
-        # 添加页眉页脚
-        add_header_and_footer()
-        
-        # 当前位置（Y坐标）
-        y_position = height - 120
-        
-        # 添加摘要
-        if not aqi_data.empty:
-            c.setFont('SimHei' if os.path.exists(font_path) else 'Helvetica', 12)
-            c.drawString(50, y_position, "空气质量摘要")
-            y_position -= 20
-            
-            # 计算平均AQI
-            avg_aqi = round(aqi_data['aqi'].mean(), 1)
-            # 获取最高AQI
-            max_aqi = aqi_data['aqi'].max()
-            # 获取最高AQI的城市
-            max_aqi_city = aqi_data.loc[aqi_data['aqi'].idxmax()]['city'] if len(aqi_data) > 0 else "无数据"
-            
-            # 绘制摘要信息
-            c.setFont('SimHei' if os.path.exists(font_path) else 'Helvetica', 10)
-            c.drawString(70, y_position, f"平均空气质量指数(AQI): {avg_aqi}")
-            y_position -= 15
-            c.drawString(70, y_position, f"最高空气质量指数: {max_aqi} ({max_aqi_city})")
-            y_position -= 15
-            c.drawString(70, y_position, f"空气质量等级: {get_air_quality_category(avg_aqi)}")
-            y_position -= 30
-        
-        # 添加空气质量概览部分
-        if content_options.get('air_quality', True) and not aqi_data.empty:
-            logger.info("添加空气质量概览...")
-            c.setFont('SimHei' if os.path.exists(font_path) else 'Helvetica', 12)
-            c.drawString(50, y_position, "空气质量概览")
-            y_position -= 20
-            
-            # 创建空气质量数据表格
-            cities = aqi_data['city'].unique()
-            rows = [["城市", "AQI", "质量等级"]]
-            
-            # 统计城市数量，以便规划表格布局
-            total_cities = len(cities)
-            logger.info(f"报告将包含 {total_cities} 个城市的数据")
-            
-            # 为所有城市添加数据
-            for city in cities:
-                city_data = aqi_data[aqi_data['city'] == city]
-                avg_city_aqi = round(city_data['aqi'].mean(), 1)
-                quality_level = get_air_quality_category(avg_city_aqi)
-                rows.append([city, str(avg_city_aqi), quality_level])
-            
-            # 绘制表格
-            table_width = width - 100
-            col_widths = [table_width * 0.4, table_width * 0.3, table_width * 0.3]
-            row_height = 20
-            rows_per_page = 25  # 每页最多显示的行数
-            
-            # 计算表格需要多少页
-            total_rows = len(rows)
-            
-            # 如果数据太多，需要分页
-            if y_position - (total_rows * row_height) < 50:
-                # 第一页能容纳的行数（考虑已用空间）
-                first_page_rows = max(1, min(rows_per_page, int((y_position - 50) / row_height)))
-                
-                # 绘制表头和第一页数据
-                for i in range(min(first_page_rows, total_rows)):
-                    row = rows[i]
-                    for j, cell in enumerate(row):
-                        x = 50 + sum(col_widths[:j])
-                        y = y_position - i * row_height
-                        
-                        # 绘制单元格
-                        if i == 0:  # 表头
-                            c.setFillColorRGB(0.9, 0.9, 0.9)
-                            c.rect(x, y - 15, col_widths[j], row_height, stroke=1, fill=1)
-                            c.setFillColorRGB(0, 0, 0)  # 重置填充颜色
-                            c.setFont('SimHei' if os.path.exists(font_path) else 'Helvetica-Bold', 9)
-                            # 居中显示表头文字
-                            text_width = c.stringWidth(cell, 'SimHei' if os.path.exists(font_path) else 'Helvetica-Bold', 9)
-                            text_x = x + (col_widths[j] - text_width) / 2
-                            c.drawString(text_x, y - 5, cell)
-                        else:
-                            c.setFont('SimHei' if os.path.exists(font_path) else 'Helvetica', 9)
-                            # 居中显示数据
-                            text_width = c.stringWidth(cell, 'SimHei' if os.path.exists(font_path) else 'Helvetica', 9)
-                            text_x = x + (col_widths[j] - text_width) / 2
-                            c.drawString(text_x, y - 5, cell)
-                            c.rect(x, y - 15, col_widths[j], row_height, stroke=1, fill=0)
-                
-                # 处理剩余的行
-                if total_rows > first_page_rows:
-                    # 开始新页面
-                    c.showPage()
-                    page_number += 1
-                    add_header_and_footer()
-                    
-                    # 重新绘制表头
-                    y_position = height - 120
-                    c.setFont('SimHei' if os.path.exists(font_path) else 'Helvetica', 12)
-                    c.drawString(50, y_position, "空气质量概览 (续)")
-                    y_position -= 20
-                    
-                    # 在新页面重新绘制表头
-                    header_row = rows[0]
-                    for j, cell in enumerate(header_row):
-                        x = 50 + sum(col_widths[:j])
-                        y = y_position
-                        
-                        c.setFillColorRGB(0.9, 0.9, 0.9)
-                        c.rect(x, y - 15, col_widths[j], row_height, stroke=1, fill=1)
-                        c.setFillColorRGB(0, 0, 0)
-                        c.setFont('SimHei' if os.path.exists(font_path) else 'Helvetica-Bold', 9)
-                        c.drawString(x + 2, y, cell)
-                        c.rect(x, y - 15, col_widths[j], row_height, stroke=1, fill=0)
-                    
-                    # 计算剩余的行
-                    remaining_rows = total_rows - first_page_rows
-                    rows_per_new_page = min(rows_per_page - 1, int((height - 150) / row_height))  # 减去表头和页眉页脚
-                    pages_needed = (remaining_rows + rows_per_new_page - 1) // rows_per_new_page
-                    
-                    row_index = first_page_rows
-                    for page in range(pages_needed):
-                        start_row = row_index
-                        end_row = min(row_index + rows_per_new_page, total_rows)
-                        
-                        for i in range(start_row, end_row):
-                            row = rows[i]
-                            row_pos = i - start_row + 1  # +1是因为表头占一行
-                            
-                            for j, cell in enumerate(row):
-                                x = 50 + sum(col_widths[:j])
-                                y = y_position - row_pos * row_height
-                                
-                                c.setFont('SimHei' if os.path.exists(font_path) else 'Helvetica', 9)
-                                c.drawString(x + 2, y - 5, cell)
-                                c.rect(x, y - 15, col_widths[j], row_height, stroke=1, fill=0)
-                        
-                        row_index = end_row
-                        
-                        # 如果还有更多页，创建新页面
-                        if page < pages_needed - 1:
-                            c.showPage()
-                            page_number += 1
-                            add_header_and_footer()
-                            
-                            # 重设Y位置
-                            y_position = height - 120
-                            c.setFont('SimHei' if os.path.exists(font_path) else 'Helvetica', 12)
-                            c.drawString(50, y_position, "空气质量概览 (续)")
-                            y_position -= 20
-                            
-                            # 重新绘制表头
-                            header_row = rows[0]
-                            for j, cell in enumerate(header_row):
-                                x = 50 + sum(col_widths[:j])
-                                y = y_position
-                                
-                                c.setFillColorRGB(0.9, 0.9, 0.9)
-                                c.rect(x, y - 15, col_widths[j], row_height, stroke=1, fill=1)
-                                c.setFillColorRGB(0, 0, 0)
-                                c.setFont('SimHei' if os.path.exists(font_path) else 'Helvetica-Bold', 9)
-                                c.drawString(x + 2, y, cell)
-                                c.rect(x, y - 15, col_widths[j], row_height, stroke=1, fill=0)
-            else:
-                # 如果一页足够，直接绘制所有行
-                for i, row in enumerate(rows):
-                    for j, cell in enumerate(row):
-                        x = 50 + sum(col_widths[:j])
-                        y = y_position - i * row_height
-                        
-                        if i == 0:  # 表头
-                            c.setFillColorRGB(0.9, 0.9, 0.9)
-                            c.rect(x, y - 15, col_widths[j], row_height, stroke=1, fill=1)
-                            c.setFillColorRGB(0, 0, 0)
-                            c.setFont('SimHei' if os.path.exists(font_path) else 'Helvetica-Bold', 9)
-                        else:
-                            c.setFont('SimHei' if os.path.exists(font_path) else 'Helvetica', 9)
-                            
-                        c.drawString(x + 2, y - 5, cell)
-                        c.rect(x, y - 15, col_widths[j], row_height, stroke=1, fill=0)
-            
-            # 更新Y位置（前进至表格末尾）
-            if total_rows <= rows_per_page:
-                y_position -= (total_rows + 1) * row_height
-            else:
-                # 如果已分页，则Y位置是当前页最后绘制的位置
-                y_position -= ((row_index - start_row) + 2) * row_height
-            
-            y_position -= 20  # 与下一部分保持间距
-        
-        # 添加污染物分析部分
-        if content_options.get('pollutants', True) and not pollutants.empty:
-            # 如果空间不足，换页
-            if y_position < 200:
-                c.showPage()
-                page_number += 1
-                add_header_and_footer()
-                y_position = height - 120
-            
-            logger.info("添加污染物分析...")
-            c.setFont('SimHei' if os.path.exists(font_path) else 'Helvetica', 12)
-            c.drawString(50, y_position, "污染物分析")
-            y_position -= 25  # 适当间距
-            
-            # 计算各污染物平均值
-            pollutants_avg = {
-                'PM2.5': round(pollutants['pm25'].mean(), 1),
-                'PM10': round(pollutants['pm10'].mean(), 1),
-                'SO2': round(pollutants['so2'].mean(), 1),
-                'NO2': round(pollutants['no2'].mean(), 1),
-                'O3': round(pollutants['o3'].mean(), 1),
-                'CO': round(pollutants['co'].mean(), 2)
-            }
-            
-            # 绘制污染物均值表格
-            c.setFont('SimHei' if os.path.exists(font_path) else 'Helvetica', 10)
-            c.drawString(70, y_position, "主要污染物平均浓度:")
-            y_position -= 25  # 适当间距
-            
-            # 绘制表头
-            pollutants_table_width = width - 140
-            col_width = pollutants_table_width / 6  # 6个污染物
-            row_height = 30  # 大幅增加行高
-            
-            # 表头
-            headers = ['PM2.5', 'PM10', 'SO2', 'NO2', 'O3', 'CO']
-            for i, header in enumerate(headers):
-                x = 70 + i * col_width
-                c.setFillColorRGB(0.9, 0.9, 0.9)
-                c.rect(x, y_position - 20, col_width, row_height, stroke=1, fill=1)
-                c.setFillColorRGB(0, 0, 0)
-                c.setFont('SimHei' if os.path.exists(font_path) else 'Helvetica-Bold', 9)
-                # 居中显示表头文字
-                text_width = c.stringWidth(header, 'SimHei' if os.path.exists(font_path) else 'Helvetica-Bold', 9)
-                text_x = x + (col_width - text_width) / 2
-                c.drawString(text_x, y_position - 5, header)
-            
-            y_position -= row_height + 5  # 增加行间距
-            
-            # 数据行
-            values = list(pollutants_avg.values())
-            for i, value in enumerate(values):
-                x = 70 + i * col_width
-                c.setFont('SimHei' if os.path.exists(font_path) else 'Helvetica', 9)
-                c.rect(x, y_position - 20, col_width, row_height, stroke=1, fill=0)
-                # 居中显示数据
-                value_str = str(value)
-                text_width = c.stringWidth(value_str, 'SimHei' if os.path.exists(font_path) else 'Helvetica', 9)
-                text_x = x + (col_width - text_width) / 2
-                c.drawString(text_x, y_position - 5, value_str)
-            
-            y_position -= (row_height + 40)  # 大幅增加间距
-            
-            # 添加各城市污染物表格
-            c.setFont('SimHei' if os.path.exists(font_path) else 'Helvetica', 10)
-            c.drawString(70, y_position, "各城市主要污染物指标:")
-            y_position -= 25  # 适当间距
-            
-            # 创建城市污染物表格
-            cities = pollutants['city'].unique()
-            rows = [["城市", "PM2.5", "PM10", "SO2", "NO2", "O3", "CO"]]
-            
-            for city in cities:
-                city_data = pollutants[pollutants['city'] == city]
-                pm25 = round(city_data['pm25'].mean(), 1)
-                pm10 = round(city_data['pm10'].mean(), 1)
-                so2 = round(city_data['so2'].mean(), 1)
-                no2 = round(city_data['no2'].mean(), 1)
-                o3 = round(city_data['o3'].mean(), 1)
-                co = round(city_data['co'].mean(), 2)
-                
-                rows.append([city, str(pm25), str(pm10), str(so2), str(no2), str(o3), str(co)])
-            
-            # 设置表格参数
-            table_width = width - 140  # 表格总宽度
-            col_widths = [
-                table_width * 0.25,  # 城市名称列宽度
-                table_width * 0.125,  # PM2.5列宽度
-                table_width * 0.125,  # PM10列宽度
-                table_width * 0.125,  # SO2列宽度
-                table_width * 0.125,  # NO2列宽度
-                table_width * 0.125,  # O3列宽度
-                table_width * 0.125   # CO列宽度
-            ]
-            
-            # 固定参数
-            row_height = 25  # 行高
-            x_start = 70     # 表格起始x坐标
-            max_rows_per_page = 15  # 每页最多行数
-            
-            # 绘制表格
-            row_index = 0
-            while row_index < len(rows):
-                # 检查是否需要新页面
-                if row_index > 0 and (row_index % max_rows_per_page == 0 or y_position < 150):
-                    c.showPage()
-                    page_number += 1
-                    add_header_and_footer()
-                    y_position = height - 120
-                    
-                    c.setFont('SimHei' if os.path.exists(font_path) else 'Helvetica', 12)
-                    c.drawString(50, y_position, "污染物分析 (续)")
-                    y_position -= 25
-                    
-                    # 重新绘制表头
-                    draw_table_header = True
-                else:
-                    draw_table_header = (row_index == 0)
-                
-                # 计算本页要绘制的行数
-                remaining_rows = len(rows) - row_index
-                rows_this_page = min(remaining_rows, max_rows_per_page if row_index > 0 else max_rows_per_page - 1)
-                
-                # 绘制表头
-                if draw_table_header:
-                    header_row = rows[0]
-                    for i, header in enumerate(header_row):
-                        x = x_start + sum(col_widths[:i])
-                        
-                        # 绘制表头背景和边框
-                        c.setFillColorRGB(0.9, 0.9, 0.9)  # 浅灰色背景
-                        c.rect(x, y_position - row_height, col_widths[i], row_height, stroke=1, fill=1)
-                        c.setFillColorRGB(0, 0, 0)  # 重置为黑色
-                        
-                        # 绘制表头文字
-                        c.setFont('SimHei' if os.path.exists(font_path) else 'Helvetica-Bold', 9)
-                        text_width = c.stringWidth(header, 'SimHei' if os.path.exists(font_path) else 'Helvetica-Bold', 9)
-                        text_x = x + (col_widths[i] - text_width) / 2  # 水平居中
-                        c.drawString(text_x, y_position - row_height + 8, header)  # 垂直居中
-                    
-                    y_position -= row_height
-                    
-                    # 如果是第一页，跳过表头行，因为已经绘制了
-                    if row_index == 0:
-                        row_index += 1
-                
-                # 绘制数据行
-                for i in range(rows_this_page):
-                    current_row = row_index + i
-                    if current_row >= len(rows):
-                        break
-                        
-                    row = rows[current_row]
-                    
-                    for j, cell in enumerate(row):
-                        x = x_start + sum(col_widths[:j])
-                        
-                        # 绘制单元格边框
-                        c.rect(x, y_position - row_height, col_widths[j], row_height, stroke=1, fill=0)
-                        
-                        # 绘制单元格内容
-                        c.setFont('SimHei' if os.path.exists(font_path) else 'Helvetica', 9)
-                        
-                        if j == 0:  # 城市名称列左对齐
-                            c.drawString(x + 5, y_position - row_height + 8, cell)
-                        else:  # 数值列居中对齐
-                            text_width = c.stringWidth(cell, 'SimHei' if os.path.exists(font_path) else 'Helvetica', 9)
-                            text_x = x + (col_widths[j] - text_width) / 2
-                            c.drawString(text_x, y_position - row_height + 8, cell)
-                    
-                    y_position -= row_height
-                
-                # 更新行索引
-                row_index += rows_this_page
-                
-                # 如果还有更多行要绘制，则添加新页面
-                if row_index < len(rows):
-                    continue
-            
-            # 表格结束后添加适当间距
-            y_position -= 20
-        
-        # 添加趋势变化部分
-        if content_options.get('trends', True) and not aqi_data.empty:
-            # 如果空间不足，换页
-            if y_position < 200:
-                c.showPage()
-                page_number += 1
-                add_header_and_footer()
-                y_position = height - 120
-            
-            logger.info("添加趋势变化...")
-            c.setFont('SimHei' if os.path.exists(font_path) else 'Helvetica', 12)
-            c.drawString(50, y_position, "趋势变化")
-            y_position -= 20
-            
-            # 对于PDF，添加趋势说明文字
-            c.setFont('SimHei' if os.path.exists(font_path) else 'Helvetica', 10)
-            c.drawString(70, y_position, "空气质量指数变化趋势(PDF格式限制，无法显示图表):")
-            y_position -= 15
-            
-            # 计算并描述变化趋势
-            if len(aqi_data['date'].unique()) > 1:
-                # 有多天数据，可计算趋势
-                earliest_date = aqi_data['date'].min()
-                latest_date = aqi_data['date'].max()
-                earliest_avg = aqi_data[aqi_data['date'] == earliest_date]['aqi'].mean()
-                latest_avg = aqi_data[aqi_data['date'] == latest_date]['aqi'].mean()
-                
-                change_pct = ((latest_avg - earliest_avg) / earliest_avg) * 100 if earliest_avg > 0 else 0
-                
-                trend_text = f"从 {earliest_date} 到 {latest_date}，平均AQI从 {earliest_avg:.1f} 变化到 {latest_avg:.1f}，"
-                
-                if change_pct > 5:
-                    trend_text += f"上升了 {abs(change_pct):.1f}%，空气质量有所下降。"
-                elif change_pct < -5:
-                    trend_text += f"下降了 {abs(change_pct):.1f}%，空气质量有所改善。"
-                else:
-                    trend_text += "变化不大，空气质量基本稳定。"
-                
-                c.drawString(70, y_position, trend_text)
-            else:
-                c.drawString(70, y_position, "监测时间段过短，无法显示变化趋势。")
-            
-            y_position -= 30
-        
-        # 添加预警信息部分
-        if content_options.get('alerts', True) and not aqi_data.empty:
-            # 如果空间不足，换页
-            if y_position < 200:
-                c.showPage()
-                page_number += 1
-                add_header_and_footer()
-                y_position = height - 120
-            
-            logger.info("添加预警信息...")
-            c.setFont('SimHei' if os.path.exists(font_path) else 'Helvetica', 12)
-            c.drawString(50, y_position, "预警信息")
-            y_position -= 20
-            
-            # 查找AQI超标的城市
-            high_aqi_data = aqi_data[aqi_data['aqi'] > 100]
-            
-            if not high_aqi_data.empty:
-                c.setFont('SimHei' if os.path.exists(font_path) else 'Helvetica', 10)
-                c.drawString(70, y_position, f"发现 {len(high_aqi_data)} 个城市AQI超过100，可能对敏感人群健康造成影响:")
-                y_position -= 15
-                
-                # 列出超标城市
-                cities_warning = high_aqi_data.groupby('city')['aqi'].mean().reset_index()
-                cities_warning = cities_warning.sort_values(by='aqi', ascending=False)
-                
-                warning_text = ", ".join([f"{row['city']}({row['aqi']:.1f})" for _, row in cities_warning.iterrows()])
-                
-                # 处理长文本换行
-                max_width = width - 140
-                words = warning_text.split(", ")
-                lines = []
-                current_line = ""
-                
-                for word in words:
-                    test_line = current_line + word + ", " if current_line else word + ", "
-                    if c.stringWidth(test_line, 'SimHei' if os.path.exists(font_path) else 'Helvetica', 9) < max_width:
-                        current_line = test_line
-                    else:
-                        lines.append(current_line)
-                        current_line = word + ", "
-                
-                if current_line:
-                    lines.append(current_line)
-                
-                # 绘制文本
-                for line in lines:
-                    c.drawString(90, y_position, line)
-                    y_position -= 15
-            else:
-                c.setFont('SimHei' if os.path.exists(font_path) else 'Helvetica', 10)
-                c.drawString(70, y_position, "监测期间内未发现明显空气质量超标情况。")
-                y_position -= 15
-            
-            y_position -= 15
-        
-        # 添加政策建议部分
-        if content_options.get('recommendations', False):
-            # 如果空间不足，换页
-            if y_position < 200:
-                c.showPage()
-                page_number += 1
-                add_header_and_footer()
-                y_position = height - 120
-            
-            logger.info("添加政策建议...")
-            c.setFont('SimHei' if os.path.exists(font_path) else 'Helvetica', 12)
-            c.drawString(50, y_position, "政策建议")
-            y_position -= 20
-            
-            # 根据空气质量给出建议
-            recommendations = [
-                "实施工业企业限产停产措施，减少污染物排放",
-                "加强道路扬尘治理，增加洒水降尘频次",
-                "建议公众减少户外活动，外出佩戴口罩",
-                "加大环保执法力度，严厉打击违法排污行为"
-            ]
-            
-            # 绘制建议列表
-            c.setFont('SimHei' if os.path.exists(font_path) else 'Helvetica', 10)
-            for i, rec in enumerate(recommendations):
-                c.drawString(70, y_position, "• " + rec)
-                y_position -= 15
-        
-        # 完成文档
-        c.save()
-        
-        # 获取PDF内容并写入文件
-        pdf_data = pdf_buffer.getvalue()
-        with open(output_path, 'wb') as f:
-            f.write(pdf_data)
-        
-        # 验证文件是否已创建
-        if os.path.exists(output_path):
-            logger.info(f"PDF报告生成成功: {output_path}")
-            return output_path
-        else:
-            error_msg = f"PDF文件写入失败: {output_path}"
-            logger.error(error_msg)
-            return {'error': error_msg}
-    except Exception as e:
-        error_msg = f"生成PDF报告失败: {str(e)}"
-        logger.error(f"{error_msg}\n{traceback.format_exc()}")
-        return {'error': error_msg}
+        data = load_report_data(start_date, end_date, region, content_options, job=job)
+        if isinstance(data, dict):
+            return data
 
-# 生成Excel报告
-def generate_excel_report(data, content_options, output_path, report_type, region, start_date, end_date):
-    try:
-        # 创建Excel工作簿
-        wb = openpyxl.Workbook()
-        
-        # 创建报告信息工作表
-        info_sheet = wb.active
-        info_sheet.title = "报告信息"
-        
-        # 添加标题和基本信息
-        info_sheet['A1'] = "广东省空气质量监测报告"
-        info_sheet['A1'].font = Font(size=16, bold=True)
-        info_sheet.merge_cells('A1:D1')
-        info_sheet['A1'].alignment = Alignment(horizontal='center')
-        
-        info_sheet['A3'] = "区域:"
-        info_sheet['B3'] = region if region != 'all' else '全省'
-        info_sheet['A4'] = "时间范围:"
-        info_sheet['B4'] = f"{start_date} 至 {end_date}"
-        info_sheet['A5'] = "生成时间:"
-        info_sheet['B5'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
-        # 1. 空气质量数据工作表
-        if content_options.get('air_quality', True) and not data['aqi_data'].empty:
-            aqi_sheet = wb.create_sheet("空气质量数据")
-            
-            # 添加表头
-            headers = ['日期', 'AQI', '质量等级', '城市']
-            for col, header in enumerate(headers, 1):
-                aqi_sheet.cell(row=1, column=col, value=header).font = Font(bold=True)
-            
-            # 添加数据
-            aqi_data = data['aqi_data']
-            for row_idx, (_, row) in enumerate(aqi_data.iterrows(), 2):
-                aqi_sheet.cell(row=row_idx, column=1, value=str(row.get('date', '')))
-                aqi_sheet.cell(row=row_idx, column=2, value=row.get('aqi', ''))
-                aqi_sheet.cell(row=row_idx, column=3, value=row.get('quality_level', ''))
-                aqi_sheet.cell(row=row_idx, column=4, value=row.get('city', ''))
-        
-        # 2. 污染物数据工作表
-        if content_options.get('pollutants', True) and not data['pollutants'].empty:
-            poll_sheet = wb.create_sheet("污染物数据")
-            
-            # 添加表头
-            headers = ['日期', 'PM2.5', 'PM10', 'SO2', 'NO2', 'O3', 'CO', '城市']
-            for col, header in enumerate(headers, 1):
-                poll_sheet.cell(row=1, column=col, value=header).font = Font(bold=True)
-            
-            # 添加数据
-            poll_data = data['pollutants']
-            for row_idx, (_, row) in enumerate(poll_data.iterrows(), 2):
-                poll_sheet.cell(row=row_idx, column=1, value=str(row.get('date', '')))
-                poll_sheet.cell(row=row_idx, column=2, value=row.get('pm25', ''))
-                poll_sheet.cell(row=row_idx, column=3, value=row.get('pm10', ''))
-                poll_sheet.cell(row=row_idx, column=4, value=row.get('so2', ''))
-                poll_sheet.cell(row=row_idx, column=5, value=row.get('no2', ''))
-                poll_sheet.cell(row=row_idx, column=6, value=row.get('o3', ''))
-                poll_sheet.cell(row=row_idx, column=7, value=row.get('co', ''))
-                poll_sheet.cell(row=row_idx, column=8, value=row.get('city', ''))
-        
-        # 3. 统计分析工作表
-        stats_sheet = wb.create_sheet("统计分析")
-        
-        row_idx = 1
-        stats_sheet.cell(row=row_idx, column=1, value="统计指标").font = Font(bold=True)
-        stats_sheet.cell(row=row_idx, column=2, value="数值").font = Font(bold=True)
-        row_idx += 1
-        
-        if not data['aqi_data'].empty:
-            aqi_data = data['aqi_data']
-            
-            stats_sheet.cell(row=row_idx, column=1, value="AQI数据记录数")
-            stats_sheet.cell(row=row_idx, column=2, value=len(aqi_data))
-            row_idx += 1
-            
-            stats_sheet.cell(row=row_idx, column=1, value="平均AQI")
-            stats_sheet.cell(row=row_idx, column=2, value=round(aqi_data['aqi'].mean(), 2))
-            row_idx += 1
-            
-            stats_sheet.cell(row=row_idx, column=1, value="最高AQI")
-            stats_sheet.cell(row=row_idx, column=2, value=round(aqi_data['aqi'].max(), 2))
-            row_idx += 1
-            
-            stats_sheet.cell(row=row_idx, column=1, value="最低AQI")
-            stats_sheet.cell(row=row_idx, column=2, value=round(aqi_data['aqi'].min(), 2))
-            row_idx += 1
-        
-        if not data['pollutants'].empty:
-            pollutants_df = data['pollutants']
-            row_idx += 1
-            stats_sheet.cell(row=row_idx, column=1, value="污染物平均值").font = Font(bold=True)
-            row_idx += 1
-            
-            # 计算主要污染物平均值
-            poll_list = [('PM2.5', 'pm25'), ('PM10', 'pm10'), ('SO2', 'so2'), 
-                        ('NO2', 'no2'), ('O3', 'o3'), ('CO', 'co')]
-            
-            for display_name, col_name in poll_list:
-                if col_name in pollutants_df.columns:
-                    stats_sheet.cell(row=row_idx, column=1, value=display_name)
-                    stats_sheet.cell(row=row_idx, column=2, value=round(pollutants_df[col_name].mean(), 2))
-                    row_idx += 1
-        
-        # 自动调整列宽
-        for sheet in wb.sheetnames:
-            ws = wb[sheet]
-            for column in ws.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = (max_length + 2)
-                ws.column_dimensions[column_letter].width = adjusted_width
-        
-        # 保存Excel文件
-        wb.save(output_path)
-        return output_path
-    except Exception as e:
-        logger.error(f"Excel生成失败: {str(e)}\n{traceback.format_exc()}")
-        return {'error': str(e)}
+        logger.info(f"生成{report_type}报告: {start_date}至{end_date}, 区域={region}, 格式={','.join(outputs)}")
+        mapped_options = map_content_options(content_options)
 
-# 生成Word报告
-def generate_word_report(data, content_options, output_path, report_type, region, start_date, end_date):
-    try:
-        # 创建Word文档
-        doc = Document()
-        
-        # 设置中文字体（如果需要）
-        try:
-            # 设置文档默认字体
-            doc.styles['Normal'].font.name = '宋体'
-            doc.styles['Normal']._element.rPr.rFonts.set(qn('w:eastAsia'), '宋体')
-        except:
-            logger.warning("无法设置中文字体，将使用默认字体")
-        
-        # 添加标题
-        doc.add_heading('广东省空气质量监测报告', level=0)
-        
-        # 添加基本信息
-        doc.add_paragraph(f"区域: {region if region != 'all' else '全省'}")
-        doc.add_paragraph(f"时间范围: {start_date} 至 {end_date}")
-        doc.add_paragraph(f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        
-        # 添加分隔线
-        doc.add_paragraph('_' * 50)
-        
-        # 1. 空气质量概览
-        if content_options.get('air_quality', True) and not data['aqi_data'].empty:
-            doc.add_heading('1. 空气质量概览', level=1)
-            aqi_data = data['aqi_data']
-            
-            # 计算统计信息
-            avg_aqi = aqi_data['aqi'].mean()
-            max_aqi = aqi_data['aqi'].max()
-            min_aqi = aqi_data['aqi'].min()
-            
-            p = doc.add_paragraph()
-            p.add_run(f"数据记录数: {len(aqi_data)}\n")
-            p.add_run(f"平均AQI: {avg_aqi:.1f}\n")
-            p.add_run(f"最高AQI: {max_aqi:.1f}\n")
-            p.add_run(f"最低AQI: {min_aqi:.1f}\n")
-            
-            # 添加空气质量数据表格
-            doc.add_heading('空气质量数据表', level=2)
-            
-            # 创建表格
-            table = doc.add_table(rows=1, cols=4)
-            table.style = 'Table Grid'
-            
-            # 添加表头
-            hdr_cells = table.rows[0].cells
-            hdr_cells[0].text = '日期'
-            hdr_cells[1].text = 'AQI'
-            hdr_cells[2].text = '质量等级'
-            hdr_cells[3].text = '城市'
-            
-            # 添加数据行 (限制为前10行以避免文档过长)
-            for _, row in aqi_data.head(10).iterrows():
-                row_cells = table.add_row().cells
-                row_cells[0].text = str(row.get('date', ''))
-                row_cells[1].text = str(row.get('aqi', ''))
-                row_cells[2].text = str(row.get('quality_level', ''))
-                row_cells[3].text = str(row.get('city', ''))
-        
-        # 2. 污染物分析
-        if content_options.get('pollutants', True) and not data['pollutants'].empty:
-            doc.add_heading('2. 主要污染物分析', level=1)
-            
-            pollutants_df = data['pollutants']
-            
-            # 计算主要污染物平均值
-            pollutants_means = {
-                'PM2.5': pollutants_df['pm25'].mean(),
-                'PM10': pollutants_df['pm10'].mean(),
-                'SO2': pollutants_df['so2'].mean(),
-                'NO2': pollutants_df['no2'].mean(),
-                'O3': pollutants_df['o3'].mean(),
-                'CO': pollutants_df['co'].mean()
-            }
-            
-            p = doc.add_paragraph()
-            for poll, value in pollutants_means.items():
-                p.add_run(f"{poll}: {value:.1f}\n")
-        
-        # 3. 趋势分析
-        if content_options.get('trends', True):
-            doc.add_heading('3. 空气质量趋势', level=1)
-            doc.add_paragraph("本报告Word版不包含图表，请选择HTML或Excel格式查看完整趋势图。")
-        
-        # 4. 预警信息
-        if content_options.get('alerts', True):
-            doc.add_heading('4. 空气质量预警信息', level=1)
-            
-            # 检查是否有超标情况
-            if not data['aqi_data'].empty:
-                high_aqi = data['aqi_data'][data['aqi_data']['aqi'] > 100]
-                if not high_aqi.empty:
-                    doc.add_paragraph(f"发现 {len(high_aqi)} 天空气质量超过100，可能对敏感人群健康造成影响。")
-                else:
-                    doc.add_paragraph("监测期间内未发现明显空气质量超标情况。")
-        
-        # 5. 政策建议
-        if content_options.get('recommendations', False):
-            doc.add_heading('5. 改善空气质量的建议', level=1)
-            
-            recommendations = [
-                "加强工业排放监管，严格执行排放标准",
-                "推广清洁能源使用，减少化石燃料消耗",
-                "加强城市绿化建设，增加空气净化能力",
-                "提高公众环保意识，鼓励绿色出行方式"
-            ]
-            
-            for rec in recommendations:
-                doc.add_paragraph(rec, style='List Bullet')
-        
-        # 保存Word文档
-        doc.save(output_path)
-        return output_path
-    except Exception as e:
-        logger.error(f"Word生成失败: {str(e)}\n{traceback.format_exc()}")
-        return {'error': str(e)}
+        # 图表只渲染一次，PDF/Word/HTML共用同一组PNG
+        if any(report_format in ('pdf', 'word', 'html') for report_format in outputs):
+            report_progress(job, 25, '渲染图表')
+            with report_stage(job, 'charts'):
+                data.charts = render_report_charts(data, mapped_options, job=job)
 
-# 生成HTML报告
-def generate_html_report(data, content_options, output_path, report_type, region, start_date, end_date):
-    try:
-        # 计算统计信息
-        aqi_stats = {}
-        pollutants_stats = {}
-        
-        if not data['aqi_data'].empty:
-            aqi_data = data['aqi_data']
-            aqi_stats = {
-                'count': len(aqi_data),
-                'avg': round(aqi_data['aqi'].mean(), 1),
-                'max': round(aqi_data['aqi'].max(), 1),
-                'min': round(aqi_data['aqi'].min(), 1),
-            }
-        
-        if not data['pollutants'].empty:
-            pollutants_df = data['pollutants']
-            pollutants_stats = {
-                'PM2.5': round(pollutants_df['pm25'].mean(), 1),
-                'PM10': round(pollutants_df['pm10'].mean(), 1),
-                'SO2': round(pollutants_df['so2'].mean(), 1),
-                'NO2': round(pollutants_df['no2'].mean(), 1),
-                'O3': round(pollutants_df['o3'].mean(), 1),
-                'CO': round(pollutants_df['co'].mean(), 1)
-            }
-        
-        # 创建HTML内容 - 头部
-        html = f"""<!DOCTYPE html>
-<html lang="zh-CN">
-        <head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>广东省空气质量监测报告</title>
-            <style>
-        body {{ 
-            font-family: "Microsoft YaHei", Arial, sans-serif; 
-            margin: 0;
-            padding: 20px;
-            color: #333;
-        }}
-        .container {{
-            max-width: 1000px;
-            margin: 0 auto;
-            background-color: #fff;
-            padding: 20px;
-            box-shadow: 0 0 10px rgba(0,0,0,0.1);
-        }}
-        h1, h2, h3 {{ color: #0066cc; }}
-        h1 {{ text-align: center; margin-bottom: 30px; }}
-        .header-info {{ 
-            text-align: center; 
-            margin-bottom: 30px;
-            color: #666;
-        }}
-        .timestamp {{
-            text-align: right;
-            color: #888;
-            font-size: 0.9em;
-            margin-bottom: 20px;
-        }}
-        table {{ 
-            border-collapse: collapse; 
-            width: 100%; 
-            margin-bottom: 20px;
-        }}
-        th, td {{ 
-            border: 1px solid #ddd; 
-            padding: 10px; 
-            text-align: center;
-        }}
-        th {{ 
-            background-color: #f2f2f2; 
-            font-weight: bold;
-        }}
-        tr:nth-child(even) {{ background-color: #f9f9f9; }}
-        .stats-card {{
-            display: inline-block;
-            background-color: #f8f9fa;
-            border-radius: 5px;
-            padding: 15px;
-            margin: 10px;
-            min-width: 120px;
-            text-align: center;
-            box-shadow: 0 2px 5px rgba(0,0,0,0.1);
-        }}
-        .stats-card .value {{
-            font-size: 24px;
-            font-weight: bold;
-            color: #0066cc;
-            margin: 10px 0;
-        }}
-        .stats-card .label {{
-            font-size: 14px;
-            color: #666;
-        }}
-        .stats-container {{
-            display: flex;
-            flex-wrap: wrap;
-            justify-content: center;
-            margin-bottom: 30px;
-        }}
-        .section {{
-            margin-bottom: 40px;
-            border-bottom: 1px solid #eee;
-            padding-bottom: 20px;
-        }}
-        .pollutant-grid {{
-            display: grid;
-            grid-template-columns: repeat(3, 1fr);
-            gap: 15px;
-            margin-top: 20px;
-        }}
-        .pollutant-card {{
-            background-color: #f8f9fa;
-            border-radius: 5px;
-            padding: 15px;
-            text-align: center;
-            box-shadow: 0 2px 5px rgba(0,0,0,0.1);
-        }}
-        .recommendation {{
-            background-color: #f0f7ff;
-            border-left: 5px solid #0066cc;
-            padding: 15px;
-            margin-bottom: 10px;
-        }}
-        .alert {{
-            background-color: #fff8f8;
-            border-left: 5px solid #cc0000;
-            padding: 15px;
-            margin-bottom: 10px;
-        }}
-        .info {{
-            background-color: #f8f8ff;
-            border-left: 5px solid #6666cc;
-            padding: 15px;
-            margin-bottom: 10px;
-        }}
-            </style>
-        </head>
-        <body>
-    <div class="container">
-        <h1>广东省空气质量监测报告</h1>
-        
-        <div class="header-info">
-            <p>区域: {region if region != 'all' else '全省'}</p>
-            <p>时间范围: {start_date} 至 {end_date}</p>
-        </div>
-        
-        <div class="timestamp">
-            <p>生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
-        </div>
-"""
-        
-        # 1. 空气质量概览部分
-        if content_options.get('air_quality', True) and aqi_stats:
-            html += """
-        <div class="section">
-            <h2>1. 空气质量概览</h2>
-            
-            <div class="stats-container">
-"""
-            
-            # 添加AQI统计卡片
-            for label, key, label_text in [
-                ('数据记录数', 'count', '记录数'),
-                ('平均AQI', 'avg', '平均AQI'),
-                ('最高AQI', 'max', '最高AQI'),
-                ('最低AQI', 'min', '最低AQI')
-            ]:
-                if key in aqi_stats:
-                    html += f"""
-                <div class="stats-card">
-                    <div class="label">{label_text}</div>
-                    <div class="value">{aqi_stats[key]}</div>
-                </div>
-"""
-            
-            html += """
-            </div>
-            
-            <h3>空气质量数据表</h3>
-            <table>
-                <tr>
-                    <th>日期</th>
-                    <th>AQI</th>
-                    <th>质量等级</th>
-                    <th>城市</th>
-                </tr>
-"""
-        
-            # 添加AQI数据行（最多显示15行）
-            for _, row in data['aqi_data'].head(15).iterrows():
-                html += f"""
-                <tr>
-                    <td>{row.get('date')}</td>
-                    <td>{row.get('aqi')}</td>
-                    <td>{row.get('quality_level')}</td>
-                    <td>{row.get('city')}</td>
-                </tr>
-"""
-        
-        html += """
-            </table>
-        </div>
-"""
-        
-        # 2. 污染物分析部分
-        if content_options.get('pollutants', True) and pollutants_stats:
-            html += """
-        <div class="section">
-            <h2>2. 主要污染物分析</h2>
-            
-            <p>以下是监测期间各项污染物的平均浓度：</p>
-            
-            <div class="pollutant-grid">
-"""
-            
-            # 添加污染物统计卡片
-            for pollutant, value in pollutants_stats.items():
-                html += f"""
-                <div class="pollutant-card">
-                    <div class="label">{pollutant}</div>
-                    <div class="value">{value}</div>
-                </div>
-"""
-            
-            html += """
-            </div>
-        </div>
-"""
-        
-        # 3. 趋势分析
-        if content_options.get('trends', True):
-            html += """
-        <div class="section">
-            <h2>3. 空气质量趋势</h2>
-            
-            <div class="info">
-                <p>本报告HTML版暂不支持图表显示。未来版本将添加趋势图表功能。</p>
-            </div>
-        </div>
-"""
-        
-        # 4. 预警信息
-        if content_options.get('alerts', True) and not data['aqi_data'].empty:
-            html += """
-        <div class="section">
-            <h2>4. 空气质量预警信息</h2>
-"""
-            
-            # 检查是否有超标情况
-            high_aqi = data['aqi_data'][data['aqi_data']['aqi'] > 100]
-            if not high_aqi.empty:
-                html += f"""
-            <div class="alert">
-                <p>发现 {len(high_aqi)} 天空气质量超过100，可能对敏感人群健康造成影响。</p>
-            </div>
-            
-            <table>
-                <tr>
-                    <th>日期</th>
-                    <th>AQI</th>
-                    <th>质量等级</th>
-                    <th>城市</th>
-                </tr>
-"""
-                
-                for _, row in high_aqi.head(10).iterrows():
-                    html += f"""
-                <tr>
-                    <td>{row.get('date')}</td>
-                    <td>{row.get('aqi')}</td>
-                    <td>{row.get('quality_level')}</td>
-                    <td>{row.get('city')}</td>
-                </tr>
-"""
-                
-                html += """
-            </table>
-"""
-            else:
-                html += """
-            <div class="info">
-                <p>监测期间内未发现明显空气质量超标情况。</p>
-            </div>
-"""
-            
-            html += """
-        </div>
-"""
-        
-        # 5. 政策建议
-        if content_options.get('recommendations', False):
-            html += """
-        <div class="section">
-            <h2>5. 改善空气质量的建议</h2>
-"""
-            
-            recommendations = [
-                "加强工业排放监管，严格执行排放标准",
-                "推广清洁能源使用，减少化石燃料消耗",
-                "加强城市绿化建设，增加空气净化能力",
-                "提高公众环保意识，鼓励绿色出行方式"
-            ]
-            
-            for rec in recommendations:
-                html += f"""
-            <div class="recommendation">
-                <p>{rec}</p>
-            </div>
-"""
-            
-            html += """
-        </div>
-"""
-        
-        # 结束文档
-        html += """
-    </div>
-        </body>
-</html>
-"""
-        
-        # 保存HTML文件
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(html)
-        
-        return output_path
+        # 生成器是CPU密集的纯Python代码，线程受GIL限制无法并行，提交到渲染进程池执行
+        report_progress(job, 40, f"并行渲染{len(outputs)}种格式")
+        results = {}
+        with report_stage(job, 'render'):
+            if job is not None:
+                job.check_cancelled()
+            futures = {CHART_POOL.submit(render_format_file, data, mapped_options, output_path, report_type,
+                                         region, start_date, end_date, report_format): report_format
+                       for report_format, output_path in outputs.items()}
+            for future in as_completed(futures):
+                report_format = futures[future]
+                try:
+                    results[report_format], seconds = future.result()
+                    if job is not None:
+                        job.record_timing(f"render:{report_format}", seconds)
+                except Exception as e:
+                    logger.error(f"{report_format}报告生成失败: {str(e)}\n{traceback.format_exc()}")
+                    results[report_format] = {'error': f"报告生成失败: {str(e)}"}
+                report_progress(job, 40 + int(50 * len(results) / len(outputs)),
+                                f"已完成{len(results)}/{len(outputs)}种格式")
+                if job is not None:
+                    job.check_cancelled()
+        return results
+    except ReportJobCancelled:
+        # 等待已开始的生成器结束后再删除文件，避免工作进程在清理后写出文件
+        for future in futures:
+            future.cancel()
+        wait(futures)
+        for output_path in outputs.values():
+            if os.path.exists(output_path):
+                try:
+                    os.remove(output_path)
+                except OSError:
+                    pass
+        raise
     except Exception as e:
-        logger.error(f"HTML生成失败: {str(e)}\n{traceback.format_exc()}")
-        return {'error': str(e)}
+        logger.error(f"报告生成失败: {str(e)}\n{traceback.format_exc()}")
+        return {'error': f"报告生成失败: {str(e)}"}
 
 # 初始化服务
 def init_reports_api():
     try:
         # 注册中文字体 
-        font_path = os.path.join(project_root, 'data', 'fonts', 'simhei.ttf')
-        if os.path.exists(font_path):
-            pdfmetrics.registerFont(TTFont('SimHei', font_path))
+        ensure_pdf_fonts()
+        
+        # 预热图表渲染进程池
+        try:
+            CHART_POOL.warm_up()
+        except Exception as e:
+            logger.warning(f"图表渲染进程池预热失败，将在首次渲染时启动: {str(e)}")
+        
+        # 数据变更事件到达时使水位缓存失效
+        subscribe_watermark_cache()
+        
+        # 启动报告保留策略的后台清理线程
+        REPORT_RETENTION.start()
         return True
     except Exception as e:
         logger.error(f"初始化失败: {str(e)}")
         return False
 
-def get_report_type_name(report_type):
-    """获取报告类型的中文名称
-    
-    Args:
-        report_type (str): 报告类型代码
-        
-    Returns:
-        str: 报告类型的中文名称
-    """
-    report_types = {
-        'daily': '日报',
-        'weekly': '周报',
-        'monthly': '月报',
-        'quarterly': '季度报告',
-        'yearly': '年度报告',
-        'custom': '自定义报告'
-    }
-    return report_types.get(report_type, '未知类型')
-
-def get_region_name(region_code):
-    """获取区域的中文名称
-    
-    Args:
-        region_code (str): 区域代码
-        
-    Returns:
-        str: 区域的中文名称
-    """
-    region_names = {
-        'all': '全省',
-        'guangzhou': '广州市',
-        'shenzhen': '深圳市',
-        'foshan': '佛山市',
-        'dongguan': '东莞市',
-        'zhongshan': '中山市',
-        'zhuhai': '珠海市',
-        'huizhou': '惠州市',
-        'jiangmen': '江门市',
-        'zhaoqing': '肇庆市',
-        'shaoguan': '韶关市',
-        'qingyuan': '清远市',
-        'meizhou': '梅州市',
-        'heyuan': '河源市',
-        'shanwei': '汕尾市',
-        'jieyang': '揭阳市',
-        'maoming': '茂名市',
-        'yangjiang': '阳江市',
-        'zhanjiang': '湛江市',
-        'chaozhou': '潮州市',
-        'shantou': '汕头市',
-        'yunfu': '云浮市',
-        'pearl_delta': '珠三角',
-        'east': '粤东地区',
-        'west': '粤西地区',
-        'north': '粤北地区'
-    }
-    return region_names.get(region_code, region_code)
-
 @app.route('/api/reports/<report_id>', methods=['DELETE'])
 def delete_report(report_id):
     """删除指定ID的报告
@@ -2344,35 +1550,13 @@ def delete_report(report_id):
         # 记录删除请求
         logger.info(f"收到删除报告请求: {report_id}")
         
-        # 从元数据中查找报告
-        reports = load_report_metadata()
-        if not reports:
-            logger.warning("元数据为空，无法找到报告")
-            return handle_error(f"找不到报告 {report_id}", 404)
-            
-        if not isinstance(reports, list):
-            logger.error(f"元数据格式错误: {type(reports)}")
-            return handle_error("报告元数据格式错误", 500)
-            
-        # 查找要删除的报告
-        report_to_delete = None
-        updated_reports = []
-        
-        for report in reports:
-            if not isinstance(report, dict):
-                continue
-                
-            # 检查ID是否匹配
-            if report.get('id') == report_id:
-                report_to_delete = report
-            else:
-                updated_reports.append(report)
-                
-        # 检查是否找到报告
+        # 从元数据中删除报告记录（单条删除，不重写其他记录）
+        report_to_delete = REPORT_STORE.delete(report_id)
         if not report_to_delete:
             logger.warning(f"找不到ID为 {report_id} 的报告")
             return handle_error(f"找不到报告 {report_id}", 404)
-            
+        logger.info(f"已从元数据中移除报告 {report_id}")
+
         # 获取报告文件路径
         file_path = report_to_delete.get('file_path')
         if file_path and os.path.exists(file_path):
@@ -2386,10 +1570,6 @@ def delete_report(report_id):
         else:
             logger.warning(f"报告文件不存在或路径无效: {file_path}")
             
-        # 更新元数据
-        save_report_metadata(updated_reports)
-        logger.info(f"已从元数据中移除报告 {report_id}")
-        
         # 返回成功响应
         return jsonify({
             'success': True,
@@ -2424,17 +1604,8 @@ def preview_report(report_id):
         clean_id = report_id.split('.')[0] if '.' in report_id else report_id
         
         # 从元数据中查找报告记录
-        reports = load_report_metadata()
-        target_report = None
-        
-        for report in reports:
-            if not isinstance(report, dict):
-                continue
-                
-            if report.get('id') == clean_id:
-                target_report = report
-                break
-        
+        target_report = REPORT_STORE.get(clean_id)
+
         if not target_report:
             logger.error(f"没有找到报告ID: {clean_id}")
             return handle_error(f"报告预览失败: 没有找到报告ID {clean_id}", 404)
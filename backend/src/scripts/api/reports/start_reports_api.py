@@ -75,50 +75,58 @@ def run_setup():
         logger.error(traceback.format_exc())
         return False
 
-# 导入报告API模块
-try:
+def main():
+    """初始化环境并启动报告API服务
+
+    图表渲染进程池使用spawn方式启动工作进程，工作进程会以__mp_main__重新导入本脚本，
+    因此环境初始化和reports_api的导入（Flask应用、报告存储、变更订阅线程）都只在这里执行。
+    """
     # 先运行初始化
     setup_success = run_setup()
     if not setup_success:
         logger.warning("环境初始化失败，服务可能无法正常运行")
-    
-    from src.scripts.api.reports.reports_api import app, logger, init_reports_api
-    
+
+    # 导入报告API模块
+    try:
+        from src.scripts.api.reports.reports_api import app, logger as api_logger, init_reports_api
+    except ImportError as e:
+        print(f"导入报告API模块失败: {str(e)}")
+        # 打印更详细的报错信息
+        print(f"详细错误: {traceback.format_exc()}")
+        sys.exit(1)
+
     # 设置日志级别
-    logger.setLevel(logging_level)
-    
+    api_logger.setLevel(logging_level)
+
     # 启动报告API服务
-    if __name__ == "__main__":
-        try:
-            logger.info("正在启动报告API服务...")
-            
-            # 初始化报告API服务
-            logger.info("初始化报告API服务...")
-            init_result = init_reports_api()
-            if not init_result:
-                logger.error("报告API服务初始化失败，服务将不会启动")
-                sys.exit(1)
-            logger.info("报告API服务初始化完成")
-            
-            # 根据环境变量决定是否使用调试模式
-            debug_mode = os.environ.get("FLASK_DEBUG", "false").lower() == "true"
-            
-            # 生产环境不使用调试模式，以减少不必要的日志
-            app.run(
-                host='0.0.0.0', 
-                port=5003, 
-                debug=debug_mode,
-                use_reloader=False,  # 禁用重载器以避免进程重启
-                threaded=True  # 启用线程支持，提高并发处理能力
-            )
-        except Exception as e:
-            logger.error(f"启动报告API服务失败: {str(e)}")
-            # 添加详细错误跟踪
-            logger.error(f"详细错误: {traceback.format_exc()}")
+    try:
+        api_logger.info("正在启动报告API服务...")
+
+        # 初始化报告API服务
+        api_logger.info("初始化报告API服务...")
+        init_result = init_reports_api()
+        if not init_result:
+            api_logger.error("报告API服务初始化失败，服务将不会启动")
             sys.exit(1)
-            
-except ImportError as e:
-    print(f"导入报告API模块失败: {str(e)}")
-    # 打印更详细的报错信息
-    print(f"详细错误: {traceback.format_exc()}")
-    sys.exit(1)
\ No newline at end of file
+        api_logger.info("报告API服务初始化完成")
+
+        # 根据环境变量决定是否使用调试模式
+        debug_mode = os.environ.get("FLASK_DEBUG", "false").lower() == "true"
+
+        # 生产环境不使用调试模式，以减少不必要的日志
+        app.run(
+            host='0.0.0.0', 
+            port=5003, 
+            debug=debug_mode,
+            use_reloader=False,  # 禁用重载器以避免进程重启
+            threaded=True  # 启用线程支持，提高并发处理能力
+        )
+    except Exception as e:
+        api_logger.error(f"启动报告API服务失败: {str(e)}")
+        # 添加详细错误跟踪
+        api_logger.error(f"详细错误: {traceback.format_exc()}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+历史数据回填/重新处理
+把指定日期范围按月切分为分片，多个进程并行处理各个分片：
+    1. 每个分片内的文件用向量化解析器解析并聚合为日数据，整个分片合并后一次写库
+    2. 写库使用 ON DUPLICATE KEY UPDATE（--bulk时为LOAD DATA+合并），同一分片重复执行结果相同
+    3. 每个文件在导入台账中认领，已导入且内容未变化的文件跳过，--force时先清除范围内的台账记录
+    4. 分片完成时输出已处理文件数、每秒文件数/记录数和预计剩余时间
+--dry-run只列出每个分片的文件数、缺失数和已导入数，并解析一个样例文件估算耗时，不写数据库。
+--ranks-only不重新导入，只按月重新计算范围内的AQI排名（aqi_rank）。
+按月切分与raw_archive的月度包一致，一个分片只需打开一个月度包。
+
+用法:
+    python backfill.py --start 2020-01-01 --end 2023-12-31 [--workers 4] [--bulk] [--download] [--force] [--dry-run]
+    python backfill.py --start 2020-01-01 --end 2023-12-31 --ranks-only [--table air_quality_data]
+"""
+
+import os
+import sys
+import argparse
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from time import perf_counter
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from download_data_process import (
+    CONFIG, setup_logging, connect_to_db, insert_data_to_db, bulk_insert_data_to_db,
+    log_import_result, quarantine_records, update_daily_ranks, publish_data_change, get_ledger, get_downloader
+)
+from ingest_ledger import DONE, file_key, worker_id
+from ingest_pipeline import parse_and_aggregate
+from raw_archive import list_raw, raw_date, raw_sha256
+from record_validation import split_records
+from daily_ranking import refresh_ranks, ensure_rank_index
+
+logger = logging.getLogger(__name__)
+
+
+def month_shards(start_date, end_date):
+    """把日期范围按自然月切分
+
+    Returns:
+        list: [(月份'YYYY-MM', [日期, ...]), ...]
+    """
+    shards = {}
+    day = start_date
+    while day <= end_date:
+        shards.setdefault(day.strftime('%Y-%m'), []).append(day)
+        day += timedelta(days=1)
+    return list(shards.items())
+
+
+def write_records(records, bulk=False, quarantined=None, source='backfill'):
+    """写入一个分片的日数据（未通过校验的记录写入隔离表）并发布变更事件，返回日数据表影响的行数"""
+    if not records and not quarantined:
+        return 0
+    affected = 0
+    if bulk and records:
+        affected = bulk_insert_data_to_db(records)['affected']
+    conn = connect_to_db()
+    if conn is None:
+        raise ConnectionError("无法连接到数据库")
+    try:
+        if not bulk:
+            batch_size = CONFIG.get('processing', {}).get('batch_size', 1000)
+            affected = sum(insert_data_to_db(conn, records[i:i + batch_size])
+                           for i in range(0, len(records), batch_size))
+        quarantine_records(conn, quarantined, source)
+        update_daily_ranks(conn, records)
+        publish_data_change(conn, records, source)
+    finally:
+        conn.close()
+    return affected
+
+
+def log_shard(month, rows, message):
+    conn = connect_to_db()
+    if conn is None:
+        return
+    try:
+        log_import_result(conn, f"backfill_{month}", rows, "SUCCESS", message)
+    finally:
+        conn.close()
+
+
+def process_shard(month, refs, bulk=False, writer=None):
+    """处理一个月的分片（在子进程中执行）
+
+    Args:
+        refs (list): 该月的原始文件引用
+        writer (callable): writer(records) 写入日数据（不含隔离的记录），默认为write_records
+
+    Returns:
+        dict: month, files(处理的文件数), skipped, failed, rows(日数据行数), written, parse_seconds, write_seconds
+    """
+    ledger = get_ledger()
+    worker = worker_id()
+    start = perf_counter()
+    claimed = []
+    frames = []
+    skipped = failed = 0
+    for ref in refs:
+        key = file_key(ref)
+        file_start = perf_counter()
+        file_date = datetime.strptime(raw_date(ref), '%Y%m%d').strftime('%Y-%m-%d')
+        try:
+            if not ledger.claim(key, file_date, ref, raw_sha256(ref), worker):
+                skipped += 1
+                continue
+        except Exception as e:
+            logger.error(f"读取文件失败: {ref}, 错误: {e}")
+            failed += 1
+            continue
+        try:
+            daily = parse_and_aggregate(ref)
+        except Exception as e:
+            logger.error(f"处理文件失败: {ref}, 错误: {e}")
+            ledger.fail(key, e, worker)
+            failed += 1
+            continue
+        if daily is not None:
+            frames.append(daily)
+        claimed.append((key, file_date, perf_counter() - file_start))
+    parse_seconds = perf_counter() - start
+
+    valid, quarantined = split_records(pd.concat(frames, ignore_index=True) if frames else None)
+    valid_by_date = Counter(record['date'] for record in valid)
+    rows_by_date = valid_by_date + Counter(record['date'] for record in quarantined)
+
+    write_start = perf_counter()
+    try:
+        if writer is not None:
+            if valid:
+                writer(valid)
+        elif valid or quarantined:
+            write_records(valid, bulk, quarantined, f"backfill_{month}")
+    except Exception as e:
+        logger.error(f"分片 {month} 写入失败: {e}")
+        for key, _, _ in claimed:
+            ledger.fail(key, f"分片写入失败: {e}", worker)
+        return {'month': month, 'files': 0, 'skipped': skipped, 'failed': failed + len(claimed),
+                'rows': 0, 'written': 0, 'quarantined': 0, 'parse_seconds': round(parse_seconds, 3),
+                'write_seconds': 0}
+    write_seconds = perf_counter() - write_start
+
+    for key, file_date, file_seconds in claimed:
+        share = valid_by_date[file_date] / len(valid) if valid else 0
+        ledger.complete(key, rows_by_date[file_date], valid_by_date[file_date], {
+            'parse': round(file_seconds, 3),
+            'write': round(write_seconds * share, 3),
+            'total': round(file_seconds + write_seconds * share, 3)
+        }, worker)
+    if valid and writer is None:
+        log_shard(month, len(valid), f"回填{len(claimed)}个文件, {len(valid)}条记录")
+    if quarantined:
+        logger.warning(f"分片 {month}: {len(quarantined)} 条记录未通过校验，转入隔离表")
+    return {'month': month, 'files': len(claimed), 'skipped': skipped, 'failed': failed,
+            'rows': len(valid) + len(quarantined), 'written': len(valid), 'quarantined': len(quarantined), 'parse_seconds': round(parse_seconds, 3),
+            'write_seconds': round(write_seconds, 3)}
+
+
+def plan_shards(shards, refs, ledger_states):
+    """统计每个分片的文件情况，返回 [(月份, 文件引用列表, 缺失数, 已导入数), ...]"""
+    plan = []
+    for month, dates in shards:
+        shard_refs = [refs[d.strftime('%Y%m%d')] for d in dates if d.strftime('%Y%m%d') in refs]
+        done = sum(1 for ref in shard_refs if ledger_states.get(file_key(ref)) == DONE)
+        plan.append((month, shard_refs, len(dates) - len(shard_refs), done))
+    return plan
+
+
+def format_seconds(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def run_backfill(start_date, end_date, workers=None, bulk=False, download=False, force=False,
+                 dry_run=False, writer=None):
+    """回填指定日期范围
+
+    Returns:
+        dict: 汇总统计（dry_run时为计划）
+    """
+    download_dir = CONFIG['paths']['download_dir']
+    ledger = get_ledger()
+    shards = month_shards(start_date, end_date)
+    dates = [d for _, shard_dates in shards for d in shard_dates]
+    refs = list_raw(download_dir)
+
+    if download and not dry_run:
+        missing = [d for d in dates if d.strftime('%Y%m%d') not in refs]
+        if missing:
+            logger.info(f"下载缺失的 {len(missing)} 天数据")
+            get_downloader().download_many(missing)
+            refs = list_raw(download_dir)
+
+    if force and not dry_run:
+        keys = [f"china_cities_{d.strftime('%Y%m%d')}.csv" for d in dates]
+        logger.info(f"--force: 清除 {ledger.reset(keys)} 条台账记录")
+
+    plan = plan_shards(shards, refs, {} if force else ledger.states())
+    total_files = sum(len(shard_refs) for _, shard_refs, _, _ in plan)
+    pending = total_files - sum(done for _, _, _, done in plan)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(plan)))
+    logger.info(f"回填 {start_date} 到 {end_date}: {len(plan)} 个分片, {total_files} 个文件, "
+                f"缺失 {len(dates) - total_files} 天, 待处理约 {pending} 个文件, 进程数 {workers}")
+
+    if dry_run:
+        for month, shard_refs, missing, done in plan:
+            print(f"{month}: 文件 {len(shard_refs)}, 缺失 {missing}, 已导入 {done}, 待处理 {len(shard_refs) - done}")
+        estimate = None
+        sample = next((ref for _, shard_refs, _, _ in plan for ref in shard_refs), None)
+        if sample is not None and pending:
+            sample_start = perf_counter()
+            parse_and_aggregate(sample)
+            estimate = (perf_counter() - sample_start) * pending / workers
+            print(f"样例文件解析耗时 {perf_counter() - sample_start:.3f}秒，预计解析总耗时约 "
+                  f"{format_seconds(estimate)}（不含写库）")
+        return {'shards': len(plan), 'files': total_files, 'pending': pending, 'estimate_seconds': estimate}
+
+    totals = Counter()
+    start = perf_counter()
+    done_files = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(process_shard, month, shard_refs, bulk, writer): (month, len(shard_refs))
+                   for month, shard_refs, _, _ in plan if shard_refs}
+        for future in as_completed(futures):
+            month, file_count = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error(f"分片 {month} 处理失败: {e}")
+                totals['failed'] += file_count
+                done_files += file_count
+                continue
+            for field in ('files', 'skipped', 'failed', 'rows', 'written', 'quarantined'):
+                totals[field] += result[field]
+            done_files += file_count
+            elapsed = perf_counter() - start
+            rate = done_files / elapsed if elapsed > 0 else 0
+            eta = (total_files - done_files) / rate if rate > 0 else 0
+            logger.info(f"分片 {month} 完成: {result}; 进度 {done_files}/{total_files} 个文件, "
+                        f"{rate:.1f} 文件/秒, {totals['written'] / elapsed:.0f} 行/秒, "
+                        f"预计剩余 {format_seconds(eta)}")
+
+    seconds = perf_counter() - start
+    summary = dict(totals, shards=len(plan), seconds=round(seconds, 2),
+                   files_per_second=round(totals['files'] / seconds, 2) if seconds > 0 else None)
+    logger.info(f"回填完成: {summary}")
+    return summary
+
+
+def rebuild_ranks(start_date, end_date, table_name='air_quality_newdata'):
+    """只重新计算日期范围内的AQI排名（不重新导入），每个月查询和提交一次
+
+    Returns:
+        int: 更新的行数
+    """
+    conn = connect_to_db()
+    if conn is None:
+        raise ConnectionError("无法连接到数据库")
+    total = 0
+    try:
+        ensure_rank_index(conn, table_name)
+        for month, dates in month_shards(start_date, end_date):
+            updated = refresh_ranks(conn, [day.strftime('%Y-%m-%d') for day in dates], table_name)
+            total += updated
+            logger.info(f"{table_name} {month}: AQI排名更新 {updated} 行")
+    finally:
+        conn.close()
+    logger.info(f"AQI排名重新计算完成: {start_date} 到 {end_date}, 共更新 {total} 行")
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description='按月分片并行回填/重新处理历史数据')
+    parser.add_argument('--start', required=True, help='开始日期 YYYY-MM-DD')
+    parser.add_argument('--end', required=True, help='结束日期 YYYY-MM-DD（包含）')
+    parser.add_argument('--workers', type=int, help='并行进程数，默认为CPU核数')
+    parser.add_argument('--bulk', action='store_true', help='每个分片通过LOAD DATA LOCAL INFILE批量写入')
+    parser.add_argument('--download', action='store_true', help='先下载范围内缺失的文件')
+    parser.add_argument('--force', action='store_true', help='忽略导入台账，重新处理范围内的所有文件')
+    parser.add_argument('--dry-run', action='store_true', help='只显示分片计划和预计耗时，不写数据库')
+    parser.add_argument('--ranks-only', action='store_true', help='不重新导入，只重新计算范围内的AQI排名')
+    parser.add_argument('--table', default='air_quality_newdata', choices=['air_quality_newdata', 'air_quality_data'],
+                        help='--ranks-only时重新排名的表')
+    args = parser.parse_args()
+
+    global logger
+    logger = setup_logging()
+    if not any(isinstance(handler, logging.StreamHandler) and not isinstance(handler, logging.FileHandler)
+               for handler in logging.getLogger().handlers):
+        logging.getLogger().addHandler(logging.StreamHandler(sys.stdout))
+
+    start_date = datetime.strptime(args.start, '%Y-%m-%d').date()
+    end_date = datetime.strptime(args.end, '%Y-%m-%d').date()
+    if end_date < start_date:
+        parser.error('结束日期早于开始日期')
+    if args.ranks_only:
+        rebuild_ranks(start_date, end_date, args.table)
+        return
+    run_backfill(start_date, end_date, workers=args.workers, bulk=args.bulk, download=args.download,
+                 force=args.force, dry_run=args.dry_run)
+
+
+if __name__ == '__main__':
+    main()
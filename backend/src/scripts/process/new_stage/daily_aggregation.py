@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+小时数据 -> 日数据聚合
+数据表以 (city, record_date) 为唯一键，每个城市每天只应写入一行。这里按城市和日期一次分组
+计算各污染物的日均浓度和O3日最大8小时滑动平均，再按《环境空气质量指数(AQI)技术规定》
+(HJ 633-2012) 的24小时分指数限值向量化计算日AQI和空气质量等级。
+"""
+
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from quotsoft_parser import POLLUTANT_FIELDS, VALUE_RANGES, quality_levels
+
+# 空气质量分指数(IAQI)及对应的污染物浓度限值（日均值；O3为日最大8小时滑动平均）
+IAQI_LEVELS = [0, 50, 100, 150, 200, 300, 400, 500]
+IAQI_BREAKPOINTS = {
+    'so2': [0, 50, 150, 475, 800, 1600, 2100, 2620],
+    'no2': [0, 40, 80, 180, 280, 565, 750, 940],
+    'pm10': [0, 50, 150, 250, 350, 420, 500, 600],
+    'co': [0, 2, 4, 14, 24, 36, 48, 60],
+    'pm25': [0, 35, 75, 115, 150, 250, 350, 500],
+    # O3 8小时浓度高于800时按规定改用1小时浓度，这里上限截断在IAQI=300
+    'o3_8h_max': [0, 100, 160, 215, 265, 800]
+}
+
+# O3 8小时滑动平均: 窗口至少有6个有效小时
+O3_8H_WINDOW = 8
+O3_8H_MIN_HOURS = 6
+
+DAILY_COLUMNS = ['date', 'city', 'aqi'] + POLLUTANT_FIELDS + ['o3_8h_max', 'hours', 'quality_level']
+
+
+def mask_invalid(hourly):
+    """超出合理范围的小时值置为缺失（不因单个指标异常丢弃整小时的数据）"""
+    hourly = hourly.copy()
+    for column in ['aqi'] + POLLUTANT_FIELDS:
+        low, high = VALUE_RANGES[column]
+        hourly[column] = hourly[column].where(hourly[column].between(low, high))
+    return hourly
+
+
+def o3_8h_daily_max(hourly):
+    """每个城市每天的O3最大8小时滑动平均
+
+    把O3整理为 (city, date) x 24小时 的矩阵，一次计算所有窗口。
+
+    Returns:
+        Series: 以 (date, city) 为索引
+    """
+    o3 = hourly.pivot_table(index=['date', 'city'], columns='hour', values='o3', aggfunc='first')
+    o3 = o3.reindex(columns=range(24))
+    values = o3.to_numpy(dtype='float64')
+    # (行, 窗口, 小时)；numpy 1.19没有sliding_window_view，直接按起始小时切片堆叠
+    windows = np.stack([values[:, start:start + O3_8H_WINDOW]
+                        for start in range(values.shape[1] - O3_8H_WINDOW + 1)], axis=1)
+    with warnings.catch_warnings():
+        # 全部缺失的窗口/日期结果为NaN，忽略numpy的空切片警告
+        warnings.simplefilter('ignore', RuntimeWarning)
+        means = np.nanmean(windows, axis=2)
+        means[(~np.isnan(windows)).sum(axis=2) < O3_8H_MIN_HOURS] = np.nan
+        daily_max = np.nanmax(means, axis=1)
+    return pd.Series(daily_max, index=o3.index, name='o3_8h_max')
+
+
+def compute_aqi(daily):
+    """按日均浓度计算AQI（取各污染物分指数的最大值，向上取整）
+
+    所有污染物都缺失时使用小时AQI的日均值。
+    """
+    iaqi = []
+    for column, breakpoints in IAQI_BREAKPOINTS.items():
+        levels = IAQI_LEVELS[:len(breakpoints)]
+        values = daily[column].to_numpy(dtype='float64')
+        iaqi.append(np.where(np.isnan(values), np.nan, np.interp(values, breakpoints, levels)))
+    stacked = np.vstack(iaqi)
+    has_value = ~np.isnan(stacked).all(axis=0)
+    aqi = np.full(len(daily), np.nan)
+    aqi[has_value] = np.ceil(np.nanmax(stacked[:, has_value], axis=0))
+    return pd.Series(aqi, index=daily.index).fillna(daily['hourly_aqi'].round(0))
+
+
+def aggregate_daily(hourly):
+    """把小时长表聚合为每城市每天一行
+
+    Args:
+        hourly (DataFrame): parse_quotsoft_file的输出，列为 date, hour, city, aqi, pm25..co
+
+    Returns:
+        DataFrame: 列为 date, city, aqi, pm25..co（日均值）, o3_8h_max, hours(有效小时数), quality_level
+    """
+    if hourly is None or hourly.empty:
+        return pd.DataFrame(columns=DAILY_COLUMNS)
+
+    hourly = mask_invalid(hourly)
+    grouped = hourly.groupby(['date', 'city'], observed=True, sort=True)
+    daily = grouped[POLLUTANT_FIELDS].mean()
+    daily['hourly_aqi'] = grouped['aqi'].mean()
+    daily['hours'] = grouped['aqi'].count()
+    daily = daily.join(o3_8h_daily_max(hourly))
+
+    daily['aqi'] = compute_aqi(daily)
+    daily = daily.dropna(subset=['aqi'])
+    # CO单位为mg/m³，保留3位小数，其余污染物保留1位
+    daily[POLLUTANT_FIELDS] = daily[POLLUTANT_FIELDS].round(
+        {column: 3 if column == 'co' else 1 for column in POLLUTANT_FIELDS})
+    daily['o3_8h_max'] = daily['o3_8h_max'].round(1)
+    daily['quality_level'] = quality_levels(daily['aqi'])
+    return daily.reset_index()[DAILY_COLUMNS]
+
+
+def to_daily_records(daily):
+    """把日数据转为insert_data_to_db使用的记录列表
+
+    Returns:
+        list: 每项包含 city, date('YYYY-MM-DD'), aqi, pm25..co, quality_level（已排名时还有aqi_rank）
+    """
+    if daily is None or daily.empty:
+        return []
+    columns = ['city', 'date', 'aqi'] + POLLUTANT_FIELDS + ['quality_level']
+    if 'aqi_rank' in daily:
+        columns.append('aqi_rank')
+    frame = daily[columns].copy()
+    frame['date'] = pd.to_datetime(frame['date']).dt.strftime('%Y-%m-%d')
+    frame = frame.astype(object).where(frame.notna(), None)
+    return frame.to_dict('records')
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+日数据AQI排名（aqi_rank）
+日聚合之后对整个日数据表做一次分组rank()：同一天、同一省份的城市按AQI从低到高排名，
+并列取最小名次（与stage2中AQIrnk的算法一致），不再逐行填写或留空。
+
+同一天的城市分多批到达（迟到的文件、增量导入的小时更新）时，批内的名次只是临时值。
+写库后只对这批数据涉及的日期重新读取并排名，只更新名次有变化的行，不必对整表重新排名。
+"""
+
+import os
+import sys
+import logging
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'utils'))
+from region_registry import get_region_registry
+
+logger = logging.getLogger(__name__)
+
+# 并列取最小名次，AQI越低名次越靠前
+RANK_METHOD = 'min'
+
+# 每次查询的日期数
+RANK_DATE_BATCH = 100
+
+
+def province_series(cities):
+    """城市列对应的省份（来自区域登记表），每个城市只查找一次"""
+    registry = get_region_registry()
+    mapping = {city: registry.province_of(city) for city in pd.unique(cities)}
+    return cities.map(mapping)
+
+
+def rank_daily(frame, date_column='date', aqi_column='aqi'):
+    """按 (日期, 省份) 分组计算AQI名次
+
+    Args:
+        frame (DataFrame): 日数据，包含city、日期列和AQI列
+
+    Returns:
+        Series: 与frame同索引的名次（float，AQI缺失时为NaN）
+    """
+    if frame is None or frame.empty:
+        return pd.Series(dtype=float)
+    provinces = province_series(frame['city'])
+    return frame.groupby([frame[date_column], provinces], sort=False)[aqi_column].rank(method=RANK_METHOD)
+
+
+def changed_ranks(frame):
+    """对若干完整日期的数据重新排名，返回名次有变化的行
+
+    Args:
+        frame (DataFrame): 列为 city, record_date, aqi_index, aqi_rank（数据库中现有的名次）
+
+    Returns:
+        list: [(新名次或None, 城市, 日期), ...]，与UPDATE语句的参数顺序一致
+    """
+    if frame.empty:
+        return []
+    ranks = rank_daily(frame, 'record_date', 'aqi_index')
+    current = pd.to_numeric(frame['aqi_rank'], errors='coerce')
+    changed = (ranks != current) & ~(ranks.isna() & current.isna())
+    if not changed.any():
+        return []
+    updates = frame.loc[changed, ['city', 'record_date']].assign(aqi_rank=ranks[changed])
+    return [(None if np.isnan(rank) else float(rank), city, record_date)
+            for city, record_date, rank in updates[['city', 'record_date', 'aqi_rank']].itertuples(index=False)]
+
+
+def refresh_ranks(conn, dates, table_name='air_quality_newdata'):
+    """重新计算指定日期的名次并写回数据库，只更新有变化的行
+
+    Args:
+        dates (iterable): 受影响的日期（'YYYY-MM-DD'或date）
+
+    Returns:
+        int: 更新的行数
+    """
+    dates = sorted({str(day) for day in dates if day})
+    if not dates:
+        return 0
+    cursor = conn.cursor()
+    updated = 0
+    try:
+        for i in range(0, len(dates), RANK_DATE_BATCH):
+            batch = dates[i:i + RANK_DATE_BATCH]
+            cursor.execute(
+                f"SELECT city, record_date, aqi_index, aqi_rank FROM {table_name} "
+                f"WHERE record_date IN ({', '.join(['%s'] * len(batch))})", batch)
+            frame = pd.DataFrame(cursor.fetchall(), columns=['city', 'record_date', 'aqi_index', 'aqi_rank'])
+            frame['aqi_index'] = pd.to_numeric(frame['aqi_index'], errors='coerce')
+            updates = changed_ranks(frame)
+            if updates:
+                cursor.executemany(f"UPDATE {table_name} SET aqi_rank = %s WHERE city = %s AND record_date = %s",
+                                   updates)
+                updated += len(updates)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"重新计算AQI排名失败: {e}")
+        raise
+    finally:
+        cursor.close()
+    if updated:
+        logger.info(f"{table_name}: {len(dates)} 天的AQI排名有 {updated} 行更新")
+    return updated
+
+
+def ensure_rank_index(conn, table_name='air_quality_newdata'):
+    """按日期重新排名需要record_date上的索引（唯一键以city开头用不上），已有的表缺少时补建"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT COUNT(*) FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = 'record_date' AND SEQ_IN_INDEX = 1",
+            (table_name,))
+        if cursor.fetchone()[0] == 0:
+            cursor.execute(f"ALTER TABLE {table_name} ADD INDEX idx_record_date (record_date)")
+            logger.info(f"{table_name}: 添加record_date索引")
+    finally:
+        cursor.close()
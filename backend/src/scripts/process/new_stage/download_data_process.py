@@ -8,16 +8,16 @@
     2. 再检查新创建的air_quality_newdata表
     3. 如果数据不是最新的，从网络自动下载从最新日期的后一天到当前日期的所有数据到指定文件夹(每5秒下载一次)
     4. 全部下载完成后，从指定文件夹读取并依次处理所有文件
-    5. 从下载的全国空气质量数据中提取广东省各城市的数据
-    6. 数据有多条则优先使用每日首小时数据，若为空则依次尝试后续小时数据
-    7. 判断空气质量等级
+    5. 从下载的全国空气质量数据中提取区域登记表（utils/regions.yaml）中启用省份各城市的数据
+    6. 将每个城市的小时数据聚合为日数据（日均浓度、O3最大8小时滑动平均）
+    7. 按日均浓度计算AQI并判断空气质量等级
     8. 将处理后的数据保存到MySQL数据库的air_quality_newdata表中
 """
 
 import os
 import csv
 import yaml
-import json
+import argparse
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
@@ -25,18 +25,35 @@ import glob
 import mysql.connector
 from mysql.connector import Error
 from mysql.connector.pooling import MySQLConnectionPool
-import requests
-import time
 import logging
 from logging.handlers import RotatingFileHandler
 import sys
-from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from time import perf_counter
 from pathlib import Path
 import pickle
 from functools import lru_cache
 from dotenv import load_dotenv
 
+# 同目录下的解析模块（本脚本既会直接运行，也会以包路径导入）
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from quotsoft_parser import resolve_city_columns, parse_quotsoft_file
+from daily_aggregation import aggregate_daily
+from quotsoft_downloader import QuotsoftDownloader, DOWNLOADED, NOT_MODIFIED, CACHED
+from raw_archive import raw_date, raw_sha256
+from ingest_ledger import IngestLedger, LEDGER_FILE, DONE, file_key, worker_id
+from ingest_pipeline import build_ingest_pipeline, start_workers
+from record_validation import split_records
+from daily_ranking import refresh_ranks, ensure_rank_index
+# 批量导入模块位于scripts/sql目录
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'sql'))
+from bulk_loader import BulkLoadError, bulk_upsert, connect as connect_bulk
+# 数据变更事件模块位于scripts/utils目录
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'utils'))
+from change_events import publish_change, summarize_records, ensure_change_table
+from region_registry import get_region_registry
+
 # Load environment variables from .env file
 backend_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
 dotenv_path = os.path.join(backend_dir, '.env')
@@ -167,15 +184,10 @@ def init_db_pool():
         logger.error(f"数据库连接池初始化失败: {e}")
         return False
 
-# 广东省城市列表
-GUANGDONG_CITIES = [
-    '广州市', '深圳市', '珠海市', '汕头市', '佛山市', '韶关市', '湛江市', '肇庆市', 
-    '江门市', '茂名市', '惠州市', '梅州市', '汕尾市', '河源市', '阳江市', '清远市', 
-    '东莞市', '中山市', '潮州市', '揭阳市', '云浮市'
-]
+# 城市列表见区域登记表utils/regions.yaml
 
 # 优化: 创建城市名称到ID的映射缓存
-CITY_ID_CACHE = {city: idx for idx, city in enumerate(GUANGDONG_CITIES)}
+CITY_ID_CACHE = {city: idx for idx, city in enumerate(get_region_registry().cities())}
 
 def get_db_connection():
     """从连接池获取数据库连接"""
@@ -223,377 +235,144 @@ def validate_data(data):
         logger.error(f"数据验证失败: {e}")
         return False
 
-# 性能优化: 使用缓存保存处理进度
-PROGRESS_CACHE = {}
-
-def save_progress(file_path, processed_records):
-    """保存处理进度"""
-    try:
-        # 首先更新内存缓存
-        PROGRESS_CACHE[str(file_path)] = {
-            'processed_records': processed_records,
-            'timestamp': datetime.now().isoformat()
-        }
-        
-        # 每10个文件或者最后一个文件才写入磁盘
-        if len(PROGRESS_CACHE) >= 10 or processed_records == 0:
-            progress_file = Path(CONFIG['paths']['log_dir']) / 'progress.json'
-            
-            # 读取现有进度
-            existing_progress = {}
-            if progress_file.exists():
-                try:
-                    with open(progress_file, 'r') as f:
-                        existing_progress = json.load(f)
-                except:
-                    pass  # 如果读取失败，使用空字典
-            
-            # 更新进度
-            existing_progress.update(PROGRESS_CACHE)
-            
-            # 写入文件
-            with open(progress_file, 'w') as f:
-                json.dump(existing_progress, f)
-            
-            # 清空缓存
-            PROGRESS_CACHE.clear()
-            
-    except Exception as e:
-        logger.error(f"保存进度失败: {e}")
+# 下载器: 进程内共用一个连接池会话和下载索引
+_downloader = None
+_downloader_lock = threading.Lock()
 
-# 性能优化: 使用缓存减少相同URL的下载请求
-DOWNLOAD_CACHE = {}
+def get_downloader():
+    """获取共享的下载器"""
+    global _downloader
+    with _downloader_lock:
+        if _downloader is None:
+            download_config = CONFIG.get('download', {})
+            _downloader = QuotsoftDownloader(
+                CONFIG['paths']['download_dir'],
+                max_workers=int(os.environ.get('DOWNLOAD_MAX_WORKERS', download_config.get('max_workers', 4))),
+                timeout=download_config.get('timeout', 30),
+                retry_attempts=download_config.get('retry_attempts', 3),
+                retry_delay=download_config.get('retry_delay', 5),
+                refresh_days=download_config.get('refresh_days', 2),
+                compression=os.environ.get('RAW_ARCHIVE_COMPRESSION', download_config.get('compression', 'gzip'))
+            )
+        return _downloader
 
 def download_air_data(date_obj):
-    """从网络下载指定日期的空气质量数据"""
-    date_str = date_obj.strftime('%Y%m%d')
-    url = f"https://quotsoft.net/air/data/china_cities_{date_str}.csv"
-    
-    # 检查缓存
-    if url in DOWNLOAD_CACHE:
-        return DOWNLOAD_CACHE[url]
-    
-    download_dir = Path(CONFIG['paths']['download_dir'])
-    file_path = download_dir / f"china_cities_{date_str}.csv"
-    
-    # 检查文件是否已存在
-    if file_path.exists():
-        DOWNLOAD_CACHE[url] = file_path
-        return file_path
-    
-    logger.info(f"准备下载文件到: {file_path}")
-    
-    for attempt in range(CONFIG['download']['retry_attempts']):
-        try:
-            # 性能优化: 使用会话维持连接，添加超时和头信息
-            session = requests.Session()
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            response = session.get(url, timeout=CONFIG['download']['timeout'], headers=headers)
-            if response.status_code == 200:
-                with open(file_path, 'wb') as f:
-                    f.write(response.content)
-                logger.info(f"数据下载成功: {file_path}")
-                DOWNLOAD_CACHE[url] = file_path
-                return file_path
-            else:
-                logger.warning(f"下载失败，状态码: {response.status_code}, 尝试次数: {attempt + 1}")
-                if attempt < CONFIG['download']['retry_attempts'] - 1:
-                    time.sleep(CONFIG['download']['retry_delay'])
-        except Exception as e:
-            logger.error(f"下载出错: {e}, 尝试次数: {attempt + 1}")
-            if attempt < CONFIG['download']['retry_attempts'] - 1:
-                time.sleep(CONFIG['download']['retry_delay'])
-    
-    return None
+    """从网络下载指定日期的空气质量数据
+
+    Returns:
+        Path或None: 本地文件路径（已是最新时直接返回已有文件），下载失败或服务端没有该文件时返回None
+    """
+    downloader = get_downloader()
+    result = downloader.download(date_obj)
+    downloader.save_index()
+    return Path(result['path']) if result['path'] else None
+
+# 导入台账: 记录每个原始文件的处理状态，替代progress.json
+_ledger = None
+_ledger_lock = threading.Lock()
+
+def get_ledger():
+    """获取导入台账（默认保存在日志目录下的ingest_ledger.db）"""
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            db_path = os.environ.get('INGEST_LEDGER_DB', os.path.join(CONFIG['paths']['log_dir'], LEDGER_FILE))
+            _ledger = IngestLedger(db_path)
+        return _ledger
 
 # 性能优化: 缓存城市索引结果
 city_indices_cache = {}
 
 def get_city_indices(header):
-    """获取广东省城市在数据中的索引位置"""
+    """获取登记的城市在数据中的索引位置（按城市名精确匹配）"""
     # 使用缓存机制
     cache_key = ','.join(header)
     if cache_key in city_indices_cache:
         return city_indices_cache[cache_key]
     
-    city_indices = {}
-    for city in GUANGDONG_CITIES:
-        for i, col_name in enumerate(header):
-            try:
-                # 尝试解码中文名称处理
-                decoded_col = col_name
-                # 检查城市名是否包含在列名中，或列名是否包含在城市名中
-                city_without_suffix = city.replace('市', '')  # 去掉"市"字进行比较
-                if city in decoded_col or city_without_suffix in decoded_col or decoded_col in city:
-                    city_indices[city] = i
-                    break
-            except Exception as e:
-                continue
+    columns = resolve_city_columns(header)
+    city_indices = {city: header.index(column) for column, city in columns.items()}
     
     # 保存到缓存
     city_indices_cache[cache_key] = city_indices
     return city_indices
 
-# 优化流程: 使用共享的数据检测日期范围，避免重复检查文件
-PROCESSED_DATES = set()
-
 def process_data_file(file_path):
-    """处理单个数据文件"""
+    """处理单个数据文件
+
+    处理前在导入台账中认领文件: 已导入且内容未变化、或正由其他进程处理的文件直接跳过；
+    处理结束后记录行数和各阶段耗时，失败时记录错误，下次运行会重新处理。
+    """
+    ledger = get_ledger()
+    key = file_key(file_path)
+    worker = worker_id()
+    conn = None
     try:
         start_time = perf_counter()
-        logger.info(f"开始处理文件: {file_path}")
-        processed_records = 0
-        
-        # 提取文件中的日期
-        try:
-            file_name = os.path.basename(file_path)
-            date_str = file_name.replace('china_cities_', '').replace('.csv', '')
-            file_date = datetime.strptime(date_str, '%Y%m%d').date()
-            
-            # 检查是否已经处理过这个日期
-            if file_date in PROCESSED_DATES:
-                logger.info(f"文件 {file_path} 对应的日期 {file_date} 已处理过，跳过")
-                return 0
-        except Exception as e:
-            logger.warning(f"无法从文件名提取日期: {e}")
-        
-        # 尝试不同的编码方式读取文件
-        encodings = ['utf-8', 'gbk', 'gb2312', 'cp936']
-        df = None
-        
-        for encoding in encodings:
-            try:
-                # 性能优化: 使用chunksize参数分批读取大文件
-                df = pd.read_csv(file_path, encoding=encoding)
-                break
-            except UnicodeDecodeError:
-                continue
-            except Exception as e:
-                logger.warning(f"读取文件时出错: {e}")
-                continue
-        
-        if df is None:
-            logger.error(f"无法读取文件: {file_path}")
-            return 0
-        
-        # 检查必要的列是否存在，兼容可能的不同列名
-        required_cols_sets = [
-            ['date', 'hour', 'type'],  # 标准格式
-            ['日期', '小时', '类型']    # 可能的中文列名
-        ]
-        
-        has_required_cols = False
-        for required_cols in required_cols_sets:
-            if all(col in df.columns for col in required_cols):
-                has_required_cols = True
-                # 如果是中文列名，重命名为英文
-                if required_cols[0] == '日期':
-                    df.rename(columns={
-                        '日期': 'date',
-                        '小时': 'hour',
-                        '类型': 'type'
-                    }, inplace=True)
-                break
-                
-        if not has_required_cols:
-            logger.error(f"文件缺少必要的列: {file_path}")
+        file_date = datetime.strptime(raw_date(file_path), '%Y%m%d').date()
+        if not ledger.claim(key, file_date.strftime('%Y-%m-%d'), file_path, raw_sha256(file_path), worker):
+            logger.info(f"文件 {file_path} 已导入且内容未变化（或正在由其他进程处理），跳过")
             return 0
+        logger.info(f"开始处理文件: {file_path}")
         
-        # 标识广东省城市的列
-        gd_cities_cols = []
-        for col in df.columns:
-            for city in GUANGDONG_CITIES:
-                city_without_suffix = city.replace('市', '')  # 去掉"市"字进行比较
-                if city in col or city_without_suffix in col or col in city:
-                    if col not in gd_cities_cols:
-                        gd_cities_cols.append(col)
-                    break
-        
-        if not gd_cities_cols:
-            logger.error(f"未找到任何广东省城市: {file_path}")
-            return 0
-        
-        # 性能优化: 预先创建指标类型的数据集，避免多次筛选
-        indicator_data = {}
-        for indicator in ['AQI', 'PM2.5', 'PM10', 'SO2', 'NO2', 'O3', 'CO']:
-            if indicator in df['type'].values:
-                indicator_data[indicator] = df[df['type'] == indicator]
-        
-        # 处理文件中的数据
-        all_processed_data = []
-        
-        # 获取AQI类型的数据
-        aqi_data = indicator_data.get('AQI', df[df['type'] == 'AQI'])
-        if len(aqi_data) == 0:
-            logger.warning(f"文件中没有AQI类型的数据: {file_path}")
-            return 0
-        
-        # 性能优化: 创建按日期和小时分组的字典，避免每次重新分组
-        date_hour_groups = {}
-        for _, row in aqi_data.iterrows():
-            key = (row['date'], row['hour'])
-            if key not in date_hour_groups:
-                date_hour_groups[key] = []
-            date_hour_groups[key].append(row)
-        
-        # 按日期小时分组处理
-        for (date, hour), group_rows in date_hour_groups.items():
-            # 格式化日期
-            try:
-                date_str = str(date)
-                # 如果日期格式是YYYYMMDD，转换为YYYY-MM-DD
-                if len(date_str) == 8 and date_str.isdigit():
-                    date_obj = datetime.strptime(date_str, '%Y%m%d')
-                    date_str = date_obj.strftime('%Y-%m-%d')
-                    
-                # 记录处理过的日期
-                PROCESSED_DATES.add(date_obj.date())
-            except Exception as e:
-                logger.warning(f"日期格式错误: {date}, {e}")
-                continue
-            
-            # 创建groupby DataFrame
-            group = pd.DataFrame(group_rows)
-            
-            # 并行处理每个城市的记录
-            city_records = []
-            
-            # 优化: 使用线程池处理多个城市的数据
-            with ThreadPoolExecutor(max_workers=min(len(gd_cities_cols), 10)) as executor:
-                # 准备城市任务
-                future_to_city = {
-                    executor.submit(process_city_data, 
-                                   city_col, 
-                                   group, 
-                                   date_str, 
-                                   hour, 
-                                   indicator_data): city_col 
-                    for city_col in gd_cities_cols
-                }
-                
-                # 收集结果
-                for future in future_to_city:
-                    try:
-                        result = future.result()
-                        if result:
-                            city_records.append(result)
-                    except Exception as e:
-                        logger.error(f"处理城市数据失败: {e}")
-            
-            all_processed_data.extend(city_records)
-            processed_records += len(city_records)
-        
+        # 解析文件: 表头只读一次，按城市名精确选列，一次melt/pivot得到小时长表
+        hourly = parse_quotsoft_file(file_path)
+        all_processed_data, quarantined = [], []
+        if hourly is None or hourly.empty:
+            logger.warning(f"文件中没有可用的城市数据: {file_path}")
+        else:
+            # 聚合为每城市每天一行（日均浓度、O3最大8小时均值、按日均浓度计算AQI），每个城市每天只写一次数据库
+            # 整个日数据表向量化校验，未通过的记录转入隔离表
+            all_processed_data, quarantined = split_records(aggregate_daily(hourly))
+        processed_records = len(all_processed_data) + len(quarantined)
+        parse_seconds = perf_counter() - start_time
+        
+        inserted_total = 0
+        if quarantined:
+            conn = get_db_connection()
+            quarantine_records(conn, quarantined, os.path.basename(file_path))
         if all_processed_data:
             # 性能优化: 使用批量插入提高数据库写入性能
-            try:
-                conn = get_db_connection()
-                # 增大批量处理的大小
-                batch_size = 1000
-                for i in range(0, len(all_processed_data), batch_size):
-                    batch = all_processed_data[i:i+batch_size]
-                    inserted_count = insert_data_to_db(conn, batch)
-                    logger.info(f"已插入 {inserted_count} 条记录（批次 {i//batch_size + 1}/{(len(all_processed_data) + batch_size - 1) // batch_size}）")
-                
-                # 记录导入结果
-                file_name = os.path.basename(file_path)
-                log_import_result(conn, file_name, processed_records, 
-                               "SUCCESS", f"处理了{len(all_processed_data)}条记录")
-                
-                # 保存到CSV（可选）
-                if CONFIG.get('save_csv', True):
-                    # 获取文件日期
-                    file_date_str = file_name.replace('china_cities_', '').replace('.csv', '')
-                    file_date = datetime.strptime(file_date_str, '%Y%m%d').strftime('%Y-%m-%d')
-                    save_to_csv(all_processed_data, file_date)
-            except Exception as e:
-                logger.error(f"保存数据失败: {e}")
-                return 0
-            finally:
-                if conn:
-                    conn.close()
-        
-        # 保存处理进度
-        save_progress(file_path, processed_records)
+            conn = conn or get_db_connection()
+            # 增大批量处理的大小
+            batch_size = 1000
+            for i in range(0, len(all_processed_data), batch_size):
+                batch = all_processed_data[i:i+batch_size]
+                inserted_count = insert_data_to_db(conn, batch)
+                inserted_total += inserted_count
+                logger.info(f"已插入 {inserted_count} 条记录（批次 {i//batch_size + 1}/{(len(all_processed_data) + batch_size - 1) // batch_size}）")
+            
+            # 记录导入结果
+            file_name = os.path.basename(file_path)
+            log_import_result(conn, file_name, processed_records, 
+                           "SUCCESS", f"处理了{len(all_processed_data)}条记录")
+            update_daily_ranks(conn, all_processed_data)
+            publish_data_change(conn, all_processed_data, file_name)
+            
+            # 保存到CSV（可选）
+            if CONFIG.get('save_csv', True):
+                save_to_csv(all_processed_data, file_date.strftime('%Y-%m-%d'))
         
         # 记录处理时间
         end_time = perf_counter()
+        ledger.complete(key, processed_records, inserted_total, {
+            'parse': round(parse_seconds, 3),
+            'write': round(end_time - start_time - parse_seconds, 3),
+            'total': round(end_time - start_time, 3)
+        }, worker)
         logger.info(f"文件处理完成: {file_path}, 处理记录数: {processed_records}, 耗时: {end_time - start_time:.2f}秒")
         
         return processed_records
     except Exception as e:
         logger.error(f"处理文件失败: {file_path}, 错误: {e}")
-        return 0
-
-def process_city_data(city_col, group, date_str, hour, indicator_data):
-    """处理单个城市的数据"""
-    try:
-        # 获取城市名称，保留"市"字
-        city_name = None
-        for city in GUANGDONG_CITIES:
-            city_without_suffix = city.replace('市', '')  # 去掉"市"字进行比较
-            if city in city_col or city_without_suffix in city_col or city_col in city:
-                city_name = city  # 使用完整城市名（带"市"字）
-                break
-        
-        if not city_name:
-            return None
-        
-        # 获取AQI值
-        aqi_value = group[city_col].iloc[0] if not pd.isna(group[city_col].iloc[0]) else None
-        if aqi_value is None or (isinstance(aqi_value, str) and not aqi_value.strip()):
-            return None
-        
-        # 转换为数值类型
         try:
-            aqi_value = float(aqi_value)
-        except (ValueError, TypeError):
-            return None
-        
-        # 创建记录
-        record = {
-            'city': city_name,  # 保留完整城市名，包括"市"字
-            'date': date_str,
-            'aqi': aqi_value,
-            'pm25': None,
-            'pm10': None,
-            'so2': None,
-            'no2': None,
-            'o3': None,
-            'co': None,
-            'quality_level': determine_quality_level(aqi_value)
-        }
-        
-        # 优化: 一次获取所有指标值
-        indicators = [
-            ('PM2.5', 'pm25'),
-            ('PM10', 'pm10'),
-            ('SO2', 'so2'),
-            ('NO2', 'no2'),
-            ('O3', 'o3'),
-            ('CO', 'co')
-        ]
-        
-        for indicator_type, field_name in indicators:
-            if indicator_type in indicator_data:
-                indicator_group = indicator_data[indicator_type]
-                indicator_group = indicator_group[(indicator_group['date'] == group['date'].iloc[0]) & 
-                                                 (indicator_group['hour'] == hour)]
-                if len(indicator_group) > 0 and city_col in indicator_group.columns:
-                    indicator_value = indicator_group[city_col].iloc[0] if not pd.isna(indicator_group[city_col].iloc[0]) else None
-                    try:
-                        record[field_name] = float(indicator_value) if indicator_value is not None else None
-                    except (ValueError, TypeError):
-                        pass
-        
-        # 验证数据合理性
-        if validate_record(record):
-            return record
-    except Exception as e:
-        logger.error(f"处理城市数据失败，城市={city_col}, 错误={e}")
-    
-    return None
+            ledger.fail(key, e, worker)
+        except Exception as e2:
+            logger.error(f"更新导入台账失败: {e2}")
+        return 0
+    finally:
+        if conn:
+            conn.close()
 
 def validate_record(record):
     """验证单条记录的数据合理性"""
@@ -675,6 +454,75 @@ def determine_quality_level(aqi):
         return "严重污染"
 
 # 性能优化: 使用批量插入优化数据库插入性能
+# 日数据表主键冲突时的更新策略：污染物新值为空时保留原值
+NEWDATA_UPDATE_COLUMNS = ['province', 'aqi_index', 'quality_level', 'aqi_rank',
+                          'pm25_avg', 'pm10_avg', 'so2_avg', 'no2_avg', 'co_avg', 'o3_avg']
+NEWDATA_KEEP_EXISTING = ['aqi_rank', 'pm25_avg', 'pm10_avg', 'so2_avg', 'no2_avg', 'co_avg', 'o3_avg']
+
+def record_to_row(record):
+    """把处理后的记录转换为数据表的一行（列顺序见bulk_loader.TARGET_COLUMNS）"""
+    return (
+        record['city'],
+        get_region_registry().province_of(record['city']),  # 省份信息来自区域登记表
+        record['date'],
+        record['aqi'],
+        record['quality_level'],
+        record.get('aqi_rank'),  # 批内按日期排名，写库后由update_daily_ranks按涉及的日期校正
+        record['pm25'],
+        record['pm10'],
+        record['so2'],
+        record['no2'],
+        record['co'],
+        record['o3'],
+        int(record['date'][:4])
+    )
+
+def bulk_insert_data_to_db(records, table_name='air_quality_newdata'):
+    """通过LOAD DATA LOCAL INFILE批量导入记录，适合回填大量数据
+
+    服务端未开启local_infile等原因导致批量导入失败时，回退到insert_data_to_db分批插入。
+
+    Returns:
+        dict: 导入统计，包含各阶段耗时和每秒行数（回退时mode为executemany）
+    """
+    if not records:
+        return {'mode': 'bulk', 'rows': 0, 'affected': 0, 'stages': {}}
+
+    conn = None
+    try:
+        conn = connect_bulk(CONFIG['database'])
+        result = bulk_upsert(conn, (record_to_row(record) for record in records), table_name,
+                             update_columns=NEWDATA_UPDATE_COLUMNS, keep_existing=NEWDATA_KEEP_EXISTING)
+        result['mode'] = 'bulk'
+        return result
+    except (BulkLoadError, Error) as e:
+        if isinstance(e, BulkLoadError) and e.local_infile_disabled:
+            logger.warning(f"服务端未开启LOCAL INFILE，回退到分批插入: {e}")
+        else:
+            logger.error(f"批量导入失败，回退到分批插入: {e}")
+    finally:
+        if conn:
+            conn.close()
+
+    start = perf_counter()
+    conn = get_db_connection()
+    try:
+        batch_size = CONFIG.get('processing', {}).get('batch_size', 1000)
+        affected = 0
+        for i in range(0, len(records), batch_size):
+            affected += insert_data_to_db(conn, records[i:i + batch_size], table_name)
+    finally:
+        conn.close()
+    seconds = perf_counter() - start
+    return {
+        'mode': 'executemany',
+        'rows': len(records),
+        'affected': affected,
+        'seconds': round(seconds, 3),
+        'stages': {'insert': {'seconds': round(seconds, 3),
+                              'rows_per_second': round(len(records) / seconds, 1) if seconds > 0 else None}}
+    }
+
 def insert_data_to_db(conn, data_batch, table_name='air_quality_newdata'):
     """批量插入数据到数据库"""
     if not data_batch:
@@ -693,6 +541,7 @@ def insert_data_to_db(conn, data_batch, table_name='air_quality_newdata'):
         province = VALUES(province),
         aqi_index = VALUES(aqi_index),
         quality_level = VALUES(quality_level),
+        aqi_rank = COALESCE(VALUES(aqi_rank), aqi_rank),
         pm25_avg = COALESCE(VALUES(pm25_avg), pm25_avg),
         pm10_avg = COALESCE(VALUES(pm10_avg), pm10_avg),
         so2_avg = COALESCE(VALUES(so2_avg), so2_avg),
@@ -702,29 +551,7 @@ def insert_data_to_db(conn, data_batch, table_name='air_quality_newdata'):
         """
         
         # 准备批量数据
-        values = []
-        for record in data_batch:
-            # 提取年份
-            date_obj = datetime.strptime(record['date'], '%Y-%m-%d')
-            year = date_obj.year
-            
-            # 准备数据
-            row = (
-                record['city'],
-                "广东省",  # 添加省份信息
-                record['date'],
-                record['aqi'],
-                record['quality_level'],
-                None,  # aqi_rank 暂时为空
-                record['pm25'],
-                record['pm10'],
-                record['so2'],
-                record['no2'],
-                record['co'],
-                record['o3'],
-                year
-            )
-            values.append(row)
+        values = [record_to_row(record) for record in data_batch]
         
         # 性能优化: 使用executemany进行批量插入
         cursor.executemany(query, values)
@@ -746,26 +573,8 @@ def insert_data_to_db(conn, data_batch, table_name='air_quality_newdata'):
                 logger.info(f"尝试逐条插入 {len(data_batch)} 条记录...")
                 for record in data_batch:
                     try:
-                        # 提取年份
-                        date_obj = datetime.strptime(record['date'], '%Y-%m-%d')
-                        year = date_obj.year
-                        
                         # 逐条插入
-                        cursor.execute(query, (
-                            record['city'],
-                            "广东省",  # 添加省份信息
-                            record['date'],
-                            record['aqi'],
-                            record['quality_level'],
-                            None,  # aqi_rank 暂时为空
-                            record['pm25'],
-                            record['pm10'],
-                            record['so2'],
-                            record['no2'],
-                            record['co'],
-                            record['o3'],
-                            year
-                        ))
+                        cursor.execute(query, record_to_row(record))
                         conn.commit()
                         inserted_count += 1
                     except Error as e2:
@@ -778,6 +587,215 @@ def insert_data_to_db(conn, data_batch, table_name='air_quality_newdata'):
         
     return inserted_count
 
+# 未通过校验的日数据写入隔离表，reason_codes为逗号分隔的原因代码（见record_validation）
+QUARANTINE_TABLE = 'air_quality_quarantine'
+
+def quarantine_records(conn, records, source):
+    """把未通过校验的记录写入隔离表，同一来源重复导入时覆盖原记录
+
+    Returns:
+        int: 影响的行数
+    """
+    if not records:
+        return 0
+    query = f"""
+    INSERT INTO {QUARANTINE_TABLE}
+    (city, record_date, aqi_index, quality_level, pm25_avg, pm10_avg, so2_avg, no2_avg, co_avg, o3_avg,
+     reason_codes, source)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+    aqi_index = VALUES(aqi_index),
+    quality_level = VALUES(quality_level),
+    pm25_avg = VALUES(pm25_avg),
+    pm10_avg = VALUES(pm10_avg),
+    so2_avg = VALUES(so2_avg),
+    no2_avg = VALUES(no2_avg),
+    co_avg = VALUES(co_avg),
+    o3_avg = VALUES(o3_avg),
+    reason_codes = VALUES(reason_codes),
+    created_at = CURRENT_TIMESTAMP
+    """
+    values = [(record['city'], record['date'], record['aqi'], record['quality_level'],
+               record['pm25'], record['pm10'], record['so2'], record['no2'], record['co'], record['o3'],
+               record['reason_codes'], source) for record in records]
+    cursor = conn.cursor()
+    try:
+        cursor.executemany(query, values)
+        conn.commit()
+        logger.warning(f"{source}: {len(records)} 条记录转入隔离表")
+        return cursor.rowcount
+    finally:
+        cursor.close()
+
+def update_daily_ranks(conn, records, table_name='air_quality_newdata'):
+    """写入日数据后重新计算涉及日期的AQI排名（同一天迟到的城市会改变其他城市的名次），失败不影响导入"""
+    if not records:
+        return 0
+    try:
+        return refresh_ranks(conn, {record['date'] for record in records}, table_name)
+    except Error as e:
+        logger.warning(f"AQI排名未更新，下次写入这些日期时重新计算: {e}")
+        return 0
+
+def publish_data_change(conn, records, source, table_name='air_quality_newdata'):
+    """写入日数据后发布变更事件（涉及的城市和日期范围），各服务据此失效缓存"""
+    if not records:
+        return None
+    cities, start_date, end_date = summarize_records(records)
+    return publish_change(conn, [table_name], cities, start_date, end_date, rows=len(records), source=source)
+
+def write_jobs(jobs):
+    """流水线写库阶段: 把一批文件的记录写入数据库（未通过校验的写入隔离表），并为每个文件记录导入日志和保存CSV"""
+    records = [record for job in jobs for record in job['records']]
+    quarantined = [job for job in jobs if job.get('quarantined')]
+    if records or quarantined:
+        conn = get_db_connection()
+        try:
+            batch_size = CONFIG.get('processing', {}).get('batch_size', 1000)
+            for i in range(0, len(records), batch_size):
+                inserted_count = insert_data_to_db(conn, records[i:i + batch_size])
+                logger.info(f"已插入 {inserted_count} 条记录（{len(jobs)} 个文件）")
+            for job in quarantined:
+                quarantine_records(conn, job['quarantined'], os.path.basename(job['ref']))
+            update_daily_ranks(conn, records)
+            publish_data_change(conn, records, ', '.join(os.path.basename(job['ref']) for job in jobs)[:255])
+            for job in jobs:
+                if job['records']:
+                    log_import_result(conn, os.path.basename(job['ref']), len(job['records']),
+                                      "SUCCESS", f"处理了{len(job['records'])}条记录")
+        finally:
+            conn.close()
+    
+    # 保存到CSV（可选）
+    if CONFIG.get('save_csv', True):
+        for job in jobs:
+            if job['records']:
+                save_to_csv(job['records'], job['date'])
+
+def run_ingest_pipeline(date_range):
+    """以流水线方式下载并导入指定日期的数据
+
+    Returns:
+        list: 写库成功的文件（job字典，包含key, ref, date, records等）
+    """
+    pipeline_config = CONFIG.get('pipeline', {})
+    parse_workers = int(os.environ.get('PIPELINE_PARSE_WORKERS',
+                                       pipeline_config.get('parse_workers', min(4, os.cpu_count() or 1))))
+    downloader = get_downloader()
+    # 解析聚合在常驻进程池中执行，解析阶段的线程数与进程数一致
+    with ProcessPoolExecutor(max_workers=parse_workers) as parse_executor:
+        start_workers(parse_executor, parse_workers)
+        pipeline = build_ingest_pipeline(
+            downloader, get_ledger(), write_jobs,
+            validate=split_records,
+            parse_executor=parse_executor,
+            parse_workers=parse_workers,
+            write_workers=pipeline_config.get('write_workers', 1),
+            queue_size=pipeline_config.get('queue_size', 8),
+            write_batch=pipeline_config.get('write_batch', 8)
+        )
+        try:
+            jobs = pipeline.run(date_range)
+        finally:
+            downloader.save_index()
+    pipeline.log_report()
+    return jobs
+
+# 增量导入在导入台账中记录水位线使用的数据源标识
+INCREMENTAL_SOURCE = 'quotsoft_china_cities'
+
+def get_latest_record_date():
+    """两个日数据表中最新的数据日期，没有数据时返回None"""
+    conn = get_db_connection()
+    try:
+        dates = [get_latest_date_from_db(conn, table) for table in ('air_quality_data', 'air_quality_newdata')]
+    finally:
+        conn.close()
+    dates = [d for d in dates if d]
+    return max(dates) if dates else None
+
+def run_incremental(today=None, writer=None, downloader=None, ledger=None):
+    """增量导入: 从水位线所在的日期到今天，只重新聚合并写入这几天的日数据
+
+    quotsoft当天的文件每小时追加新的小时数据。水位线记录已导入的最新日期和小时，
+    当天未满24小时时下次仍从这一天开始；文件没有变化时条件请求返回304，导入台账按内容哈希跳过。
+    水位线之前的日期不会被下载、解析或改写。某一天的文件没有发布、下载失败、正被其他进程处理或导入失败时，
+    不再处理之后的日期，水位线停在这一天之前，下次增量导入从这一天重新开始。
+
+    Args:
+        today (date): 截止日期，默认为今天
+        writer (callable): 写库函数，默认为write_jobs
+        downloader (QuotsoftDownloader): 默认为共享的下载器
+        ledger (IngestLedger): 默认为共享的导入台账
+
+    Returns:
+        dict: dates(检查的日期数), files(导入的文件数), records(写入的记录数), watermark(新的水位线)
+    """
+    ledger = ledger or get_ledger()
+    downloader = downloader or get_downloader()
+    writer = writer or write_jobs
+    today = today or datetime.now().date()
+    watermark = ledger.get_watermark(INCREMENTAL_SOURCE)
+    if watermark is not None:
+        start_date = datetime.strptime(watermark[0], '%Y-%m-%d').date()
+        if watermark[1] >= 23:
+            start_date += timedelta(days=1)
+    else:
+        latest_date = get_latest_record_date()
+        start_date = latest_date + timedelta(days=1) if latest_date else today - timedelta(days=1)
+        logger.info(f"增量导入没有水位线，从数据库最新日期之后开始: {start_date}")
+    start_date = min(start_date, today)
+    date_range = [start_date + timedelta(days=i) for i in range((today - start_date).days + 1)]
+    logger.info(f"增量导入: 水位线 {watermark}, 检查 {start_date} 到 {today}")
+
+    files = 0
+    records_written = 0
+    # 当天和前一天的文件在下载器的refresh_days内，总是发条件请求确认是否有新的小时数据
+    for result in downloader.download_many(date_range):
+        if result['status'] not in (DOWNLOADED, NOT_MODIFIED, CACHED):
+            # 当天的文件可能还没有发布；之后的日期即使可用也不导入，否则水位线会越过这一天
+            logger.info(f"增量导入: {result['date']} 没有可用文件 ({result['status']})，水位线停在这一天之前")
+            break
+        ref = result['path']
+        key = file_key(ref)
+        worker = worker_id()
+        file_date = result['date'].strftime('%Y-%m-%d')
+        if not ledger.claim(key, file_date, ref, raw_sha256(ref), worker):
+            entry = ledger.get(key)
+            if entry is None or entry['state'] != DONE:
+                # 正被其他进程处理，结果未知
+                logger.info(f"增量导入: {ref} 正在由其他进程导入，水位线停在这一天之前")
+                break
+            logger.info(f"增量导入: {ref} 没有新数据，跳过")
+            continue
+        start = perf_counter()
+        try:
+            hourly = parse_quotsoft_file(ref)
+            if hourly is None or hourly.empty:
+                ledger.complete(key, 0, 0, {'total': round(perf_counter() - start, 3)}, worker)
+                continue
+            last_hour = int(hourly['hour'].max())
+            valid, quarantined = split_records(aggregate_daily(hourly))
+            parse_seconds = perf_counter() - start
+            writer([{'key': key, 'ref': ref, 'date': file_date, 'records': valid, 'quarantined': quarantined}])
+            end = perf_counter()
+            ledger.complete(key, len(valid) + len(quarantined), len(valid), {
+                'parse': round(parse_seconds, 3),
+                'write': round(end - start - parse_seconds, 3),
+                'total': round(end - start, 3)
+            }, worker)
+        except Exception as e:
+            logger.error(f"增量导入失败: {ref}, 错误: {e}")
+            ledger.fail(key, e, worker)
+            break
+        ledger.advance_watermark(INCREMENTAL_SOURCE, file_date, last_hour)
+        files += 1
+        records_written += len(valid)
+        logger.info(f"增量导入: {ref} 已导入到 {last_hour} 时, {len(valid)} 条日数据, 耗时 {end - start:.2f}秒")
+
+    return {'dates': len(date_range), 'files': files, 'records': records_written,
+            'watermark': ledger.get_watermark(INCREMENTAL_SOURCE)}
+
 def check_and_update_data():
     """检查数据库中的最新日期，并下载更新数据"""
     try:
@@ -994,7 +1012,8 @@ def create_tables_if_not_exist(conn):
                 o3_avg FLOAT,
                 data_year INT,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE KEY uc_city_date (city, record_date)
+                UNIQUE KEY uc_city_date (city, record_date),
+                KEY idx_record_date (record_date)
             ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
             """
             cursor.execute(create_table_query)
@@ -1018,6 +1037,39 @@ def create_tables_if_not_exist(conn):
             cursor.execute(create_log_table_query)
             logger.info("创建导入日志表")
             cursor.close()
+        
+        # 检查隔离表是否存在
+        if not check_table_exists(conn, QUARANTINE_TABLE):
+            cursor = conn.cursor()
+            create_quarantine_table_query = f"""
+            CREATE TABLE IF NOT EXISTS {QUARANTINE_TABLE} (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                city VARCHAR(50),
+                record_date DATE,
+                aqi_index FLOAT,
+                quality_level VARCHAR(20),
+                pm25_avg FLOAT,
+                pm10_avg FLOAT,
+                so2_avg FLOAT,
+                no2_avg FLOAT,
+                co_avg FLOAT,
+                o3_avg FLOAT,
+                reason_codes VARCHAR(255) NOT NULL,
+                source VARCHAR(255) NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE KEY uc_city_date_source (city, record_date, source),
+                KEY idx_record_date (record_date)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """
+            cursor.execute(create_quarantine_table_query)
+            logger.info("创建隔离表")
+            cursor.close()
+        
+        # 按日期重新计算AQI排名需要的索引（已有的表补建）
+        ensure_rank_index(conn, 'air_quality_newdata')
+        
+        # 数据变更事件表（各服务轮询该表失效缓存）
+        ensure_change_table(conn)
             
         conn.commit()
         logger.info("数据表已检查完成")
@@ -1080,14 +1132,14 @@ def connect_to_db():
         logger.error(f"数据库连接错误: {e}")
         return None
 
-def main():
+def main(incremental=False):
     try:
         # 初始化日志
         global logger
         logger = setup_logging()
         
         start_time = perf_counter()
-        logger.info("===== 开始运行空气质量数据处理脚本 =====")
+        logger.info(f"===== 开始运行空气质量数据处理脚本{'（增量模式）' if incremental else ''} =====")
         
         # 创建必要的目录
         for path in CONFIG['paths'].values():
@@ -1120,6 +1172,12 @@ def main():
         # !! 原 init_db_pool() 位置移除 !!
         # 连接池已在上面成功初始化，可以继续执行
         
+        # 增量模式: 只检查水位线之后的文件
+        if incremental:
+            result = run_incremental()
+            logger.info(f"增量导入完成: {result}, 耗时: {perf_counter() - start_time:.2f}秒")
+            return
+        
         # 确定需要下载的日期范围 - 现在会使用 get_db_connection() 从池中获取连接
         date_range = check_and_update_data()
         
@@ -1130,52 +1188,13 @@ def main():
         download_dir = Path(CONFIG['paths']['download_dir'])
         download_dir.mkdir(parents=True, exist_ok=True)
         
-        # 性能优化: 并行下载数据
-        logger.info(f"开始下载数据，共 {len(date_range)} 天")
-        
-        # 使用多线程并行下载
-        with ThreadPoolExecutor(max_workers=min(5, len(date_range))) as executor:
-            # 提交下载任务
-            future_to_date = {executor.submit(download_air_data, date_obj): date_obj for date_obj in date_range}
-            
-            # 收集下载结果
-            downloaded_files = []
-            for future in future_to_date:
-                try:
-                    result = future.result()
-                    if result:
-                        downloaded_files.append(result)
-                        logger.info(f"成功下载: {result}")
-                    else:
-                        date_obj = future_to_date[future]
-                        logger.warning(f"下载失败: {date_obj}")
-                except Exception as e:
-                    logger.error(f"下载过程出错: {e}")
-        
-        if not downloaded_files:
-            logger.info("没有找到下载的文件")
-            return
-            
-        logger.info(f"下载完成，找到 {len(downloaded_files)} 个文件等待处理")
-        
-        # 性能优化: 使用进程池并行处理文件
-        with ProcessPoolExecutor(max_workers=min(os.cpu_count(), len(downloaded_files))) as executor:
-            # 提交处理任务
-            future_to_file = {executor.submit(process_data_file, file_path): file_path for file_path in downloaded_files}
-            
-            # 收集处理结果
-            total_processed = 0
-            for future in future_to_file:
-                try:
-                    processed_count = future.result()
-                    total_processed += processed_count
-                    file_path = future_to_file[future]
-                    logger.info(f"文件 {file_path} 处理完成，处理了 {processed_count} 条记录")
-                except Exception as e:
-                    file_path = future_to_file[future]
-                    logger.error(f"处理文件 {file_path} 时出错: {e}")
+        # 下载、解析聚合、校验、写库各阶段同时运行，文件下载完成后立即进入解析
+        logger.info(f"开始下载并处理数据，共 {len(date_range)} 天")
+        jobs = run_ingest_pipeline(date_range)
+        total_processed = sum(len(job['records']) for job in jobs)
         
-        logger.info(f"所有文件处理完成，共处理 {total_processed} 条记录")
+        logger.info(f"所有文件处理完成，共处理 {len(jobs)} 个文件, {total_processed} 条记录")
+        logger.info(f"导入台账: {get_ledger().summary()}")
         
         # 计算总运行时间
         end_time = perf_counter()
@@ -1186,4 +1205,8 @@ def main():
         sys.exit(1)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='下载并处理空气质量数据')
+    parser.add_argument('--incremental', action='store_true',
+                        help='增量模式: 从水位线开始只导入最新的文件（包括当天未满24小时的文件）')
+    args = parser.parse_args()
+    main(incremental=args.incremental)
\ No newline at end of file
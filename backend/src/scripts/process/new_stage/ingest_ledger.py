@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+原始数据导入台账
+基于SQLite记录每个原始文件的导入状态、内容哈希、行数和各阶段耗时，替代progress.json和
+进程内的PROCESSED_DATES集合：
+    1. 处理前用一条UPSERT原子地认领文件，多个进程/线程不会重复处理同一个文件
+    2. 已完成且内容哈希未变的文件直接跳过；文件内容变化（如当天数据更新）时重新处理
+    3. 认领带租约，处理进程崩溃后租约过期，下次运行可以重新认领
+另外按数据源记录水位线（已导入的最新日期和小时），供增量导入确定从哪里继续。
+"""
+
+import os
+import time
+import argparse
+import socket
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+
+from raw_archive import raw_date
+
+logger = logging.getLogger(__name__)
+
+LEDGER_FILE = 'ingest_ledger.db'
+
+# 认领租约秒数，超过后其他进程可以接手
+INGEST_LEASE_SECONDS = int(os.environ.get('INGEST_LEASE_SECONDS', '900'))
+
+# 文件状态
+PROCESSING = 'processing'
+DONE = 'done'
+FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingest_files (
+    file_key TEXT PRIMARY KEY,
+    file_date TEXT,
+    ref TEXT,
+    content_sha256 TEXT,
+    state TEXT NOT NULL,
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER DEFAULT 0,
+    rows_parsed INTEGER,
+    rows_written INTEGER,
+    parse_seconds REAL,
+    write_seconds REAL,
+    total_seconds REAL,
+    error TEXT,
+    started_at TEXT,
+    finished_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_ingest_files_state ON ingest_files (state, file_date);
+CREATE INDEX IF NOT EXISTS idx_ingest_files_date ON ingest_files (file_date);
+CREATE TABLE IF NOT EXISTS ingest_watermarks (
+    source TEXT PRIMARY KEY,
+    watermark_date TEXT NOT NULL,
+    watermark_hour INTEGER NOT NULL,
+    updated_at TEXT
+);
+"""
+
+FIELDS = [
+    'file_key', 'file_date', 'ref', 'content_sha256', 'state', 'worker', 'lease_until', 'attempts',
+    'rows_parsed', 'rows_written', 'parse_seconds', 'write_seconds', 'total_seconds', 'error',
+    'started_at', 'finished_at'
+]
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def file_key(ref):
+    """台账中的文件标识: 原始文件名china_cities_YYYYMMDD.csv，与压缩和打包方式无关"""
+    return f"china_cities_{raw_date(ref)}.csv"
+
+
+def worker_id():
+    """当前处理者标识: 主机名:进程号:线程号"""
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+class IngestLedger:
+    """原始文件导入台账
+
+    每个线程（以及fork出的每个子进程）使用独立的SQLite连接，数据库以WAL模式打开。
+    """
+
+    def __init__(self, db_path, lease_seconds=INGEST_LEASE_SECONDS):
+        self.db_path = str(db_path)
+        self.lease_seconds = lease_seconds
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        conn.commit()
+
+    def _conn(self):
+        # 进程池通过fork创建子进程时会继承父进程的线程局部变量，连接不能跨进程复用
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def claim(self, file_key, file_date, ref, content_sha256, worker=None):
+        """认领一个文件
+
+        已完成且哈希相同、或正被其他处理者在租约内处理的文件不能认领。
+
+        Returns:
+            bool: 是否认领成功
+        """
+        worker = worker or worker_id()
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            cursor = conn.execute(
+                """
+                INSERT INTO ingest_files (file_key, file_date, ref, content_sha256, state, worker,
+                                          lease_until, attempts, started_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, 1, ?)
+                ON CONFLICT(file_key) DO UPDATE SET
+                    file_date = excluded.file_date,
+                    ref = excluded.ref,
+                    content_sha256 = excluded.content_sha256,
+                    state = excluded.state,
+                    worker = excluded.worker,
+                    lease_until = excluded.lease_until,
+                    attempts = ingest_files.attempts + 1,
+                    rows_parsed = NULL,
+                    rows_written = NULL,
+                    parse_seconds = NULL,
+                    write_seconds = NULL,
+                    total_seconds = NULL,
+                    error = NULL,
+                    started_at = excluded.started_at,
+                    finished_at = NULL
+                WHERE NOT (ingest_files.state = 'done'
+                           AND ingest_files.content_sha256 IS excluded.content_sha256)
+                  AND NOT (ingest_files.state = 'processing' AND ingest_files.lease_until > ?)
+                """,
+                (file_key, file_date, str(ref), content_sha256, PROCESSING, worker,
+                 now + self.lease_seconds, datetime.now().strftime(TIME_FORMAT), now)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, file_key, rows_parsed, rows_written, timings=None, worker=None):
+        """标记文件处理完成
+
+        Args:
+            timings (dict): parse / write / total 各阶段秒数
+
+        Returns:
+            bool: 是否更新成功（认领已被他人接手时为False）
+        """
+        timings = timings or {}
+        conn = self._conn()
+        with conn:
+            cursor = conn.execute(
+                """
+                UPDATE ingest_files SET state = ?, rows_parsed = ?, rows_written = ?,
+                    parse_seconds = ?, write_seconds = ?, total_seconds = ?,
+                    lease_until = NULL, error = NULL, finished_at = ?
+                WHERE file_key = ? AND state = 'processing' AND worker = ?
+                """,
+                (DONE, rows_parsed, rows_written, timings.get('parse'), timings.get('write'),
+                 timings.get('total'), datetime.now().strftime(TIME_FORMAT), file_key, worker or worker_id())
+            )
+        if cursor.rowcount != 1:
+            logger.warning(f"导入台账更新失败，认领可能已过期: {file_key}")
+        return cursor.rowcount == 1
+
+    def fail(self, file_key, error, worker=None):
+        """标记文件处理失败，下次运行会重新认领"""
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                """
+                UPDATE ingest_files SET state = ?, error = ?, lease_until = NULL, finished_at = ?
+                WHERE file_key = ? AND state = 'processing' AND worker = ?
+                """,
+                (FAILED, str(error)[:2000], datetime.now().strftime(TIME_FORMAT), file_key, worker or worker_id())
+            )
+
+    def get_watermark(self, source):
+        """数据源的水位线
+
+        Returns:
+            tuple: (日期'YYYY-MM-DD', 小时)，没有记录时返回None
+        """
+        row = self._conn().execute('SELECT watermark_date, watermark_hour FROM ingest_watermarks WHERE source = ?',
+                                   (source,)).fetchone()
+        return (row['watermark_date'], row['watermark_hour']) if row else None
+
+    def advance_watermark(self, source, watermark_date, watermark_hour):
+        """推进水位线，新值不晚于当前水位线时保持不变
+
+        Returns:
+            bool: 水位线是否前进
+        """
+        conn = self._conn()
+        with conn:
+            cursor = conn.execute(
+                """
+                INSERT INTO ingest_watermarks (source, watermark_date, watermark_hour, updated_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(source) DO UPDATE SET
+                    watermark_date = excluded.watermark_date,
+                    watermark_hour = excluded.watermark_hour,
+                    updated_at = excluded.updated_at
+                WHERE (excluded.watermark_date, excluded.watermark_hour)
+                      > (ingest_watermarks.watermark_date, ingest_watermarks.watermark_hour)
+                """,
+                (source, watermark_date, int(watermark_hour), datetime.now().strftime(TIME_FORMAT))
+            )
+            return cursor.rowcount == 1
+
+    def get(self, file_key):
+        row = self._conn().execute('SELECT * FROM ingest_files WHERE file_key = ?', (file_key,)).fetchone()
+        return {field: row[field] for field in FIELDS} if row else None
+
+    def states(self):
+        """所有文件的当前状态 {file_key: state}"""
+        rows = self._conn().execute('SELECT file_key, state FROM ingest_files').fetchall()
+        return {row['file_key']: row['state'] for row in rows}
+
+    def done_keys(self):
+        """所有已完成文件的标识"""
+        rows = self._conn().execute("SELECT file_key FROM ingest_files WHERE state = 'done'").fetchall()
+        return {row['file_key'] for row in rows}
+
+    def reset(self, file_keys=None):
+        """清除台账记录，使文件在下次运行时重新处理
+
+        Args:
+            file_keys (list): 要清除的文件，None表示全部
+        """
+        conn = self._conn()
+        with conn:
+            if file_keys is None:
+                cursor = conn.execute('DELETE FROM ingest_files')
+            else:
+                cursor = conn.executemany('DELETE FROM ingest_files WHERE file_key = ?',
+                                          [(key,) for key in file_keys])
+        return cursor.rowcount
+
+    def summary(self):
+        """各状态的文件数、行数和耗时统计"""
+        rows = self._conn().execute(
+            """
+            SELECT state, COUNT(*) AS files, SUM(rows_parsed) AS rows_parsed,
+                   SUM(rows_written) AS rows_written, SUM(total_seconds) AS seconds,
+                   MIN(file_date) AS first_date, MAX(file_date) AS last_date
+            FROM ingest_files GROUP BY state
+            """
+        ).fetchall()
+        return {row['state']: {key: row[key] for key in row.keys() if key != 'state'} for row in rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='查看或重置原始数据导入台账')
+    parser.add_argument('--db', help='台账数据库路径，默认为日志目录下的ingest_ledger.db')
+    parser.add_argument('--reset', nargs='*', metavar='YYYYMMDD',
+                        help='清除指定日期的记录使其重新导入，不带日期时清除全部')
+    parser.add_argument('--failed', action='store_true', help='列出处理失败的文件')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    db_path = args.db
+    if not db_path:
+        from download_data_process import CONFIG
+        db_path = os.environ.get('INGEST_LEDGER_DB', os.path.join(CONFIG['paths']['log_dir'], LEDGER_FILE))
+    ledger = IngestLedger(db_path)
+
+    if args.reset is not None:
+        keys = [f"china_cities_{date_str}.csv" for date_str in args.reset] if args.reset else None
+        logger.info(f"已清除 {ledger.reset(keys)} 条台账记录")
+    for state, stats in sorted(ledger.summary().items()):
+        print(f"{state}: {stats}")
+    if args.failed:
+        for key, state in sorted(ledger.states().items()):
+            if state == FAILED:
+                print(f"{key}: {ledger.get(key)['error']}")
+
+
+if __name__ == '__main__':
+    main()
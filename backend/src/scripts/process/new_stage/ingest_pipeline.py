@@ -0,0 +1,364 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+流式导入流水线
+下载、解析聚合、校验、写库几个阶段同时运行，阶段之间用有界队列连接，每个阶段有固定数量的
+常驻工作线程：
+    1. 下游处理不过来时队列写满，上游的put阻塞（背压），内存中积压的文件数有上限
+    2. 第一个文件下载完成后立即开始解析，解析与网络I/O重叠，不再等所有文件下载完
+    3. 每个阶段统计处理数、耗时、吞吐量、工作线程利用率、队列平均/最大深度和被下游阻塞的时间，
+       用来判断瓶颈在哪个阶段
+解析聚合是CPU密集的，可以交给常驻的进程池执行，解析阶段的线程只负责提交和等待。
+"""
+
+import os
+import queue
+import logging
+import threading
+from datetime import datetime
+from time import perf_counter
+
+from quotsoft_parser import parse_quotsoft_file
+from daily_aggregation import aggregate_daily, to_daily_records
+from quotsoft_downloader import DOWNLOADED, NOT_MODIFIED, CACHED
+from raw_archive import raw_date, raw_sha256
+from ingest_ledger import file_key, worker_id
+
+logger = logging.getLogger(__name__)
+
+# 阶段之间队列的默认容量
+DEFAULT_QUEUE_SIZE = 8
+
+# 队列深度采样间隔（秒）
+SAMPLE_INTERVAL = 0.05
+
+_SENTINEL = object()
+
+
+class Stage:
+    """流水线中的一个阶段
+
+    Args:
+        name (str): 阶段名称
+        func (callable): 处理函数。batch_size为1时接收单个元素，返回结果（None表示丢弃）；
+            batch_size大于1时接收元素列表，返回结果列表
+        workers (int): 常驻工作线程数
+        queue_size (int): 本阶段输入队列容量
+        batch_size (int): 每次最多合并处理的元素数
+        batch_wait (float): 凑批时等待后续元素的最长秒数
+        on_error (callable): 处理函数抛出异常时调用 on_error(元素或元素列表, 异常)
+    """
+
+    def __init__(self, name, func, workers=1, queue_size=DEFAULT_QUEUE_SIZE, batch_size=1,
+                 batch_wait=0.2, on_error=None):
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers))
+        self.queue_size = max(1, int(queue_size))
+        self.batch_size = max(1, int(batch_size))
+        self.batch_wait = batch_wait
+        self.on_error = on_error
+
+
+class StageMetrics:
+    """单个阶段的运行统计"""
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.items_in = 0
+        self.items_out = 0
+        self.dropped = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.put_wait_seconds = 0.0
+        self.depth_sum = 0
+        self.depth_samples = 0
+        self.depth_max = 0
+        self.first_start = None
+        self.last_end = None
+        self._lock = threading.Lock()
+
+    def record(self, items_in, items_out, dropped, errors, start, end):
+        with self._lock:
+            self.items_in += items_in
+            self.items_out += items_out
+            self.dropped += dropped
+            self.errors += errors
+            self.busy_seconds += end - start
+            self.first_start = start if self.first_start is None else min(self.first_start, start)
+            self.last_end = end if self.last_end is None else max(self.last_end, end)
+
+    def record_put_wait(self, seconds):
+        with self._lock:
+            self.put_wait_seconds += seconds
+
+    def sample_depth(self, depth):
+        with self._lock:
+            self.depth_sum += depth
+            self.depth_samples += 1
+            self.depth_max = max(self.depth_max, depth)
+
+    def to_dict(self, total_seconds):
+        active = (self.last_end - self.first_start) if self.first_start is not None else 0.0
+        return {
+            'stage': self.name,
+            'workers': self.workers,
+            'items_in': self.items_in,
+            'items_out': self.items_out,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'busy_seconds': round(self.busy_seconds, 3),
+            'active_seconds': round(active, 3),
+            'items_per_second': round(self.items_in / active, 2) if active > 0 else None,
+            'utilization': round(self.busy_seconds / (total_seconds * self.workers), 3) if total_seconds > 0 else None,
+            'queue_avg': round(self.depth_sum / self.depth_samples, 2) if self.depth_samples else 0,
+            'queue_max': self.depth_max,
+            'blocked_seconds': round(self.put_wait_seconds, 3)
+        }
+
+
+class Pipeline:
+    """由有界队列连接的多阶段流水线
+
+    第i个阶段的输出写入第i+1个阶段的输入队列，最后一个阶段的输出作为run()的返回值。
+    每个阶段的工作线程各自消费一个结束标记后退出，阶段的最后一个线程退出时再向下游发送结束标记。
+    """
+
+    def __init__(self, stages, sample_interval=SAMPLE_INTERVAL):
+        self.stages = list(stages)
+        self.sample_interval = sample_interval
+        self.queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        self.metrics = [StageMetrics(stage.name, stage.workers) for stage in self.stages]
+        self.source_wait_seconds = 0.0
+        self.total_seconds = 0.0
+        self._remaining = [stage.workers for stage in self.stages]
+        self._lock = threading.Lock()
+        self._results = []
+        self._finished = threading.Event()
+
+    def _put(self, index, item, metrics=None):
+        """写入第index个阶段的输入队列，返回阻塞等待的秒数"""
+        start = perf_counter()
+        self.queues[index].put(item)
+        waited = perf_counter() - start
+        if metrics is not None:
+            metrics.record_put_wait(waited)
+        return waited
+
+    def _emit(self, index, item):
+        if index + 1 < len(self.stages):
+            self._put(index + 1, item, self.metrics[index])
+        else:
+            with self._lock:
+                self._results.append(item)
+
+    def _take(self, index):
+        """从输入队列取一批元素，返回 (元素列表, 是否已收到结束标记)"""
+        stage = self.stages[index]
+        in_queue = self.queues[index]
+        item = in_queue.get()
+        if item is _SENTINEL:
+            return [], True
+        batch = [item]
+        deadline = perf_counter() + stage.batch_wait
+        while len(batch) < stage.batch_size:
+            timeout = deadline - perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                item = in_queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is _SENTINEL:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _worker(self, index):
+        stage = self.stages[index]
+        metrics = self.metrics[index]
+        done = False
+        while not done:
+            batch, done = self._take(index)
+            if not batch:
+                continue
+            start = perf_counter()
+            outputs = []
+            errors = 0
+            try:
+                if stage.batch_size > 1:
+                    outputs = list(stage.func(batch) or [])
+                else:
+                    outputs = [stage.func(batch[0])]
+            except Exception as e:
+                errors = len(batch)
+                logger.error(f"流水线阶段 {stage.name} 处理失败: {e}")
+                if stage.on_error is not None:
+                    try:
+                        stage.on_error(batch if stage.batch_size > 1 else batch[0], e)
+                    except Exception as e2:
+                        logger.error(f"流水线阶段 {stage.name} 错误处理失败: {e2}")
+            end = perf_counter()
+            kept = [output for output in outputs if output is not None]
+            metrics.record(len(batch), len(kept), max(0, len(batch) - len(kept) - errors), errors, start, end)
+            for output in kept:
+                self._emit(index, output)
+
+        with self._lock:
+            self._remaining[index] -= 1
+            last = self._remaining[index] == 0
+        if last:
+            if index + 1 < len(self.stages):
+                for _ in range(self.stages[index + 1].workers):
+                    self._put(index + 1, _SENTINEL)
+            else:
+                self._finished.set()
+
+    def _monitor(self):
+        while not self._finished.wait(self.sample_interval):
+            for in_queue, metrics in zip(self.queues, self.metrics):
+                metrics.sample_depth(in_queue.qsize())
+
+    def run(self, items):
+        """运行流水线直到所有元素处理完
+
+        Returns:
+            list: 最后一个阶段的输出（顺序与输入无关）
+        """
+        start = perf_counter()
+        threads = [threading.Thread(target=self._monitor, name='pipeline-monitor', daemon=True)]
+        for index, stage in enumerate(self.stages):
+            for number in range(stage.workers):
+                threads.append(threading.Thread(target=self._worker, args=(index,),
+                                                name=f"pipeline-{stage.name}-{number}", daemon=True))
+        for thread in threads:
+            thread.start()
+
+        # 输入也受第一个队列容量限制，第一个阶段处理不过来时在这里等待
+        for item in items:
+            self.source_wait_seconds += self._put(0, item)
+        for _ in range(self.stages[0].workers):
+            self._put(0, _SENTINEL)
+
+        for thread in threads:
+            thread.join()
+        self.total_seconds = perf_counter() - start
+        return self._results
+
+    def report(self):
+        """各阶段统计，blocked_seconds为该阶段因下游队列已满而等待的时间"""
+        return [metrics.to_dict(self.total_seconds) for metrics in self.metrics]
+
+    def log_report(self):
+        for stats in self.report():
+            logger.info(f"流水线阶段 {stats['stage']}: {stats}")
+        logger.info(f"流水线总耗时 {self.total_seconds:.2f}秒, 输入等待 {self.source_wait_seconds:.2f}秒")
+
+
+def start_workers(executor, count):
+    """在流水线线程启动前创建好进程池的全部子进程
+
+    进程池按需创建子进程，Linux下以fork方式创建时父进程中不应有其他线程在运行（可能持有锁）。
+    """
+    for future in [executor.submit(os.getpid) for _ in range(count)]:
+        future.result()
+
+
+def parse_and_aggregate(ref):
+    """解析原始文件并聚合为日数据（在进程池中执行），没有可用数据时返回None"""
+    hourly = parse_quotsoft_file(ref)
+    if hourly is None or hourly.empty:
+        return None
+    return aggregate_daily(hourly)
+
+
+def build_ingest_pipeline(downloader, ledger, write_jobs, validate=None, parse_executor=None,
+                          download_workers=None, parse_workers=2, validate_workers=1, write_workers=1,
+                          queue_size=DEFAULT_QUEUE_SIZE, write_batch=8):
+    """组装 下载 -> 解析聚合 -> 校验 -> 写库 流水线
+
+    解析前在导入台账中认领文件，写库成功后标记完成，任一阶段失败时标记失败。
+
+    Args:
+        downloader (QuotsoftDownloader): 下载器，download_workers默认取其并发数
+        ledger (IngestLedger): 导入台账
+        write_jobs (callable): write_jobs(jobs) 把一批文件的记录写入数据库，失败时抛出异常；
+            每个job包含 key, ref, date('YYYY-MM-DD'), records, quarantined
+        validate (callable): validate(日数据) 返回 (可写库的记录, 隔离的记录)，如record_validation.split_records
+        parse_executor (Executor): 执行解析聚合的进程池，None时在解析线程内执行
+
+    Returns:
+        Pipeline: run(日期列表) 返回写库成功的job列表
+    """
+    def download(date_obj):
+        result = downloader.download(date_obj)
+        if result['status'] not in (DOWNLOADED, NOT_MODIFIED, CACHED):
+            logger.warning(f"下载失败: {date_obj} ({result['status']})")
+            return None
+        return result['path']
+
+    def parse(ref):
+        key = file_key(ref)
+        worker = worker_id()
+        file_date = datetime.strptime(raw_date(ref), '%Y%m%d').strftime('%Y-%m-%d')
+        if not ledger.claim(key, file_date, ref, raw_sha256(ref), worker):
+            logger.info(f"文件 {ref} 已导入且内容未变化（或正在由其他进程处理），跳过")
+            return None
+        start = perf_counter()
+        try:
+            if parse_executor is not None:
+                daily = parse_executor.submit(parse_and_aggregate, ref).result()
+            else:
+                daily = parse_and_aggregate(ref)
+        except Exception as e:
+            ledger.fail(key, e, worker)
+            raise
+        if daily is None:
+            logger.warning(f"文件中没有可用的城市数据: {ref}")
+        return {'key': key, 'ref': ref, 'date': file_date, 'worker': worker, 'start': start,
+                'parse_seconds': perf_counter() - start, 'daily': daily}
+
+    def check(job):
+        daily = job.pop('daily')
+        if validate is not None:
+            valid, quarantined = validate(daily)
+        else:
+            valid, quarantined = to_daily_records(daily), []
+        if quarantined:
+            logger.warning(f"{job['ref']}: {len(quarantined)} 条记录未通过校验，转入隔离表")
+        job['rows_parsed'] = len(valid) + len(quarantined)
+        job['records'] = valid
+        job['quarantined'] = quarantined
+        return job
+
+    def write(jobs):
+        start = perf_counter()
+        write_jobs(jobs)
+        seconds = perf_counter() - start
+        total = sum(len(job['records']) for job in jobs) or 1
+        end = perf_counter()
+        for job in jobs:
+            # 一批的写库耗时按记录数分摊到各个文件
+            ledger.complete(job['key'], job['rows_parsed'], len(job['records']), {
+                'parse': round(job['parse_seconds'], 3),
+                'write': round(seconds * len(job['records']) / total, 3),
+                'total': round(end - job['start'], 3)
+            }, job['worker'])
+        return jobs
+
+    def fail_job(job, error):
+        ledger.fail(job['key'], error, job['worker'])
+
+    def fail_jobs(jobs, error):
+        for job in jobs:
+            fail_job(job, error)
+
+    return Pipeline([
+        Stage('download', download, workers=download_workers or downloader.max_workers, queue_size=queue_size),
+        Stage('parse', parse, workers=parse_workers, queue_size=queue_size),
+        Stage('validate', check, workers=validate_workers, queue_size=queue_size, on_error=fail_job),
+        Stage('write', write, workers=write_workers, queue_size=queue_size, batch_size=write_batch,
+              on_error=fail_jobs)
+    ])
@@ -5,15 +5,17 @@
 广东省空气质量已下载数据处理脚本
 功能：
     1. 读取data/new_data/raw_data目录下的所有已下载数据文件
-    2. 检查对应的processed_newdata目录中是否有对应的处理后文件
+    2. 根据导入台账找出尚未导入的文件（台账中没有记录的文件，以processed_newdata目录中的处理后文件为准）
     3. 处理所有缺失的文件，并同时保存到数据库和处理后的CSV文件
     4. 对于周末或处理结果为0的文件进行特殊处理
+    5. 处理失败的文件在台账中记为failed，下次运行会重新处理
 注意：这个脚本仅处理已下载但未处理的数据，不会下载新数据
 """
 
 import os
 import sys
 import time
+import argparse
 import logging
 import pandas as pd
 import numpy as np
@@ -31,9 +33,16 @@ from functools import lru_cache
 # 导入原始数据处理脚本中的函数
 from download_data_process import (
     setup_logging, init_db_pool, get_db_connection, 
-    validate_record, determine_quality_level,
-    insert_data_to_db, log_import_result, CONFIG, GUANGDONG_CITIES
+    quarantine_records, update_daily_ranks, publish_data_change,
+    insert_data_to_db, bulk_insert_data_to_db, log_import_result, get_ledger, CONFIG
 )
+from quotsoft_parser import parse_quotsoft_file
+from daily_aggregation import aggregate_daily
+from record_validation import split_records
+from raw_archive import list_raw, raw_date, raw_sha256
+from ingest_ledger import DONE, file_key, worker_id
+# 本模块的CONFIG重新读取了config.yaml，不含路径配置，原始数据目录取自处理脚本的配置
+from download_data_process import CONFIG as PROCESS_CONFIG
 
 # 初始化logger
 logger = logging.getLogger(__name__)
@@ -55,9 +64,8 @@ def load_config():
 CONFIG = load_config()
 
 def get_raw_files():
-    """获取raw_data目录下的所有CSV文件"""
-    raw_dir = Path(CONFIG['paths']['download_dir'])
-    return sorted(list(raw_dir.glob('*.csv')))
+    """获取raw_data目录下的所有原始文件（含压缩文件和月度包中的文件），按日期排序"""
+    return [Path(ref) for ref in list_raw(PROCESS_CONFIG['paths']['download_dir']).values()]
 
 def get_processed_files():
     """获取processed_newdata目录下的所有已处理文件"""
@@ -65,173 +73,104 @@ def get_processed_files():
     processed_dir.mkdir(parents=True, exist_ok=True)
     return [f.stem for f in processed_dir.glob('*.csv')]
 
-def find_missing_files(raw_files, processed_files):
-    """找出已下载但尚未处理的文件"""
+def find_missing_files(raw_files, processed_files, ledger_states=None):
+    """找出已下载但尚未处理的文件
+
+    台账中有记录的文件以台账状态为准（失败的文件会重新处理）；
+    台账启用前处理过的文件没有记录，仍以是否有处理后的CSV文件判断。
+    """
+    ledger_states = ledger_states or {}
     missing_files = []
     
     for raw_file in raw_files:
-        file_name = raw_file.stem
-        # 从文件名提取日期
-        date_str = file_name.replace('china_cities_', '')
+        state = ledger_states.get(file_key(raw_file))
+        if state is not None:
+            if state != DONE:
+                missing_files.append(raw_file)
+            continue
         
         # 检查是否已有处理后的文件
-        if date_str not in processed_files:
+        if raw_date(raw_file) not in processed_files:
             missing_files.append(raw_file)
     
     return missing_files
 
-def read_and_process_file(file_path):
-    """直接读取并处理文件，替代原来的process_data_file函数"""
+def read_and_process_file(file_path, bulk_records=None):
+    """直接读取并处理文件，替代原来的process_data_file函数
+
+    Args:
+        bulk_records (list): 批量导入模式下传入，处理结果追加到该列表，由调用方统一写入数据库，
+            写入成功后再在台账中标记完成
+    """
+    ledger = get_ledger()
+    key = file_key(file_path)
+    worker = worker_id()
+    conn = None
     try:
         start_time = perf_counter()
-        logger.info(f"开始处理文件: {file_path}")
         processed_records = 0
         
         # 提取文件中的日期
         file_name = os.path.basename(file_path)
-        date_str = file_name.replace('china_cities_', '').replace('.csv', '')
+        date_str = raw_date(file_path)
         file_date = datetime.strptime(date_str, '%Y%m%d').date()
         
-        # 尝试不同的编码方式读取文件
-        encodings = ['utf-8', 'gbk', 'gb2312', 'cp936']
-        df = None
-        
-        for encoding in encodings:
-            try:
-                df = pd.read_csv(file_path, encoding=encoding)
-                break
-            except UnicodeDecodeError:
-                continue
-            except Exception as e:
-                logger.warning(f"读取文件时出错: {e}")
-                continue
-        
-        if df is None:
-            logger.error(f"无法读取文件: {file_path}")
-            # 为0记录的文件创建一个空的CSV文件，防止重复处理
-            save_empty_csv(date_str)
-            return 0
-        
-        # 检查必要的列是否存在，兼容可能的不同列名
-        required_cols_sets = [
-            ['date', 'hour', 'type'],  # 标准格式
-            ['日期', '小时', '类型']    # 可能的中文列名
-        ]
-        
-        has_required_cols = False
-        for required_cols in required_cols_sets:
-            if all(col in df.columns for col in required_cols):
-                has_required_cols = True
-                # 如果是中文列名，重命名为英文
-                if required_cols[0] == '日期':
-                    df.rename(columns={
-                        '日期': 'date',
-                        '小时': 'hour',
-                        '类型': 'type'
-                    }, inplace=True)
-                break
-                
-        if not has_required_cols:
-            logger.error(f"文件缺少必要的列: {file_path}")
-            save_empty_csv(date_str)
+        # 在台账中认领文件，已导入且内容未变化的文件跳过
+        if not ledger.claim(key, file_date.strftime('%Y-%m-%d'), file_path, raw_sha256(file_path), worker):
+            logger.info(f"文件 {file_path} 已导入且内容未变化（或正在由其他进程处理），跳过")
             return 0
+        logger.info(f"开始处理文件: {file_path}")
         
-        # 标识广东省城市的列
-        gd_cities_cols = []
-        for col in df.columns:
-            for city in GUANGDONG_CITIES:
-                city_without_suffix = city.replace('市', '')  # 去掉"市"字进行比较
-                if city in col or city_without_suffix in col or col in city:
-                    if col not in gd_cities_cols:
-                        gd_cities_cols.append(col)
-                    break
-        
-        if not gd_cities_cols:
-            logger.error(f"未找到任何广东省城市: {file_path}")
+        # 解析文件: 表头只读一次，按城市名精确选列，一次melt/pivot得到小时长表
+        hourly = parse_quotsoft_file(file_path)
+        if hourly is None or hourly.empty:
+            logger.warning(f"文件中没有可用的城市数据: {file_path}")
+            # 为0记录的文件创建一个空的CSV文件，与其他日期的输出保持一致
             save_empty_csv(date_str)
+            seconds = round(perf_counter() - start_time, 3)
+            ledger.complete(key, 0, 0, {'parse': seconds, 'total': seconds}, worker)
             return 0
         
-        # 仅保留AQI类型的数据用于检查
-        aqi_data = df[df['type'] == 'AQI']
-        if len(aqi_data) == 0:
-            logger.warning(f"文件中没有AQI类型的数据: {file_path}")
-            save_empty_csv(date_str)
-            return 0
-            
         # 处理周末数据 - 周末也应该有数据，检查特殊处理
         is_weekend = file_date.weekday() >= 5  # 5是周六，6是周日
         if is_weekend:
             logger.info(f"检测到周末数据 ({file_date}), 应用特殊处理逻辑")
         
-        # 创建指标数据集
-        indicators = {
-            'AQI': aqi_data
-        }
-        for indicator in ['PM2.5', 'PM10', 'SO2', 'NO2', 'O3', 'CO']:
-            indicator_data = df[df['type'] == indicator]
-            if len(indicator_data) > 0:
-                indicators[indicator] = indicator_data
-        
-        # 收集所有广东省的数据
-        all_processed_data = []
-        
-        # 按日期小时分组
-        date_hour_groups = {}
-        for _, row in aqi_data.iterrows():
-            key = (row['date'], row['hour'])
-            if key not in date_hour_groups:
-                date_hour_groups[key] = []
-            date_hour_groups[key].append(row)
-        
-        # 处理每个日期和小时的数据
-        for (date, hour), group_rows in date_hour_groups.items():
-            # 格式化日期
-            try:
-                date_str = str(date)
-                # 如果日期格式是YYYYMMDD，转换为YYYY-MM-DD
-                if len(date_str) == 8 and date_str.isdigit():
-                    date_obj = datetime.strptime(date_str, '%Y%m%d')
-                    date_str = date_obj.strftime('%Y-%m-%d')
-            except Exception as e:
-                logger.warning(f"日期格式错误: {date}, {e}")
-                continue
-            
-            # 创建DataFrame用于处理
-            group = pd.DataFrame(group_rows)
-            
-            # 处理每个广东省城市
-            city_records = []
-            for city_col in gd_cities_cols:
-                record = process_city_data_local(city_col, group, date_str, hour, indicators)
-                if record:
-                    city_records.append(record)
-            
-            all_processed_data.extend(city_records)
-            processed_records += len(city_records)
+        # 聚合为每城市每天一行（日均浓度、O3最大8小时均值、按日均浓度计算AQI），每个城市每天只写一次数据库
+        # 整个日数据表向量化校验，未通过的记录带原因代码转入隔离表
+        all_processed_data, quarantined = split_records(aggregate_daily(hourly))
+        processed_records = len(all_processed_data) + len(quarantined)
+        parse_seconds = perf_counter() - start_time
         
         # 保存数据到数据库和CSV
+        inserted_total = 0
+        if quarantined:
+            conn = get_db_connection()
+            quarantine_records(conn, quarantined, file_name)
         if all_processed_data:
             # 使用自己的save_to_csv函数保存CSV
             save_to_csv(all_processed_data, file_date.strftime('%Y-%m-%d'))
             
+            # 批量导入模式: 暂存记录，所有文件处理完后一次导入，文件在台账中保持处理中状态
+            if bulk_records is not None:
+                bulk_records.extend(all_processed_data)
+                logger.info(f"文件处理完成: {file_path}, 暂存 {len(all_processed_data)} 条记录等待批量导入")
+                return len(all_processed_data)
+            
             # 保存到数据库
-            try:
-                conn = get_db_connection()
-                batch_size = 1000
-                for i in range(0, len(all_processed_data), batch_size):
-                    batch = all_processed_data[i:i+batch_size]
-                    inserted_count = insert_data_to_db(conn, batch)
-                    logger.info(f"已插入 {inserted_count} 条记录（批次 {i//batch_size + 1}/{(len(all_processed_data) + batch_size - 1) // batch_size}）")
-                
-                # 记录导入结果
-                log_import_result(conn, file_name, processed_records, 
-                                "SUCCESS", f"处理了{len(all_processed_data)}条记录")
-            except Exception as e:
-                logger.error(f"保存数据失败: {e}")
-                return 0
-            finally:
-                if conn:
-                    conn.close()
+            conn = conn or get_db_connection()
+            batch_size = 1000
+            for i in range(0, len(all_processed_data), batch_size):
+                batch = all_processed_data[i:i+batch_size]
+                inserted_count = insert_data_to_db(conn, batch)
+                inserted_total += inserted_count
+                logger.info(f"已插入 {inserted_count} 条记录（批次 {i//batch_size + 1}/{(len(all_processed_data) + batch_size - 1) // batch_size}）")
+            
+            # 记录导入结果
+            log_import_result(conn, file_name, processed_records, 
+                            "SUCCESS", f"处理了{len(all_processed_data)}条记录")
+            update_daily_ranks(conn, all_processed_data)
+            publish_data_change(conn, all_processed_data, file_name)
         else:
             # 如果没有提取到数据，创建一个空的CSV文件
             save_empty_csv(file_date.strftime('%Y%m%d'))
@@ -239,89 +178,25 @@ def read_and_process_file(file_path):
         
         # 记录处理时间
         end_time = perf_counter()
+        ledger.complete(key, processed_records, inserted_total, {
+            'parse': round(parse_seconds, 3),
+            'write': round(end_time - start_time - parse_seconds, 3),
+            'total': round(end_time - start_time, 3)
+        }, worker)
         logger.info(f"文件处理完成: {file_path}, 处理记录数: {processed_records}, 耗时: {end_time - start_time:.2f}秒")
         
         return processed_records
     except Exception as e:
+        # 失败的文件在台账中记为failed，下次运行重新处理（不再写空CSV占位）
         logger.error(f"处理文件失败: {file_path}, 错误: {e}")
-        # 提取文件中的日期并创建空文件
         try:
-            file_name = os.path.basename(file_path)
-            date_str = file_name.replace('china_cities_', '').replace('.csv', '')
-            save_empty_csv(date_str)
-        except:
-            pass
+            ledger.fail(key, e, worker)
+        except Exception as e2:
+            logger.error(f"更新导入台账失败: {e2}")
         return 0
-
-def process_city_data_local(city_col, group, date_str, hour, indicator_data):
-    """处理单个城市的数据"""
-    try:
-        # 获取城市名称，保留"市"字
-        city_name = None
-        for city in GUANGDONG_CITIES:
-            city_without_suffix = city.replace('市', '')  # 去掉"市"字进行比较
-            if city in city_col or city_without_suffix in city_col or city_col in city:
-                city_name = city  # 使用完整城市名（带"市"字）
-                break
-        
-        if not city_name:
-            return None
-        
-        # 获取AQI值
-        aqi_value = group[city_col].iloc[0] if not pd.isna(group[city_col].iloc[0]) else None
-        if aqi_value is None or (isinstance(aqi_value, str) and not aqi_value.strip()):
-            return None
-        
-        # 转换为数值类型
-        try:
-            aqi_value = float(aqi_value)
-        except (ValueError, TypeError):
-            return None
-        
-        # 创建记录
-        record = {
-            'city': city_name,  # 保留完整城市名，包括"市"字
-            'date': date_str,
-            'aqi': aqi_value,
-            'pm25': None,
-            'pm10': None,
-            'so2': None,
-            'no2': None,
-            'o3': None,
-            'co': None,
-            'quality_level': determine_quality_level(aqi_value)
-        }
-        
-        # 获取所有指标值
-        indicators = [
-            ('PM2.5', 'pm25'),
-            ('PM10', 'pm10'),
-            ('SO2', 'so2'),
-            ('NO2', 'no2'),
-            ('O3', 'o3'),
-            ('CO', 'co')
-        ]
-        
-        for indicator_type, field_name in indicators:
-            if indicator_type in indicator_data:
-                indicator_group = indicator_data[indicator_type]
-                indicator_group = indicator_group[(indicator_group['date'] == group['date'].iloc[0]) & 
-                                               (indicator_group['hour'] == hour)]
-                
-                if len(indicator_group) > 0 and city_col in indicator_group.columns:
-                    indicator_value = indicator_group[city_col].iloc[0] if not pd.isna(indicator_group[city_col].iloc[0]) else None
-                    try:
-                        record[field_name] = float(indicator_value) if indicator_value is not None else None
-                    except (ValueError, TypeError):
-                        pass
-        
-        # 验证数据合理性
-        if validate_record(record):
-            return record
-    except Exception as e:
-        logger.error(f"处理城市数据失败，城市={city_col}, 错误={e}")
-    
-    return None
+    finally:
+        if conn:
+            conn.close()
 
 def save_to_csv(data, file_date):
     """将处理好的数据保存为CSV文件，以日期命名"""
@@ -378,7 +253,42 @@ def save_empty_csv(date_str):
     except Exception as e:
         logger.error(f"创建空CSV文件失败: {e}")
 
-def main():
+def bulk_import(records, file_counts):
+    """批量导入模式: 一次写入所有文件的记录，为每个文件记录导入日志，并在台账中标记完成
+
+    Args:
+        file_counts (dict): 文件路径 -> 记录数
+    """
+    if not records:
+        return
+    ledger = get_ledger()
+    worker = worker_id()
+    try:
+        result = bulk_insert_data_to_db(records)
+    except Exception as e:
+        for file_path in file_counts:
+            ledger.fail(file_key(file_path), f"批量导入失败: {e}", worker)
+        raise
+    for stage, metrics in result.get('stages', {}).items():
+        logger.info(f"批量导入阶段 {stage}: 耗时 {metrics['seconds']}秒, {metrics['rows_per_second']} 行/秒")
+    logger.info(f"批量导入完成({result['mode']}): {result['rows']} 条记录, 影响 {result['affected']} 行")
+
+    # 批量写入的耗时按记录数分摊到各个文件
+    seconds = result.get('seconds', 0) or 0
+    for file_path, count in file_counts.items():
+        ledger.complete(file_key(file_path), count, count,
+                        {'write': round(seconds * count / len(records), 3)}, worker)
+
+    conn = get_db_connection()
+    try:
+        for file_path, count in file_counts.items():
+            log_import_result(conn, os.path.basename(file_path), count, "SUCCESS", f"批量导入{count}条记录")
+        update_daily_ranks(conn, records)
+        publish_data_change(conn, records, f"批量导入{len(file_counts)}个文件")
+    finally:
+        conn.close()
+
+def main(bulk=False):
     # 初始化日志
     global logger
     logger = setup_logging()
@@ -396,7 +306,7 @@ def main():
     processed_files = get_processed_files()
     
     # 找出缺失的文件
-    missing_files = find_missing_files(raw_files, processed_files)
+    missing_files = find_missing_files(raw_files, processed_files, get_ledger().states())
     logger.info(f"发现 {len(missing_files)} 个已下载但未处理的文件")
     
     if not missing_files:
@@ -405,26 +315,40 @@ def main():
     
     # 显示时间范围
     try:
-        start_date = datetime.strptime(missing_files[0].stem.replace('china_cities_', ''), '%Y%m%d')
-        end_date = datetime.strptime(missing_files[-1].stem.replace('china_cities_', ''), '%Y%m%d')
+        start_date = datetime.strptime(raw_date(missing_files[0]), '%Y%m%d')
+        end_date = datetime.strptime(raw_date(missing_files[-1]), '%Y%m%d')
         logger.info(f"将处理从 {start_date.strftime('%Y-%m-%d')} 到 {end_date.strftime('%Y-%m-%d')} 的数据")
     except Exception as e:
         logger.warning(f"无法解析文件日期范围: {e}")
     
     # 串行处理文件，避免多进程导致的问题
     total_processed = 0
+    bulk_records = [] if bulk else None
+    file_counts = {}
     for file_path in missing_files:
         try:
-            processed_count = read_and_process_file(file_path)
+            processed_count = read_and_process_file(file_path, bulk_records)
             total_processed += processed_count
+            if processed_count:
+                file_counts[file_path] = processed_count
             logger.info(f"文件 {file_path} 处理完成，处理了 {processed_count} 条记录")
         except Exception as e:
             logger.error(f"处理文件 {file_path} 时出错: {e}")
     
+    if bulk:
+        try:
+            bulk_import(bulk_records, file_counts)
+        except Exception as e:
+            logger.error(f"批量导入失败: {e}")
+    
     # 计算总运行时间
     end_time = perf_counter()
     logger.info(f"所有文件处理完成，共处理 {total_processed} 条记录")
     logger.info(f"===== 处理完成，总耗时: {end_time - start_time:.2f}秒 =====")
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='处理已下载未处理的空气质量数据文件')
+    parser.add_argument('--bulk', action='store_true',
+                        help='所有文件处理完后通过LOAD DATA LOCAL INFILE一次批量导入（适合大量回填）')
+    args = parser.parse_args()
+    main(bulk=args.bulk) 
\ No newline at end of file
@@ -0,0 +1,282 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+quotsoft全国城市小时数据下载
+所有下载共用一个带连接池的requests.Session，并发数可配置。已下载的文件记录在下载目录的
+索引文件(download_index.json)中，包括ETag、Last-Modified、大小和SHA-256：
+    1. 索引中有记录且校验和一致的历史文件直接复用，不发请求
+    2. 最近几天的文件可能仍在更新，带If-None-Match/If-Modified-Since发条件请求，304时复用本地文件
+    3. 新内容先写入.part临时文件，校验长度并计算SHA-256后再原子替换正式文件
+文件按raw_archive的方式压缩保存，索引中的大小和SHA-256都是解压后内容的，
+文件被压缩或打包进月度包后索引仍然有效。
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from datetime import datetime, date
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from raw_archive import find_raw, raw_sha256, resolve_compression, split_ref, store_raw, RAW_ARCHIVE_COMPRESSION
+
+logger = logging.getLogger(__name__)
+
+BASE_URL = 'https://quotsoft.net/air/data'
+FILE_TEMPLATE = 'china_cities_{date}.csv'
+INDEX_FILE = 'download_index.json'
+
+USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
+
+# 距今天数不超过该值的文件每次都发条件请求确认是否有更新
+REFRESH_DAYS = 2
+
+CHUNK_SIZE = 64 * 1024
+
+# 下载结果状态
+DOWNLOADED = 'downloaded'        # 下载了新内容
+NOT_MODIFIED = 'not_modified'    # 条件请求返回304，复用本地文件
+CACHED = 'cached'                # 索引命中，未发请求
+MISSING = 'missing'              # 服务端没有该日期的文件(404)
+FAILED = 'failed'                # 重试后仍然失败
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class QuotsoftDownloader:
+    """quotsoft数据下载器
+
+    Args:
+        download_dir (str): 文件保存目录，索引文件也保存在这里
+        base_url (str): 数据地址前缀
+        max_workers (int): 最大并发下载数（同时也是连接池大小）
+        timeout (int): 单次请求超时秒数
+        retry_attempts (int): 每个文件的最大尝试次数
+        retry_delay (float): 重试间隔秒数
+        refresh_days (int): 需要条件请求确认更新的最近天数
+        compression (str): 保存时的压缩方式（gzip / zstd / none）
+    """
+
+    def __init__(self, download_dir, base_url=BASE_URL, max_workers=4, timeout=30,
+                 retry_attempts=3, retry_delay=5, refresh_days=REFRESH_DAYS,
+                 compression=RAW_ARCHIVE_COMPRESSION):
+        self.download_dir = str(download_dir)
+        self.base_url = base_url.rstrip('/')
+        self.max_workers = max(1, int(max_workers))
+        self.timeout = timeout
+        self.retry_attempts = max(1, int(retry_attempts))
+        self.retry_delay = retry_delay
+        self.refresh_days = refresh_days
+        self.compression = resolve_compression(compression)
+        self.index_path = os.path.join(self.download_dir, INDEX_FILE)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['User-Agent'] = USER_AGENT
+
+        self._lock = threading.Lock()
+        self.index = self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取下载索引失败，将重新建立: {e}")
+            return {}
+
+    def save_index(self):
+        """原子写入索引文件"""
+        with self._lock:
+            data = json.dumps(self.index, ensure_ascii=False, indent=1, sort_keys=True)
+        os.makedirs(self.download_dir, exist_ok=True)
+        tmp_path = f"{self.index_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, self.index_path)
+
+    def _set_entry(self, file_name, entry):
+        with self._lock:
+            if entry is None:
+                self.index.pop(file_name, None)
+            else:
+                self.index[file_name] = entry
+
+    def file_name(self, date_obj):
+        return FILE_TEMPLATE.format(date=date_obj.strftime('%Y%m%d'))
+
+    def url(self, date_obj):
+        return f"{self.base_url}/{self.file_name(date_obj)}"
+
+    def _verified_entry(self, file_name, ref):
+        """本地文件与索引记录一致时返回索引记录，否则返回None
+
+        没有索引记录的已有文件（旧版本下载的）会计算校验和后补录。
+        """
+        if ref is None:
+            return None
+        path, member = split_ref(ref)
+        plain = member is None and path.endswith('.csv')
+        entry = self.index.get(file_name)
+        if plain and entry is not None and entry.get('size') not in (None, os.path.getsize(path)):
+            logger.warning(f"本地文件与下载索引不一致，重新下载: {ref}")
+            return None
+        try:
+            sha256 = file_sha256(path) if plain else raw_sha256(ref)
+        except (OSError, EOFError, ValueError) as e:
+            logger.warning(f"本地文件无法读取，重新下载: {ref}: {e}")
+            return None
+        if entry is None:
+            if plain and os.path.getsize(path) == 0:
+                return None
+            entry = {'sha256': sha256, 'fetched_at': None}
+            self._set_entry(file_name, entry)
+            return entry
+        if entry.get('sha256') != sha256:
+            logger.warning(f"本地文件与下载索引不一致，重新下载: {ref}")
+            return None
+        return entry
+
+    def _needs_refresh(self, date_obj):
+        if isinstance(date_obj, datetime):
+            date_obj = date_obj.date()
+        return (date.today() - date_obj).days <= self.refresh_days
+
+    def download(self, date_obj, force=False):
+        """下载指定日期的数据文件
+
+        Args:
+            force (bool): 忽略索引，总是发请求（仍然带条件请求头）
+
+        Returns:
+            dict: path(文件路径，失败或缺失时为None), status, bytes(本次下载的字节数)
+        """
+        file_name = self.file_name(date_obj)
+        url = self.url(date_obj)
+
+        path = find_raw(self.download_dir, date_obj)
+        entry = self._verified_entry(file_name, path)
+        if entry is not None and not force and not self._needs_refresh(date_obj):
+            return {'path': path, 'status': CACHED, 'bytes': 0}
+
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        for attempt in range(1, self.retry_attempts + 1):
+            try:
+                result = self._fetch(url, date_obj, path, file_name, headers, entry)
+                if result is not None:
+                    return result
+            except (requests.RequestException, OSError) as e:
+                logger.warning(f"下载出错: {url}: {e}, 尝试次数: {attempt}")
+            if attempt < self.retry_attempts:
+                time.sleep(self.retry_delay)
+
+        logger.error(f"下载失败: {url}")
+        if entry is not None:
+            # 无法确认更新时继续使用本地文件
+            return {'path': path, 'status': CACHED, 'bytes': 0}
+        return {'path': None, 'status': FAILED, 'bytes': 0}
+
+    def _fetch(self, url, date_obj, path, file_name, headers, entry):
+        """发起一次请求，返回结果；需要重试时返回None"""
+        with self.session.get(url, headers=headers, timeout=self.timeout, stream=True) as response:
+            if response.status_code == 304 and entry is not None:
+                return {'path': path, 'status': NOT_MODIFIED, 'bytes': 0}
+            if response.status_code == 404:
+                logger.info(f"服务端没有该文件: {url}")
+                return {'path': None, 'status': MISSING, 'bytes': 0}
+            if response.status_code != 200:
+                logger.warning(f"下载失败，状态码: {response.status_code}: {url}")
+                return None
+
+            os.makedirs(self.download_dir, exist_ok=True)
+            tmp_path = os.path.join(self.download_dir, f"{file_name}.{threading.get_ident()}.part")
+            digest = hashlib.sha256()
+            size = 0
+            try:
+                with open(tmp_path, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                        f.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+
+                expected = response.headers.get('Content-Length')
+                content_encoding = response.headers.get('Content-Encoding')
+                if expected and not content_encoding and int(expected) != size:
+                    logger.warning(f"下载不完整: {url}, 期望 {expected} 字节, 实际 {size} 字节")
+                    return None
+                if size == 0:
+                    logger.warning(f"下载内容为空: {url}")
+                    return None
+
+                sha256 = digest.hexdigest()
+                if file_sha256(tmp_path) != sha256:
+                    logger.warning(f"写入文件校验失败: {tmp_path}")
+                    return None
+                path = store_raw(tmp_path, self.download_dir, date_obj, self.compression, sha256)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+        self._set_entry(file_name, {
+            'url': url,
+            'size': size,
+            'sha256': sha256,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'fetched_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        })
+        changed = entry is None or entry.get('sha256') != sha256
+        logger.info(f"数据下载成功: {path}, {size} 字节{'' if changed else '（内容未变化）'}")
+        return {'path': path, 'status': DOWNLOADED, 'bytes': size}
+
+    def download_many(self, dates, force=False):
+        """并发下载多个日期的文件，完成后保存索引
+
+        Returns:
+            list: 与dates顺序一致的下载结果，每项额外包含date
+        """
+        dates = list(dates)
+        if not dates:
+            return []
+        start = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(dates))) as executor:
+                results = list(executor.map(lambda d: self.download(d, force=force), dates))
+        finally:
+            self.save_index()
+        for date_obj, result in zip(dates, results):
+            result['date'] = date_obj
+
+        summary = {}
+        for result in results:
+            summary[result['status']] = summary.get(result['status'], 0) + 1
+        total_bytes = sum(result['bytes'] for result in results)
+        logger.info(f"下载完成: {len(dates)} 个文件, {summary}, 共 {total_bytes} 字节, "
+                    f"耗时 {time.perf_counter() - start:.2f}秒")
+        return results
+
+    def close(self):
+        self.session.close()
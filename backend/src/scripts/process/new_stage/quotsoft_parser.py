@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+quotsoft全国城市小时数据(china_cities_YYYYMMDD.csv)解析
+原始文件为宽表: date, hour, type, 城市1, 城市2, ...，每行是某小时某个指标在所有城市的值。
+解析时只读取表头一次，按区域登记表（utils/regions.yaml）中启用省份的城市名精确匹配出城市列
+（也可以保留全部城市），用usecols只加载这些列，
+再通过一次melt/pivot把整个文件转为 (date, hour, city) 为行、污染物为列的长表。
+文件编码由开头的一小段字节判断，同一来源（目录+去掉日期后的文件名）的结果会缓存，后续文件不再探测。
+文件通过raw_archive.open_raw读取，可以是未压缩、gzip/zstd压缩或月度包中的文件。
+"""
+
+import os
+import re
+import sys
+import csv
+import codecs
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+
+from raw_archive import open_raw, open_raw_text
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'utils'))
+from region_registry import get_region_registry
+
+logger = logging.getLogger(__name__)
+
+# 原始文件中的指标类型 -> 输出列名
+INDICATOR_COLUMNS = {
+    'AQI': 'aqi',
+    'PM2.5': 'pm25',
+    'PM10': 'pm10',
+    'SO2': 'so2',
+    'NO2': 'no2',
+    'O3': 'o3',
+    'CO': 'co'
+}
+POLLUTANT_FIELDS = ['pm25', 'pm10', 'so2', 'no2', 'o3', 'co']
+
+# 兼容中文表头
+KEY_COLUMN_ALIASES = {'日期': 'date', '小时': 'hour', '类型': 'type'}
+KEY_COLUMNS = ['date', 'hour', 'type']
+
+# 按顺序探测: UTF-8校验严格放在最前；GBK系列几乎能解码任意字节，只能作为后备
+ENCODINGS = ['utf-8', 'gbk', 'gb2312', 'cp936']
+
+# 编码探测读取的字节数（表头约几KB，足以覆盖所有城市名）
+SNIFF_BYTES = 32 * 1024
+
+# 来源 -> 编码
+_encoding_cache = {}
+_encoding_lock = threading.Lock()
+
+# 数值合理范围，与download_data_process.validate_record保持一致
+VALUE_RANGES = {
+    'aqi': (0, 500),
+    'pm25': (0, 500),
+    'pm10': (0, 600),
+    'so2': (0, 800),
+    'no2': (0, 200),
+    'o3': (0, 300),
+    'co': (0, 20)
+}
+
+# AQI等级分界（与determine_quality_level一致: 区间左开右闭）
+QUALITY_BINS = [-np.inf, 50, 100, 150, 200, 300, np.inf]
+QUALITY_LABELS = ['优', '良', '轻度污染', '中度污染', '重度污染', '严重污染']
+
+OUTPUT_COLUMNS = ['date', 'hour', 'city', 'aqi'] + POLLUTANT_FIELDS
+
+
+def source_key(file_path):
+    """文件来源标识: 所在目录 + 去掉数字（日期）后的文件名，如 (raw_data, china_cities_.csv)"""
+    directory, name = os.path.split(os.path.abspath(file_path))
+    return directory, re.sub(r'\d+', '', name)
+
+
+def sniff_encoding(file_path, sample_size=SNIFF_BYTES):
+    """根据文件开头的字节样本判断编码，不读取整个文件
+
+    Returns:
+        str或None: 编码名，所有候选编码都无法解码样本时返回None
+    """
+    with open_raw(file_path) as f:
+        sample = f.read(sample_size)
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    for encoding in ENCODINGS:
+        # 样本末尾可能截断在多字节字符中间，使用增量解码器且不结束输入
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            decoder.decode(sample, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return None
+
+
+def detect_encoding(file_path):
+    """获取文件编码: 优先使用同一来源缓存的结果，没有时探测并缓存"""
+    key = source_key(file_path)
+    encoding = _encoding_cache.get(key)
+    if encoding is None:
+        encoding = sniff_encoding(file_path)
+        if encoding is not None:
+            with _encoding_lock:
+                _encoding_cache[key] = encoding
+    return encoding
+
+
+def forget_encoding(file_path):
+    """缓存的编码不适用于该文件时清除，下次重新探测"""
+    with _encoding_lock:
+        _encoding_cache.pop(source_key(file_path), None)
+
+
+def read_header(file_path, encoding=None):
+    """只读取表头行，返回 (列名列表, 编码)"""
+    encoding = encoding or detect_encoding(file_path)
+    if encoding is None:
+        return None, None
+    try:
+        with open_raw_text(file_path, encoding) as f:
+            header = next(csv.reader(f), None)
+    except UnicodeDecodeError:
+        return None, None
+    if header is None:
+        return None, None
+    return [column.strip().lstrip('\ufeff') for column in header], encoding
+
+
+def resolve_city_columns(header, cities=None):
+    """按城市名精确匹配城市列（列名可带或不带"市"字）
+
+    Args:
+        header (list): 表头列名
+        cities (list): 只保留这些城市，默认按区域登记表
+
+    Returns:
+        dict: 原始列名 -> 标准城市名
+    """
+    columns = [column for column in header if KEY_COLUMN_ALIASES.get(column, column) not in KEY_COLUMNS]
+    return get_region_registry().column_mapping(columns, cities)
+
+
+def read_projected(file_path, cities=None):
+    """先读表头确定需要的列，再只加载这些列
+
+    使用缓存编码的文件若解码失败或表头中找不到任何城市（编码不对时城市名会是乱码），
+    清除该来源的缓存后重新探测一次。
+
+    Returns:
+        DataFrame或None: 列为 date, hour, type(字符串) 和各城市(float64，列名为标准城市名)
+    """
+    for attempt in range(2):
+        header, encoding = read_header(file_path)
+        if header is None:
+            forget_encoding(file_path)
+            if attempt == 0:
+                continue
+            logger.error(f"无法读取文件表头: {file_path}")
+            return None
+
+        rename = {column: KEY_COLUMN_ALIASES.get(column, column) for column in header}
+        key_columns = [column for column in header if rename[column] in KEY_COLUMNS]
+        if len(key_columns) < len(KEY_COLUMNS):
+            logger.error(f"文件缺少必要的列: {file_path}")
+            return None
+
+        city_columns = resolve_city_columns(header, cities)
+        if not city_columns:
+            forget_encoding(file_path)
+            if attempt == 0:
+                continue
+            logger.error(f"未找到任何登记的城市: {file_path}")
+            return None
+
+        dtypes = {column: 'float64' for column in city_columns}
+        dtypes.update({column: 'string' for column in key_columns})
+        try:
+            with open_raw(file_path) as f:
+                df = pd.read_csv(f, encoding=encoding, usecols=key_columns + list(city_columns),
+                                 dtype=dtypes, na_values=['', ' ', '-', '—'])
+        except UnicodeDecodeError:
+            # 样本之后出现了无法解码的字节
+            forget_encoding(file_path)
+            if attempt == 0:
+                continue
+            logger.error(f"文件编码无法识别: {file_path}")
+            return None
+        return df.rename(columns=rename).rename(columns=city_columns)
+    return None
+
+
+def parse_quotsoft_file(file_path, cities=None, indicators=INDICATOR_COLUMNS):
+    """把一个quotsoft宽表文件解析为小时长表
+
+    Returns:
+        DataFrame或None: 列为 date(datetime64), hour, city, aqi, pm25, pm10, so2, no2, o3, co，
+            每个 (date, hour, city) 一行；文件无法读取或缺少必要列时返回None
+    """
+    df = read_projected(file_path, cities)
+    if df is None:
+        return None
+
+    # 只保留需要的指标类型（跳过PM2.5_24h等滑动均值）
+    df = df[df['type'].isin(list(indicators))]
+    if df.empty:
+        logger.warning(f"文件中没有需要的指标数据: {file_path}")
+        return None
+
+    # 宽表 -> 长表: 每个 (date, hour, type, city) 一行
+    long_df = df.melt(id_vars=KEY_COLUMNS, var_name='city', value_name='value').dropna(subset=['value'])
+
+    # 长表 -> 污染物为列: 每个 (date, hour, city) 一行，同一小时重复出现的指标取第一条
+    hourly = long_df.pivot_table(index=['date', 'hour', 'city'], columns='type', values='value',
+                                 aggfunc='first').rename(columns=indicators)
+    hourly.columns.name = None
+    hourly = hourly.reset_index()
+    for column in ['aqi'] + POLLUTANT_FIELDS:
+        if column not in hourly.columns:
+            hourly[column] = np.nan
+
+    hourly['date'] = pd.to_datetime(hourly['date'].str.strip(), format='%Y%m%d', errors='coerce')
+    hourly['hour'] = pd.to_numeric(hourly['hour'], errors='coerce')
+    hourly = hourly.dropna(subset=['date', 'hour'])
+    hourly['hour'] = hourly['hour'].astype('int16')
+    return hourly[OUTPUT_COLUMNS].sort_values(['date', 'hour', 'city']).reset_index(drop=True)
+
+
+def quality_levels(aqi):
+    """按AQI向量化计算空气质量等级"""
+    return pd.cut(aqi, bins=QUALITY_BINS, labels=QUALITY_LABELS, right=True).astype(object)
+
+
+def valid_rows(frame):
+    """向量化的记录合理性检查: AQI必须存在且在范围内，污染物缺失或在范围内"""
+    low, high = VALUE_RANGES['aqi']
+    mask = frame['aqi'].between(low, high)
+    for column in POLLUTANT_FIELDS:
+        low, high = VALUE_RANGES[column]
+        mask &= frame[column].isna() | frame[column].between(low, high)
+    return mask
+
+
+def to_records(frame):
+    """把解析结果转为insert_data_to_db使用的记录列表
+
+    Returns:
+        list: 每项包含 city, date('YYYY-MM-DD'), hour, aqi, pm25..co, quality_level
+    """
+    if frame is None or frame.empty:
+        return []
+    frame = frame[valid_rows(frame)].copy()
+    if frame.empty:
+        return []
+    frame['quality_level'] = quality_levels(frame['aqi'])
+    frame['date'] = frame['date'].dt.strftime('%Y-%m-%d')
+    # NaN转为None，便于直接写入数据库
+    frame = frame.astype(object).where(frame.notna(), None)
+    return frame.to_dict('records')
@@ -0,0 +1,340 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+quotsoft原始数据归档
+下载的china_cities_YYYYMMDD.csv以压缩文件保存（默认gzip，安装了zstandard时可用zstd），
+已结束的月份可以进一步打包为按月的zip文件(monthly/china_cities_YYYYMM.zip)。
+所有读取方通过open_raw获得解压后的字节流，不需要关心文件是否压缩、是否在月度包中。
+
+归档中的一个原始文件用字符串引用表示：
+    raw_data/china_cities_20240101.csv                          未压缩
+    raw_data/china_cities_20240101.csv.gz                       单文件压缩
+    raw_data/monthly/china_cities_202401.zip!china_cities_20240101.csv   月度包中的成员
+
+用法（整理已有的原始数据目录）:
+    python raw_archive.py [--dir 原始数据目录] [--compression gzip|zstd|none] [--bundle] [--keep-days 2]
+"""
+
+import os
+import io
+import re
+import gzip
+import shutil
+import hashlib
+import logging
+import zipfile
+import argparse
+import threading
+from datetime import date, datetime, timedelta
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# 新下载文件的压缩方式: gzip / zstd / none
+RAW_ARCHIVE_COMPRESSION = os.environ.get('RAW_ARCHIVE_COMPRESSION', 'gzip')
+
+COMPRESSION_SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 10
+ZIP_LEVEL = 6
+
+BUNDLE_DIR = 'monthly'
+MEMBER_SEPARATOR = '!'
+
+RAW_NAME_PATTERN = re.compile(r'china_cities_(\d{8})\.csv(\.gz|\.zst)?$')
+BUNDLE_NAME_PATTERN = re.compile(r'china_cities_(\d{6})\.zip$')
+
+CHUNK_SIZE = 256 * 1024
+
+
+def resolve_compression(name):
+    """规范化压缩方式名称，zstandard未安装时退回gzip
+
+    Returns:
+        str或None: 'gzip'、'zstd'，不压缩时为None
+    """
+    name = (name or '').strip().lower()
+    if name in ('', 'none', 'off', 'false'):
+        return None
+    if name in ('zstd', 'zst', 'zstandard'):
+        if zstandard is None:
+            logger.warning("未安装zstandard，原始数据改用gzip压缩")
+            return 'gzip'
+        return 'zstd'
+    return 'gzip'
+
+
+def raw_file_name(date_obj, compression=None):
+    """原始文件名，例如 china_cities_20240101.csv.gz"""
+    suffix = COMPRESSION_SUFFIXES.get(compression, '')
+    return f"china_cities_{date_obj.strftime('%Y%m%d')}.csv{suffix}"
+
+
+def bundle_path(download_dir, month):
+    """月度包路径，month为'YYYYMM'"""
+    return os.path.join(download_dir, BUNDLE_DIR, f"china_cities_{month}.zip")
+
+
+def split_ref(ref):
+    """拆分原始文件引用为 (文件路径, 包内成员名或None)"""
+    ref = str(ref)
+    if MEMBER_SEPARATOR in ref:
+        path, member = ref.rsplit(MEMBER_SEPARATOR, 1)
+        return path, member
+    return ref, None
+
+
+def raw_date(ref):
+    """从原始文件引用中提取日期字符串'YYYYMMDD'，无法识别时返回None"""
+    path, member = split_ref(ref)
+    match = RAW_NAME_PATTERN.search(os.path.basename(member or path))
+    return match.group(1) if match else None
+
+
+def open_raw(ref):
+    """以二进制流打开原始文件，压缩文件和月度包成员边读边解压"""
+    path, member = split_ref(ref)
+    if member is not None:
+        bundle = zipfile.ZipFile(path)
+        try:
+            # 成员流持有底层文件的引用，关闭ZipFile后仍可读取，成员流关闭时释放文件
+            return bundle.open(member)
+        finally:
+            bundle.close()
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError(f"读取{path}需要安装zstandard")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    return open(path, 'rb')
+
+
+def open_raw_text(ref, encoding):
+    """以文本流打开原始文件"""
+    return io.TextIOWrapper(open_raw(ref), encoding=encoding, newline='')
+
+
+def raw_sha256(ref):
+    """原始文件解压后内容的SHA-256"""
+    digest = hashlib.sha256()
+    with open_raw(ref) as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _compressed_writer(file_obj, compression):
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=file_obj, mode='wb', compresslevel=GZIP_LEVEL, mtime=0)
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(file_obj, closefd=False)
+    return None
+
+
+def write_compressed(source, dest_path, compression):
+    """把二进制流写入压缩文件（先写临时文件再原子替换）"""
+    tmp_path = f"{dest_path}.{threading.get_ident()}.part"
+    try:
+        with open(tmp_path, 'wb') as raw:
+            writer = _compressed_writer(raw, compression)
+            if writer is None:
+                shutil.copyfileobj(source, raw, CHUNK_SIZE)
+            else:
+                with writer:
+                    shutil.copyfileobj(source, writer, CHUNK_SIZE)
+        os.replace(tmp_path, dest_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return dest_path
+
+
+def store_raw(src_path, download_dir, date_obj, compression, sha256=None):
+    """把下载好的未压缩文件存入归档并删除同一日期的其他旧格式文件
+
+    Args:
+        sha256 (str): 原始内容的SHA-256，提供时校验压缩结果解压后与之一致
+
+    Returns:
+        str: 归档后的文件引用
+    """
+    dest_path = os.path.join(download_dir, raw_file_name(date_obj, compression))
+    if compression is None:
+        os.replace(src_path, dest_path)
+    else:
+        with open(src_path, 'rb') as source:
+            write_compressed(source, dest_path, compression)
+        if sha256 is not None and raw_sha256(dest_path) != sha256:
+            os.remove(dest_path)
+            raise IOError(f"压缩后校验失败: {dest_path}")
+        os.remove(src_path)
+    for other in (None, 'gzip', 'zstd'):
+        other_path = os.path.join(download_dir, raw_file_name(date_obj, other))
+        if other_path != dest_path and os.path.exists(other_path):
+            os.remove(other_path)
+    return dest_path
+
+
+def compress_raw(path, compression):
+    """压缩单个未压缩的原始文件，校验解压内容一致后删除原文件
+
+    Returns:
+        str: 压缩后的文件路径
+    """
+    dest_path = f"{path}{COMPRESSION_SUFFIXES[compression]}"
+    expected = raw_sha256(path)
+    with open(path, 'rb') as source:
+        write_compressed(source, dest_path, compression)
+    if raw_sha256(dest_path) != expected:
+        os.remove(dest_path)
+        raise IOError(f"压缩后校验失败: {path}")
+    os.remove(path)
+    return dest_path
+
+
+def list_raw(download_dir):
+    """列出归档中的所有原始文件
+
+    同一日期同时存在单独文件和月度包成员时使用单独文件（更新的下载不会写入已打包的月份）。
+
+    Returns:
+        dict: 日期字符串'YYYYMMDD' -> 文件引用，按日期排序
+    """
+    refs = {}
+    bundle_dir = os.path.join(download_dir, BUNDLE_DIR)
+    if os.path.isdir(bundle_dir):
+        for name in sorted(os.listdir(bundle_dir)):
+            if not BUNDLE_NAME_PATTERN.match(name):
+                continue
+            path = os.path.join(bundle_dir, name)
+            try:
+                with zipfile.ZipFile(path) as bundle:
+                    members = bundle.namelist()
+            except (OSError, zipfile.BadZipFile) as e:
+                logger.warning(f"无法读取月度包 {path}: {e}")
+                continue
+            for member in members:
+                date_str = raw_date(member)
+                if date_str:
+                    refs[date_str] = f"{path}{MEMBER_SEPARATOR}{member}"
+    if os.path.isdir(download_dir):
+        for name in os.listdir(download_dir):
+            date_str = raw_date(name)
+            if date_str:
+                refs[date_str] = os.path.join(download_dir, name)
+    return dict(sorted(refs.items()))
+
+
+def find_raw(download_dir, date_obj):
+    """查找某天的原始文件，返回引用或None"""
+    for compression in (None, 'gzip', 'zstd'):
+        path = os.path.join(download_dir, raw_file_name(date_obj, compression))
+        if os.path.exists(path):
+            return path
+    path = bundle_path(download_dir, date_obj.strftime('%Y%m'))
+    member = raw_file_name(date_obj)
+    if os.path.exists(path):
+        try:
+            with zipfile.ZipFile(path) as bundle:
+                bundle.getinfo(member)
+            return f"{path}{MEMBER_SEPARATOR}{member}"
+        except (KeyError, OSError, zipfile.BadZipFile):
+            return None
+    return None
+
+
+def bundle_month(download_dir, month, refs=None):
+    """把某月的单独文件合并进月度包（保留包中已有的其他日期），完成后删除单独文件
+
+    Returns:
+        int: 新打包的文件数
+    """
+    refs = refs if refs is not None else list_raw(download_dir)
+    loose = {date_str: ref for date_str, ref in refs.items()
+             if date_str.startswith(month) and split_ref(ref)[1] is None}
+    if not loose:
+        return 0
+
+    path = bundle_path(download_dir, month)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{threading.get_ident()}.part"
+    try:
+        with zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=ZIP_LEVEL) as target:
+            if os.path.exists(path):
+                with zipfile.ZipFile(path) as existing:
+                    for info in existing.infolist():
+                        if raw_date(info.filename) not in loose:
+                            target.writestr(info, existing.read(info.filename))
+            for date_str, ref in sorted(loose.items()):
+                with open_raw(ref) as source, target.open(f"china_cities_{date_str}.csv", 'w') as member:
+                    shutil.copyfileobj(source, member, CHUNK_SIZE)
+        with zipfile.ZipFile(tmp_path) as check:
+            bad = check.testzip()
+            if bad is not None:
+                raise IOError(f"月度包校验失败: {bad}")
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    for ref in loose.values():
+        os.remove(ref)
+    logger.info(f"已打包 {month} 的 {len(loose)} 个原始文件: {path}")
+    return len(loose)
+
+
+def archive(download_dir, compression=RAW_ARCHIVE_COMPRESSION, bundle=False, keep_days=2):
+    """整理原始数据目录
+
+    1. 最近keep_days天以前的未压缩文件按compression压缩
+    2. bundle=True时，把已经结束（月末早于最近keep_days天）的月份打包
+
+    Returns:
+        dict: compressed, bundled 文件数
+    """
+    compression = resolve_compression(compression)
+    cutoff = (date.today() - timedelta(days=keep_days)).strftime('%Y%m%d')
+    result = {'compressed': 0, 'bundled': 0}
+
+    if compression is not None:
+        for date_str, ref in list_raw(download_dir).items():
+            path, member = split_ref(ref)
+            if member is None and path.endswith('.csv') and date_str < cutoff:
+                compress_raw(path, compression)
+                result['compressed'] += 1
+
+    if bundle:
+        refs = list_raw(download_dir)
+        months = {date_str[:6] for date_str, ref in refs.items() if split_ref(ref)[1] is None}
+        for month in sorted(months):
+            month_end = (datetime.strptime(month, '%Y%m') + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+            if month_end.strftime('%Y%m%d') < cutoff:
+                result['bundled'] += bundle_month(download_dir, month, refs)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='整理quotsoft原始数据归档')
+    parser.add_argument('--dir', help='原始数据目录，默认使用config.yaml中的download_dir')
+    parser.add_argument('--compression', default=RAW_ARCHIVE_COMPRESSION, help='gzip / zstd / none')
+    parser.add_argument('--bundle', action='store_true', help='把已结束的月份打包为月度zip')
+    parser.add_argument('--keep-days', type=int, default=2, help='最近N天的文件保持原样')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    download_dir = args.dir
+    if not download_dir:
+        from download_data_process import CONFIG
+        download_dir = CONFIG['paths']['download_dir']
+    result = archive(download_dir, args.compression, args.bundle, args.keep_days)
+    logger.info(f"原始数据整理完成: {download_dir}, {result}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+日数据向量化校验
+对整个DataFrame按列计算各条规则的布尔掩码，不再逐条记录执行if判断。未通过的行带上原因代码
+（多个原因用逗号分隔）转入隔离表air_quality_quarantine，而不是被悄悄丢弃或在写库时触发逐条重试。
+
+规则及原因代码:
+    MISSING_REQUIRED        城市、日期、AQI或空气质量等级缺失
+    AQI_OUT_OF_RANGE        AQI不在合理范围内
+    PM25_OUT_OF_RANGE 等    污染物浓度不在合理范围内（缺失的污染物不算错误）
+    FUTURE_DATE             日期晚于今天
+    DUPLICATE_DATE          同一城市的日期不是严格递增（同一批中重复），保留最后一条
+    PM25_GT_PM10            PM2.5明显高于PM10（PM2.5是PM10的一部分）
+    LEVEL_MISMATCH          空气质量等级与AQI不符
+"""
+
+import numpy as np
+import pandas as pd
+
+from quotsoft_parser import POLLUTANT_FIELDS, VALUE_RANGES, QUALITY_BINS, QUALITY_LABELS
+from daily_aggregation import to_daily_records
+from daily_ranking import rank_daily
+
+MISSING_REQUIRED = 'MISSING_REQUIRED'
+AQI_OUT_OF_RANGE = 'AQI_OUT_OF_RANGE'
+FUTURE_DATE = 'FUTURE_DATE'
+DUPLICATE_DATE = 'DUPLICATE_DATE'
+PM25_GT_PM10 = 'PM25_GT_PM10'
+LEVEL_MISMATCH = 'LEVEL_MISMATCH'
+
+# 不同仪器的测量误差使PM2.5可能略高于PM10，超过 PM10 * 比例 + 常数 才视为不一致
+PM25_PM10_RATIO = 1.1
+PM25_PM10_SLACK = 5.0
+
+# 重复日期检查把 (城市编码, 日期) 合成一个整数键
+DAY_KEY_SPAN = 1 << 32
+
+def out_of_range_code(column):
+    return f"{column.upper()}_OUT_OF_RANGE"
+
+
+def numeric_values(series):
+    """转为float数组，无法转换的值为NaN"""
+    if not pd.api.types.is_numeric_dtype(series):
+        series = pd.to_numeric(series, errors='coerce')
+    return series.to_numpy(dtype=float, na_value=np.nan)
+
+
+def rule_masks(frame, today=None):
+    """计算每条规则的违规掩码
+
+    字符串列只做一次因子化（城市编码、等级编码），其余规则都是numpy数组上的比较。
+
+    Args:
+        frame (DataFrame): 日数据，包含city, date, aqi, 污染物列和quality_level（date可以是日期或'YYYY-MM-DD'字符串）
+        today (Timestamp): 判断未来日期的基准，默认为今天
+
+    Returns:
+        dict: 原因代码 -> 布尔数组（True表示违反该规则）
+    """
+    today = pd.Timestamp.now().normalize() if today is None else pd.Timestamp(today)
+    dates = pd.to_datetime(frame['date'], errors='coerce').to_numpy(dtype='datetime64[ns]')
+    missing_date = np.isnat(dates)
+    city_codes = pd.factorize(frame['city'])[0]
+    level_codes = pd.Categorical(frame['quality_level'], categories=QUALITY_LABELS).codes
+    aqi = numeric_values(frame['aqi'])
+    masks = {}
+
+    # 等级编码为-1的是缺失或未知的等级名称，只对这些行判断是否缺失
+    missing_level = level_codes < 0
+    if missing_level.any():
+        missing_level[missing_level] = pd.isna(frame['quality_level'].to_numpy()[missing_level])
+    masks[MISSING_REQUIRED] = missing_date | np.isnan(aqi) | (city_codes < 0) | missing_level
+
+    with np.errstate(invalid='ignore'):
+        low, high = VALUE_RANGES['aqi']
+        masks[AQI_OUT_OF_RANGE] = (aqi < low) | (aqi > high)
+        values = {column: numeric_values(frame[column]) for column in POLLUTANT_FIELDS if column in frame}
+        for column, value in values.items():
+            low, high = VALUE_RANGES[column]
+            masks[out_of_range_code(column)] = (value < low) | (value > high)
+
+        masks[FUTURE_DATE] = ~missing_date & (dates > today.to_datetime64())
+        # 同一城市同一日期出现多次时只保留最后一条（与写库时后写覆盖一致）
+        days = dates.astype('datetime64[D]').astype(np.int64)
+        keys = pd.Series(city_codes.astype(np.int64) * DAY_KEY_SPAN + days % DAY_KEY_SPAN)
+        masks[DUPLICATE_DATE] = keys.duplicated(keep='last').to_numpy() & ~missing_date
+
+        if 'pm25' in values and 'pm10' in values:
+            masks[PM25_GT_PM10] = values['pm25'] > values['pm10'] * PM25_PM10_RATIO + PM25_PM10_SLACK
+
+        # 等级区间左开右闭，与quality_levels一致；未知的等级名称也算不符
+        expected_level = np.searchsorted(QUALITY_BINS[1:-1], aqi, side='left')
+        masks[LEVEL_MISMATCH] = ~np.isnan(aqi) & ~missing_level & (level_codes != expected_level)
+    return masks
+
+
+def validate_frame(frame, today=None):
+    """校验日数据
+
+    Returns:
+        tuple: (通过的行, 未通过的行)，未通过的行多一列reason_codes
+    """
+    if frame is None or frame.empty:
+        empty = frame if frame is not None else pd.DataFrame()
+        return empty, empty.assign(reason_codes=pd.Series(dtype=object))
+    masks = rule_masks(frame, today)
+    codes = list(masks)
+    matrix = np.column_stack([masks[code] for code in codes])
+    bad = matrix.any(axis=1)
+    if not bad.any():
+        return frame, frame.iloc[0:0].assign(reason_codes=pd.Series(dtype=object))
+
+    # 只为未通过的行拼接原因代码
+    rejected_matrix = matrix[bad]
+    reasons = np.full(rejected_matrix.shape[0], '', dtype=object)
+    for index, code in enumerate(codes):
+        reasons = reasons + np.where(rejected_matrix[:, index], code + ',', '')
+    rejected = frame[bad].copy()
+    rejected['reason_codes'] = [reason.rstrip(',') for reason in reasons]
+    return frame[~bad], rejected
+
+
+def reason_counts(rejected):
+    """统计各原因代码的行数"""
+    if rejected is None or rejected.empty:
+        return {}
+    return rejected['reason_codes'].str.split(',').explode().value_counts().to_dict()
+
+
+def split_records(daily, today=None):
+    """校验日数据，对通过的行按日期排名（aqi_rank），再转为记录列表
+
+    Returns:
+        tuple: (可写库的记录, 隔离的记录)，隔离的记录多一个reason_codes字段
+    """
+    if daily is None or daily.empty:
+        return [], []
+    valid, rejected = validate_frame(daily, today)
+    valid = valid.assign(aqi_rank=rank_daily(valid))
+    quarantined = to_daily_records(rejected)
+    for record, codes in zip(quarantined, rejected['reason_codes']):
+        record['reason_codes'] = codes
+    return to_daily_records(valid), quarantined
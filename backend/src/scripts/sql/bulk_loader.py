@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+空气质量日数据批量导入
+把整理好的行数据写入临时TSV文件，通过LOAD DATA LOCAL INFILE一次性加载到临时暂存表，
+再用一条INSERT ... SELECT ... ON DUPLICATE KEY UPDATE合并到目标表。
+相比逐批executemany，服务端只需解析一次文件、执行一次合并语句，适合大批量回填。
+
+注意：
+    1. 连接需要开启allow_local_infile（见connect），服务端需要开启local_infile
+    2. 暂存表为会话级临时表，不影响其他连接
+"""
+
+import os
+import time
+import logging
+import tempfile
+
+import mysql.connector
+from mysql.connector import Error
+
+logger = logging.getLogger(__name__)
+
+# 日数据表的列顺序（air_quality_data / air_quality_newdata 结构相同）
+TARGET_COLUMNS = [
+    'city', 'province', 'record_date', 'aqi_index', 'quality_level', 'aqi_rank',
+    'pm25_avg', 'pm10_avg', 'so2_avg', 'no2_avg', 'co_avg', 'o3_avg', 'data_year'
+]
+
+# 唯一键列，合并时不更新
+KEY_COLUMNS = ['city', 'record_date']
+
+# 服务端或客户端未开启LOCAL INFILE时的错误号，调用方可据此回退到executemany
+LOCAL_INFILE_DISABLED_ERRNOS = {1148, 2068, 3948, 3950}
+
+NULL_VALUE = '\\N'
+
+
+class BulkLoadError(Exception):
+    """批量导入失败
+
+    Attributes:
+        stage (str): 失败的阶段（write/load/merge）
+        local_infile_disabled (bool): 是否因为LOCAL INFILE未开启而失败
+    """
+
+    def __init__(self, stage, message, errno=None):
+        super().__init__(f"{stage}: {message}")
+        self.stage = stage
+        self.errno = errno
+        self.local_infile_disabled = errno in LOCAL_INFILE_DISABLED_ERRNOS
+
+
+def connect(db_config, **kwargs):
+    """创建允许LOAD DATA LOCAL INFILE的数据库连接"""
+    params = {
+        'host': db_config['host'],
+        'user': db_config['user'],
+        'password': db_config['password'],
+        'database': db_config['database'],
+        'charset': 'utf8mb4',
+        'use_unicode': True,
+        'allow_local_infile': True,
+        'autocommit': False
+    }
+    if db_config.get('port'):
+        params['port'] = db_config['port']
+    params.update(kwargs)
+    return mysql.connector.connect(**params)
+
+
+def format_value(value):
+    """把单个值转换为LOAD DATA默认格式（制表符分隔、\\N表示NULL）"""
+    if value is None:
+        return NULL_VALUE
+    if isinstance(value, float):
+        if value != value:  # NaN
+            return NULL_VALUE
+        return repr(value)
+    text = str(value)
+    if '\\' in text or '\t' in text or '\n' in text:
+        text = text.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+    return text
+
+
+def write_tsv(rows, file_obj):
+    """把行数据写入TSV文件
+
+    Args:
+        rows (iterable): 每行是按TARGET_COLUMNS顺序排列的元组，可以是生成器
+        file_obj: 以文本模式打开的文件对象
+
+    Returns:
+        int: 写入的行数
+    """
+    count = 0
+    for row in rows:
+        file_obj.write('\t'.join(format_value(value) for value in row))
+        file_obj.write('\n')
+        count += 1
+    return count
+
+
+def stage_metrics(rows, seconds):
+    return {
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(rows / seconds, 1) if seconds > 0 else None
+    }
+
+
+def build_merge_sql(table_name, staging_name, update_columns, keep_existing=()):
+    """构建暂存表 -> 目标表的合并语句
+
+    Args:
+        update_columns (list): 主键冲突时需要更新的列
+        keep_existing (iterable): 新值为NULL时保留原值的列
+    """
+    column_list = ', '.join(TARGET_COLUMNS)
+    source_list = ', '.join(f"s.{column}" for column in TARGET_COLUMNS)
+    keep_existing = set(keep_existing)
+    updates = []
+    for column in update_columns:
+        if column in keep_existing:
+            updates.append(f"{column} = COALESCE(s.{column}, {table_name}.{column})")
+        else:
+            updates.append(f"{column} = s.{column}")
+    return (
+        f"INSERT INTO {table_name} ({column_list}) "
+        f"SELECT {source_list} FROM {staging_name} AS s "
+        f"ON DUPLICATE KEY UPDATE {', '.join(updates)}"
+    )
+
+
+def bulk_upsert(conn, rows, table_name, update_columns=None, keep_existing=(), tmp_dir=None):
+    """把行数据批量导入目标表
+
+    分三个阶段：写入临时TSV(write) -> LOAD DATA到暂存表(load) -> 一条语句合并到目标表(merge)。
+    暂存表用CREATE TEMPORARY TABLE ... LIKE创建，保留目标表的唯一键，输入中重复的
+    (city, record_date) 只保留第一条。
+
+    Args:
+        conn: 开启了allow_local_infile的数据库连接
+        rows (iterable): 按TARGET_COLUMNS顺序排列的元组
+        table_name (str): 目标表
+        update_columns (list): 主键冲突时更新的列，默认更新除唯一键外的所有列
+        keep_existing (iterable): 新值为NULL时保留原值的列
+        tmp_dir (str): 临时TSV文件目录
+
+    Returns:
+        dict: rows(写入行数), loaded(加载到暂存表的行数), affected(合并影响行数),
+            stages(各阶段耗时和每秒行数), seconds(总耗时)
+    """
+    if update_columns is None:
+        update_columns = [column for column in TARGET_COLUMNS if column not in KEY_COLUMNS]
+    staging_name = f"{table_name}_staging"
+    total_start = time.perf_counter()
+    result = {'rows': 0, 'loaded': 0, 'affected': 0, 'stages': {}}
+
+    fd, tsv_path = tempfile.mkstemp(prefix=f"{table_name}_", suffix='.tsv', dir=tmp_dir)
+    cursor = conn.cursor()
+    try:
+        # 1. 写入临时TSV
+        start = time.perf_counter()
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8', newline='\n') as f:
+                result['rows'] = write_tsv(rows, f)
+        except (OSError, ValueError) as e:
+            raise BulkLoadError('write', str(e))
+        result['stages']['write'] = stage_metrics(result['rows'], time.perf_counter() - start)
+        if result['rows'] == 0:
+            result['seconds'] = round(time.perf_counter() - total_start, 3)
+            return result
+
+        # 2. 加载到暂存表
+        start = time.perf_counter()
+        try:
+            cursor.execute(f"CREATE TEMPORARY TABLE IF NOT EXISTS {staging_name} LIKE {table_name}")
+            cursor.execute(f"TRUNCATE TABLE {staging_name}")
+            cursor.execute(
+                f"LOAD DATA LOCAL INFILE %s INTO TABLE {staging_name} CHARACTER SET utf8mb4 "
+                f"FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' ({', '.join(TARGET_COLUMNS)})",
+                (tsv_path,)
+            )
+            result['loaded'] = cursor.rowcount
+        except Error as e:
+            conn.rollback()
+            raise BulkLoadError('load', str(e), getattr(e, 'errno', None))
+        result['stages']['load'] = stage_metrics(result['loaded'], time.perf_counter() - start)
+
+        # 3. 一条语句合并到目标表
+        start = time.perf_counter()
+        try:
+            cursor.execute(build_merge_sql(table_name, staging_name, update_columns, keep_existing))
+            result['affected'] = cursor.rowcount
+            conn.commit()
+        except Error as e:
+            conn.rollback()
+            raise BulkLoadError('merge', str(e), getattr(e, 'errno', None))
+        result['stages']['merge'] = stage_metrics(result['loaded'], time.perf_counter() - start)
+
+        result['seconds'] = round(time.perf_counter() - total_start, 3)
+        logger.info(f"批量导入 {table_name} 完成: 写入 {result['rows']} 行, 加载 {result['loaded']} 行, "
+                    f"合并影响 {result['affected']} 行, 耗时 {result['seconds']} 秒, 各阶段: {result['stages']}")
+        return result
+    finally:
+        try:
+            cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {staging_name}")
+        except Error:
+            pass
+        cursor.close()
+        try:
+            os.remove(tsv_path)
+        except OSError:
+            pass
@@ -4,16 +4,27 @@
 """
 导入空气质量数据到MySQL数据库
 将data/air_data/processed/stage3目录下的所有CSV文件导入到MySQL数据库中
+
+用法:
+    python import_air_data.py           # 逐文件分批插入
+    python import_air_data.py --bulk    # 所有文件写入一个TSV，通过LOAD DATA LOCAL INFILE一次导入
 """
 
 import os
 import csv
+import argparse
 import mysql.connector
 from mysql.connector import Error
+import sys
 import glob
 import datetime
 from dotenv import load_dotenv
 
+from bulk_loader import BulkLoadError, bulk_upsert, connect as connect_bulk
+# 数据变更事件模块位于scripts/utils目录
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'utils'))
+from change_events import publish_change
+
 # Load environment variables from .env file
 backend_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 dotenv_path = os.path.join(backend_dir, '.env')
@@ -102,6 +113,91 @@ def create_tables():
         print(f"创建表时出错: {e}")
         return False
 
+# 主键冲突时更新的列（与import_csv_file的插入语句一致）
+UPDATE_COLUMNS = ['aqi_index', 'quality_level', 'aqi_rank', 'pm25_avg', 'pm10_avg',
+                  'so2_avg', 'no2_avg', 'co_avg', 'o3_avg']
+
+def parse_row(row, year):
+    """把CSV行解析为数据表的一行"""
+    def to_float(value):
+        return None if value == '' else float(value)
+    return (
+        row[0], row[1], row[2], to_float(row[3]), row[4], to_float(row[5]),
+        to_float(row[6]), to_float(row[7]), to_float(row[8]), to_float(row[9]),
+        to_float(row[10]), to_float(row[11]), year
+    )
+
+def new_scope():
+    """导入涉及的城市和日期范围，写入后据此发布数据变更事件"""
+    return {'cities': set(), 'start_date': None, 'end_date': None}
+
+def track_scope(scope, parsed):
+    """把一行数据（parse_row的结果）计入变更范围"""
+    scope['cities'].add(parsed[0])
+    record_date = parsed[2]
+    if scope['start_date'] is None or record_date < scope['start_date']:
+        scope['start_date'] = record_date
+    if scope['end_date'] is None or record_date > scope['end_date']:
+        scope['end_date'] = record_date
+
+def publish_import(conn, scope, rows, source):
+    """写入完成后发布变更事件，各服务据此失效缓存（报告水位线、历史查询等）"""
+    if not rows:
+        return None
+    return publish_change(conn, ['air_quality_data'], sorted(scope['cities']), scope['start_date'],
+                          scope['end_date'], rows=rows, source=source)
+
+def iter_csv_rows(csv_files, stats, scope=None):
+    """逐个读取CSV文件并产出数据行，解析失败的行计入stats['errors']"""
+    for file_path in csv_files:
+        year = os.path.basename(file_path).split('_')[-1].split('.')[0]
+        with open(file_path, 'r', encoding='utf-8') as csvfile:
+            csv_reader = csv.reader(csvfile)
+            next(csv_reader, None)  # 跳过表头
+            for row in csv_reader:
+                try:
+                    parsed = parse_row(row, year)
+                except Exception as e:
+                    stats['errors'] += 1
+                    print(f"处理行数据时出错: {e}, 行: {row}")
+                    continue
+                if scope is not None:
+                    track_scope(scope, parsed)
+                yield parsed
+        stats['files'] += 1
+
+def bulk_import_files(csv_files):
+    """批量导入: 所有文件写入一个临时TSV，LOAD DATA到暂存表后一条语句合并
+
+    Returns:
+        tuple: (记录数, 错误数)；服务端不支持LOCAL INFILE时返回None，由调用方回退到逐文件导入
+    """
+    stats = {'files': 0, 'errors': 0}
+    scope = new_scope()
+    try:
+        conn = connect_bulk(DB_CONFIG)
+    except Error as e:
+        print(f"创建批量导入连接失败: {e}")
+        return None
+    try:
+        result = bulk_upsert(conn, iter_csv_rows(csv_files, stats, scope), 'air_quality_data',
+                             update_columns=UPDATE_COLUMNS)
+        publish_import(conn, scope, result['rows'], 'import_air_data --bulk')
+    except BulkLoadError as e:
+        print(f"批量导入失败: {e}")
+        if e.local_infile_disabled:
+            print("服务端未开启local_infile，请执行 SET GLOBAL local_infile = 1 或改用逐文件导入")
+            return None
+        return 0, stats['errors']
+    finally:
+        conn.close()
+
+    print(f"批量导入 {stats['files']} 个文件: 写入 {result['rows']} 行, 加载 {result['loaded']} 行, "
+          f"合并影响 {result['affected']} 行")
+    for stage, metrics in result['stages'].items():
+        print(f"  阶段 {stage}: 耗时 {metrics['seconds']} 秒, {metrics['rows_per_second']} 行/秒")
+    return result['rows'], stats['errors']
+
 def import_csv_file(file_path):
     """导入单个CSV文件到数据库"""
     try:
@@ -120,6 +216,7 @@ def import_csv_file(file_path):
             
             records_count = 0
             errors_count = 0
+            scope = new_scope()
             
             # 准备插入语句
             insert_query = """
@@ -146,26 +243,9 @@ def import_csv_file(file_path):
             for row in csv_reader:
                 try:
                     # 解析CSV行数据
-                    city = row[0]
-                    province = row[1]
-                    date = row[2]
-                    aqi = None if row[3] == '' else float(row[3])
-                    quality = row[4]
-                    rank = None if row[5] == '' else float(row[5])
-                    pm25 = None if row[6] == '' else float(row[6])
-                    pm10 = None if row[7] == '' else float(row[7])
-                    so2 = None if row[8] == '' else float(row[8])
-                    no2 = None if row[9] == '' else float(row[9])
-                    co = None if row[10] == '' else float(row[10])
-                    o3 = None if row[11] == '' else float(row[11])
-                    
-                    # 准备数据
-                    data = (
-                        city, province, date, aqi, quality, rank,
-                        pm25, pm10, so2, no2, co, o3, year
-                    )
-                    
-                    batch_data.append(data)
+                    parsed = parse_row(row, year)
+                    batch_data.append(parsed)
+                    track_scope(scope, parsed)
                     records_count += 1
                     
                     # 达到批处理大小时执行批量插入
@@ -184,6 +264,7 @@ def import_csv_file(file_path):
                 conn.commit()
             
             print(f"已成功导入文件 {file_name}，共 {records_count} 条记录")
+            publish_import(conn, scope, records_count, file_name)
             
         conn.close()
         return records_count, errors_count
@@ -192,7 +273,7 @@ def import_csv_file(file_path):
         print(f"导入文件 {file_path} 时出错: {e}")
         return 0, 0
 
-def main():
+def main(bulk=False):
     """主函数"""
     start_time = datetime.datetime.now()
     print("开始导入数据")
@@ -216,11 +297,15 @@ def main():
     total_records = 0
     total_errors = 0
     
-    for i, file_path in enumerate(csv_files, 1):
-        print(f"正在导入文件 [{i}/{total_files}]: {os.path.basename(file_path)}")
-        records, errors = import_csv_file(file_path)
-        total_records += records
-        total_errors += errors
+    bulk_result = bulk_import_files(csv_files) if bulk and csv_files else None
+    if bulk_result is not None:
+        total_records, total_errors = bulk_result
+    else:
+        for i, file_path in enumerate(csv_files, 1):
+            print(f"正在导入文件 [{i}/{total_files}]: {os.path.basename(file_path)}")
+            records, errors = import_csv_file(file_path)
+            total_records += records
+            total_errors += errors
     
     # 计算总耗时
     end_time = datetime.datetime.now()
@@ -232,4 +317,8 @@ def main():
     print(f"总耗时: {duration:.2f} 秒")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='导入空气质量数据到MySQL数据库')
+    parser.add_argument('--bulk', action='store_true',
+                        help='通过LOAD DATA LOCAL INFILE和暂存表一次导入所有文件')
+    args = parser.parse_args()
+    main(bulk=args.bulk) 
\ No newline at end of file
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+历史数据回填基准
+生成一段时间的模拟原始文件，对比:
+    1. 原方式: 与process_existing_data相同，逐个文件串行解析、聚合、写库
+    2. backfill.run_backfill: 按月分片、多进程并行、每个分片一次写库
+写库用固定的往返延迟加每条记录的耗时模拟（不需要MySQL），写入的数据保存到临时目录后与原方式比对。
+另外测量再次运行（全部按导入台账跳过）和--dry-run的耗时。
+
+注意: 并行加速比受本机CPU核数限制。
+
+用法:
+    python benchmark_backfill.py [--days 365] [--workers 1 2 4]
+"""
+
+import os
+import sys
+import time
+import uuid
+import pickle
+import shutil
+import argparse
+import tempfile
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+# 确保能引用到导入模块
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = Path(current_dir).parents[2]  # backend目录
+sys.path.append(str(project_root / 'src' / 'scripts' / 'process' / 'new_stage'))
+
+# download_data_process在导入时读取配置，原始数据目录和导入台账都指向临时目录
+work_dir = tempfile.mkdtemp(prefix='backfill_bench_')
+os.environ.setdefault('DB_PASSWORD', 'unused')
+os.environ['PROJECT_ROOT'] = work_dir
+os.environ['INGEST_LEDGER_DB'] = os.path.join(work_dir, 'ingest_ledger.db')
+
+from backfill import run_backfill
+from download_data_process import CONFIG, get_ledger
+from record_validation import split_records
+from ingest_pipeline import parse_and_aggregate
+from raw_archive import list_raw
+from benchmark_quotsoft_parser import generate_files
+
+# 创建报告目录
+reports_dir = os.path.join(current_dir, "reports")
+os.makedirs(reports_dir, exist_ok=True)
+
+OUTPUT_DIR = os.path.join(work_dir, 'written')
+WRITE_CALL_SECONDS = 0.02
+WRITE_RECORD_SECONDS = 0.0005
+
+
+def simulated_write(records):
+    """模拟写库，并把写入的记录保存到临时目录（子进程中执行）"""
+    time.sleep(WRITE_CALL_SECONDS + WRITE_RECORD_SECONDS * len(records))
+    with open(os.path.join(OUTPUT_DIR, f"{uuid.uuid4().hex}.pkl"), 'wb') as f:
+        pickle.dump(records, f)
+
+
+def collect_written():
+    rows = {}
+    for name in os.listdir(OUTPUT_DIR):
+        with open(os.path.join(OUTPUT_DIR, name), 'rb') as f:
+            for record in pickle.load(f):
+                rows[(record['city'], record['date'])] = record
+    return rows
+
+
+def reset_output():
+    shutil.rmtree(OUTPUT_DIR, ignore_errors=True)
+    os.makedirs(OUTPUT_DIR)
+
+
+def run_serial(refs):
+    """原方式: 逐个文件解析、聚合、写库"""
+    for ref in refs:
+        records, _ = split_records(parse_and_aggregate(ref))
+        if records:
+            simulated_write(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='历史数据回填基准')
+    parser.add_argument('--days', type=int, default=365, help='文件天数（从2024-01-01开始）')
+    parser.add_argument('--other-cities', type=int, default=350, help='广东省以外的城市列数')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help='要测试的进程数')
+    args = parser.parse_args()
+
+    rows = []
+    try:
+        download_dir = CONFIG['paths']['download_dir']
+        os.makedirs(download_dir, exist_ok=True)
+        print(f"生成 {args.days} 个模拟文件 ...", flush=True)
+        generate_files(download_dir, args.days, args.other_cities)
+        refs = list(list_raw(download_dir).values())
+        start_date = date(2024, 1, 1)
+        end_date = start_date + timedelta(days=args.days - 1)
+
+        reset_output()
+        start = time.perf_counter()
+        run_serial(refs)
+        seconds = time.perf_counter() - start
+        expected = collect_written()
+        rows.append(['原方式: 逐文件串行', '-', len(refs), len(expected), round(seconds, 2),
+                     round(len(refs) / seconds, 1), '-'])
+        print(f"原方式: {seconds:.2f}秒", flush=True)
+
+        for workers in args.workers:
+            reset_output()
+            get_ledger().reset()
+            start = time.perf_counter()
+            summary = run_backfill(start_date, end_date, workers=workers, writer=simulated_write)
+            seconds = time.perf_counter() - start
+            written = collect_written()
+            rows.append(["回填: 按月分片", workers, summary['files'], len(written), round(seconds, 2),
+                         round(summary['files'] / seconds, 1), '是' if written == expected else '否'])
+            print(f"回填 {workers} 进程: {seconds:.2f}秒", flush=True)
+
+        reset_output()
+        start = time.perf_counter()
+        summary = run_backfill(start_date, end_date, workers=args.workers[-1], writer=simulated_write)
+        seconds = time.perf_counter() - start
+        rows.append(['回填: 再次运行(台账跳过)', args.workers[-1], summary['files'], len(collect_written()),
+                     round(seconds, 2), '-', '-'])
+
+        start = time.perf_counter()
+        plan = run_backfill(start_date, end_date, workers=args.workers[-1], force=True, dry_run=True)
+        rows.append(['回填: --dry-run --force', args.workers[-1], plan['files'], 0,
+                     round(time.perf_counter() - start, 2), '-', '-'])
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    headers = ['方式', '进程数', '处理文件数', '写入日数据', '耗时(秒)', '文件/秒', '与原方式一致']
+    try:
+        from tabulate import tabulate
+        text = tabulate(rows, headers=headers, tablefmt='github')
+    except ImportError:
+        text = '\n'.join(['\t'.join(map(str, headers))] + ['\t'.join(map(str, row)) for row in rows])
+    print(text)
+
+    report_path = os.path.join(reports_dir, f"backfill_benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md")
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.write("# 历史数据回填基准\n\n")
+        f.write(f"测试时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+        f.write(f"文件天数: {args.days}, CPU核数: {os.cpu_count()}, 模拟写库: 每次"
+                f"{WRITE_CALL_SECONDS * 1000:.0f}ms + 每条{WRITE_RECORD_SECONDS * 1000}ms\n\n")
+        f.write(text + "\n")
+    print(f"结果已保存: {report_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+日数据批量导入性能基准
+在本地MySQL中创建两张与air_quality_data结构相同的临时基准表，用模拟的城市日数据对比
+原分批executemany插入（每500条提交一次）与bulk_loader批量导入（TSV -> LOAD DATA -> 合并）的
+每秒行数，并校验两张表的最终内容一致。第二轮导入相同主键的数据，测试主键冲突时的合并路径。
+
+需要可连接的MySQL（连接参数同import_air_data.py，读取DB_HOST/DB_USER/DB_PASSWORD/DB_NAME），
+且服务端开启local_infile:
+    SET GLOBAL local_infile = 1;
+
+用法:
+    python benchmark_bulk_load.py [--cities 21] [--days 3650] [--batch-size 500]
+"""
+
+import os
+import sys
+import time
+import argparse
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+from dotenv import load_dotenv
+
+# 确保能引用到批量导入模块
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = Path(current_dir).parents[2]  # backend目录
+sys.path.append(str(project_root / 'src' / 'scripts' / 'sql'))
+
+from bulk_loader import TARGET_COLUMNS, bulk_upsert, connect as connect_bulk
+
+dotenv_path = project_root / '.env'
+if dotenv_path.exists():
+    load_dotenv(dotenv_path)
+
+DB_CONFIG = {
+    'host': os.environ.get('DB_HOST', 'localhost'),
+    'user': os.environ.get('DB_USER', 'root'),
+    'password': os.environ.get('DB_PASSWORD', ''),
+    'database': os.environ.get('DB_NAME', 'air_quality_monitoring')
+}
+
+# 创建报告目录
+reports_dir = os.path.join(current_dir, "reports")
+os.makedirs(reports_dir, exist_ok=True)
+
+EXECUTEMANY_TABLE = 'air_quality_bench_executemany'
+BULK_TABLE = 'air_quality_bench_bulk'
+
+UPDATE_COLUMNS = ['aqi_index', 'quality_level', 'aqi_rank', 'pm25_avg', 'pm10_avg',
+                  'so2_avg', 'no2_avg', 'co_avg', 'o3_avg']
+
+QUALITY_LEVELS = ['优', '良', '轻度污染', '中度污染', '重度污染', '严重污染']
+
+
+def create_table(cursor, table_name):
+    cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
+    cursor.execute(f"""
+    CREATE TABLE {table_name} (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        city VARCHAR(50) NOT NULL,
+        province VARCHAR(50) NOT NULL,
+        record_date DATE NOT NULL,
+        aqi_index FLOAT,
+        quality_level VARCHAR(20),
+        aqi_rank FLOAT,
+        pm25_avg FLOAT,
+        pm10_avg FLOAT,
+        so2_avg FLOAT,
+        no2_avg FLOAT,
+        co_avg FLOAT,
+        o3_avg FLOAT,
+        data_year INT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        INDEX idx_city (city),
+        INDEX idx_date (record_date),
+        INDEX idx_year (data_year),
+        UNIQUE KEY uc_city_date (city, record_date)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+
+
+def generate_rows(cities, days, seed):
+    """生成模拟的城市日数据，约5%的污染物为空"""
+    rng = np.random.default_rng(seed)
+    start = date(2014, 1, 1)
+    count = cities * days
+    values = rng.uniform(1, 200, size=(count, 7)).round(1)
+    values[:, 5] = (values[:, 5] / 100).round(3)  # CO单位为mg/m³
+    missing = rng.random((count, 7)) < 0.05
+    missing[:, 0] = False
+    rows = []
+    for i in range(count):
+        day = start + timedelta(days=i // cities)
+        aqi = float(values[i, 0])
+        pollutants = [None if missing[i, j] else float(values[i, j]) for j in range(1, 7)]
+        rows.append((
+            f"城市{i % cities:02d}", '广东省', day.isoformat(), aqi,
+            QUALITY_LEVELS[min(int(aqi // 50), 5)], float(i % cities + 1),
+            *pollutants, day.year
+        ))
+    return rows
+
+
+def executemany_load(conn, table_name, rows, batch_size):
+    """原import_air_data.import_csv_file的写入方式"""
+    columns = ', '.join(TARGET_COLUMNS)
+    placeholders = ', '.join(['%s'] * len(TARGET_COLUMNS))
+    updates = ', '.join(f"{column} = VALUES({column})" for column in UPDATE_COLUMNS)
+    query = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders}) ON DUPLICATE KEY UPDATE {updates}"
+    cursor = conn.cursor()
+    start = time.perf_counter()
+    for i in range(0, len(rows), batch_size):
+        cursor.executemany(query, rows[i:i + batch_size])
+        conn.commit()
+    seconds = time.perf_counter() - start
+    cursor.close()
+    return seconds
+
+
+def table_snapshot(conn, table_name):
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT {', '.join(TARGET_COLUMNS)} FROM {table_name} ORDER BY city, record_date")
+    rows = cursor.fetchall()
+    cursor.close()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='日数据批量导入性能基准')
+    parser.add_argument('--cities', type=int, default=21, help='城市数')
+    parser.add_argument('--days', type=int, default=3650, help='天数')
+    parser.add_argument('--batch-size', type=int, default=500, help='executemany每批提交的记录数')
+    parser.add_argument('--keep-tables', action='store_true', help='保留基准表便于检查')
+    args = parser.parse_args()
+
+    conn = connect_bulk(DB_CONFIG)
+    cursor = conn.cursor()
+    cursor.execute("SELECT @@local_infile, VERSION()")
+    local_infile, version = cursor.fetchone()
+    print(f"MySQL版本: {version}, local_infile: {local_infile}")
+
+    results = []
+    try:
+        for round_name, seed in [('首次导入', 1), ('主键冲突合并', 2)]:
+            rows = generate_rows(args.cities, args.days, seed)
+            if seed == 1:
+                create_table(cursor, EXECUTEMANY_TABLE)
+                create_table(cursor, BULK_TABLE)
+                conn.commit()
+            print(f"{round_name}: {len(rows)} 行 ...", flush=True)
+
+            seconds = executemany_load(conn, EXECUTEMANY_TABLE, rows, args.batch_size)
+            results.append([round_name, f"executemany(每{args.batch_size}条)", len(rows), '-', '-', '-',
+                            round(seconds, 2), round(len(rows) / seconds, 1)])
+
+            bulk = bulk_upsert(conn, iter(rows), BULK_TABLE, update_columns=UPDATE_COLUMNS)
+            stages = bulk['stages']
+            results.append([round_name, 'bulk_loader', bulk['rows'],
+                            stages['write']['rows_per_second'], stages['load']['rows_per_second'],
+                            stages['merge']['rows_per_second'], bulk['seconds'],
+                            round(bulk['rows'] / bulk['seconds'], 1) if bulk['seconds'] else None])
+
+        mismatched = sum(1 for a, b in zip(table_snapshot(conn, EXECUTEMANY_TABLE), table_snapshot(conn, BULK_TABLE))
+                         if a != b)
+    finally:
+        if not args.keep_tables:
+            cursor.execute(f"DROP TABLE IF EXISTS {EXECUTEMANY_TABLE}")
+            cursor.execute(f"DROP TABLE IF EXISTS {BULK_TABLE}")
+            conn.commit()
+        cursor.close()
+        conn.close()
+
+    headers = ['场景', '写入方式', '行数', '写TSV(行/秒)', 'LOAD DATA(行/秒)', '合并(行/秒)', '总耗时(秒)', '总体(行/秒)']
+    try:
+        from tabulate import tabulate
+        text = tabulate(results, headers=headers, tablefmt='github')
+    except ImportError:
+        text = '\n'.join(['\t'.join(map(str, headers))] + ['\t'.join(map(str, row)) for row in results])
+    print(text)
+    print(f"两张表内容不一致的行: {mismatched}")
+
+    report_path = os.path.join(reports_dir, f"bulk_load_benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md")
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.write("# 日数据批量导入性能基准\n\n")
+        f.write(f"测试时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+        f.write(f"MySQL版本: {version}, 城市数: {args.cities}, 天数: {args.days}\n\n")
+        f.write(text + "\n\n")
+        f.write(f"两张表内容不一致的行: {mismatched}\n")
+    print(f"结果已保存: {report_path}")
+
+
+if __name__ == '__main__':
+    main()
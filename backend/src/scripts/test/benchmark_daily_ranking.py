@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+日数据AQI排名基准
+生成模拟的日数据表（天数 x 约370个城市，省份来自区域登记表），对比:
+    1. 原方式: 逐行计算名次（每行与同一天同一省份的其他城市比较，只在较小的样本上运行）
+    2. daily_ranking.rank_daily: 一次分组rank()
+迟到数据（若干天的部分城市AQI变化）时对比:
+    1. 整表重新排名
+    2. 只读取受影响日期的行重新排名（模拟record_date索引），只输出名次变化的行
+并校验: 向量化名次与逐行名次一致；增量更新后的名次与整表重新排名一致；
+同一天的城市分两批写入时，第二批写入后的增量校正得到与一次写入相同的名次。
+
+用法:
+    python benchmark_daily_ranking.py [--days 3650] [--other-cities 349] [--legacy-days 30] [--late-dates 3]
+"""
+
+import os
+import sys
+import time
+import argparse
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# 确保能引用到导入模块
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = Path(current_dir).parents[2]  # backend目录
+sys.path.append(str(project_root / 'src' / 'scripts' / 'process' / 'new_stage'))
+
+from daily_ranking import rank_daily, changed_ranks, province_series
+from region_registry import get_region_registry
+
+# 创建报告目录
+reports_dir = os.path.join(current_dir, "reports")
+os.makedirs(reports_dir, exist_ok=True)
+
+
+def generate_table(days, other_cities, seed=5):
+    """生成模拟的日数据表（列与air_quality_newdata一致），AQI取整以产生并列名次"""
+    rng = np.random.default_rng(seed)
+    cities = get_region_registry().cities(['广东省']) + [f"城市{i:03d}" for i in range(other_cities)]
+    dates = pd.date_range('2015-01-01', periods=days, freq='D').date
+    table = pd.DataFrame({
+        'city': np.tile(cities, days),
+        'record_date': np.repeat(dates, len(cities))
+    })
+    table['aqi_index'] = rng.uniform(15, 250, len(table)).round()
+    table.loc[rng.random(len(table)) < 0.002, 'aqi_index'] = np.nan
+    table['aqi_rank'] = np.nan
+    return table
+
+
+def legacy_ranks(table):
+    """原方式: 逐行统计同一天同一省份中AQI更低的城市数"""
+    registry = get_region_registry()
+    groups = {}
+    keys = []
+    for city, record_date, aqi in table[['city', 'record_date', 'aqi_index']].itertuples(index=False):
+        key = (record_date, registry.province_of(city))
+        keys.append(key)
+        if not np.isnan(aqi):
+            groups.setdefault(key, []).append(aqi)
+    ranks = []
+    for key, aqi in zip(keys, table['aqi_index']):
+        if np.isnan(aqi):
+            ranks.append(np.nan)
+        else:
+            ranks.append(1.0 + sum(1 for other in groups[key] if other < aqi))
+    return np.array(ranks)
+
+
+def apply_updates(table, updates):
+    """把changed_ranks的结果写回模拟表（相当于UPDATE ... WHERE city AND record_date）"""
+    if not updates:
+        return table
+    changes = pd.DataFrame(updates, columns=['new_rank', 'city', 'record_date'])
+    merged = table[['city', 'record_date']].merge(changes, on=['city', 'record_date'], how='left', indicator=True)
+    hit = (merged['_merge'] == 'both').to_numpy()
+    table = table.copy()
+    table.loc[hit, 'aqi_rank'] = merged.loc[hit, 'new_rank'].astype(float).to_numpy()
+    return table
+
+
+def same_ranks(left, right):
+    left = np.asarray(left, dtype=float)
+    right = np.asarray(right, dtype=float)
+    return bool(((left == right) | (np.isnan(left) & np.isnan(right))).all())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='日数据AQI排名基准')
+    parser.add_argument('--days', type=int, default=3650, help='模拟日数据表的天数')
+    parser.add_argument('--other-cities', type=int, default=349, help='广东省以外的城市数')
+    parser.add_argument('--legacy-days', type=int, default=30, help='逐行计算的样本天数')
+    parser.add_argument('--late-dates', type=int, default=3, help='迟到数据涉及的天数')
+    args = parser.parse_args()
+    rng = np.random.default_rng(9)
+
+    table = generate_table(args.days, args.other_cities)
+    city_count = table['city'].nunique()
+    rows = []
+
+    # 1. 逐行名次与分组rank()
+    sample = table[table['record_date'] < table['record_date'].iloc[0] + pd.Timedelta(days=args.legacy_days)]
+    start = time.perf_counter()
+    legacy = legacy_ranks(sample)
+    legacy_seconds = time.perf_counter() - start
+    rows.append(['原方式: 逐行计算名次', len(sample), round(legacy_seconds, 3),
+                 round(len(sample) / legacy_seconds), '-'])
+    vectorized_same = same_ranks(rank_daily(sample, 'record_date', 'aqi_index'), legacy)
+
+    start = time.perf_counter()
+    table['aqi_rank'] = rank_daily(table, 'record_date', 'aqi_index')
+    full_seconds = time.perf_counter() - start
+    rows.append(['rank_daily: 整表一次分组rank()', len(table), round(full_seconds, 3),
+                 round(len(table) / full_seconds), round(legacy_seconds / len(sample) * len(table) / full_seconds, 1)])
+    print(f"整表排名 {len(table)} 行: {full_seconds:.3f}秒", flush=True)
+
+    # 2. 迟到数据: 若干天的部分城市AQI变化
+    dates = np.array(sorted(table['record_date'].unique()))
+    late_dates = set(rng.choice(dates, size=min(args.late_dates, len(dates)), replace=False))
+    late = table['record_date'].isin(late_dates) & (rng.random(len(table)) < 0.2)
+    table.loc[late, 'aqi_index'] = rng.uniform(15, 250, int(late.sum())).round()
+
+    start = time.perf_counter()
+    expected = rank_daily(table, 'record_date', 'aqi_index')
+    full_updates = int((~((expected == table['aqi_rank']) | (expected.isna() & table['aqi_rank'].isna()))).sum())
+    full_seconds = time.perf_counter() - start
+    rows.append(["迟到数据: 整表重新排名", len(table), round(full_seconds, 4), round(len(table) / full_seconds),
+                 f"{full_updates}行变化"])
+
+    # 受影响日期的行通过按日期排序的位置直接取出（相当于数据库的record_date索引）
+    order = table.sort_values('record_date', kind='mergesort')
+    positions = {day: (lo, hi) for day, lo, hi in zip(
+        dates, np.searchsorted(order['record_date'].to_numpy(), dates, 'left'),
+        np.searchsorted(order['record_date'].to_numpy(), dates, 'right'))}
+    start = time.perf_counter()
+    affected = pd.concat([order.iloc[slice(*positions[day])] for day in sorted(late_dates)])
+    updates = changed_ranks(affected)
+    incremental_seconds = time.perf_counter() - start
+    rows.append([f"迟到数据: 只重新排名{len(late_dates)}天", len(affected), round(incremental_seconds, 4),
+                 round(len(affected) / incremental_seconds), f"{len(updates)}行变化, 快{full_seconds / incremental_seconds:.0f}倍"])
+    updated = apply_updates(table, updates)
+    incremental_same = same_ranks(updated['aqi_rank'], expected) and len(updates) == full_updates
+
+    # 3. 同一天的城市分两批写入: 第二批写入后按日期增量校正
+    day = dates[0]
+    day_rows = table[table['record_date'] == day].drop(columns='aqi_rank')
+    first, second = day_rows.iloc[::2], day_rows.iloc[1::2]
+    stored = first.assign(aqi_rank=rank_daily(first, 'record_date', 'aqi_index'))
+    stored = pd.concat([stored, second.assign(aqi_rank=rank_daily(second, 'record_date', 'aqi_index'))])
+    batch_updates = changed_ranks(stored)
+    corrected = apply_updates(stored, batch_updates)
+    split_same = same_ranks(corrected.sort_index()['aqi_rank'],
+                            rank_daily(day_rows, 'record_date', 'aqi_index').sort_index())
+
+    headers = ['方式', '行数', '耗时(秒)', '行/秒', '说明/相对原方式加速']
+    try:
+        from tabulate import tabulate
+        text = tabulate(rows, headers=headers, tablefmt='github')
+    except ImportError:
+        text = '\n'.join(['\t'.join(map(str, headers))] + ['\t'.join(map(str, row)) for row in rows])
+    provinces = province_series(table['city']).value_counts().to_dict()
+    checks = [
+        ('分组rank()与逐行名次一致', vectorized_same),
+        ('增量重新排名后与整表重新排名一致', incremental_same),
+        (f"分两批写入后校正的名次与一次写入一致（第二批后更新{len(batch_updates)}行）", split_same)
+    ]
+    check_text = '\n'.join(f"{name}: {'是' if ok else '否'}" for name, ok in checks)
+    print(text)
+    print()
+    print(check_text)
+
+    report_path = os.path.join(reports_dir, f"daily_ranking_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md")
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.write("# 日数据AQI排名基准\n\n")
+        f.write(f"测试时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+        f.write(f"天数: {args.days}, 城市数: {city_count}, 各省份行数: {provinces}\n\n")
+        f.write(text + "\n\n")
+        f.write(check_text.replace('\n', '\n\n') + "\n")
+    print(f"结果已保存: {report_path}")
+    if not all(ok for _, ok in checks):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
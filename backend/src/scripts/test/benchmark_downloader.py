@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+quotsoft数据下载器基准
+在本机启动一个模拟quotsoft的HTTP服务（支持ETag/Last-Modified条件请求，可设置每个请求的延迟），
+对比原下载方式（每次尝试新建Session、固定5线程、只按文件是否存在跳过）与QuotsoftDownloader在
+首次下载、再次运行、强制条件请求、本地文件损坏几种场景下的请求数、传输量和耗时，
+并校验下载文件与服务端内容一致。
+
+用法:
+    python benchmark_downloader.py [--files 60] [--latency-ms 50] [--workers 8]
+"""
+
+import os
+import sys
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import threading
+from datetime import date, datetime, timedelta
+from email.utils import formatdate
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+# 确保能引用到下载模块
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = Path(current_dir).parents[2]  # backend目录
+sys.path.append(str(project_root / 'src' / 'scripts' / 'process' / 'new_stage'))
+
+from quotsoft_downloader import QuotsoftDownloader
+from raw_archive import find_raw, raw_date, raw_sha256
+
+# 创建报告目录
+reports_dir = os.path.join(current_dir, "reports")
+os.makedirs(reports_dir, exist_ok=True)
+
+
+class SampleServer:
+    """提供样例CSV的本地HTTP服务"""
+
+    def __init__(self, files, latency):
+        self.files = files  # 文件名 -> 内容(bytes)
+        self.latency = latency
+        self.last_modified = formatdate(time.time() - 86400, usegmt=True)
+        self.counts = {}
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(server.latency)
+                name = self.path.rsplit('/', 1)[-1]
+                body = server.files.get(name)
+                if body is None:
+                    server.record(404, 0)
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                etag = '"%s"' % hashlib.md5(body).hexdigest()
+                if self.headers.get('If-None-Match') == etag:
+                    server.record(304, 0)
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                server.record(200, len(body))
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/csv')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('ETag', etag)
+                self.send_header('Last-Modified', server.last_modified)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/air/data"
+
+    def record(self, status, size):
+        with self._lock:
+            self.counts[status] = self.counts.get(status, 0) + 1
+            self.bytes_sent += size
+
+    def reset(self):
+        with self._lock:
+            self.counts = {}
+            self.bytes_sent = 0
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def sample_files(dates, size_kb):
+    """生成模拟的城市小时数据文件内容"""
+    files = {}
+    for index, date_obj in enumerate(dates):
+        header = 'date,hour,type,' + ','.join(f"城市{i:03d}" for i in range(370)) + '\n'
+        line = f"{date_obj.strftime('%Y%m%d')},0,AQI," + ','.join(str((index + i) % 300) for i in range(370)) + '\n'
+        body = header + line * max(1, size_kb * 1024 // len(line.encode('utf-8')))
+        files[f"china_cities_{date_obj.strftime('%Y%m%d')}.csv"] = body.encode('utf-8')
+    return files
+
+
+def legacy_download(base_url, download_dir, date_obj):
+    """原download_air_data的下载方式（不含重试等待）"""
+    file_path = Path(download_dir) / f"china_cities_{date_obj.strftime('%Y%m%d')}.csv"
+    if file_path.exists():
+        return file_path
+    session = requests.Session()
+    response = session.get(f"{base_url}/{file_path.name}", timeout=30)
+    if response.status_code == 200:
+        with open(file_path, 'wb') as f:
+            f.write(response.content)
+        return file_path
+    return None
+
+
+def run_legacy(server, download_dir, dates):
+    with ThreadPoolExecutor(max_workers=min(5, len(dates))) as executor:
+        return list(executor.map(lambda d: legacy_download(server.base_url, download_dir, d), dates))
+
+
+def verify(download_dir, files):
+    """校验下载目录中的文件（解压后）与服务端内容一致，返回不一致的文件数"""
+    mismatched = 0
+    for name, body in files.items():
+        ref = find_raw(download_dir, datetime.strptime(raw_date(name), '%Y%m%d'))
+        if ref is None or raw_sha256(ref) != hashlib.sha256(body).hexdigest():
+            mismatched += 1
+    return mismatched
+
+
+def main():
+    parser = argparse.ArgumentParser(description='quotsoft数据下载器基准')
+    parser.add_argument('--files', type=int, default=60, help='文件数（按天）')
+    parser.add_argument('--size-kb', type=int, default=200, help='每个文件的大小(KB)')
+    parser.add_argument('--latency-ms', type=int, default=50, help='服务端每个请求的延迟(毫秒)')
+    parser.add_argument('--workers', type=int, default=8, help='下载器并发数')
+    args = parser.parse_args()
+
+    dates = [date(2024, 1, 1) + timedelta(days=i) for i in range(args.files)]
+    files = sample_files(dates, args.size_kb)
+    # 服务端缺少最后一天的文件，测试404处理
+    missing_date = dates[-1] + timedelta(days=1)
+    server = SampleServer(files, args.latency_ms / 1000)
+    server.start()
+    work_dir = tempfile.mkdtemp(prefix='downloader_bench_')
+    rows = []
+
+    def measure(name, func, download_dir):
+        server.reset()
+        start = time.perf_counter()
+        func()
+        seconds = time.perf_counter() - start
+        rows.append([name, len(dates), sum(server.counts.values()), server.counts.get(200, 0),
+                     server.counts.get(304, 0), server.counts.get(404, 0),
+                     round(server.bytes_sent / 1024 / 1024, 1), round(seconds, 2), verify(download_dir, files)])
+
+    try:
+        legacy_dir = os.path.join(work_dir, 'legacy')
+        os.makedirs(legacy_dir)
+        measure('原方式: 首次下载', lambda: run_legacy(server, legacy_dir, dates), legacy_dir)
+        # 原方式写入的是截断文件时无法发现
+        with open(os.path.join(legacy_dir, next(iter(files))), 'wb') as f:
+            f.write(b'date,hour')
+        measure('原方式: 再次运行(1个文件已损坏)', lambda: run_legacy(server, legacy_dir, dates), legacy_dir)
+
+        new_dir = os.path.join(work_dir, 'new')
+        downloader = QuotsoftDownloader(new_dir, base_url=server.base_url, max_workers=args.workers,
+                                        retry_attempts=1, retry_delay=0)
+        measure('下载器: 首次下载', lambda: downloader.download_many(dates + [missing_date]), new_dir)
+        measure('下载器: 再次运行', lambda: downloader.download_many(dates), new_dir)
+        measure('下载器: 强制条件请求', lambda: downloader.download_many(dates, force=True), new_dir)
+        with open(find_raw(new_dir, dates[0]), 'wb') as f:
+            f.write(b'date,hour')
+        # 新进程: 从磁盘索引恢复
+        downloader.close()
+        downloader = QuotsoftDownloader(new_dir, base_url=server.base_url, max_workers=args.workers,
+                                        retry_attempts=1, retry_delay=0)
+        measure('下载器: 新进程再次运行(1个文件已损坏)', lambda: downloader.download_many(dates), new_dir)
+        downloader.close()
+    finally:
+        server.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    headers = ['场景', '文件数', '请求数', '200', '304', '404', '传输量(MB)', '耗时(秒)', '与服务端不一致的文件']
+    try:
+        from tabulate import tabulate
+        text = tabulate(rows, headers=headers, tablefmt='github')
+    except ImportError:
+        text = '\n'.join(['\t'.join(map(str, headers))] + ['\t'.join(map(str, row)) for row in rows])
+    print(text)
+
+    report_path = os.path.join(reports_dir, f"downloader_benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md")
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.write("# quotsoft数据下载器基准\n\n")
+        f.write(f"测试时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+        f.write(f"文件数: {args.files}, 文件大小: {args.size_kb}KB, 请求延迟: {args.latency_ms}ms, "
+                f"下载器并发数: {args.workers}\n\n")
+        f.write(text + "\n")
+    print(f"结果已保存: {report_path}")
+
+
+if __name__ == '__main__':
+    main()
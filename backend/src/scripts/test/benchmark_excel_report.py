@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Excel报告写入性能基准
+对比流式(write_only)与常规内存模式在1年、5年、10年全省数据导出时的耗时和峰值内存(RSS)。
+每个场景在独立子进程中运行，以便准确获得该场景的峰值RSS。
+
+用法:
+    python benchmark_excel_report.py [--years 1 5 10] [--modes streaming memory]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+# 确保能引用到项目模块
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = Path(current_dir).parents[2]  # backend目录
+sys.path.append(str(project_root))
+
+# 创建报告目录
+reports_dir = os.path.join(current_dir, "reports")
+os.makedirs(reports_dir, exist_ok=True)
+
+CITIES = [
+    '广州市', '深圳市', '珠海市', '汕头市', '佛山市', '韶关市', '湛江市', '肇庆市',
+    '江门市', '茂名市', '惠州市', '梅州市', '汕尾市', '河源市', '阳江市', '清远市',
+    '东莞市', '中山市', '潮州市', '揭阳市', '云浮市'
+]
+
+
+def peak_rss_mb():
+    """当前进程的峰值RSS(MB)，Linux上ru_maxrss单位为KB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 if sys.platform != 'darwin' else peak / 1024 / 1024
+
+
+def build_dataset(years):
+    """构造全省每城市每日一行的模拟报告数据"""
+    import numpy as np
+    import pandas as pd
+
+    dates = pd.date_range('2015-01-01', periods=365 * years, freq='D')
+    rng = np.random.default_rng(42)
+    n = len(dates) * len(CITIES)
+    frame = pd.DataFrame({
+        'date': np.repeat(dates.date, len(CITIES)),
+        'city': np.tile(CITIES, len(dates)),
+        'aqi': rng.uniform(20, 200, n).round(0),
+        'quality_level': rng.choice(['优', '良', '轻度污染', '中度污染'], n),
+        'pm25': rng.uniform(5, 120, n).round(1),
+        'pm10': rng.uniform(10, 180, n).round(1),
+        'so2': rng.uniform(2, 30, n).round(1),
+        'no2': rng.uniform(5, 80, n).round(1),
+        'o3': rng.uniform(20, 200, n).round(1),
+        'co': rng.uniform(0.3, 2.0, n).round(2)
+    })
+    return {
+        'aqi_data': frame[['date', 'aqi', 'quality_level', 'city']],
+        'pollutants': frame[['date', 'pm25', 'pm10', 'so2', 'no2', 'o3', 'co', 'city']]
+    }
+
+
+def run_case(years, mode):
+    """在当前进程中运行单个场景并返回测量结果"""
+    from src.scripts.api.reports.report_excel import write_excel_report
+
+    data = build_dataset(years)
+    rows = len(data['aqi_data'])
+    rss_before = peak_rss_mb()
+
+    output_path = os.path.join(tempfile.mkdtemp(prefix='excel_bench_'), f"bench_{years}y_{mode}.xlsx")
+    content_options = {'air_quality': True, 'pollutants': True, 'trends': True}
+
+    start = time.perf_counter()
+    write_excel_report(data, content_options, output_path, 'all', '2015-01-01', 'N/A',
+                       streaming=(mode == 'streaming'))
+    elapsed = time.perf_counter() - start
+
+    result = {
+        'years': years,
+        'mode': mode,
+        'rows': rows,
+        'seconds': round(elapsed, 2),
+        'rows_per_second': int(rows * 2 / elapsed) if elapsed else None,
+        'rss_data_mb': round(rss_before, 1),
+        'rss_peak_mb': round(peak_rss_mb(), 1),
+        'file_mb': round(os.path.getsize(output_path) / 1024 / 1024, 2)
+    }
+    result['rss_writer_mb'] = round(result['rss_peak_mb'] - result['rss_data_mb'], 1)
+    os.remove(output_path)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Excel报告写入性能基准')
+    parser.add_argument('--years', type=int, nargs='+', default=[1, 5, 10])
+    parser.add_argument('--modes', nargs='+', default=['streaming', 'memory'],
+                        choices=['streaming', 'memory'])
+    parser.add_argument('--case', nargs=2, metavar=('YEARS', 'MODE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(int(args.case[0]), args.case[1])))
+        return
+
+    results = []
+    for years in args.years:
+        for mode in args.modes:
+            print(f"运行场景: {years}年, {mode}模式 ...", flush=True)
+            proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--case', str(years), mode],
+                                  capture_output=True, text=True)
+            if proc.returncode != 0:
+                print(f"场景失败: {proc.stderr.strip()[-500:]}")
+                continue
+            results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    headers = ['年数', '模式', '数据行数', '耗时(秒)', '行/秒', '数据RSS(MB)', '峰值RSS(MB)', '写入增量(MB)', '文件(MB)']
+    table = [[r['years'], r['mode'], r['rows'], r['seconds'], r['rows_per_second'], r['rss_data_mb'],
+              r['rss_peak_mb'], r['rss_writer_mb'], r['file_mb']] for r in results]
+    try:
+        from tabulate import tabulate
+        text = tabulate(table, headers=headers, tablefmt='github')
+    except ImportError:
+        text = '\n'.join(['\t'.join(map(str, headers))] + ['\t'.join(map(str, row)) for row in table])
+    print(text)
+
+    report_path = os.path.join(reports_dir, f"excel_benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md")
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.write("# Excel报告写入性能基准\n\n")
+        f.write(f"测试时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+        f.write(text + "\n")
+    print(f"结果已保存: {report_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+增量导入基准
+在本机启动模拟quotsoft的HTTP服务，当天的文件随"时间"推进每小时追加一小时的数据，
+逐小时运行download_data_process.run_incremental，统计每次运行的请求数、传输量、写入记录数和耗时，
+并与全量方式对比:
+    1. 全量方式每6小时运行一次，日期范围截止到前一天，当天的数据要到第二天才能入库
+    2. 增量方式每小时运行一次，当天的数据在发布后的下一次运行即入库，水位线之前的日期不会被改写
+同时校验当天最后写入的日数据与用完整文件聚合、校验后的结果一致；中间某天的文件缺失时水位线停在这一天之前，
+文件发布后下一次运行从这一天补上。写库用内存中的字典代替（不需要MySQL）。
+
+用法:
+    python benchmark_incremental_ingest.py [--history-days 7] [--latency-ms 50]
+"""
+
+import io
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import pandas as pd
+
+# 确保能引用到导入模块
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = Path(current_dir).parents[2]  # backend目录
+sys.path.append(str(project_root / 'src' / 'scripts' / 'process' / 'new_stage'))
+
+# download_data_process在导入时读取配置，这里只用到不访问数据库的部分
+work_dir = tempfile.mkdtemp(prefix='incremental_bench_')
+os.environ.setdefault('DB_PASSWORD', 'unused')
+os.environ['PROJECT_ROOT'] = work_dir
+
+from download_data_process import run_incremental, INCREMENTAL_SOURCE
+from quotsoft_downloader import QuotsoftDownloader
+from ingest_ledger import IngestLedger
+from raw_archive import find_raw
+from quotsoft_parser import parse_quotsoft_file
+from daily_aggregation import aggregate_daily
+from record_validation import split_records
+from benchmark_quotsoft_parser import generate_files
+from benchmark_downloader import SampleServer
+
+# 创建报告目录
+reports_dir = os.path.join(current_dir, "reports")
+os.makedirs(reports_dir, exist_ok=True)
+
+
+class MemoryWriter:
+    """记录写入的日数据，(city, date)相同时覆盖，与数据表的唯一键一致"""
+
+    def __init__(self):
+        self.rows = {}
+        self.written_dates = []
+
+    def __call__(self, jobs):
+        for job in jobs:
+            self.written_dates.append(job['date'])
+            for record in job['records']:
+                self.rows[(record['city'], record['date'])] = record
+
+
+def day_files(source_dir, history_days, other_cities):
+    """生成history_days天的历史文件和今天的完整文件，文件内的日期改为实际日期"""
+    today = date.today()
+    files = {}
+    for index, path in enumerate(generate_files(source_dir, history_days + 1, other_cities)):
+        day = today - timedelta(days=history_days - index)
+        frame = pd.read_csv(path)
+        frame['date'] = int(day.strftime('%Y%m%d'))
+        files[day] = frame
+    return files
+
+
+def to_bytes(frame):
+    buffer = io.StringIO()
+    frame.to_csv(buffer, index=False)
+    return buffer.getvalue().encode('utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='增量导入基准')
+    parser.add_argument('--history-days', type=int, default=7, help='今天之前已导入的天数')
+    parser.add_argument('--other-cities', type=int, default=350, help='广东省以外的城市列数')
+    parser.add_argument('--latency-ms', type=int, default=50, help='服务端每个请求的延迟(毫秒)')
+    args = parser.parse_args()
+
+    server = None
+    rows = []
+    try:
+        source_dir = os.path.join(work_dir, 'source')
+        os.makedirs(source_dir)
+        frames = day_files(source_dir, args.history_days, args.other_cities)
+        today = date.today()
+        yesterday = today - timedelta(days=1)
+        served = {f"china_cities_{day.strftime('%Y%m%d')}.csv": to_bytes(frame)
+                  for day, frame in frames.items() if day < today}
+        server = SampleServer(served, args.latency_ms / 1000)
+        server.start()
+
+        download_dir = os.path.join(work_dir, 'raw_data')
+        downloader = QuotsoftDownloader(download_dir, base_url=server.base_url, max_workers=4,
+                                        retry_attempts=1, retry_delay=0)
+        ledger = IngestLedger(os.path.join(work_dir, 'ingest_ledger.db'))
+        writer = MemoryWriter()
+
+        # 历史数据已导入到前一天的23时
+        ledger.advance_watermark(INCREMENTAL_SOURCE, yesterday.strftime('%Y-%m-%d'), 23)
+        today_frame = frames[today]
+        today_name = f"china_cities_{today.strftime('%Y%m%d')}.csv"
+
+        for hour in range(-1, 24):
+            if hour >= 0:
+                # 服务端发布到第hour时的数据
+                server.files[today_name] = to_bytes(today_frame[today_frame['hour'] <= hour])
+            server.reset()
+            written_before = len(writer.written_dates)
+            start = time.perf_counter()
+            result = run_incremental(today=today, writer=writer, downloader=downloader, ledger=ledger)
+            seconds = time.perf_counter() - start
+            rows.append([f"{hour}时" if hour >= 0 else '当天文件未发布', sum(server.counts.values()),
+                         server.counts.get(200, 0), server.counts.get(304, 0), server.counts.get(404, 0),
+                         round(server.bytes_sent / 1024, 1), len(writer.written_dates) - written_before,
+                         result['records'], f"{result['watermark'][0]} {result['watermark'][1]}时",
+                         round(seconds * 1000, 1)])
+
+        # 再运行一次: 当天已满24小时，没有变化
+        server.reset()
+        result = run_incremental(today=today, writer=writer, downloader=downloader, ledger=ledger)
+        rows.append(['全部发布后再次运行', sum(server.counts.values()), server.counts.get(200, 0),
+                     server.counts.get(304, 0), server.counts.get(404, 0), round(server.bytes_sent / 1024, 1),
+                     0, result['records'], f"{result['watermark'][0]} {result['watermark'][1]}时", '-'])
+        downloader.close()
+
+        # 中间某天的文件缺失: 之后的日期即使可用也不导入，文件发布后从缺失的日期继续
+        gap_day = today - timedelta(days=2)
+        gap_name = f"china_cities_{gap_day.strftime('%Y%m%d')}.csv"
+        gap_bytes = server.files.pop(gap_name)
+        gap_ledger = IngestLedger(os.path.join(work_dir, 'gap_ledger.db'))
+        gap_ledger.advance_watermark(INCREMENTAL_SOURCE, (gap_day - timedelta(days=1)).strftime('%Y-%m-%d'), 23)
+        gap_writer = MemoryWriter()
+        gap_downloader = QuotsoftDownloader(os.path.join(work_dir, 'gap_raw'), base_url=server.base_url,
+                                            max_workers=4, retry_attempts=1, retry_delay=0)
+        stalled = run_incremental(today=yesterday, writer=gap_writer, downloader=gap_downloader, ledger=gap_ledger)
+        stalled_dates = list(gap_writer.written_dates)
+        server.files[gap_name] = gap_bytes
+        resumed = run_incremental(today=yesterday, writer=gap_writer, downloader=gap_downloader, ledger=gap_ledger)
+        gap_downloader.close()
+        gap_resumed = (stalled['watermark'][0] == (gap_day - timedelta(days=1)).strftime('%Y-%m-%d')
+                       and not stalled_dates
+                       and gap_writer.written_dates == [gap_day.strftime('%Y-%m-%d'), yesterday.strftime('%Y-%m-%d')]
+                       and resumed['watermark'] == (yesterday.strftime('%Y-%m-%d'), 23))
+
+        expected = {(r['city'], r['date']): r for r in split_records(aggregate_daily(
+            parse_quotsoft_file(find_raw(download_dir, today))))[0]}
+        today_rows = {key: value for key, value in writer.rows.items() if key[1] == today.strftime('%Y-%m-%d')}
+        # 最终未通过校验的城市转入隔离表，数据表中保留此前某小时写入的最后一次有效值
+        same = all(today_rows.get(key) == value for key, value in expected.items())
+        untouched = all(d >= yesterday.strftime('%Y-%m-%d') for d in writer.written_dates)
+    finally:
+        if server is not None:
+            server.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    headers = ['当天已发布到', '请求数', '200', '304', '404', '传输量(KB)', '写入文件数', '写入日数据', '水位线', '耗时(毫秒)']
+    try:
+        from tabulate import tabulate
+        text = tabulate(rows, headers=headers, tablefmt='github')
+    except ImportError:
+        text = '\n'.join(['\t'.join(map(str, headers))] + ['\t'.join(map(str, row)) for row in rows])
+    print(text)
+    summary = (f"\n当天日数据与完整文件聚合结果一致: {'是' if same else '否'}\n"
+               f"只写入了水位线所在日期及之后的数据: {'是' if untouched else '否'}\n"
+               f"中间某天文件缺失时水位线停在缺失之前，文件发布后从这一天补上: {'是' if gap_resumed else '否'}\n"
+               f"全量方式（每6小时，截止到前一天）: 当天数据最早在次日0时的运行中入库；"
+               f"增量方式: 每小时运行，当天数据在发布后的下一次运行中入库\n")
+    print(summary)
+
+    report_path = os.path.join(reports_dir, f"incremental_ingest_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md")
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.write("# 增量导入基准\n\n")
+        f.write(f"测试时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+        f.write(f"历史天数: {args.history_days}, 请求延迟: {args.latency_ms}ms\n\n")
+        f.write(text + "\n")
+        f.write(summary)
+    print(f"结果已保存: {report_path}")
+    if not (same and untouched and gap_resumed):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+流式导入流水线基准
+在本机启动模拟quotsoft的HTTP服务（每个请求有固定延迟），提供生成的全国城市小时数据文件，
+对比两种导入方式的总耗时:
+    1. 原方式: 先并发下载全部文件，全部完成后再用进程池逐个文件解析、聚合、写库
+    2. 流水线: 下载、解析聚合、校验、写库同时运行，阶段之间由有界队列连接
+写库用固定的往返延迟加每条记录的耗时模拟（不需要MySQL），并校验两种方式写入的日数据一致。
+同时输出流水线各阶段的吞吐量、利用率、队列深度和被下游阻塞的时间。
+
+用法:
+    python benchmark_ingest_pipeline.py [--days 90] [--latency-ms 150] [--parse-workers 4]
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+from datetime import date, datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# 确保能引用到导入模块
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = Path(current_dir).parents[2]  # backend目录
+sys.path.append(str(project_root / 'src' / 'scripts' / 'process' / 'new_stage'))
+
+from quotsoft_downloader import QuotsoftDownloader, DOWNLOADED, NOT_MODIFIED, CACHED
+from ingest_ledger import IngestLedger
+from ingest_pipeline import build_ingest_pipeline, parse_and_aggregate, start_workers
+from daily_aggregation import to_daily_records
+from benchmark_quotsoft_parser import generate_files
+from benchmark_downloader import SampleServer
+
+# 创建报告目录
+reports_dir = os.path.join(current_dir, "reports")
+os.makedirs(reports_dir, exist_ok=True)
+
+
+class FakeWriter:
+    """模拟写库: 每次调用有固定的往返延迟，另加每条记录的耗时"""
+
+    def __init__(self, call_seconds, record_seconds):
+        self.call_seconds = call_seconds
+        self.record_seconds = record_seconds
+        self.rows = {}
+
+    def write(self, records):
+        time.sleep(self.call_seconds + self.record_seconds * len(records))
+        for record in records:
+            self.rows[(record['city'], record['date'])] = record
+
+    def write_jobs(self, jobs):
+        self.write([record for job in jobs for record in job['records']])
+
+
+def process_file(ref):
+    """原方式进程池中的单文件处理（解析聚合，写库在主进程模拟）"""
+    return to_daily_records(parse_and_aggregate(ref))
+
+
+def run_legacy(server, download_dir, dates, writer, parse_workers):
+    downloader = QuotsoftDownloader(download_dir, base_url=server.base_url, max_workers=4,
+                                    retry_attempts=1, retry_delay=0, compression='none')
+    files = [result['path'] for result in downloader.download_many(dates)
+             if result['status'] in (DOWNLOADED, NOT_MODIFIED, CACHED)]
+    downloader.close()
+    with ProcessPoolExecutor(max_workers=parse_workers) as executor:
+        for records in executor.map(process_file, files):
+            writer.write(records)
+
+
+def run_pipeline(server, download_dir, dates, writer, parse_workers, ledger_path):
+    downloader = QuotsoftDownloader(download_dir, base_url=server.base_url, max_workers=4,
+                                    retry_attempts=1, retry_delay=0, compression='none')
+    with ProcessPoolExecutor(max_workers=parse_workers) as executor:
+        start_workers(executor, parse_workers)
+        pipeline = build_ingest_pipeline(downloader, IngestLedger(ledger_path), writer.write_jobs,
+                                         parse_executor=executor, parse_workers=parse_workers)
+        pipeline.run(dates)
+    downloader.close()
+    return pipeline
+
+
+def main():
+    parser = argparse.ArgumentParser(description='流式导入流水线基准')
+    parser.add_argument('--days', type=int, default=90, help='文件天数')
+    parser.add_argument('--other-cities', type=int, default=350, help='广东省以外的城市列数')
+    parser.add_argument('--latency-ms', type=int, default=150, help='服务端每个请求的延迟(毫秒)')
+    parser.add_argument('--parse-workers', type=int, default=4, help='解析进程数')
+    parser.add_argument('--write-call-ms', type=float, default=20, help='模拟每次写库的往返延迟(毫秒)')
+    parser.add_argument('--write-record-ms', type=float, default=0.5, help='模拟每条记录的写库耗时(毫秒)')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='ingest_pipeline_bench_')
+    server = None
+    rows = []
+    try:
+        source_dir = os.path.join(work_dir, 'source')
+        os.makedirs(source_dir)
+        print(f"生成 {args.days} 个模拟文件 ...", flush=True)
+        files = {}
+        for path in generate_files(source_dir, args.days, args.other_cities):
+            with open(path, 'rb') as f:
+                files[os.path.basename(path)] = f.read()
+        dates = [date(2024, 1, 1) + timedelta(days=i) for i in range(args.days)]
+
+        server = SampleServer(files, args.latency_ms / 1000)
+        server.start()
+
+        results = {}
+        for name in ['原方式: 先下载后处理', '流水线']:
+            writer = FakeWriter(args.write_call_ms / 1000, args.write_record_ms / 1000)
+            download_dir = os.path.join(work_dir, f"download_{len(results)}")
+            start = time.perf_counter()
+            if name == '流水线':
+                pipeline = run_pipeline(server, download_dir, dates, writer, args.parse_workers,
+                                        os.path.join(work_dir, 'ingest_ledger.db'))
+            else:
+                run_legacy(server, download_dir, dates, writer, args.parse_workers)
+            seconds = time.perf_counter() - start
+            results[name] = writer.rows
+            rows.append([name, args.days, len(writer.rows), round(seconds, 2), round(args.days / seconds, 1)])
+            print(f"{name}: {seconds:.2f}秒", flush=True)
+        same = results['原方式: 先下载后处理'] == results['流水线']
+    finally:
+        if server is not None:
+            server.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    headers = ['方式', '文件数', '写入日数据行数', '总耗时(秒)', '文件/秒']
+    stage_headers = ['阶段', '线程数', '输入', '输出', '错误', '活跃时长(秒)', '吞吐(个/秒)', '利用率',
+                     '平均队列深度', '最大队列深度', '被下游阻塞(秒)']
+    stage_rows = [[s['stage'], s['workers'], s['items_in'], s['items_out'], s['errors'], s['active_seconds'],
+                   s['items_per_second'], s['utilization'], s['queue_avg'], s['queue_max'], s['blocked_seconds']]
+                  for s in pipeline.report()]
+    try:
+        from tabulate import tabulate
+        text = tabulate(rows, headers=headers, tablefmt='github')
+        stage_text = tabulate(stage_rows, headers=stage_headers, tablefmt='github')
+    except ImportError:
+        text = '\n'.join(['\t'.join(map(str, headers))] + ['\t'.join(map(str, row)) for row in rows])
+        stage_text = '\n'.join(['\t'.join(stage_headers)] + ['\t'.join(map(str, row)) for row in stage_rows])
+    print(text)
+    print()
+    print(stage_text)
+    print(f"\n两种方式写入的数据一致: {'是' if same else '否'}")
+
+    report_path = os.path.join(reports_dir, f"ingest_pipeline_benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md")
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.write("# 流式导入流水线基准\n\n")
+        f.write(f"测试时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+        f.write(f"文件数: {args.days}, 请求延迟: {args.latency_ms}ms, 解析进程数: {args.parse_workers}, "
+                f"模拟写库: 每次{args.write_call_ms}ms + 每条{args.write_record_ms}ms\n\n")
+        f.write(text + "\n\n")
+        f.write("## 流水线各阶段\n\n")
+        f.write(stage_text + "\n\n")
+        f.write(f"两种方式写入的数据一致: {'是' if same else '否'}\n")
+    print(f"结果已保存: {report_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+quotsoft城市小时数据解析性能基准
+在临时目录生成一年的模拟china_cities_YYYYMMDD.csv文件（全国约370个城市列），
+对比原逐行解析路径（子串匹配城市列、iterrows按小时分组、逐城市过滤指标）
+与新的向量化解析(quotsoft_parser)的耗时和单文件内存峰值，并校验两者输出的记录一致。
+--encoding gbk 可生成GBK编码的文件，测试逐个编码整文件重试与样本探测的差别。
+
+用法:
+    python benchmark_quotsoft_parser.py [--days 365] [--other-cities 350] [--legacy-days 30] [--encoding utf-8]
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# 确保能引用到解析模块
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = Path(current_dir).parents[2]  # backend目录
+sys.path.append(str(project_root / 'src' / 'scripts' / 'process' / 'new_stage'))
+
+from quotsoft_parser import parse_quotsoft_file, to_records
+from region_registry import get_region_registry
+
+# 模拟文件中带真实城市名的列（广东省），其余为编号城市
+GUANGDONG_CITIES = get_region_registry().cities(['广东省'])
+
+# 创建报告目录
+reports_dir = os.path.join(current_dir, "reports")
+os.makedirs(reports_dir, exist_ok=True)
+
+TYPES = ['AQI', 'PM2.5', 'PM2.5_24h', 'PM10', 'PM10_24h', 'SO2', 'SO2_24h', 'NO2', 'NO2_24h',
+         'O3', 'O3_24h', 'O3_8h', 'O3_8h_24h', 'CO', 'CO_24h']
+
+
+def generate_files(target_dir, days, other_cities, encoding='utf-8'):
+    """生成模拟的全国城市小时数据文件"""
+    rng = np.random.default_rng(7)
+    columns = [city[:-1] for city in GUANGDONG_CITIES] + [f"城市{i:03d}" for i in range(other_cities)]
+    start = datetime(2024, 1, 1)
+    files = []
+    for day in range(days):
+        date_value = int((start + timedelta(days=day)).strftime('%Y%m%d'))
+        rows = len(TYPES) * 24
+        values = rng.uniform(1, 150, size=(rows, len(columns))).round(1)
+        types = np.array(TYPES * 24)
+        # CO单位为mg/m³，数值量级较小
+        values[np.char.startswith(types, 'CO')] /= 50
+        values[rng.random(values.shape) < 0.03] = np.nan
+        frame = pd.DataFrame(values, columns=columns)
+        frame.insert(0, 'type', types)
+        frame.insert(0, 'hour', np.repeat(np.arange(24), len(TYPES)))
+        frame.insert(0, 'date', date_value)
+        path = os.path.join(target_dir, f"china_cities_{date_value}.csv")
+        frame.to_csv(path, index=False, encoding=encoding)
+        files.append(path)
+    return files
+
+
+def legacy_parse(file_path):
+    """原process_existing_data.read_and_process_file中的解析逻辑（不含数据库写入）"""
+    df = None
+    for encoding in ['utf-8', 'gbk', 'gb2312', 'cp936']:
+        try:
+            df = pd.read_csv(file_path, encoding=encoding)
+            break
+        except UnicodeDecodeError:
+            continue
+
+    gd_cities_cols = []
+    for col in df.columns:
+        for city in GUANGDONG_CITIES:
+            city_without_suffix = city.replace('市', '')
+            if city in col or city_without_suffix in col or col in city:
+                if col not in gd_cities_cols:
+                    gd_cities_cols.append(col)
+                break
+
+    aqi_data = df[df['type'] == 'AQI']
+    indicators = {'AQI': aqi_data}
+    for indicator in ['PM2.5', 'PM10', 'SO2', 'NO2', 'O3', 'CO']:
+        indicator_data = df[df['type'] == indicator]
+        if len(indicator_data) > 0:
+            indicators[indicator] = indicator_data
+
+    date_hour_groups = {}
+    for _, row in aqi_data.iterrows():
+        date_hour_groups.setdefault((row['date'], row['hour']), []).append(row)
+
+    records = []
+    for (date, hour), group_rows in date_hour_groups.items():
+        date_str = datetime.strptime(str(date), '%Y%m%d').strftime('%Y-%m-%d')
+        group = pd.DataFrame(group_rows)
+        for city_col in gd_cities_cols:
+            city_name = next(city for city in GUANGDONG_CITIES
+                             if city in city_col or city.replace('市', '') in city_col or city_col in city)
+            aqi_value = group[city_col].iloc[0]
+            if pd.isna(aqi_value):
+                continue
+            record = {'city': city_name, 'date': date_str, 'hour': int(hour), 'aqi': float(aqi_value)}
+            for indicator_type, field_name in [('PM2.5', 'pm25'), ('PM10', 'pm10'), ('SO2', 'so2'),
+                                               ('NO2', 'no2'), ('O3', 'o3'), ('CO', 'co')]:
+                record[field_name] = None
+                if indicator_type in indicators:
+                    indicator_group = indicators[indicator_type]
+                    indicator_group = indicator_group[(indicator_group['date'] == group['date'].iloc[0]) &
+                                                      (indicator_group['hour'] == hour)]
+                    if len(indicator_group) > 0:
+                        value = indicator_group[city_col].iloc[0]
+                        record[field_name] = None if pd.isna(value) else float(value)
+            records.append(record)
+    return records
+
+
+def new_parse(file_path):
+    return to_records(parse_quotsoft_file(file_path))
+
+
+def peak_memory(func, file_path):
+    """解析单个文件时的内存分配峰值(MB)"""
+    tracemalloc.start()
+    try:
+        func(file_path)
+        return tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def record_keys(records):
+    return {(r['city'], r['date'], r['hour']): (r['aqi'], r['pm25'], r['o3'], r['co']) for r in records}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='quotsoft城市小时数据解析性能基准')
+    parser.add_argument('--days', type=int, default=365, help='生成的文件天数')
+    parser.add_argument('--other-cities', type=int, default=350, help='广东省以外的城市列数')
+    parser.add_argument('--legacy-days', type=int, default=30,
+                        help='原解析路径只运行前N个文件后按比例推算全年耗时（0表示全部运行）')
+    parser.add_argument('--encoding', default='utf-8', choices=['utf-8', 'gbk'], help='模拟文件的编码')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='quotsoft_bench_')
+    try:
+        print(f"生成 {args.days} 个模拟文件 ...", flush=True)
+        files = generate_files(work_dir, args.days, args.other_cities, args.encoding)
+        total_mb = sum(os.path.getsize(f) for f in files) / 1024 / 1024
+
+        start = time.perf_counter()
+        new_records = [new_parse(f) for f in files]
+        new_seconds = time.perf_counter() - start
+
+        legacy_files = files[:args.legacy_days] if args.legacy_days else files
+        start = time.perf_counter()
+        legacy_records = [legacy_parse(f) for f in legacy_files]
+        legacy_measured = time.perf_counter() - start
+        legacy_seconds = legacy_measured * len(files) / len(legacy_files)
+
+        # 校验: 原路径未做范围过滤，仅比较两者都保留的记录
+        mismatched = 0
+        for legacy, new in zip(legacy_records, new_records):
+            legacy_keys = record_keys(legacy)
+            new_keys = record_keys(new)
+            mismatched += sum(1 for key, value in new_keys.items() if legacy_keys.get(key) != value)
+        rows = sum(len(r) for r in new_records)
+        legacy_peak = peak_memory(legacy_parse, files[0])
+        new_peak = peak_memory(new_parse, files[0])
+
+        headers = ['解析路径', '文件数', '数据量(MB)', '耗时(秒)', '每文件(毫秒)', '每文件记录数', '内存峰值(MB)', '加速比']
+        table = [
+            ['原逐行解析' + ('(推算)' if len(legacy_files) < len(files) else ''), len(files), round(total_mb, 1),
+             round(legacy_seconds, 2), round(legacy_seconds / len(files) * 1000, 1),
+             round(sum(len(r) for r in legacy_records) / len(legacy_files), 1), round(legacy_peak, 1), 1.0],
+            ['向量化解析', len(files), round(total_mb, 1), round(new_seconds, 2),
+             round(new_seconds / len(files) * 1000, 1), round(rows / len(files), 1), round(new_peak, 1),
+             round(legacy_seconds / new_seconds, 1)]
+        ]
+        try:
+            from tabulate import tabulate
+            text = tabulate(table, headers=headers, tablefmt='github')
+        except ImportError:
+            text = '\n'.join(['\t'.join(map(str, headers))] + ['\t'.join(map(str, row)) for row in table])
+        print(text)
+        print(f"与原路径不一致的记录: {mismatched}")
+
+        report_path = os.path.join(reports_dir, f"quotsoft_parser_benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md")
+        with open(report_path, 'w', encoding='utf-8') as f:
+            f.write("# quotsoft城市小时数据解析性能基准\n\n")
+            f.write(f"测试时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+            f.write(f"城市列数: {len(GUANGDONG_CITIES) + args.other_cities}, 文件编码: {args.encoding}, "
+                    f"原路径实测文件数: {len(legacy_files)}\n\n")
+            f.write(text + "\n\n")
+            f.write(f"与原路径不一致的记录: {mismatched}\n")
+        print(f"结果已保存: {report_path}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+原始数据归档基准
+生成模拟的china_cities_YYYYMMDD.csv文件，分别以未压缩、gzip、zstd（已安装zstandard时）和
+gzip+月度包几种方式保存，统计磁盘占用，并测量端到端解析耗时（列出文件 -> 解析 -> 日聚合），
+同时校验各种存储方式得到的日数据完全一致。
+
+注意: 文件刚生成时位于系统页缓存中，这里测到的是解压带来的CPU开销；
+磁盘读取受限的场景下（冷缓存、机械盘、网络盘），读取量减少带来的收益会更明显。
+
+用法:
+    python benchmark_raw_archive.py [--days 120] [--other-cities 350]
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+# 确保能引用到归档和解析模块
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = Path(current_dir).parents[2]  # backend目录
+sys.path.append(str(project_root / 'src' / 'scripts' / 'process' / 'new_stage'))
+
+from raw_archive import archive, list_raw, zstandard
+from quotsoft_parser import parse_quotsoft_file
+from daily_aggregation import aggregate_daily
+from benchmark_quotsoft_parser import generate_files
+
+# 创建报告目录
+reports_dir = os.path.join(current_dir, "reports")
+os.makedirs(reports_dir, exist_ok=True)
+
+
+def disk_usage(path):
+    files = 0
+    size = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            files += 1
+            size += os.path.getsize(os.path.join(root, name))
+    return files, size
+
+
+def parse_all(directory):
+    """端到端解析目录中的所有原始文件，返回 (日数据, 耗时秒数)"""
+    start = time.perf_counter()
+    frames = [aggregate_daily(parse_quotsoft_file(ref)) for ref in list_raw(directory).values()]
+    seconds = time.perf_counter() - start
+    return pd.concat(frames, ignore_index=True), seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description='原始数据归档基准')
+    parser.add_argument('--days', type=int, default=120, help='生成的文件天数（从2024-01-01开始）')
+    parser.add_argument('--other-cities', type=int, default=350, help='广东省以外的城市列数')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='raw_archive_bench_')
+    try:
+        plain_dir = os.path.join(work_dir, 'plain')
+        os.makedirs(plain_dir)
+        print(f"生成 {args.days} 个模拟文件 ...", flush=True)
+        generate_files(plain_dir, args.days, args.other_cities)
+
+        layouts = [('未压缩', plain_dir)]
+        for name, compression, bundle in [('gzip', 'gzip', False), ('zstd', 'zstd', False),
+                                          ('gzip + 月度包', 'gzip', True)]:
+            if compression == 'zstd' and zstandard is None:
+                print("未安装zstandard，跳过zstd")
+                continue
+            directory = os.path.join(work_dir, name.replace(' ', ''))
+            shutil.copytree(plain_dir, directory)
+            start = time.perf_counter()
+            archive(directory, compression, bundle=bundle, keep_days=0)
+            print(f"{name}: 整理耗时 {time.perf_counter() - start:.2f}秒", flush=True)
+            layouts.append((name, directory))
+
+        rows = []
+        baseline = None
+        plain_bytes = None
+        for name, directory in layouts:
+            files, size = disk_usage(directory)
+            daily, seconds = parse_all(directory)
+            if baseline is None:
+                baseline, plain_bytes, plain_seconds = daily, size, seconds
+            same = daily.equals(baseline)
+            rows.append([name, files, round(size / 1024 / 1024, 1), round(size / plain_bytes, 3),
+                         round(seconds, 2), round(seconds / args.days * 1000, 1),
+                         round(seconds / plain_seconds, 2), len(daily), '是' if same else '否'])
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    headers = ['存储方式', '文件数', '占用(MB)', '占用比例', '解析耗时(秒)', '每文件(毫秒)', '耗时比例', '日数据行数', '结果一致']
+    try:
+        from tabulate import tabulate
+        text = tabulate(rows, headers=headers, tablefmt='github')
+    except ImportError:
+        text = '\n'.join(['\t'.join(map(str, headers))] + ['\t'.join(map(str, row)) for row in rows])
+    print(text)
+
+    report_path = os.path.join(reports_dir, f"raw_archive_benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md")
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.write("# 原始数据归档基准\n\n")
+        f.write(f"测试时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+        f.write(f"文件天数: {args.days}, 城市列数: {args.other_cities + 21}\n\n")
+        f.write(text + "\n")
+    print(f"结果已保存: {report_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+日数据校验吞吐量基准
+生成模拟的日数据（约1%的行注入缺失、超范围、未来日期、重复日期、PM2.5高于PM10等错误），对比:
+    1. 原方式: download_data_process.validate_record 逐条记录校验（只在较小的样本上运行）
+    2. record_validation.validate_frame: 整个DataFrame按列计算布尔掩码，未通过的行带原因代码
+输出每秒校验的行数（百万行/秒），并校验两种方式在共同规则（必填、AQI和污染物范围）上的判定一致。
+
+用法:
+    python benchmark_record_validation.py [--rows 1000000 5000000] [--legacy-rows 200000]
+"""
+
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# 确保能引用到导入模块
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = Path(current_dir).parents[2]  # backend目录
+sys.path.append(str(project_root / 'src' / 'scripts' / 'process' / 'new_stage'))
+
+# download_data_process在导入时读取配置，这里只用到不访问数据库的validate_record
+work_dir = tempfile.mkdtemp(prefix='validation_bench_')
+os.environ.setdefault('DB_PASSWORD', 'unused')
+os.environ['PROJECT_ROOT'] = work_dir
+
+from download_data_process import validate_record
+from daily_aggregation import to_daily_records
+from quotsoft_parser import POLLUTANT_FIELDS, quality_levels
+from record_validation import (
+    validate_frame, rule_masks, reason_counts, out_of_range_code, MISSING_REQUIRED, AQI_OUT_OF_RANGE
+)
+
+# 创建报告目录
+reports_dir = os.path.join(current_dir, "reports")
+os.makedirs(reports_dir, exist_ok=True)
+
+BAD_FRACTION = 0.01
+
+
+def generate_daily(rows, seed=11):
+    """生成模拟日数据: 城市数 x 天数约等于rows，并注入少量错误"""
+    rng = np.random.default_rng(seed)
+    cities = 370
+    days = -(-rows // cities)
+    dates = pd.date_range('1980-01-01', periods=days, freq='D')
+    frame = pd.DataFrame({
+        'city': np.tile([f"城市{i:03d}" for i in range(cities)], days)[:rows],
+        'date': np.repeat(dates.values, cities)[:rows]
+    })
+    frame['aqi'] = rng.uniform(10, 300, rows).round()
+    frame['pm25'] = rng.uniform(5, 150, rows).round(1)
+    frame['pm10'] = (frame['pm25'] * rng.uniform(1.2, 2.0, rows)).round(1)
+    frame['so2'] = rng.uniform(1, 60, rows).round(1)
+    frame['no2'] = rng.uniform(5, 90, rows).round(1)
+    frame['o3'] = rng.uniform(10, 200, rows).round(1)
+    frame['co'] = rng.uniform(0.2, 2, rows).round(2)
+
+    # 注入错误: 每类错误各占一部分行
+    bad = np.flatnonzero(rng.random(rows) < BAD_FRACTION)
+    kinds = rng.integers(0, 6, len(bad))
+    frame.loc[bad[kinds == 0], 'aqi'] = np.nan
+    frame.loc[bad[kinds == 1], 'aqi'] = 650
+    frame.loc[bad[kinds == 2], 'so2'] = -5
+    frame.loc[bad[kinds == 3], 'pm25'] = frame.loc[bad[kinds == 3], 'pm10'] * 2 + 20
+    frame.loc[bad[kinds == 4], 'date'] = pd.Timestamp('2099-01-01')
+    duplicates = bad[(kinds == 5) & (bad > 0)]
+    frame.loc[duplicates, ['city', 'date']] = frame.loc[duplicates - 1, ['city', 'date']].values
+    frame['quality_level'] = quality_levels(frame['aqi'])
+    return frame
+
+
+def legacy_mask(records):
+    """原方式逐条校验，返回是否通过"""
+    return np.array([validate_record(record) for record in records])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='日数据校验吞吐量基准')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000000, 5000000], help='向量化校验的行数')
+    parser.add_argument('--legacy-rows', type=int, default=200000, help='逐条校验的样本行数')
+    args = parser.parse_args()
+    # 原方式对每条超范围记录输出一条警告，基准中不输出
+    logging.disable(logging.WARNING)
+
+    rows = []
+    try:
+        sample = generate_daily(args.legacy_rows)
+        records = to_daily_records(sample)
+        start = time.perf_counter()
+        legacy = legacy_mask(records)
+        legacy_seconds = time.perf_counter() - start
+        rows.append(['原方式: validate_record逐条', len(records), round(legacy_seconds, 3),
+                     round(len(records) / legacy_seconds / 1e6, 3), int((~legacy).sum()), '-'])
+
+        # 共同规则上的判定一致: 原方式不检查日期、PM2.5/PM10关系和等级
+        masks = rule_masks(sample)
+        common = [MISSING_REQUIRED, AQI_OUT_OF_RANGE] + [out_of_range_code(column) for column in POLLUTANT_FIELDS]
+        common_ok = ~np.column_stack([masks[code] for code in common]).any(axis=1)
+        same = bool((common_ok == legacy).all())
+
+        for count in [args.legacy_rows] + args.rows:
+            frame = sample if count == args.legacy_rows else generate_daily(count)
+            start = time.perf_counter()
+            valid, rejected = validate_frame(frame)
+            seconds = time.perf_counter() - start
+            rows.append(["向量化: validate_frame", count, round(seconds, 3), round(count / seconds / 1e6, 3),
+                         len(rejected), round(legacy_seconds / len(records) * count / seconds, 1)])
+            print(f"validate_frame {count} 行: {seconds:.3f}秒", flush=True)
+        counts = reason_counts(rejected)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    headers = ['方式', '行数', '耗时(秒)', '百万行/秒', '未通过行数', '相对原方式加速']
+    reason_rows = sorted(counts.items(), key=lambda item: -item[1])
+    try:
+        from tabulate import tabulate
+        text = tabulate(rows, headers=headers, tablefmt='github')
+        reason_text = tabulate(reason_rows, headers=['原因代码', '行数'], tablefmt='github')
+    except ImportError:
+        text = '\n'.join(['\t'.join(map(str, headers))] + ['\t'.join(map(str, row)) for row in rows])
+        reason_text = '\n'.join(['原因代码\t行数'] + [f"{code}\t{count}" for code, count in reason_rows])
+    print(text)
+    print()
+    print(reason_text)
+    print(f"\n共同规则上与原方式判定一致: {'是' if same else '否'}")
+
+    report_path = os.path.join(reports_dir, f"record_validation_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md")
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.write("# 日数据校验吞吐量基准\n\n")
+        f.write(f"测试时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+        f.write(f"注入错误的行比例: {BAD_FRACTION:.0%}\n\n")
+        f.write(text + "\n\n")
+        f.write(f"## 原因代码分布（{args.rows[-1]}行）\n\n")
+        f.write(reason_text + "\n\n")
+        f.write(f"共同规则上与原方式判定一致: {'是' if same else '否'}\n")
+    print(f"结果已保存: {report_path}")
+    if not same:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+导入吞吐量随城市数的扩展性基准
+生成带全国约370个城市列的模拟原始文件，按不同的城市数完整执行导入的CPU部分
+（解析 -> 日聚合 -> 向量化校验 -> 转为数据表行，省份来自区域登记表），不写数据库:
+    - 21个城市: 区域登记表启用广东省
+    - 中间规模: 广东省 + 若干编号城市
+    - 全部城市: 区域登记表的ingest_all_cities
+对耗时做线性拟合（耗时 = 固定开销 + 每城市开销 x 城市数），输出R²和每城市日的耗时。
+另外对比原子串匹配与登记表精确匹配解析城市列的耗时（前者随 列数 x 城市数 增长）。
+
+用法:
+    python benchmark_region_scaling.py [--days 30] [--other-cities 349] [--sizes 21 50 100 200 370]
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+# 确保能引用到导入模块
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = Path(current_dir).parents[2]  # backend目录
+sys.path.append(str(project_root / 'src' / 'scripts' / 'process' / 'new_stage'))
+
+# download_data_process在导入时读取配置；登记表保留原始文件中的全部城市，较小规模通过cities参数指定
+work_dir = tempfile.mkdtemp(prefix='region_bench_')
+os.environ.setdefault('DB_PASSWORD', 'unused')
+os.environ['PROJECT_ROOT'] = work_dir
+os.environ['ACTIVE_PROVINCES'] = '广东省'
+os.environ['INGEST_ALL_CITIES'] = 'true'
+
+from download_data_process import record_to_row
+from quotsoft_parser import parse_quotsoft_file, read_header, resolve_city_columns
+from daily_aggregation import aggregate_daily
+from record_validation import split_records
+from region_registry import get_region_registry, OTHER_PROVINCE
+from benchmark_quotsoft_parser import generate_files
+
+# 创建报告目录
+reports_dir = os.path.join(current_dir, "reports")
+os.makedirs(reports_dir, exist_ok=True)
+
+REPEATS = 3
+
+
+def ingest_files(files, cities):
+    """导入的CPU部分，返回 (写入的行, 隔离的记录数)"""
+    rows = []
+    quarantined = 0
+    for path in files:
+        hourly = parse_quotsoft_file(path, cities)
+        if hourly is None or hourly.empty:
+            continue
+        valid, rejected = split_records(aggregate_daily(hourly))
+        rows.extend(record_to_row(record) for record in valid)
+        quarantined += len(rejected)
+    return rows, quarantined
+
+
+def legacy_city_columns(header, cities):
+    """原方式: 每列与每个城市做子串匹配"""
+    columns = []
+    for column in header:
+        for city in cities:
+            if city in column or city.replace('市', '') in column or column in city:
+                if column not in columns:
+                    columns.append(column)
+                break
+    return columns
+
+
+def timed(func, *args):
+    """重复执行取中位数耗时，返回 (结果, 秒)"""
+    seconds = []
+    result = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = func(*args)
+        seconds.append(time.perf_counter() - start)
+    return result, float(np.median(seconds))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='导入吞吐量随城市数的扩展性基准')
+    parser.add_argument('--days', type=int, default=30, help='模拟文件天数')
+    parser.add_argument('--other-cities', type=int, default=349, help='广东省以外的城市列数')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[21, 50, 100, 200, 370], help='导入的城市数')
+    args = parser.parse_args()
+
+    registry = get_region_registry()
+    guangdong = registry.cities(['广东省'])
+    total_cities = len(guangdong) + args.other_cities
+    sizes = sorted({min(size, total_cities) for size in args.sizes if size >= len(guangdong)})
+
+    rows = []
+    mapping_rows = []
+    try:
+        source_dir = os.path.join(work_dir, 'raw')
+        os.makedirs(source_dir)
+        print(f"生成 {args.days} 个模拟文件（{total_cities} 个城市列）...", flush=True)
+        files = generate_files(source_dir, args.days, args.other_cities)
+        header, _ = read_header(files[0])
+        others = [f"城市{i:03d}" for i in range(args.other_cities)]
+
+        results = []
+        for size in sizes:
+            # 全部城市时使用登记表的ingest_all_cities，否则广东省加前若干个编号城市
+            if size == total_cities:
+                label, cities = "全部城市(登记表ingest_all_cities)", None
+            elif size == len(guangdong):
+                label, cities = '广东省(登记表启用的省份)', guangdong
+            else:
+                label, cities = f"广东省 + {size - len(guangdong)}个城市", guangdong + others[:size - len(guangdong)]
+            (written, quarantined), seconds = timed(ingest_files, files, cities)
+            city_count = len({row[0] for row in written})
+            results.append((size, seconds))
+            provinces = {row[1] for row in written}
+            rows.append([label, city_count, len(written), quarantined, round(seconds, 3),
+                         round(len(written) / seconds), round(seconds / (size * args.days) * 1e6, 1),
+                         '/'.join(sorted(provinces))])
+            print(f"{label}: {seconds:.3f}秒", flush=True)
+
+            wanted = guangdong + others if cities is None else cities
+            _, legacy_seconds = timed(legacy_city_columns, header, wanted)
+            _, registry_seconds = timed(resolve_city_columns, header, cities)
+            mapping_rows.append([size, round(legacy_seconds * 1000, 2), round(registry_seconds * 1000, 3),
+                                 round(legacy_seconds / registry_seconds, 1)])
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    # 线性拟合: 耗时 = 固定开销 + 每城市开销 x 城市数
+    x = np.array([size for size, _ in results], dtype=float)
+    y = np.array([seconds for _, seconds in results])
+    slope, intercept = np.polyfit(x, y, 1)
+    r_squared = 1 - ((y - (slope * x + intercept)) ** 2).sum() / max(((y - y.mean()) ** 2).sum(), 1e-12)
+    linear = r_squared >= 0.95
+    ratio = (results[-1][1] / results[0][1]) / (results[-1][0] / results[0][0])
+
+    headers = ['导入城市', '城市数', '写入日数据', '隔离记录', '耗时(秒)', '行/秒', '每城市日(微秒)', '省份']
+    mapping_headers = ['城市数', '原子串匹配(毫秒)', '登记表精确匹配(毫秒)', '加速比']
+    try:
+        from tabulate import tabulate
+        text = tabulate(rows, headers=headers, tablefmt='github')
+        mapping_text = tabulate(mapping_rows, headers=mapping_headers, tablefmt='github')
+    except ImportError:
+        text = '\n'.join(['\t'.join(map(str, headers))] + ['\t'.join(map(str, row)) for row in rows])
+        mapping_text = '\n'.join(['\t'.join(map(str, mapping_headers))] +
+                                 ['\t'.join(map(str, row)) for row in mapping_rows])
+    fit_text = (f"线性拟合: 耗时 = {intercept:.3f}秒 + {slope * 1000:.2f}毫秒 x 城市数, R² = {r_squared:.4f}\n"
+                f"城市数 {results[0][0]} -> {results[-1][0]} 时耗时增长与城市数增长之比: {ratio:.2f}"
+                f"（1为严格线性，小于1说明固定开销被摊薄）\n"
+                f"未登记城市的省份记为: {OTHER_PROVINCE}")
+    print(text)
+    print()
+    print(mapping_text)
+    print()
+    print(fit_text)
+    print(f"导入耗时随城市数线性增长: {'是' if linear else '否'}")
+
+    report_path = os.path.join(reports_dir, f"region_scaling_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md")
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.write("# 导入吞吐量随城市数的扩展性基准\n\n")
+        f.write(f"测试时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+        f.write(f"文件天数: {args.days}, 城市列数: {total_cities}, 每种规模重复{REPEATS}次取中位数\n\n")
+        f.write(text + "\n\n")
+        f.write("## 城市列解析（每个文件表头一次）\n\n")
+        f.write(mapping_text + "\n\n")
+        f.write(fit_text.replace('\n', '\n\n') + "\n\n")
+        f.write(f"导入耗时随城市数线性增长: {'是' if linear else '否'}\n")
+    print(f"结果已保存: {report_path}")
+    if not linear:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+报告下载性能基准
+对运行中的报告API服务发起大量并发下载，统计吞吐量(MB/s)和延迟分位数，
+并检查Range断点续传和ETag条件请求是否生效。
+
+用法:
+    python benchmark_report_download.py [--url http://localhost:5003] [--files report_xxx.pdf ...]
+                                        [--concurrency 1 8 32] [--requests 200] [--range-chunk 0]
+未指定--files时从报告历史中选取体积最大的若干个报告。
+"""
+
+import os
+import sys
+import time
+import argparse
+import threading
+import statistics
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# 创建报告目录
+current_dir = os.path.dirname(os.path.abspath(__file__))
+reports_dir = os.path.join(current_dir, "reports")
+os.makedirs(reports_dir, exist_ok=True)
+
+_local = threading.local()
+
+
+def get_session(pool_size):
+    """每个线程使用独立的Session，连接复用"""
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _local.session = session
+    return session
+
+
+def pick_largest_reports(base_url, count):
+    """从报告历史中选出体积最大的报告文件名"""
+    response = requests.get(f"{base_url}/api/reports/history", params={'page_size': 500}, timeout=30)
+    response.raise_for_status()
+    payload = response.json()
+    reports = payload.get('reports', payload) if isinstance(payload, dict) else payload
+    reports = [r for r in reports if r.get('file_name') and r.get('format') != 'zip']
+    reports.sort(key=lambda r: r.get('size_bytes') or 0, reverse=True)
+    return [r['file_name'] for r in reports[:count]]
+
+
+def download(base_url, file_name, pool_size, range_chunk=0):
+    """下载一个文件，range_chunk>0时按Range分段下载
+
+    Returns:
+        tuple: (字节数, 耗时秒数, 是否成功)
+    """
+    session = get_session(pool_size)
+    url = f"{base_url}/api/reports/download/{file_name}"
+    start = time.perf_counter()
+    received = 0
+    try:
+        if range_chunk <= 0:
+            with session.get(url, stream=True, timeout=120) as response:
+                if response.status_code != 200:
+                    return 0, time.perf_counter() - start, False
+                for chunk in response.iter_content(chunk_size=256 * 1024):
+                    received += len(chunk)
+            return received, time.perf_counter() - start, True
+
+        total = None
+        while total is None or received < total:
+            headers = {'Range': f"bytes={received}-{received + range_chunk - 1}"}
+            response = session.get(url, headers=headers, timeout=120)
+            if response.status_code not in (200, 206):
+                return received, time.perf_counter() - start, False
+            received += len(response.content)
+            if response.status_code == 200:
+                break
+            total = int(response.headers['Content-Range'].rsplit('/', 1)[1])
+        return received, time.perf_counter() - start, True
+    except requests.RequestException:
+        return received, time.perf_counter() - start, False
+
+
+def check_protocol(base_url, file_name):
+    """检查ETag、Last-Modified、条件请求与Range支持"""
+    response = requests.get(f"{base_url}/api/reports/download/{file_name}", timeout=120)
+    etag = response.headers.get('ETag')
+    result = {
+        'etag': etag,
+        'last_modified': response.headers.get('Last-Modified'),
+        'accept_ranges': response.headers.get('Accept-Ranges'),
+        'size': len(response.content)
+    }
+    if etag:
+        conditional = requests.get(f"{base_url}/api/reports/download/{file_name}",
+                                   headers={'If-None-Match': etag}, timeout=30)
+        result['if_none_match_status'] = conditional.status_code
+    partial = requests.get(f"{base_url}/api/reports/download/{file_name}",
+                           headers={'Range': 'bytes=0-1023'}, timeout=30)
+    result['range_status'] = partial.status_code
+    result['range_bytes'] = len(partial.content)
+    return result
+
+
+def run_case(base_url, files, concurrency, total_requests, range_chunk):
+    """以指定并发数下载total_requests次"""
+    targets = [files[i % len(files)] for i in range(total_requests)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda name: download(base_url, name, concurrency, range_chunk), targets))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(seconds for _, seconds, ok in results if ok)
+    total_bytes = sum(size for size, _, ok in results if ok)
+    failed = sum(1 for _, _, ok in results if not ok)
+    return {
+        'concurrency': concurrency,
+        'requests': total_requests,
+        'failed': failed,
+        'seconds': round(elapsed, 2),
+        'mb': round(total_bytes / 1024 / 1024, 1),
+        'mb_per_second': round(total_bytes / 1024 / 1024 / elapsed, 1) if elapsed else None,
+        'requests_per_second': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'p50_ms': round(statistics.median(latencies) * 1000, 1) if latencies else None,
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1) if latencies else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='报告下载性能基准')
+    parser.add_argument('--url', default=os.environ.get('REPORTS_API_URL', 'http://localhost:5003'))
+    parser.add_argument('--files', nargs='+', help='要下载的报告文件名')
+    parser.add_argument('--top', type=int, default=5, help='未指定--files时选取的报告数量')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--requests', type=int, default=200, help='每个并发级别的下载次数')
+    parser.add_argument('--range-chunk', type=int, default=0, help='按Range分段下载的块大小(字节)，0表示整体下载')
+    args = parser.parse_args()
+
+    base_url = args.url.rstrip('/')
+    files = args.files or pick_largest_reports(base_url, args.top)
+    if not files:
+        print("没有可下载的报告，请先生成报告或通过--files指定")
+        sys.exit(1)
+    print(f"测试文件: {', '.join(files)}")
+
+    protocol = check_protocol(base_url, files[0])
+    print(f"协议检查: {protocol}")
+
+    results = []
+    for concurrency in args.concurrency:
+        print(f"运行场景: 并发{concurrency}, 共{args.requests}次下载 ...", flush=True)
+        results.append(run_case(base_url, files, concurrency, args.requests, args.range_chunk))
+
+    headers = ['并发数', '下载次数', '失败', '耗时(秒)', '总量(MB)', 'MB/秒', '请求/秒', 'P50(ms)', 'P95(ms)']
+    table = [[r['concurrency'], r['requests'], r['failed'], r['seconds'], r['mb'], r['mb_per_second'],
+              r['requests_per_second'], r['p50_ms'], r['p95_ms']] for r in results]
+    try:
+        from tabulate import tabulate
+        text = tabulate(table, headers=headers, tablefmt='github')
+    except ImportError:
+        text = '\n'.join(['\t'.join(map(str, headers))] + ['\t'.join(map(str, row)) for row in table])
+    print(text)
+
+    report_path = os.path.join(reports_dir, f"download_benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md")
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.write("# 报告下载性能基准\n\n")
+        f.write(f"测试时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+        f.write(f"服务地址: {base_url}\n\n")
+        f.write(f"测试文件: {', '.join(files)}\n\n")
+        f.write(f"分段大小: {args.range_chunk or '整体下载'}\n\n")
+        f.write("## 协议检查\n\n")
+        for key, value in protocol.items():
+            f.write(f"- {key}: {value}\n")
+        f.write("\n## 吞吐量\n\n")
+        f.write(text + "\n")
+    print(f"结果已保存: {report_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+报告格式生成并行基准
+报告格式生成器(PDF/Excel/Word/HTML)是CPU密集的纯Python代码，对比三种执行方式:
+    1. 顺序执行
+    2. 线程池（受GIL限制）
+    3. 图表渲染进程池(ChartRenderPool.submit，spawn工作进程)
+场景:
+    multi: 全省数据一次生成pdf/excel/word/html四种格式（generate_multi_format_content）
+    batch: 按城市拆分后每个城市生成一份报告（批量报告接口）
+并校验每种方式都写出了全部报告文件。加速比受CPU核数限制，结果中记录本机CPU核数。
+
+用法:
+    python benchmark_report_formats.py [--months 12] [--workers 4] [--batch-format pdf] [--scenarios multi batch]
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# 确保能引用到项目模块
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = Path(current_dir).parents[2]  # backend目录
+sys.path.append(str(project_root))
+
+from src.scripts.api.reports.report_data_loader import ReportDataset, REPORT_FRAME_DTYPES
+from src.scripts.api.reports.report_writers import render_format_file
+from src.scripts.utils.chart_pool import ChartRenderPool
+
+# 创建报告目录
+reports_dir = os.path.join(current_dir, "reports")
+os.makedirs(reports_dir, exist_ok=True)
+
+CITIES = [
+    '广州市', '深圳市', '珠海市', '汕头市', '佛山市', '韶关市', '湛江市', '肇庆市',
+    '江门市', '茂名市', '惠州市', '梅州市', '汕尾市', '河源市', '阳江市', '清远市',
+    '东莞市', '中山市', '潮州市', '揭阳市', '云浮市'
+]
+
+FORMAT_EXTENSIONS = {'pdf': '.pdf', 'excel': '.xlsx', 'word': '.docx', 'html': '.html'}
+
+CONTENT_OPTIONS = {'air_quality': True, 'pollutants': True, 'trends': True, 'alerts': True,
+                   'recommendations': False}
+
+
+def build_dataset(months, seed=42):
+    """构造全省每城市每日一行的模拟报告数据（列和类型与report_data_loader一致）"""
+    dates = pd.date_range('2024-01-01', periods=30 * months, freq='D')
+    rng = np.random.default_rng(seed)
+    n = len(dates) * len(CITIES)
+    frame = pd.DataFrame({
+        'date': np.repeat(dates, len(CITIES)),
+        'city': np.tile(CITIES, len(dates)),
+        'aqi': rng.uniform(20, 200, n).round(0),
+        'quality_level': rng.choice(['优', '良', '轻度污染', '中度污染'], n),
+        'pm25': rng.uniform(5, 120, n).round(1),
+        'pm10': rng.uniform(10, 180, n).round(1),
+        'so2': rng.uniform(2, 30, n).round(1),
+        'no2': rng.uniform(5, 80, n).round(1),
+        'o3': rng.uniform(20, 200, n).round(1),
+        'co': rng.uniform(0.3, 2.0, n).round(2)
+    })
+    return ReportDataset(frame.astype(REPORT_FRAME_DTYPES))
+
+
+def attach_charts(pool, dataset):
+    """渲染趋势图和城市对比图，PDF/Word/HTML报告中嵌入同一组PNG"""
+    frame = dataset.frame
+    daily = frame.groupby('date', as_index=False)['aqi'].mean()
+    city_avg = frame.groupby('city', observed=True, as_index=False)['aqi'].mean()
+    city_avg['city'] = city_avg['city'].astype(str)
+    specs = [
+        {'name': 'aqi_trend', 'kind': 'line', 'data': daily,
+         'options': {'x_column': 'date', 'y_columns': ['aqi'], 'title': 'AQI日均值变化趋势'}},
+        {'name': 'city_aqi', 'kind': 'bar', 'data': city_avg,
+         'options': {'x_column': 'city', 'y_column': 'aqi', 'title': '各城市平均AQI'}}
+    ]
+    dataset.charts = [result for result in pool.render_many(specs) if result['png']]
+
+
+def build_tasks(scenario, dataset, batch_format, work_dir):
+    """构建 (数据集, 格式, 输出路径, 区域) 任务列表"""
+    if scenario == 'multi':
+        return [(dataset, fmt, os.path.join(work_dir, f"all{ext}"), 'all')
+                for fmt, ext in FORMAT_EXTENSIONS.items()]
+    tasks = []
+    for index, (city, city_data) in enumerate(dataset.split_by_city().items()):
+        city_data.charts = dataset.charts
+        tasks.append((city_data, batch_format, os.path.join(work_dir, f"{index:02d}{FORMAT_EXTENSIONS[batch_format]}"),
+                      'all'))
+    return tasks
+
+
+def call_args(task):
+    data, fmt, output_path, region = task
+    return (data, CONTENT_OPTIONS, output_path, 'monthly', region, '2024-01-01', '2024-12-31', fmt)
+
+
+def run_mode(mode, tasks, workers, pool):
+    """用指定方式写出全部报告，返回 (耗时秒数, 成功写出的文件数)"""
+    start = time.perf_counter()
+    if mode == 'sequential':
+        results = [render_format_file(*call_args(task))[0] for task in tasks]
+    elif mode == 'threads':
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = [result for result, _ in executor.map(lambda task: render_format_file(*call_args(task)), tasks)]
+    else:
+        futures = [pool.submit(render_format_file, *call_args(task)) for task in tasks]
+        results = [future.result()[0] for future in futures]
+    elapsed = time.perf_counter() - start
+    written = sum(1 for (_, _, output_path, _), result in zip(tasks, results)
+                  if result == output_path and os.path.exists(output_path))
+    return elapsed, written
+
+
+def main():
+    parser = argparse.ArgumentParser(description='报告格式生成并行基准')
+    parser.add_argument('--months', type=int, default=12, help='模拟数据的月数（每月30天）')
+    parser.add_argument('--workers', type=int, default=4, help='线程池和进程池的并发数')
+    parser.add_argument('--batch-format', default='pdf', choices=list(FORMAT_EXTENSIONS))
+    parser.add_argument('--scenarios', nargs='+', default=['multi', 'batch'], choices=['multi', 'batch'])
+    parser.add_argument('--modes', nargs='+', default=['sequential', 'threads', 'processes'],
+                        choices=['sequential', 'threads', 'processes'])
+    args = parser.parse_args()
+
+    cpu_count = os.cpu_count() or 1
+    pool = ChartRenderPool(max_workers=args.workers)
+    start = time.perf_counter()
+    pool.warm_up()
+    warmup_seconds = time.perf_counter() - start
+
+    dataset = build_dataset(args.months)
+    attach_charts(pool, dataset)
+
+    rows = []
+    checks = []
+    for scenario in args.scenarios:
+        baseline = None
+        for mode in args.modes:
+            work_dir = tempfile.mkdtemp(prefix=f"report_formats_{scenario}_{mode}_")
+            tasks = build_tasks(scenario, dataset, args.batch_format, work_dir)
+            print(f"运行场景: {scenario}, {mode}, {len(tasks)}份报告 ...", flush=True)
+            try:
+                elapsed, written = run_mode(mode, tasks, args.workers, pool)
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+            if mode == 'sequential':
+                baseline = elapsed
+            speedup = round(baseline / elapsed, 2) if baseline else '-'
+            rows.append([scenario, mode, len(tasks), round(elapsed, 2), speedup])
+            checks.append((f"{scenario}/{mode}: 写出全部{len(tasks)}份报告", written == len(tasks)))
+    pool.shutdown(wait=True)
+
+    headers = ['场景', '方式', '报告数', '耗时(秒)', '相对顺序执行加速']
+    try:
+        from tabulate import tabulate
+        text = tabulate(rows, headers=headers, tablefmt='github')
+    except ImportError:
+        text = '\n'.join(['\t'.join(map(str, headers))] + ['\t'.join(map(str, row)) for row in rows])
+    check_text = '\n'.join(f"{name}: {'是' if ok else '否'}" for name, ok in checks)
+    summary = (f"CPU核数: {cpu_count}, 并发数: {args.workers}, 数据: {args.months}个月 x {len(CITIES)}个城市 "
+               f"({len(dataset.frame)}行), 进程池预热: {warmup_seconds:.2f}秒")
+    if cpu_count < 2:
+        summary += "\n\n注意: 本机只有1个CPU核，进程池无法体现并行加速，只能反映进程间传递数据的开销"
+    print(summary)
+    print(text)
+    print()
+    print(check_text)
+
+    report_path = os.path.join(reports_dir, f"report_formats_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md")
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.write("# 报告格式生成并行基准\n\n")
+        f.write(f"测试时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+        f.write(summary + "\n\n")
+        f.write(text + "\n\n")
+        f.write(check_text.replace('\n', '\n\n') + "\n")
+    print(f"结果已保存: {report_path}")
+    if not all(ok for _, ok in checks):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,326 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+数据变更事件校验
+用内存中的模拟事件表（支持ID先分配后提交、回滚、清理和连接中断）代替MySQL，校验
+change_events中不依赖数据库的逻辑:
+    1. event_overlaps: 表、城市、日期范围的重叠判断
+    2. ScopedCache: 只失效范围重叠的条目，查询期间有变更时put()放弃写入，TTL到期和条目数上限
+    3. ChangeSubscriber: 并发发布时ID乱序提交的事件全部分发且只分发一次；回滚留下的空洞
+       超时后不再等待；事件被清理或读取失败后发出reset事件
+
+用法:
+    python verify_change_events.py [--events 2000] [--seed 7]
+"""
+
+import os
+import sys
+import random
+import argparse
+from datetime import datetime
+from pathlib import Path
+
+# 确保能引用到事件模块
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = Path(current_dir).parents[2]  # backend目录
+sys.path.append(str(project_root / 'src' / 'scripts' / 'utils'))
+
+from change_events import (ChangeSubscriber, ScopedCache, event_overlaps, reset_event,
+                           CHANGE_EVENT_MAX_HOLES)
+
+# 创建报告目录
+reports_dir = os.path.join(current_dir, "reports")
+os.makedirs(reports_dir, exist_ok=True)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeEventTable:
+    """模拟data_change_events表: allocate()分配自增ID（未提交不可见），commit()后才能读到"""
+
+    def __init__(self):
+        self.next_id = 1
+        self.committed = {}
+        self.pending = {}
+        self.down = False
+
+    def allocate(self, cities=None, start_date=None, end_date=None, tables=('air_quality_newdata',)):
+        event_id = self.next_id
+        self.next_id += 1
+        self.pending[event_id] = (event_id, 'verify', ','.join(tables),
+                                  None if cities is None else '["' + '","'.join(cities) + '"]',
+                                  start_date, end_date, 1, None)
+        return event_id
+
+    def commit(self, event_id):
+        self.committed[event_id] = self.pending.pop(event_id)
+
+    def rollback(self, event_id):
+        del self.pending[event_id]
+
+    def publish(self, **scope):
+        event_id = self.allocate(**scope)
+        self.commit(event_id)
+        return event_id
+
+    def purge_below(self, event_id):
+        for key in [key for key in self.committed if key < event_id]:
+            del self.committed[key]
+
+
+class FakeCursor:
+    """只支持ChangeSubscriber用到的四种查询"""
+
+    def __init__(self, table):
+        self.table = table
+        self.result = []
+
+    def execute(self, sql, params=()):
+        rows = self.table.committed
+        if 'MAX(id)' in sql:
+            self.result = [(max(rows, default=0),)]
+        elif 'MIN(id)' in sql:
+            self.result = [(min(rows) if rows else None,)]
+        elif 'id IN' in sql:
+            self.result = [rows[event_id] for event_id in sorted(params) if event_id in rows]
+        elif 'id >' in sql:
+            self.result = [rows[event_id] for event_id in sorted(rows) if event_id > params[0]][:1000]
+        else:
+            raise ValueError(f"不支持的查询: {sql}")
+
+    def fetchone(self):
+        return self.result[0]
+
+    def fetchall(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, table):
+        self.table = table
+        self.autocommit = False
+        self.closed = False
+
+    def is_connected(self):
+        return not self.closed and not self.table.down
+
+    def cursor(self):
+        return FakeCursor(self.table)
+
+    def close(self):
+        self.closed = True
+
+
+def make_subscriber(table, clock, hole_seconds=60):
+    def connect():
+        if table.down:
+            raise ConnectionError('模拟的数据库不可用')
+        return FakeConnection(table)
+
+    subscriber = ChangeSubscriber(connect, interval=0, hole_seconds=hole_seconds, clock=clock)
+    received = []
+    # 不启动后台线程，直接调用poll()
+    subscriber._callbacks.append((received.append, None))
+    subscriber.poll()
+    return subscriber, received
+
+
+def check_overlaps():
+    event = {'tables': ['air_quality_newdata'], 'cities': ['广州市', '深圳市'],
+             'start_date': '2024-03-01', 'end_date': '2024-03-10'}
+    cases = [
+        (dict(tables=['air_quality_newdata'], cities=['广州市'], start_date='2024-03-05', end_date='2024-03-20'), True),
+        (dict(tables=['air_quality_data'], cities=['广州市']), False),
+        (dict(cities=['佛山市']), False),
+        (dict(cities=None, start_date='2024-03-10', end_date='2024-03-10'), True),
+        (dict(start_date='2024-03-11', end_date='2024-04-01'), False),
+        (dict(start_date='2024-01-01', end_date='2024-02-29'), False),
+        (dict(), True)
+    ]
+    unlimited = {'tables': None, 'cities': None, 'start_date': None, 'end_date': None}
+    return (all(event_overlaps(event, **scope) == expected for scope, expected in cases)
+            and event_overlaps(unlimited, tables=['air_quality_data'], cities=['佛山市'],
+                               start_date='2024-01-01', end_date='2024-01-01'))
+
+
+def check_scoped_cache():
+    results = []
+    cache = ScopedCache('verify', max_entries=10)
+    version = cache.version()
+    cache.put('gz', 1, version, ['air_quality_newdata'], ['广州市'], '2024-03-01', '2024-03-31')
+    cache.put('sz', 2, version, ['air_quality_newdata'], ['深圳市'], '2024-03-01', '2024-03-31')
+    cache.put('gz_old', 3, version, ['air_quality_newdata'], ['广州市'], '2023-01-01', '2023-01-31')
+    removed = cache.invalidate({'tables': ['air_quality_newdata'], 'cities': ['广州市'],
+                                'start_date': '2024-03-15', 'end_date': '2024-03-15'})
+    results.append(('ScopedCache: 只失效范围重叠的条目',
+                    removed == 1 and cache.get('gz') is None and cache.get('sz') == 2 and cache.get('gz_old') == 3))
+
+    # 查询期间处理了变更事件: 查询结果可能已过时，不写入缓存
+    version = cache.version()
+    cache.invalidate({'tables': ['air_quality_newdata'], 'cities': ['佛山市'], 'start_date': None, 'end_date': None})
+    stale = cache.put('gz', 'stale', version, ['air_quality_newdata'], ['广州市'])
+    fresh = cache.put('gz', 'fresh', cache.version(), ['air_quality_newdata'], ['广州市'])
+    results.append(('ScopedCache: 查询期间有变更事件时put()放弃写入',
+                    not stale and fresh and cache.get('gz') == 'fresh'))
+
+    cache.invalidate(reset_event())
+    results.append(('ScopedCache: reset事件清空全部条目', cache.stats()['entries'] == 0))
+
+    clock = FakeClock()
+    ttl_cache = ScopedCache('verify_ttl', ttl=300, clock=clock)
+    ttl_cache.put('watermark', 'v1', ttl_cache.version())
+    hit = ttl_cache.get('watermark') == 'v1'
+    clock.now = 301
+    results.append(('ScopedCache: 超过TTL的条目失效（兜底不发布事件的写入方）',
+                    hit and ttl_cache.get('watermark') is None and ttl_cache.stats()['expired'] == 1))
+
+    small = ScopedCache('verify_lru', max_entries=3)
+    for i in range(5):
+        small.put(i, i, small.version())
+    results.append(('ScopedCache: 超过条目数上限时淘汰最久未用的条目',
+                    small.stats()['entries'] == 3 and small.get(0) is None and small.get(4) == 4))
+    return results
+
+
+def check_out_of_order(events, seed, commit_seconds=10):
+    """多个写入方并发发布: ID按顺序分配，提交顺序随机（最迟commit_seconds秒内提交），每秒轮询一次"""
+    rng = random.Random(seed)
+    table = FakeEventTable()
+    clock = FakeClock()
+    subscriber, received = make_subscriber(table, clock, hole_seconds=60)
+    # 订阅开始前已有事件（正常运行时事件表中保留着最近几天的事件）
+    table.publish()
+    subscriber.poll()
+    received.clear()
+    pending = {}
+    allocated = []
+    while len(allocated) < events or pending:
+        action = rng.random()
+        if len(allocated) < events and (action < 0.5 or not pending):
+            event_id = table.allocate(cities=['广州市'])
+            allocated.append(event_id)
+            pending[event_id] = clock.now
+        elif action < 0.9:
+            event_id = rng.choice(list(pending))
+            table.commit(event_id)
+            del pending[event_id]
+        else:
+            clock.now += 1
+            for event_id in [event_id for event_id, since in pending.items() if clock.now - since >= commit_seconds]:
+                table.commit(event_id)
+                del pending[event_id]
+            subscriber.poll()
+    subscriber.poll()
+    ids = [event['id'] for event in received]
+    stats = subscriber.stats()
+    passed = sorted(ids) == allocated and len(set(ids)) == len(ids) and stats['resets'] == 0
+    return passed, stats['late_events'], stats
+
+
+def check_rollback_hole():
+    table = FakeEventTable()
+    clock = FakeClock()
+    subscriber, received = make_subscriber(table, clock, hole_seconds=60)
+    table.publish()
+    subscriber.poll()
+    rolled_back = table.allocate()
+    table.publish()
+    subscriber.poll()
+    waiting = subscriber.stats()['holes'] == 1
+    table.rollback(rolled_back)
+    clock.now = 61
+    table.publish()
+    subscriber.poll()
+    stats = subscriber.stats()
+    return (waiting and stats['holes'] == 0 and stats['expired_holes'] == 1 and stats['resets'] == 0
+            and len(received) == 3)
+
+
+def check_purged_gap():
+    table = FakeEventTable()
+    clock = FakeClock()
+    subscriber, received = make_subscriber(table, clock)
+    table.publish()
+    subscriber.poll()
+    for _ in range(5):
+        table.publish()
+    table.purge_below(table.next_id - 2)
+    subscriber.poll()
+    return any(event.get('reset') for event in received) and subscriber.stats()['resets'] == 1
+
+
+def check_connection_failure():
+    table = FakeEventTable()
+    clock = FakeClock()
+    subscriber, received = make_subscriber(table, clock)
+    table.down = True
+    subscriber.poll()
+    table.down = False
+    table.publish(cities=['广州市'])
+    subscriber.poll()
+    return [bool(event.get('reset')) for event in received] == [True, False]
+
+
+def check_too_many_holes():
+    table = FakeEventTable()
+    clock = FakeClock()
+    subscriber, received = make_subscriber(table, clock)
+    table.publish()
+    subscriber.poll()
+    for _ in range(CHANGE_EVENT_MAX_HOLES + 1):
+        table.allocate()
+    table.publish()
+    subscriber.poll()
+    return (subscriber.stats()['resets'] == 1 and subscriber.stats()['holes'] == 0
+            and [bool(event.get('reset')) for event in received] == [False, True, False])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='数据变更事件校验')
+    parser.add_argument('--events', type=int, default=2000, help='乱序提交场景的事件数')
+    parser.add_argument('--seed', type=int, default=7, help='随机种子')
+    args = parser.parse_args()
+
+    checks = [('event_overlaps: 表、城市、日期范围的重叠判断', check_overlaps())]
+    checks.extend(check_scoped_cache())
+    ordered, late, stats = check_out_of_order(args.events, args.seed)
+    checks.append((f"ChangeSubscriber: 乱序提交的{args.events}个事件全部分发且只分发一次（{late}个晚于更大ID提交）",
+                   ordered))
+    checks.append(('ChangeSubscriber: 回滚留下的空洞超时后不再等待，不触发reset', check_rollback_hole()))
+    checks.append(('ChangeSubscriber: 未读的事件已被清理时发出reset事件', check_purged_gap()))
+    checks.append(('ChangeSubscriber: 读取失败恢复后发出reset事件，之后正常分发', check_connection_failure()))
+    checks.append(('ChangeSubscriber: 空洞过多时按缺口处理（reset）', check_too_many_holes()))
+
+    rows = [[name, '通过' if passed else '失败'] for name, passed in checks]
+    try:
+        from tabulate import tabulate
+        text = tabulate(rows, headers=['场景', '结果'], tablefmt='github')
+    except ImportError:
+        text = '\n'.join(['场景\t结果'] + ['\t'.join(row) for row in rows])
+    print(text)
+    print(f"\n乱序提交场景的订阅统计: {stats}")
+
+    report_path = os.path.join(reports_dir, f"change_events_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md")
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.write("# 数据变更事件校验\n\n")
+        f.write(f"测试时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+        f.write(f"乱序提交场景: {args.events} 个事件, 随机种子 {args.seed}\n\n")
+        f.write(text + "\n\n")
+        f.write(f"乱序提交场景的订阅统计: {stats}\n")
+    print(f"结果已保存: {report_path}")
+    if not all(passed for _, passed in checks):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+导入台账校验
+生成一批模拟的原始文件，用多个进程同时按不同顺序处理同一批文件，对比原方式（每个进程各自的
+PROCESSED_DATES集合）与导入台账的实际处理次数，并依次校验以下场景:
+    1. 并发认领: 每个文件恰好处理一次
+    2. 再次运行: 已完成的文件全部跳过
+    3. 进程崩溃: 租约内其他进程不能接手，租约过期后可以重新认领
+    4. 处理失败: 下次运行重新处理
+    5. 文件内容变化: 重新处理该文件
+
+用法:
+    python verify_ingest_ledger.py [--files 200] [--workers 8]
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+from datetime import date, datetime, timedelta
+from multiprocessing import Pool
+from pathlib import Path
+
+# 确保能引用到台账模块
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = Path(current_dir).parents[2]  # backend目录
+sys.path.append(str(project_root / 'src' / 'scripts' / 'process' / 'new_stage'))
+
+from ingest_ledger import IngestLedger, DONE, FAILED, file_key, worker_id
+from raw_archive import raw_date, raw_sha256
+
+# 创建报告目录
+reports_dir = os.path.join(current_dir, "reports")
+os.makedirs(reports_dir, exist_ok=True)
+
+WORK_SECONDS = 0.002
+
+
+def iso_date(path):
+    return datetime.strptime(raw_date(path), '%Y%m%d').strftime('%Y-%m-%d')
+
+
+def make_files(target_dir, count):
+    files = []
+    for i in range(count):
+        day = date(2024, 1, 1) + timedelta(days=i)
+        path = os.path.join(target_dir, f"china_cities_{day.strftime('%Y%m%d')}.csv")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('date,hour,type,广州\n' + f"{day.strftime('%Y%m%d')},0,AQI,{i % 300}\n")
+        files.append(path)
+    return files
+
+
+def ledger_worker(args):
+    """按打乱的顺序处理全部文件，返回本进程实际处理的文件"""
+    db_path, files, seed, lease = args
+    ledger = IngestLedger(db_path, lease_seconds=lease)
+    order = list(files)
+    random.Random(seed).shuffle(order)
+    processed = []
+    for path in order:
+        key = file_key(path)
+        worker = worker_id()
+        if not ledger.claim(key, iso_date(path), path, raw_sha256(path), worker):
+            continue
+        time.sleep(WORK_SECONDS)
+        if ledger.complete(key, 1, 1, {'total': WORK_SECONDS}, worker):
+            processed.append(key)
+    return processed
+
+
+def legacy_worker(args):
+    """原方式: 每个进程有自己的PROCESSED_DATES，进程之间互不知道对方处理过什么"""
+    files, seed = args
+    processed_dates = set()
+    order = list(files)
+    random.Random(seed).shuffle(order)
+    processed = []
+    for path in order:
+        file_date = raw_date(path)
+        if file_date in processed_dates:
+            continue
+        time.sleep(WORK_SECONDS)
+        processed_dates.add(file_date)
+        processed.append(file_key(path))
+    return processed
+
+
+def run_pool(func, tasks):
+    start = time.perf_counter()
+    with Pool(len(tasks)) as pool:
+        results = pool.map(func, tasks)
+    seconds = time.perf_counter() - start
+    counts = {}
+    for processed in results:
+        for key in processed:
+            counts[key] = counts.get(key, 0) + 1
+    return counts, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description='导入台账校验')
+    parser.add_argument('--files', type=int, default=200, help='文件数')
+    parser.add_argument('--workers', type=int, default=8, help='并发进程数')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='ingest_ledger_')
+    rows = []
+    checks = []
+
+    def check(name, passed):
+        checks.append([name, '通过' if passed else '失败'])
+
+    try:
+        files = make_files(work_dir, args.files)
+        db_path = os.path.join(work_dir, 'ingest_ledger.db')
+        ledger = IngestLedger(db_path, lease_seconds=1)
+
+        counts, seconds = run_pool(legacy_worker, [(files, seed) for seed in range(args.workers)])
+        rows.append(['原方式(PROCESSED_DATES)', args.workers, len(files), sum(counts.values()),
+                     sum(1 for c in counts.values() if c > 1), round(seconds, 2)])
+
+        tasks = [(db_path, files, seed, 60) for seed in range(args.workers)]
+        counts, seconds = run_pool(ledger_worker, tasks)
+        rows.append(['导入台账: 首次运行', args.workers, len(files), sum(counts.values()),
+                     sum(1 for c in counts.values() if c > 1), round(seconds, 2)])
+        check('并发认领: 每个文件恰好处理一次', len(counts) == len(files) and set(counts.values()) == {1})
+
+        counts, seconds = run_pool(ledger_worker, tasks)
+        rows.append(['导入台账: 再次运行', args.workers, len(files), sum(counts.values()), 0, round(seconds, 2)])
+        check('再次运行: 已完成的文件全部跳过', not counts and len(ledger.done_keys()) == len(files))
+
+        # 进程崩溃: 认领后既没有完成也没有失败
+        crashed = files[0]
+        key = file_key(crashed)
+        ledger.reset([key])
+        ledger.claim(key, iso_date(crashed), crashed, raw_sha256(crashed), 'crashed-worker')
+        blocked = not ledger.claim(key, iso_date(crashed), crashed, raw_sha256(crashed), 'other-worker')
+        time.sleep(1.1)
+        taken = ledger.claim(key, iso_date(crashed), crashed, raw_sha256(crashed), 'other-worker')
+        late = ledger.complete(key, 1, 1, worker='crashed-worker')
+        ledger.complete(key, 1, 1, worker='other-worker')
+        check('进程崩溃: 租约内不能接手，过期后可以接手，原进程的迟到结果被拒绝', blocked and taken and not late)
+
+        # 处理失败
+        failed = files[1]
+        key = file_key(failed)
+        ledger.reset([key])
+        ledger.claim(key, iso_date(failed), failed, raw_sha256(failed), 'w')
+        ledger.fail(key, RuntimeError('数据库连接失败'), 'w')
+        state_failed = ledger.get(key)['state'] == FAILED
+        counts, _ = run_pool(ledger_worker, tasks)
+        check('处理失败: 下次运行重新处理', state_failed and counts == {key: 1} and ledger.get(key)['attempts'] == 2)
+
+        # 文件内容变化
+        changed = files[2]
+        with open(changed, 'a', encoding='utf-8') as f:
+            f.write(f"{raw_date(changed)},1,AQI,42\n")
+        counts, _ = run_pool(ledger_worker, tasks)
+        entry = ledger.get(file_key(changed))
+        check('文件内容变化: 重新处理该文件', counts == {file_key(changed): 1} and entry['state'] == DONE
+              and entry['content_sha256'] == raw_sha256(changed))
+
+        summary = ledger.summary()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    headers = ['方式', '进程数', '文件数', '实际处理次数', '被重复处理的文件', '耗时(秒)']
+    try:
+        from tabulate import tabulate
+        text = tabulate(rows, headers=headers, tablefmt='github')
+        check_text = tabulate(checks, headers=['场景', '结果'], tablefmt='github')
+    except ImportError:
+        text = '\n'.join(['\t'.join(map(str, headers))] + ['\t'.join(map(str, row)) for row in rows])
+        check_text = '\n'.join(['场景\t结果'] + ['\t'.join(row) for row in checks])
+    print(text)
+    print()
+    print(check_text)
+    print(f"\n台账汇总: {summary}")
+
+    report_path = os.path.join(reports_dir, f"ingest_ledger_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md")
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.write("# 导入台账校验\n\n")
+        f.write(f"测试时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+        f.write(f"文件数: {args.files}, 并发进程数: {args.workers}, 每个文件模拟处理 {WORK_SECONDS * 1000:.0f}ms\n\n")
+        f.write(text + "\n\n")
+        f.write(check_text + "\n")
+    print(f"结果已保存: {report_path}")
+    if any(result != '通过' for _, result in checks):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
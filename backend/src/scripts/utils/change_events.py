@@ -0,0 +1,417 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+数据变更事件
+导入脚本写入日数据后，在data_change_events表中登记一条事件（涉及的表、城市和日期范围），
+事件ID自增即为全局序号。各服务进程内的订阅线程定期读取比上次更大的ID，
+把事件分发给已注册的回调，缓存据此只失效与变更范围重叠的条目，不必依赖短TTL。
+
+自增ID在提交之前分配，并发发布时较小的ID可能晚于较大的ID提交。订阅线程记录读取时
+跳过的ID（空洞），之后的轮询继续读取这些ID，超过CHANGE_EVENT_HOLE_SECONDS仍未出现的
+按回滚留下的空洞处理。
+
+订阅线程读取失败（数据库不可用）、事件已被清理导致中间有缺口或空洞过多时，恢复后发出一次
+reset事件（范围为全部），订阅方应清空全部缓存。
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+
+logger = logging.getLogger(__name__)
+
+CHANGE_EVENTS_TABLE = 'data_change_events'
+
+# 订阅线程的轮询间隔（秒）和事件保留天数
+CHANGE_EVENT_POLL_SECONDS = float(os.environ.get('CHANGE_EVENT_POLL_SECONDS', '5'))
+CHANGE_EVENT_RETENTION_DAYS = int(os.environ.get('CHANGE_EVENT_RETENTION_DAYS', '7'))
+
+# 跳过的ID等待提交的时间（秒），以及同时跟踪的空洞数上限（超过时按缺口处理）
+CHANGE_EVENT_HOLE_SECONDS = float(os.environ.get('CHANGE_EVENT_HOLE_SECONDS', '300'))
+CHANGE_EVENT_MAX_HOLES = 1000
+
+# 表不存在（还没有任何导入发布过事件）
+TABLE_MISSING_ERRNO = 1146
+
+CREATE_CHANGE_EVENTS_TABLE = f"""
+CREATE TABLE IF NOT EXISTS {CHANGE_EVENTS_TABLE} (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    source VARCHAR(255),
+    tables VARCHAR(255) NOT NULL,
+    cities TEXT,
+    start_date DATE,
+    end_date DATE,
+    row_count INT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    KEY idx_created_at (created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+_table_ready = False
+
+
+def ensure_change_table(conn):
+    """创建事件表（如果不存在）"""
+    global _table_ready
+    cursor = conn.cursor()
+    try:
+        cursor.execute(CREATE_CHANGE_EVENTS_TABLE)
+        conn.commit()
+        _table_ready = True
+    finally:
+        cursor.close()
+
+
+def _date_str(value):
+    if value is None:
+        return None
+    if isinstance(value, (date, datetime)):
+        return value.strftime('%Y-%m-%d')
+    return str(value)[:10]
+
+
+def summarize_records(records):
+    """日数据记录涉及的城市和日期范围
+
+    Returns:
+        tuple: (城市列表, 开始日期, 结束日期)，日期为'YYYY-MM-DD'
+    """
+    cities = sorted({record['city'] for record in records if record.get('city')})
+    dates = [_date_str(record['date']) for record in records if record.get('date')]
+    return cities, (min(dates) if dates else None), (max(dates) if dates else None)
+
+
+def publish_change(conn, tables, cities=None, start_date=None, end_date=None, rows=None, source=None):
+    """登记一条数据变更事件，同时清理超过保留天数的旧事件
+
+    发布失败只记录日志，不影响已经完成的写入。
+
+    Args:
+        tables (list): 写入的表名
+        cities (list): 涉及的城市，None表示全部城市
+        start_date/end_date: 涉及的日期范围（包含），None表示不限
+        rows (int): 写入的行数
+        source (str): 事件来源（文件名、任务名等）
+
+    Returns:
+        int或None: 事件ID
+    """
+    try:
+        if not _table_ready:
+            ensure_change_table(conn)
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                f"INSERT INTO {CHANGE_EVENTS_TABLE} (source, tables, cities, start_date, end_date, row_count) "
+                f"VALUES (%s, %s, %s, %s, %s, %s)",
+                (source, ','.join(tables), json.dumps(list(cities), ensure_ascii=False) if cities is not None else None,
+                 _date_str(start_date), _date_str(end_date), rows)
+            )
+            event_id = cursor.lastrowid
+            cursor.execute(f"DELETE FROM {CHANGE_EVENTS_TABLE} WHERE created_at < NOW() - INTERVAL %s DAY",
+                           (CHANGE_EVENT_RETENTION_DAYS,))
+            conn.commit()
+        finally:
+            cursor.close()
+        logger.info(f"发布数据变更事件 #{event_id}: {','.join(tables)}, "
+                    f"{len(cities) if cities is not None else '全部'}个城市, {_date_str(start_date)} ~ {_date_str(end_date)}")
+        return event_id
+    except Exception as e:
+        logger.warning(f"发布数据变更事件失败: {e}")
+        return None
+
+
+def _row_to_event(row):
+    event_id, source, tables, cities, start_date, end_date, rows, created_at = row
+    return {
+        'id': event_id,
+        'source': source,
+        'tables': tables.split(',') if tables else None,
+        'cities': json.loads(cities) if cities else None,
+        'start_date': _date_str(start_date),
+        'end_date': _date_str(end_date),
+        'rows': rows,
+        'created_at': str(created_at) if created_at is not None else None
+    }
+
+
+def reset_event():
+    """范围为全部数据的事件，订阅方应清空全部缓存"""
+    return {'id': None, 'reset': True, 'source': None, 'tables': None, 'cities': None,
+            'start_date': None, 'end_date': None, 'rows': None, 'created_at': None}
+
+
+def event_overlaps(event, tables=None, cities=None, start_date=None, end_date=None):
+    """判断事件的变更范围与给定范围是否重叠，任一侧为None表示不限"""
+    if event.get('tables') is not None and tables is not None and not set(event['tables']) & set(tables):
+        return False
+    if event.get('cities') is not None and cities is not None and not set(event['cities']) & set(cities):
+        return False
+    if event.get('start_date') and end_date and event['start_date'] > _date_str(end_date):
+        return False
+    if event.get('end_date') and start_date and event['end_date'] < _date_str(start_date):
+        return False
+    return True
+
+
+class ChangeSubscriber:
+    """数据变更事件订阅线程
+
+    Args:
+        connect (callable): 返回数据库连接的函数，失败时返回None或抛出异常
+        interval (float): 轮询间隔（秒）
+    """
+
+    def __init__(self, connect, interval=CHANGE_EVENT_POLL_SECONDS, hole_seconds=CHANGE_EVENT_HOLE_SECONDS,
+                 clock=time.monotonic):
+        self.connect = connect
+        self.interval = interval
+        self.hole_seconds = hole_seconds
+        self.clock = clock
+        self.last_id = None
+        # 读取时跳过的ID -> 发现时间，等待晚提交的事件
+        self._holes = {}
+        self._callbacks = []
+        self._conn = None
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._failed = False
+        self._stats = {'polls': 0, 'events': 0, 'resets': 0, 'errors': 0, 'late_events': 0, 'expired_holes': 0}
+
+    def subscribe(self, callback, tables=None):
+        """注册回调 callback(event)，tables不为None时只接收涉及这些表的事件"""
+        with self._lock:
+            self._callbacks.append((callback, tables))
+        self.start()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='change-subscriber', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+        self._close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.poll()
+            self._stop.wait(self.interval)
+
+    def _close(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+    def _cursor(self):
+        if self._conn is None or not self._conn.is_connected():
+            self._close()
+            self._conn = self.connect()
+            if self._conn is None:
+                raise ConnectionError("无法连接到数据库")
+            # 自动提交，每次查询都能看到其他连接已提交的事件
+            self._conn.autocommit = True
+        return self._conn.cursor()
+
+    def _fetch(self):
+        """读取新事件和晚提交的空洞事件，返回 (事件列表, 是否有缺口)"""
+        cursor = self._cursor()
+        try:
+            try:
+                if self.last_id is None:
+                    cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {CHANGE_EVENTS_TABLE}")
+                    self.last_id = cursor.fetchone()[0]
+                    return [], False
+                columns = "id, source, tables, cities, start_date, end_date, row_count, created_at"
+                late = []
+                if self._holes:
+                    holes = sorted(self._holes)
+                    cursor.execute(f"SELECT {columns} FROM {CHANGE_EVENTS_TABLE} "
+                                   f"WHERE id IN ({', '.join(['%s'] * len(holes))}) ORDER BY id", holes)
+                    late = cursor.fetchall()
+                cursor.execute(f"SELECT {columns} FROM {CHANGE_EVENTS_TABLE} "
+                               f"WHERE id > %s ORDER BY id LIMIT 1000", (self.last_id,))
+                rows = cursor.fetchall()
+                gap = False
+                if rows and rows[0][0] > self.last_id + 1:
+                    # 中间的ID可能尚未提交或是回滚留下的空洞（记为空洞继续等待）；上次读到的事件也已被清理时，
+                    # 中间的事件可能同样已被清理，需要重置
+                    cursor.execute(f"SELECT MIN(id) FROM {CHANGE_EVENTS_TABLE}")
+                    gap = cursor.fetchone()[0] > self.last_id
+            except Exception as e:
+                if getattr(e, 'errno', None) == TABLE_MISSING_ERRNO:
+                    self.last_id = self.last_id or 0
+                    return [], False
+                raise
+        finally:
+            cursor.close()
+        events = [_row_to_event(row) for row in late]
+        for event in events:
+            self._holes.pop(event['id'], None)
+        self._stats['late_events'] += len(events)
+        if not gap:
+            gap = self._track_holes([row[0] for row in rows])
+        return events + [_row_to_event(row) for row in rows], gap
+
+    def _track_holes(self, ids):
+        """登记本次读取跳过的ID，清理超时的空洞；空洞过多时返回True（按缺口处理）"""
+        now = self.clock()
+        previous = self.last_id
+        for event_id in ids:
+            for missing in range(previous + 1, event_id):
+                self._holes.setdefault(missing, now)
+                if len(self._holes) > CHANGE_EVENT_MAX_HOLES:
+                    self._holes.clear()
+                    return True
+            previous = event_id
+        expired = [event_id for event_id, seen in self._holes.items() if now - seen > self.hole_seconds]
+        for event_id in expired:
+            del self._holes[event_id]
+        self._stats['expired_holes'] += len(expired)
+        return False
+
+    def poll(self):
+        """读取并分发一次新事件，返回分发的事件数（也可在已知数据变更后直接调用，不必等下一次轮询）"""
+        with self._poll_lock:
+            return self._poll()
+
+    def _poll(self):
+        try:
+            events, gap = self._fetch()
+        except Exception as e:
+            self._stats['errors'] += 1
+            if not self._failed:
+                logger.warning(f"读取数据变更事件失败，恢复后将清空缓存: {e}")
+            self._failed = True
+            self._close()
+            return 0
+        self._stats['polls'] += 1
+        if self._failed or gap:
+            # 读取失败期间或已被清理的事件无法得知范围，按全部数据变更处理
+            self._failed = False
+            self._holes.clear()
+            self._stats['resets'] += 1
+            self._dispatch(reset_event())
+        for event in events:
+            self.last_id = max(self.last_id, event['id'])
+            self._dispatch(event)
+        self._stats['events'] += len(events)
+        return len(events)
+
+    def _dispatch(self, event):
+        with self._lock:
+            callbacks = list(self._callbacks)
+        for callback, tables in callbacks:
+            if tables is not None and event['tables'] is not None and not set(event['tables']) & set(tables):
+                continue
+            try:
+                callback(event)
+            except Exception as e:
+                logger.error(f"处理数据变更事件失败: {e}")
+
+    def stats(self):
+        return dict(self._stats, last_id=self.last_id, interval=self.interval, holes=len(self._holes))
+
+
+class ScopedCache:
+    """按数据范围失效的内存缓存
+
+    每个条目登记其依赖的 (表, 城市, 日期范围)，收到变更事件时只删除范围重叠的条目。
+    查询数据库前先取version()，写入缓存时传回；期间如有重叠的变更事件被处理，
+    本次查询结果可能已过时，不写入缓存。
+    ttl不为None时条目最多保留ttl秒，用于兜底不发布事件的写入方。
+    """
+
+    def __init__(self, name, max_entries=1024, ttl=None, clock=time.monotonic):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = 0
+        self._stats = {'hits': 0, 'misses': 0, 'invalidated': 0, 'expired': 0}
+
+    def version(self):
+        with self._lock:
+            return self._version
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is not None and self.clock() >= entry[2]:
+                del self._entries[key]
+                self._stats['expired'] += 1
+                entry = None
+            if entry is None:
+                self._stats['misses'] += 1
+                return default
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[0]
+
+    def put(self, key, value, version, tables=None, cities=None, start_date=None, end_date=None):
+        """写入缓存，version与当前版本不一致时放弃写入"""
+        scope = {'tables': tables, 'cities': cities,
+                 'start_date': _date_str(start_date), 'end_date': _date_str(end_date)}
+        with self._lock:
+            if version != self._version:
+                return False
+            expires_at = self.clock() + self.ttl if self.ttl is not None else None
+            self._entries[key] = (value, scope, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return True
+
+    def invalidate(self, event):
+        """删除与事件范围重叠的条目，返回删除的条目数"""
+        with self._lock:
+            self._version += 1
+            if event.get('reset'):
+                removed = list(self._entries)
+            else:
+                removed = [key for key, (_, scope, _) in self._entries.items()
+                           if event_overlaps(event, **scope)]
+            for key in removed:
+                del self._entries[key]
+            self._stats['invalidated'] += len(removed)
+        if removed:
+            logger.info(f"缓存 {self.name}: 数据变更事件 #{event.get('id')} 失效 {len(removed)} 个条目")
+        return len(removed)
+
+    def clear(self):
+        self.invalidate(reset_event())
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, name=self.name, entries=len(self._entries))
+
+
+_subscriber = None
+_subscriber_lock = threading.Lock()
+
+
+def get_change_subscriber(connect):
+    """获取进程内共享的订阅线程（第一次调用时传入的connect用于之后的全部轮询）"""
+    global _subscriber
+    if _subscriber is None:
+        with _subscriber_lock:
+            if _subscriber is None:
+                _subscriber = ChangeSubscriber(connect)
+    return _subscriber
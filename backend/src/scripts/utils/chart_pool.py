@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+图表渲染进程池
+常驻的工作进程在启动时预加载Agg后端、中文字体和绘图工具，报告中的多个图表并发渲染，
+渲染结果（PNG二进制）按数据哈希和图表参数缓存。
+报告格式生成器等其他CPU密集的任务通过submit在同一组工作进程中执行，不受主进程GIL限制。
+"""
+
+import os
+import sys
+import time
+import json
+import hashlib
+import functools
+import logging
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 后端根目录和默认中文字体
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+DEFAULT_FONT_PATH = os.path.join(BACKEND_ROOT, 'data', 'fonts', 'simhei.ttf')
+
+# 并发与缓存配置 - 可通过环境变量覆盖，CHART_WORKERS=0 时在当前进程内渲染
+CHART_WORKERS = int(os.environ.get('CHART_WORKERS', str(min(4, os.cpu_count() or 1))))
+CHART_DPI = int(os.environ.get('CHART_DPI', '150'))
+CHART_CACHE_MAX_BYTES = int(os.environ.get('CHART_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+
+# 图表类型到plot_utils函数名的映射
+CHART_FUNCTIONS = {
+    'bar': 'create_bar_chart',
+    'line': 'create_line_chart',
+    'heatmap': 'create_heatmap',
+    'pie': 'create_pie_chart'
+}
+
+_plot_utils = None
+
+# 不使用进程池时，pyplot的全局状态需要串行访问
+_inline_lock = threading.Lock()
+
+
+def _init_worker(font_path=DEFAULT_FONT_PATH):
+    """工作进程初始化: 选择Agg后端、注册中文字体并导入绘图工具"""
+    global _plot_utils
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib import font_manager
+    import matplotlib.pyplot as plt
+
+    if font_path and os.path.exists(font_path):
+        font_manager.fontManager.addfont(font_path)
+        font_name = font_manager.FontProperties(fname=font_path).get_name()
+        plt.rcParams['font.sans-serif'] = [font_name] + plt.rcParams['font.sans-serif']
+    plt.rcParams['axes.unicode_minus'] = False
+
+    if BACKEND_ROOT not in sys.path:
+        sys.path.append(BACKEND_ROOT)
+    from src.scripts.utils import plot_utils
+    _plot_utils = plot_utils
+
+
+def _warmup():
+    return os.getpid()
+
+
+def _render_chart(kind, data, options, dpi):
+    """在工作进程中渲染单个图表
+
+    Returns:
+        tuple: (PNG二进制数据或None, 渲染耗时秒数)
+    """
+    if _plot_utils is None:
+        _init_worker()
+    start = time.perf_counter()
+    func = getattr(_plot_utils, CHART_FUNCTIONS[kind])
+    png = func(data, dpi=dpi, **options)
+    return png, time.perf_counter() - start
+
+
+def chart_cache_key(kind, data, options, dpi):
+    """按数据内容哈希和图表参数构建缓存键"""
+    digest = hashlib.sha256()
+    digest.update(kind.encode('utf-8'))
+    digest.update(str(dpi).encode('utf-8'))
+    digest.update(json.dumps(options, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8'))
+    if isinstance(data, pd.DataFrame):
+        digest.update(','.join(map(str, data.columns)).encode('utf-8'))
+        digest.update(pd.util.hash_pandas_object(data, index=False).values.tobytes())
+    else:
+        digest.update(json.dumps(data, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ChartRenderPool:
+    """图表渲染池
+
+    render_many接收图表规格列表，每个规格为:
+        {'name': 图表名称, 'kind': 'bar'|'line'|'heatmap'|'pie', 'data': DataFrame, 'options': {...}}
+    options原样传给plot_utils中对应的函数（title、x_column等）。
+    """
+
+    def __init__(self, max_workers=CHART_WORKERS, dpi=CHART_DPI, cache_max_bytes=CHART_CACHE_MAX_BYTES):
+        self.max_workers = max(0, max_workers)
+        self.dpi = dpi
+        self.cache_max_bytes = cache_max_bytes
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._cache_bytes = 0
+        self._cache_lock = threading.Lock()
+        self._stats = {'rendered': 0, 'cache_hits': 0, 'failed': 0, 'render_seconds': 0.0, 'tasks': 0}
+
+    def _get_executor(self):
+        with self._executor_lock:
+            if self._executor is None and self.max_workers > 0:
+                # spawn避免在多线程的Flask进程中fork；工作进程会以__mp_main__重新导入启动脚本，
+                # 启动脚本的初始化必须放在__main__保护之下
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker
+                )
+            return self._executor
+
+    def warm_up(self):
+        """启动全部工作进程，使首个报告不承担进程启动和字体加载的开销"""
+        executor = self._get_executor()
+        if executor is None:
+            _init_worker()
+            return []
+        futures = [executor.submit(_warmup) for _ in range(self.max_workers)]
+        pids = sorted({f.result() for f in futures})
+        logger.info(f"图表渲染进程池已就绪: {len(pids)}个进程")
+        return pids
+
+    def _cache_get(self, key):
+        with self._cache_lock:
+            png = self._cache.get(key)
+            if png is not None:
+                self._cache.move_to_end(key)
+            return png
+
+    def _cache_put(self, key, png):
+        if not png or len(png) > self.cache_max_bytes:
+            return
+        with self._cache_lock:
+            if key in self._cache:
+                return
+            self._cache[key] = png
+            self._cache_bytes += len(png)
+            while self._cache_bytes > self.cache_max_bytes and self._cache:
+                _, evicted = self._cache.popitem(last=False)
+                self._cache_bytes -= len(evicted)
+
+    def render_many(self, specs, dpi=None):
+        """并发渲染一组图表
+
+        Returns:
+            list: 与specs顺序一致的结果，每项为
+                {'name', 'kind', 'title', 'png', 'cached', 'render_seconds', 'error'}
+        """
+        dpi = dpi or self.dpi
+        results = [None] * len(specs)
+        pending = {}
+
+        for index, spec in enumerate(specs):
+            kind = spec.get('kind')
+            options = spec.get('options', {})
+            name = spec.get('name', f"chart_{index}")
+            if kind not in CHART_FUNCTIONS:
+                results[index] = {'name': name, 'kind': kind, 'title': options.get('title'), 'png': None,
+                                  'cached': False, 'render_seconds': 0.0, 'error': f"不支持的图表类型: {kind}"}
+                continue
+            key = chart_cache_key(kind, spec.get('data'), options, dpi)
+            png = self._cache_get(key)
+            if png is not None:
+                with self._cache_lock:
+                    self._stats['cache_hits'] += 1
+                results[index] = {'name': name, 'kind': kind, 'title': options.get('title'), 'png': png,
+                                  'cached': True, 'render_seconds': 0.0, 'error': None}
+                continue
+            pending[index] = (key, name, kind, spec.get('data'), options)
+
+        if pending:
+            executor = self._get_executor()
+            futures = {}
+            for index, (key, name, kind, data, options) in pending.items():
+                if executor is None:
+                    futures[index] = None
+                else:
+                    futures[index] = executor.submit(_render_chart, kind, data, options, dpi)
+
+            for index, future in futures.items():
+                key, name, kind, data, options = pending[index]
+                try:
+                    if future is None:
+                        with _inline_lock:
+                            png, seconds = _render_chart(kind, data, options, dpi)
+                    else:
+                        png, seconds = future.result()
+                    error = None if png else '图表渲染结果为空'
+                except BrokenProcessPool as e:
+                    self._reset_executor()
+                    png, seconds, error = None, 0.0, f"图表渲染进程异常退出: {str(e)}"
+                except Exception as e:
+                    png, seconds, error = None, 0.0, str(e)
+
+                with self._cache_lock:
+                    if png:
+                        self._stats['rendered'] += 1
+                        self._stats['render_seconds'] += seconds
+                    else:
+                        self._stats['failed'] += 1
+                if png:
+                    self._cache_put(key, png)
+                else:
+                    logger.warning(f"图表渲染失败: {name}: {error}")
+                results[index] = {'name': name, 'kind': kind, 'title': options.get('title'), 'png': png,
+                                  'cached': False, 'render_seconds': round(seconds, 4), 'error': error}
+
+        return results
+
+    def submit(self, fn, *args):
+        """在工作进程中执行其他CPU密集的任务（如报告格式生成器）
+
+        fn和参数需要能被pickle，fn必须是模块级函数，且所在模块导入时没有副作用（工作进程会导入它，
+        不能因此创建Flask应用、打开数据库或启动线程）。CHART_WORKERS=0时在当前线程中执行。
+
+        Returns:
+            Future: 任务结果，工作进程异常退出时抛出BrokenProcessPool（进程池随后重建）
+        """
+        executor = self._get_executor()
+        if executor is None:
+            future = Future()
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._reset_executor(executor)
+            executor = self._get_executor()
+            future = executor.submit(fn, *args)
+        future.add_done_callback(functools.partial(self._check_broken, executor))
+        with self._cache_lock:
+            self._stats['tasks'] += 1
+        return future
+
+    def _check_broken(self, executor, future):
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            self._reset_executor(executor)
+
+    def _reset_executor(self, executor=None):
+        """关闭异常的进程池，下次使用时重建；executor已被替换时不做处理"""
+        with self._executor_lock:
+            if self._executor is None or (executor is not None and self._executor is not executor):
+                return
+            broken, self._executor = self._executor, None
+        broken.shutdown(wait=False)
+
+    def stats(self):
+        with self._cache_lock:
+            stats = dict(self._stats)
+            stats['render_seconds'] = round(stats['render_seconds'], 4)
+            stats['cache_entries'] = len(self._cache)
+            stats['cache_bytes'] = self._cache_bytes
+        stats['workers'] = self.max_workers
+        stats['dpi'] = self.dpi
+        return stats
+
+    def shutdown(self, wait=False):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_chart_pool():
+    """获取进程内共享的图表渲染池"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ChartRenderPool()
+    return _pool
@@ -39,8 +39,28 @@ except Exception as e:
 # 设置Seaborn样式
 sns.set(style="whitegrid")
 
+# 默认渲染分辨率
+DEFAULT_DPI = 150
+
+def _render_figure(save_path=None, show=False, dpi=DEFAULT_DPI):
+    """以指定分辨率渲染当前图表一次，返回PNG二进制数据，需要时写入save_path"""
+    img_data = io.BytesIO()
+    plt.savefig(img_data, format='png', dpi=dpi, bbox_inches='tight')
+    png_bytes = img_data.getvalue()
+
+    if save_path:
+        with open(save_path, 'wb') as f:
+            f.write(png_bytes)
+
+    if show:
+        plt.show()
+
+    plt.close()
+    return png_bytes
+
 def create_bar_chart(data, x_column, y_column, title=None, xlabel=None, ylabel=None, 
-                    color='#1890ff', figsize=(10, 6), save_path=None, show=False):
+                    color='#1890ff', figsize=(10, 6), save_path=None, show=False,
+                    dpi=DEFAULT_DPI):
     """
     创建柱状图
     
@@ -55,6 +75,7 @@ def create_bar_chart(data, x_column, y_column, title=None, xlabel=None, ylabel=N
         figsize: 图表尺寸
         save_path: 保存路径
         show: 是否显示图表
+        dpi: 渲染分辨率，图表只渲染一次，返回值与保存的文件内容相同
         
     Returns:
         bytes或None: 图表二进制数据或None
@@ -84,21 +105,7 @@ def create_bar_chart(data, x_column, y_column, title=None, xlabel=None, ylabel=N
         # 自动调整布局
         plt.tight_layout()
         
-        # 保存或返回图表
-        if save_path:
-            plt.savefig(save_path, dpi=300, bbox_inches='tight')
-            
-        if show:
-            plt.show()
-            
-        # 将图表转换为二进制数据
-        img_data = io.BytesIO()
-        plt.savefig(img_data, format='png', dpi=100, bbox_inches='tight')
-        img_data.seek(0)
-        
-        plt.close()
-        
-        return img_data.getvalue()
+        return _render_figure(save_path, show, dpi)
         
     except Exception as e:
         logger.error(f"创建柱状图失败: {str(e)}")
@@ -107,7 +114,7 @@ def create_bar_chart(data, x_column, y_column, title=None, xlabel=None, ylabel=N
 
 def create_line_chart(data, x_column, y_columns, title=None, xlabel=None, ylabel=None,
                      colors=None, figsize=(12, 6), save_path=None, show=False, 
-                     include_markers=True, grid=True):
+                     include_markers=True, grid=True, dpi=DEFAULT_DPI):
     """
     创建折线图
     
@@ -122,6 +129,7 @@ def create_line_chart(data, x_column, y_columns, title=None, xlabel=None, ylabel
         figsize: 图表尺寸
         save_path: 保存路径
         show: 是否显示图表
+        dpi: 渲染分辨率，图表只渲染一次，返回值与保存的文件内容相同
         include_markers: 是否包含数据点标记
         grid: 是否显示网格
         
@@ -186,21 +194,7 @@ def create_line_chart(data, x_column, y_columns, title=None, xlabel=None, ylabel
         # 自动调整布局
         plt.tight_layout()
         
-        # 保存或返回图表
-        if save_path:
-            plt.savefig(save_path, dpi=300, bbox_inches='tight')
-            
-        if show:
-            plt.show()
-            
-        # 将图表转换为二进制数据
-        img_data = io.BytesIO()
-        plt.savefig(img_data, format='png', dpi=100, bbox_inches='tight')
-        img_data.seek(0)
-        
-        plt.close()
-        
-        return img_data.getvalue()
+        return _render_figure(save_path, show, dpi)
         
     except Exception as e:
         logger.error(f"创建折线图失败: {str(e)}")
@@ -209,7 +203,7 @@ def create_line_chart(data, x_column, y_columns, title=None, xlabel=None, ylabel
 
 def create_heatmap(data, x_column, y_column, value_column, title=None, 
                   xlabel=None, ylabel=None, cmap='YlOrRd', figsize=(12, 8), 
-                  save_path=None, show=False):
+                  save_path=None, show=False, dpi=DEFAULT_DPI):
     """
     创建热力图
     
@@ -225,6 +219,7 @@ def create_heatmap(data, x_column, y_column, value_column, title=None,
         figsize: 图表尺寸
         save_path: 保存路径
         show: 是否显示图表
+        dpi: 渲染分辨率，图表只渲染一次，返回值与保存的文件内容相同
         
     Returns:
         bytes或None: 图表二进制数据或None
@@ -257,21 +252,7 @@ def create_heatmap(data, x_column, y_column, value_column, title=None,
         # 自动调整布局
         plt.tight_layout()
         
-        # 保存或返回图表
-        if save_path:
-            plt.savefig(save_path, dpi=300, bbox_inches='tight')
-            
-        if show:
-            plt.show()
-            
-        # 将图表转换为二进制数据
-        img_data = io.BytesIO()
-        plt.savefig(img_data, format='png', dpi=100, bbox_inches='tight')
-        img_data.seek(0)
-        
-        plt.close()
-        
-        return img_data.getvalue()
+        return _render_figure(save_path, show, dpi)
         
     except Exception as e:
         logger.error(f"创建热力图失败: {str(e)}")
@@ -279,7 +260,8 @@ def create_heatmap(data, x_column, y_column, value_column, title=None,
         return None
 
 def create_pie_chart(data, labels, values, title=None, colors=None, 
-                    figsize=(8, 8), save_path=None, show=False, autopct='%1.1f%%'):
+                    figsize=(8, 8), save_path=None, show=False, autopct='%1.1f%%',
+                    dpi=DEFAULT_DPI):
     """
     创建饼图
     
@@ -293,6 +275,7 @@ def create_pie_chart(data, labels, values, title=None, colors=None,
         save_path: 保存路径
         show: 是否显示图表
         autopct: 百分比格式
+        dpi: 渲染分辨率，图表只渲染一次，返回值与保存的文件内容相同
         
     Returns:
         bytes或None: 图表二进制数据或None
@@ -325,21 +308,7 @@ def create_pie_chart(data, labels, values, title=None, colors=None,
         # 自动调整布局
         plt.tight_layout()
         
-        # 保存或返回图表
-        if save_path:
-            plt.savefig(save_path, dpi=300, bbox_inches='tight')
-            
-        if show:
-            plt.show()
-            
-        # 将图表转换为二进制数据
-        img_data = io.BytesIO()
-        plt.savefig(img_data, format='png', dpi=100, bbox_inches='tight')
-        img_data.seek(0)
-        
-        plt.close()
-        
-        return img_data.getvalue()
+        return _render_figure(save_path, show, dpi)
         
     except Exception as e:
         logger.error(f"创建饼图失败: {str(e)}")
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+区域登记表
+省份和城市的唯一来源（regions.yaml），取代导入、实时数据和查询服务中各自维护的广东省城市列表。
+启用哪些省份由配置决定，导入时按城市名（带或不带"市"字）精确匹配原始文件的列，
+也可以保留原始文件中的全部城市。
+"""
+
+import os
+import logging
+import threading
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+REGION_CONFIG_PATH = os.environ.get(
+    'REGION_CONFIG', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'regions.yaml'))
+
+# 未登记城市的省份（ingest_all_cities时入库的省份字段）
+OTHER_PROVINCE = '其他'
+
+
+def city_aliases(name):
+    """城市名的各种写法: 原名和去掉"市"字的简称"""
+    aliases = [name]
+    if name.endswith('市') and len(name) > 2:
+        aliases.append(name[:-1])
+    return aliases
+
+
+class RegionRegistry:
+    """省份 -> 城市的登记表
+
+    Args:
+        provinces (list): 省份配置，每项包含name, slug, code, cities（城市字典列表）和可选的groups、group_names
+        active (list或str): 启用的省份名称，None或'all'为全部
+        ingest_all_cities (bool): 导入时是否保留原始文件中未登记的城市
+    """
+
+    def __init__(self, provinces, active=None, ingest_all_cities=False):
+        self._provinces = {}
+        self._cities = {}
+        self._aliases = {}
+        for province in provinces or []:
+            name = province['name']
+            cities = []
+            for city in province.get('cities') or []:
+                city = dict(city, province=name)
+                cities.append(city)
+                self._cities[city['name']] = city
+                for alias in city_aliases(city['name']):
+                    self._aliases.setdefault(alias, city['name'])
+            self._provinces[name] = dict(province, cities=cities, groups=dict(province.get('groups') or {}),
+                                         group_names=dict(province.get('group_names') or {}))
+
+        if active is None or active == 'all' or active == ['all']:
+            active = list(self._provinces)
+        unknown = [name for name in active if name not in self._provinces]
+        if unknown:
+            raise ValueError(f"区域登记表中没有这些省份: {', '.join(unknown)}")
+        self.active = list(active)
+        self.ingest_all_cities = bool(ingest_all_cities)
+        self._active_aliases = {alias: city for alias, city in self._aliases.items()
+                                if self._cities[city]['province'] in self.active}
+
+    def provinces(self, active_only=True):
+        """省份配置列表"""
+        names = self.active if active_only else list(self._provinces)
+        return [self._provinces[name] for name in names]
+
+    def city_infos(self, provinces=None):
+        """城市字典列表（含province字段），默认为启用的省份"""
+        names = self.active if provinces is None else provinces
+        return [city for name in names for city in self._provinces[name]['cities']]
+
+    def cities(self, provinces=None):
+        """城市名列表，默认为启用的省份"""
+        return [city['name'] for city in self.city_infos(provinces)]
+
+    def find_city(self, name):
+        """按城市名（带或不带"市"字）查找已登记的城市，找不到返回None"""
+        city = self._aliases.get((name or '').strip())
+        return self._cities[city] if city else None
+
+    def province_of(self, city):
+        """城市所属的省份，未登记的城市返回OTHER_PROVINCE"""
+        info = self._cities.get(city) or self.find_city(city)
+        return info['province'] if info else OTHER_PROVINCE
+
+    def region_city_map(self):
+        """区域代码 -> 城市列表: 启用省份的每个城市、省内分组和整个省份"""
+        mapping = {}
+        for province in self.provinces():
+            for city in province['cities']:
+                mapping[city['slug']] = [city['name']]
+            for group, cities in province['groups'].items():
+                mapping[group] = list(cities)
+            if province.get('slug'):
+                mapping[province['slug']] = [city['name'] for city in province['cities']]
+        return mapping
+
+    def area_name(self):
+        """启用省份的名称（报告中'all'区域和系统标题使用），多个省份以顿号连接"""
+        return '、'.join(self.active)
+
+    def region_info(self, code):
+        """区域代码的名称和类型
+
+        Args:
+            code (str): 'all'、省份/城市/分组的区域代码，或城市名
+
+        Returns:
+            dict: {'id', 'name', 'type'}，type为province、city、region之一；无法识别时名称为代码本身
+        """
+        if not code or code == 'all':
+            return {'id': 'all', 'name': self.area_name(), 'type': 'province'}
+        for province in self.provinces():
+            if code == province.get('slug'):
+                return {'id': code, 'name': province['name'], 'type': 'province'}
+            if code in province['groups']:
+                return {'id': code, 'name': province['group_names'].get(code, code), 'type': 'region'}
+            for city in province['cities']:
+                if code == city['slug']:
+                    return {'id': code, 'name': city['name'], 'type': 'city'}
+        city = self.find_city(code)
+        if city:
+            return {'id': code, 'name': city['name'], 'type': 'city'}
+        return {'id': code, 'name': code, 'type': 'region'}
+
+    def column_mapping(self, columns, cities=None):
+        """把原始文件的城市列映射为标准城市名
+
+        每列只做一次字典查找，同一城市出现多列时保留第一列。
+
+        Args:
+            columns (list): 原始文件中除日期、小时、类型以外的列名
+            cities (list): 只保留这些城市，None时按登记表（启用的省份；ingest_all_cities时保留全部列）
+
+        Returns:
+            dict: 原始列名 -> 标准城市名
+        """
+        if cities is not None:
+            wanted = {}
+            for city in cities:
+                for alias in city_aliases(city):
+                    wanted.setdefault(alias, city)
+        else:
+            wanted = self._active_aliases
+        mapping = {}
+        seen = set()
+        for column in columns:
+            city = wanted.get(column)
+            if city is None and cities is None and self.ingest_all_cities and column:
+                city = self._aliases.get(column, column)
+            if city is not None and city not in seen:
+                seen.add(city)
+                mapping[column] = city
+        return mapping
+
+    def describe(self):
+        return {
+            'active': self.active,
+            'ingest_all_cities': self.ingest_all_cities,
+            'provinces': [{'name': province['name'], 'slug': province.get('slug'), 'code': province.get('code'),
+                           'cities': [city['name'] for city in province['cities']],
+                           'groups': province['groups'], 'group_names': province['group_names']}
+                          for province in self.provinces(active_only=False)]
+        }
+
+
+def load_region_registry(path=None):
+    """从配置文件加载区域登记表，环境变量ACTIVE_PROVINCES和INGEST_ALL_CITIES覆盖配置"""
+    path = path or REGION_CONFIG_PATH
+    with open(path, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f) or {}
+    active = config.get('active')
+    if os.environ.get('ACTIVE_PROVINCES'):
+        active = [name.strip() for name in os.environ['ACTIVE_PROVINCES'].split(',') if name.strip()]
+    ingest_all_cities = config.get('ingest_all_cities', False)
+    if os.environ.get('INGEST_ALL_CITIES'):
+        ingest_all_cities = os.environ['INGEST_ALL_CITIES'].lower() in ('1', 'true', 'yes')
+    registry = RegionRegistry(config.get('provinces'), active, ingest_all_cities)
+    logger.debug(f"区域登记表: 启用 {', '.join(registry.active)}, 城市 {len(registry.cities())} 个")
+    return registry
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_region_registry():
+    """获取进程内共享的区域登记表"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = load_region_registry()
+    return _registry
@@ -252,44 +252,69 @@ def run_user_auth_api():
     """运行用户认证API服务"""
     return run_api_service(user_auth_api_path, 5004, "用户认证API", "auth")
 
+def next_data_process_run(now, hourly, hour_interval=6, minute=0):
+    """计算下一次数据更新的时间和方式
+
+    默认每6小时（0点、6点、12点、18点）全量更新一次；hourly模式下每小时的第minute分钟运行，
+    逢6小时的整点仍做全量更新，其余时间只做增量导入。
+
+    Returns:
+        tuple: (下次运行时间, 是否增量)
+    """
+    if hourly:
+        next_run = now.replace(minute=minute, second=0, microsecond=0)
+        if next_run <= now:
+            next_run += datetime.timedelta(hours=1)
+        return next_run, next_run.hour % hour_interval != 0
+    next_slot = (now.hour // hour_interval + 1) * hour_interval % 24
+    next_run = now.replace(hour=next_slot, minute=0, second=0, microsecond=0)
+    next_run = next_run + datetime.timedelta(days=1) if next_run <= now else next_run
+    return next_run, False
+
 def run_data_process():
-    """定时运行数据处理脚本"""
+    """定时运行数据处理脚本
+
+    环境变量DATA_PROCESS_MODE=hourly时每小时做一次增量导入（DATA_PROCESS_MINUTE指定在第几分钟运行，
+    默认第10分钟），新数据在发布后几分钟内入库；默认仍为每6小时全量更新。
+    """
     log('INFO', "数据处理线程已启动", service='data_process')
     
     script_path = os.path.join(project_root, 'src', 'scripts', 'process', 'new_stage', 'download_data_process.py')
     python_path = sys.executable
     last_success_time = datetime.datetime.now()
+    hourly = os.environ.get('DATA_PROCESS_MODE', 'full').lower() == 'hourly'
+    minute = int(os.environ.get('DATA_PROCESS_MINUTE', '10'))
+    # 增量导入每小时一次，不受全量更新30分钟最小间隔的限制
+    min_interval = 0 if hourly else 1800
     
     # 检查数据处理脚本是否存在
     if not os.path.exists(script_path):
         log('ERROR', f"数据处理脚本不存在: {script_path}", service='data_process')
         return 1
     
-    # 计算首次执行时间（每6小时：0点、6点、12点、18点）
-    now = datetime.datetime.now()
-    hour_interval = 6
-    next_slot = (now.hour // hour_interval + 1) * hour_interval % 24
-    next_hour = now.replace(hour=next_slot, minute=0, second=0, microsecond=0)
-    next_hour = next_hour + datetime.timedelta(days=1) if next_hour <= now else next_hour
+    # 计算首次执行时间
+    next_hour, incremental = next_data_process_run(datetime.datetime.now(), hourly, minute=minute)
     
-    log('INFO', f"首次数据更新将在 {next_hour.strftime('%Y-%m-%d %H:%M:%S')} 进行", service='data_process')
+    log('INFO', f"首次数据更新将在 {next_hour.strftime('%Y-%m-%d %H:%M:%S')} 进行"
+        f"{'（增量）' if incremental else ''}", service='data_process')
     
     while True:
         try:
             now = datetime.datetime.now()
             
-            # 如果距离上次成功执行不足30分钟，跳过本次执行
-            if (now - last_success_time).total_seconds() < 1800:
+            # 未到计划时间，或全量更新距离上次成功执行不足30分钟，跳过本次执行
+            if now < next_hour or (now - last_success_time).total_seconds() < min_interval:
                 pass
             else:
                 # 执行数据更新
-                log('INFO', "开始执行定时数据更新", service='data_process')
+                log('INFO', f"开始执行定时数据{'增量导入' if incremental else '更新'}", service='data_process')
                 
                 env = os.environ.copy()
                 env["PYTHONPATH"] = project_root + os.pathsep + env.get("PYTHONPATH", "")
                 
+                command = [python_path, script_path] + (['--incremental'] if incremental else [])
                 process = subprocess.run(
-                    [python_path, script_path],
+                    command,
                     stdout=subprocess.PIPE, stderr=subprocess.STDOUT, 
                     universal_newlines=True, env=env, check=False
                 )
@@ -303,12 +328,11 @@ def run_data_process():
             
             # 计算下次执行时间
             now = datetime.datetime.now()
-            next_slot = (now.hour // hour_interval + 1) * hour_interval % 24
-            next_hour = now.replace(hour=next_slot, minute=0, second=0, microsecond=0)
-            next_hour = next_hour + datetime.timedelta(days=1) if next_hour <= now else next_hour
+            next_hour, incremental = next_data_process_run(now, hourly, minute=minute)
             
             sleep_seconds = (next_hour - now).total_seconds()
-            log('INFO', f"下次数据更新将在 {next_hour.strftime('%Y-%m-%d %H:%M:%S')} 进行", service='data_process')
+            log('INFO', f"下次数据更新将在 {next_hour.strftime('%Y-%m-%d %H:%M:%S')} 进行"
+                f"{'（增量）' if incremental else ''}", service='data_process')
             
             # 分段休眠，便于响应系统信号
             remaining_sleep = sleep_seconds
@@ -15,12 +15,13 @@ const apiClient = axios.create({
 
 /**
  * 获取报告历史记录
+ * @param {Object} [filters] - 可选过滤条件 (region, type, format, start_date, end_date, page, page_size)
  * @returns {Promise} 报告历史记录列表
  */
-export async function fetchReportHistory() {
+export async function fetchReportHistory(filters = {}) {
   try {
     // 使用已创建的apiClient实例而不是单独的端口
-    const response = await apiClient.get('/api/reports/history');
+    const response = await apiClient.get('/api/reports/history', { params: filters });
     
     // 确保返回的数据是数组
     if (Array.isArray(response.data)) {
@@ -72,6 +73,11 @@ export async function generateReportRequest(reportData) {
       throw new Error('报告生成失败：服务器返回空响应');
     }
     
+    // 报告在后台任务队列中生成，轮询任务状态直到完成
+    if (response.data.job_id && response.data.status !== 'completed') {
+      return await waitForReportJob(response.data.job_id)
+    }
+    
     return response.data
   } catch (error) {
     console.error('Error generating report:', error)
@@ -92,6 +98,46 @@ export async function generateReportRequest(reportData) {
   }
 }
 
+/**
+ * 轮询报告生成任务，直到任务结束
+ * @param {string} jobId - 任务ID
+ * @param {Function} onProgress - 进度回调 (progress, message)
+ * @param {number} interval - 轮询间隔(毫秒)
+ * @returns {Promise} 生成完成的报告信息
+ */
+export async function waitForReportJob(jobId, onProgress, interval = 1000) {
+  while (true) {
+    const response = await apiClient.get(`/api/reports/jobs/${jobId}`)
+    const job = response.data
+    
+    if (typeof onProgress === 'function') {
+      onProgress(job.progress, job.message)
+    }
+    
+    if (job.status === 'completed') {
+      return job.result
+    }
+    if (job.status === 'failed') {
+      throw new Error(job.error || '报告生成失败')
+    }
+    if (job.status === 'cancelled') {
+      throw new Error('报告生成已取消')
+    }
+    
+    await new Promise(resolve => setTimeout(resolve, interval))
+  }
+}
+
+/**
+ * 取消报告生成任务
+ * @param {string} jobId - 任务ID
+ * @returns {Promise} 任务状态
+ */
+export async function cancelReportJob(jobId) {
+  const response = await apiClient.post(`/api/reports/jobs/${jobId}/cancel`)
+  return response.data
+}
+
 /**
  * 获取特定报告详情
  * @param {string} reportId - 报告ID